@@ -0,0 +1,222 @@
+//! In-process Python binding to the native AshMaize hash.
+//!
+//! Same ROM parameters and preimage/difficulty rules as the daemon, but
+//! called directly from Python: no socket, no hex encoding, and the GIL is
+//! released while ROMs are built and hashes are computed, so coordinator
+//! worker threads hash in parallel.
+//!
+//! ```python
+//! import ashpy
+//! rom = ashpy.rom(challenge["no_pre_mine"])       # build once, cached
+//! hashes = ashpy.hash_batch(rom, [pre1, pre2])     # list of 64-byte hashes
+//! hashed, winners = ashpy.search(rom, suffix, mask, start, count)
+//! ```
+
+use std::collections::HashMap;
+use std::sync::{Arc, Mutex, OnceLock};
+use std::thread;
+
+use ashmaize::{hash, Rom, RomGenerationType};
+use pyo3::prelude::*;
+use pyo3::types::PyBytes;
+
+const NB_LOOPS: u32 = 8;
+const NB_INSTRS: u32 = 256;
+
+/// A cache entry: set once its ROM is built.
+type Slot = Arc<OnceLock<Arc<Rom>>>;
+
+// ROM cache keyed by the raw seed string (no_pre_mine), like the daemon's.
+fn rom_cache() -> &'static Mutex<HashMap<String, Slot>> {
+    static CACHE: OnceLock<Mutex<HashMap<String, Slot>>> = OnceLock::new();
+    CACHE.get_or_init(|| Mutex::new(HashMap::new()))
+}
+
+/// Look up or build the ROM for `seed`. The build runs outside the cache
+/// lock, in the seed's slot: concurrent callers asking for the same new seed
+/// wait for one build instead of each allocating 1 GiB, and lookups of
+/// other seeds are not held up by it.
+fn cached_rom(seed: &str) -> Arc<Rom> {
+    let slot = rom_cache().lock().unwrap().entry(seed.to_string()).or_default().clone();
+    slot.get_or_init(|| {
+        // same parameters as native_rom() in the daemon
+        Arc::new(Rom::new(
+            seed.as_bytes(),
+            RomGenerationType::TwoStep {
+                pre_size: 16 * 1024 * 1024, // 16MB
+                mixing_numbers: 4,
+            },
+            1024 * 1024 * 1024, // 1GB
+        ))
+    })
+    .clone()
+}
+
+/// The ROM for `seed` if it is cached and built.
+fn built_rom(seed: &str) -> Option<Arc<Rom>> {
+    rom_cache().lock().unwrap().get(seed)?.get().cloned()
+}
+
+/// Handle to a cached ROM. Hold on to it; looking it up again is cheap too.
+#[pyclass(frozen, name = "Rom", module = "ashpy")]
+struct PyRom {
+    seed: String,
+    rom: Arc<Rom>,
+}
+
+#[pymethods]
+impl PyRom {
+    #[getter]
+    fn seed(&self) -> &str {
+        &self.seed
+    }
+
+    fn __repr__(&self) -> String {
+        format!("ashpy.Rom({:?})", self.seed)
+    }
+}
+
+/// Return the ROM for `seed` (the challenge's no_pre_mine), building and
+/// caching it on first use. Releases the GIL while building.
+#[pyfunction]
+fn rom(py: Python<'_>, seed: String) -> PyRom {
+    let rom = py.allow_threads(|| cached_rom(&seed));
+    PyRom { seed, rom }
+}
+
+/// Return the ROM for `seed` if it is already cached, else None.
+#[pyfunction]
+fn lookup_rom(seed: String) -> Option<PyRom> {
+    let rom = built_rom(&seed)?;
+    Some(PyRom { seed, rom })
+}
+
+/// Seeds of all cached ROMs, not counting ones still being built.
+#[pyfunction]
+fn cached_roms() -> Vec<String> {
+    let m = rom_cache().lock().unwrap();
+    m.iter().filter(|(_, slot)| slot.get().is_some()).map(|(seed, _)| seed.clone()).collect()
+}
+
+/// Remove `seed` from the cache. The memory is freed once no Rom handle for
+/// it is left; a build under way still finishes for its callers. Returns
+/// True if it was cached.
+#[pyfunction]
+fn drop_rom(seed: &str) -> bool {
+    rom_cache().lock().unwrap().remove(seed).is_some_and(|slot| slot.get().is_some())
+}
+
+/// Hash every preimage with `rom`, spread over `threads` threads with the
+/// GIL released. Returns a list of 64-byte hashes in input order.
+#[pyfunction]
+#[pyo3(signature = (rom, preimages, threads = 1))]
+fn hash_batch<'py>(
+    py: Python<'py>,
+    rom: &PyRom,
+    preimages: Vec<Vec<u8>>,
+    threads: usize,
+) -> Vec<Bound<'py, PyBytes>> {
+    let r = rom.rom.clone();
+    let hashes = py.allow_threads(move || {
+        let mut out = vec![[0u8; 64]; preimages.len()];
+        let chunk = preimages.len().div_ceil(threads.max(1)).max(1);
+        thread::scope(|s| {
+            for (pres, outs) in preimages.chunks(chunk).zip(out.chunks_mut(chunk)) {
+                let r = &r;
+                s.spawn(move || {
+                    for (pre, o) in pres.iter().zip(outs.iter_mut()) {
+                        *o = hash(pre, r, NB_LOOPS, NB_INSTRS);
+                    }
+                });
+            }
+        });
+        out
+    });
+    hashes.iter().map(|h| PyBytes::new_bound(py, h)).collect()
+}
+
+/// Hash the preimages `hex16(nonce) + suffix` for `count` nonces starting
+/// at `start` (wrapping at 2**64) and test each against the difficulty
+/// `mask`, the same way the daemon's range jobs do. Runs on `threads`
+/// threads with the GIL released. Returns (hashed, [(nonce, hash), ...])
+/// with winners sorted by nonce.
+#[pyfunction]
+#[pyo3(signature = (rom, suffix, mask, start, count, threads = 1))]
+fn search<'py>(
+    py: Python<'py>,
+    rom: &PyRom,
+    suffix: Vec<u8>,
+    mask: u32,
+    start: u64,
+    count: u64,
+    threads: usize,
+) -> (u64, Vec<(u64, Bound<'py, PyBytes>)>) {
+    let r = rom.rom.clone();
+    let mut winners = py.allow_threads(move || {
+        let threads = (threads.max(1) as u64).min(count.max(1));
+        let per = count.div_ceil(threads);
+        let mut found = Vec::new();
+        thread::scope(|s| {
+            let handles: Vec<_> = (0..threads)
+                .map(|t| {
+                    let first = t * per;
+                    let n = per.min(count.saturating_sub(first));
+                    let (r, suffix) = (&r, &suffix);
+                    s.spawn(move || search_range(r, suffix, mask, start.wrapping_add(first), n))
+                })
+                .collect();
+            for h in handles {
+                found.extend(h.join().unwrap());
+            }
+        });
+        found
+    });
+    winners.sort_by_key(|(n, _)| *n);
+    let winners = winners
+        .into_iter()
+        .map(|(n, h)| (n, PyBytes::new_bound(py, &h)))
+        .collect();
+    (count, winners)
+}
+
+fn search_range(rom: &Rom, suffix: &[u8], mask: u32, start: u64, count: u64) -> Vec<(u64, [u8; 64])> {
+    let mut pre = vec![b'0'; 16];
+    pre.extend_from_slice(suffix);
+    let mut found = Vec::new();
+    for i in 0..count {
+        let nonce = start.wrapping_add(i);
+        write_nonce_hex(&mut pre[..16], nonce);
+        let h = hash(&pre, rom, NB_LOOPS, NB_INSTRS);
+        if hash_meets_difficulty(&h, mask) {
+            found.push((nonce, h));
+        }
+    }
+    found
+}
+
+/// Lowercase zero-padded hex of `nonce` into `dst[..16]`.
+fn write_nonce_hex(dst: &mut [u8], nonce: u64) {
+    const HEX: &[u8; 16] = b"0123456789abcdef";
+    for (i, d) in dst[..16].iter_mut().enumerate() {
+        *d = HEX[((nonce >> (60 - 4 * i)) & 0xf) as usize];
+    }
+}
+
+/// Same test as hash_meets_difficulty() in the coordinators: the first 4
+/// hash bytes (big-endian) may only have bits set where `mask` does.
+fn hash_meets_difficulty(hash: &[u8], mask: u32) -> bool {
+    let left4 = u32::from_be_bytes([hash[0], hash[1], hash[2], hash[3]]);
+    left4 & !mask == 0
+}
+
+#[pymodule]
+fn ashpy(m: &Bound<'_, PyModule>) -> PyResult<()> {
+    m.add_class::<PyRom>()?;
+    m.add_function(wrap_pyfunction!(rom, m)?)?;
+    m.add_function(wrap_pyfunction!(lookup_rom, m)?)?;
+    m.add_function(wrap_pyfunction!(cached_roms, m)?)?;
+    m.add_function(wrap_pyfunction!(drop_rom, m)?)?;
+    m.add_function(wrap_pyfunction!(hash_batch, m)?)?;
+    m.add_function(wrap_pyfunction!(search, m)?)?;
+    Ok(())
+}
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+bench_transport.py
+
+Per-request latency of the ashdaemon line protocol over each transport:
+- tcp   : daemon listening on 127.0.0.1:PORT
+- unix  : daemon started with --unix PATH
+- stdio : daemon started as a co-process with --stdio
+
+The daemon runs in demo mode by default so the numbers show transport
+overhead, not AshMaize cost. Every request is one preimage line and the next
+one is only sent after the reply arrived (one request in flight).
+
+Usage:
+    python3 bench_transport.py --daemon-bin ./target/release/ashdaemon
+"""
+
+import argparse
+import os
+import shlex
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+
+# same shape as a real request: "<no_pre_mine>|<nonce + address + challenge...>"
+SAMPLE_ROM = "40a60d4540740cf9ecc75dfac253817f51405be3bc0f8e6350ea43a2709de454"
+SAMPLE_PRE = ("0123456789abcdef"
+              "addr1q8cecrzfwenw6du5sflmq5svju9vv2m9nhlayq5rk33wqrhgg7emy76r8nrqhg76vfwlg74k5wsrfekal3ltqlyt8qxqqca792"
+              "**D11C23" "000007FF" + SAMPLE_ROM + "2025-11-10T21:59:59.000Z" "508202920")
+
+
+def wait_connect(fn, timeout=10.0):
+    """Retry fn() until the freshly started daemon accepts connections."""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return fn()
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def open_tcp(cmd, port):
+    proc = subprocess.Popen(cmd + ["--port", str(port)], stdout=subprocess.DEVNULL)
+
+    def connect():
+        s = socket.create_connection(("127.0.0.1", port), timeout=5.0)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return s
+    return proc, wait_connect(connect)
+
+
+def open_unix(cmd, path):
+    proc = subprocess.Popen(cmd + ["--unix", path], stdout=subprocess.DEVNULL)
+
+    def connect():
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            s.connect(path)
+        except OSError:
+            s.close()
+            raise
+        return s
+    return proc, wait_connect(connect)
+
+
+def open_stdio(cmd):
+    # same wiring as connect_daemon("stdio:...") in the coordinators
+    ours, theirs = socket.socketpair()
+    proc = subprocess.Popen(cmd + ["--stdio"], stdin=theirs, stdout=theirs, close_fds=True)
+    theirs.close()
+    return proc, ours
+
+
+def run_requests(sock, count, payload):
+    """Send count requests one at a time, return per-request latency in seconds."""
+    sock.settimeout(30.0)
+    latencies = []
+    buf = bytearray()
+    for _ in range(count):
+        t0 = time.perf_counter()
+        sock.sendall(payload)
+        while b"\n" not in buf:
+            b = sock.recv(4096)
+            if not b:
+                raise ConnectionError("daemon closed")
+            buf.extend(b)
+        latencies.append(time.perf_counter() - t0)
+        del buf[:buf.index(b"\n") + 1]
+    return latencies
+
+
+def report(name, latencies):
+    lat_us = sorted(x * 1e6 for x in latencies)
+    p = lambda q: lat_us[min(len(lat_us) - 1, int(q * len(lat_us)))]
+    total = sum(latencies)
+    print(f"{name:<6} n={len(lat_us):<7} mean={statistics.mean(lat_us):8.1f}us "
+          f"p50={p(0.50):8.1f}us p99={p(0.99):8.1f}us max={lat_us[-1]:9.1f}us "
+          f"({len(lat_us) / total:,.0f} req/s)")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Compare ashdaemon request latency over TCP, Unix socket and stdio")
+    p.add_argument("--daemon-bin", default="./target/release/ashdaemon", help="ashdaemon binary")
+    p.add_argument("--mode", default="demo", help="daemon --mode (default: demo, measures transport only)")
+    p.add_argument("--requests", default=20000, type=int, help="requests per transport (default: 20000)")
+    p.add_argument("--warmup", default=500, type=int, help="untimed requests before measuring (default: 500)")
+    p.add_argument("--port", default=4999, type=int, help="TCP port for the benchmark daemon (default: 4999)")
+    p.add_argument("--transports", default="tcp,unix,stdio", help="comma separated list (default: tcp,unix,stdio)")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    cmd = shlex.split(args.daemon_bin) + ["--mode", args.mode]
+    payload = f"{SAMPLE_ROM}|{SAMPLE_PRE}\n".encode("utf-8")
+    unix_path = os.path.join(tempfile.gettempdir(), f"ashbench.{os.getpid()}.sock")
+
+    print(f"payload={len(payload)} bytes, {args.requests} requests per transport, one in flight")
+    for name in args.transports.split(","):
+        name = name.strip()
+        if name == "tcp":
+            proc, sock = open_tcp(cmd, args.port)
+        elif name == "unix":
+            proc, sock = open_unix(cmd, unix_path)
+        elif name == "stdio":
+            proc, sock = open_stdio(cmd)
+        else:
+            print(f"unknown transport {name}, skipping")
+            continue
+        try:
+            run_requests(sock, args.warmup, payload)
+            report(name, run_requests(sock, args.requests, payload))
+        finally:
+            sock.close()
+            proc.terminate()
+            proc.wait()
+    if os.path.exists(unix_path):
+        os.remove(unix_path)
+
+
+if __name__ == "__main__":
+    main()
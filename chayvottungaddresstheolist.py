@@ -10,6 +10,7 @@ Python coordinator for Scavenger Mine:
 """
 
 import argparse
+import asyncio
 import requests
 import socket
 import threading
@@ -19,7 +20,18 @@ import sys
 import csv
 import os
 import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import collections
+import math
+import multiprocessing
+import heapq
+import shlex
+import subprocess
+import struct
+import ctypes
+import mmap
+import platform
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from typing import Optional, Dict, List
 from datetime import datetime, timezone
 import argparse
@@ -28,6 +40,11 @@ import time
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
 from rich.console import Console
+try:
+    # optional in-process AshMaize binding (ashpy/, build with maturin)
+    import ashpy
+except ImportError:
+    ashpy = None
 from rich.progress import Progress, BarColumn, TextColumn, TimeElapsedColumn, TimeRemainingColumn
 
 # Initialize console for logging
@@ -39,35 +56,179 @@ DAEMON_HOST = "127.0.0.1"
 DAEMON_PORT = 4002
 SOCKET_TIMEOUT = 5.0  # seconds
 NONCE_BATCH = 1024  # number of nonces a worker loops before refreshing challenge check
+HASH_BATCH = 256  # nonces per daemon round trip (1 = one full-preimage request per hash)
+ROM_TIMEOUT = 300.0  # seconds to wait for the daemon to build a 1 GiB ROM
+CHALLENGE_POLL = 300.0  # seconds between /challenge checks for a new day's ROM
+# binary daemon protocol (see src/binproto.rs)
+BIN_MAGIC = b"\xa5ASH"
+BIN_OP_ROM, BIN_OP_HASH, BIN_OP_DEADLINE = 0x01, 0x02, 0x03
+BIN_OP_JOB, BIN_OP_NONCE, BIN_OP_MINE, BIN_OP_CANCEL = 0x04, 0x05, 0x06, 0x08
+BIN_OP_ROM_OK, BIN_OP_HASH_OK, BIN_OP_JOB_OK, BIN_OP_MINE_OK, BIN_OP_ERROR = 0x81, 0x82, 0x84, 0x86, 0xFF
+BIN_FLAG_SHORT, BIN_FLAG_RANDOM = 0x01, 0x02
 # -----------------------------------
 
-# thread-safe counters
-class Stats:
-    def __init__(self):
-        self.lock = threading.Lock()
+LATENCY_BUCKETS = 32  # log2 buckets of microseconds per hash
+EWMA_TAU = 10.0  # seconds
+RATE_WINDOWS = (("1m", 60.0), ("5m", 300.0), ("15m", 900.0))
+
+class _Slot:
+    """One thread's counters; only that thread writes them."""
+    __slots__ = ("epoch", "hashes", "solutions", "by_key", "latency")
+
+    def __init__(self, epoch: int):
+        self.epoch = epoch
         self.hashes = 0
         self.solutions = 0
-        self.starts = 0
-        self.last_report = time.time()
+        self.by_key: Dict[tuple, int] = {}
+        self.latency = [0] * LATENCY_BUCKETS
 
-    def add_hashes(self, n):
-        with self.lock:
-            self.hashes += n
+# per-thread counters
+class Stats:
+    """Hash and solution counts with no lock on the hot path: each thread
+    counts into its own slot, which only it writes, and the reporting
+    thread sums the slots. report() also keeps an EWMA and 1m/5m/15m
+    rates (decayed like load averages), hashes per (address, challenge)
+    and a log2 histogram of the time per hash for p50/p99."""
+
+    def __init__(self):
+        self.lock = threading.Lock()  # slot registration and reset only
+        self.local = threading.local()
+        self.epoch = 0
+        self.slots: List[_Slot] = []
+        self.reset()
+
+    def _slot(self) -> _Slot:
+        slot = getattr(self.local, "slot", None)
+        if slot is None or slot.epoch != self.epoch:
+            with self.lock:
+                slot = _Slot(self.epoch)
+                self.slots.append(slot)
+            self.local.slot = slot
+        return slot
+
+    def add_hashes(self, n, key=None, seconds=None):
+        """Count n hashes done by this thread. key, (address, challenge_id),
+        feeds the breakdown; seconds, the time they took, the latency
+        histogram."""
+        slot = self._slot()
+        slot.hashes += n
+        if key is not None:
+            slot.by_key[key] = slot.by_key.get(key, 0) + n
+        if seconds is not None and n > 0:
+            us = int(seconds * 1e6 / n)
+            slot.latency[min(us.bit_length(), LATENCY_BUCKETS - 1)] += n
 
     def inc_solutions(self):
-        with self.lock:
-            self.solutions += 1
+        self._slot().solutions += 1
 
     def snapshot(self):
-        with self.lock:
-            return self.hashes, self.solutions
+        slots = self.slots
+        return sum(s.hashes for s in slots), sum(s.solutions for s in slots)
 
     def reset(self):
         with self.lock:
-            self.hashes = 0
-            self.solutions = 0
-            self.starts = 0
-            self.last_report = time.time()
+            self.epoch += 1
+            self.slots = []
+        self.last_tick = time.time()
+        self.last_total = 0
+        self.ticks = 0
+        self.ewma = 0.0
+        self.rates = {name: 0.0 for name, _ in RATE_WINDOWS}
+
+    def by_key(self) -> Dict[tuple, int]:
+        totals: Dict[tuple, int] = {}
+        for s in self.slots:
+            for key, n in list(s.by_key.items()):
+                totals[key] = totals.get(key, 0) + n
+        return totals
+
+    def latency_us(self, q: float) -> Optional[int]:
+        """Upper bound in microseconds of the time per hash at quantile q,
+        None before any timed hash."""
+        buckets = [sum(col) for col in zip(*(s.latency for s in self.slots))]
+        total = sum(buckets)
+        seen = 0
+        for b, n in enumerate(buckets):
+            seen += n
+            if seen >= q * total > 0:
+                return 1 << b  # bucket b holds [2^(b-1), 2^b) us
+        return None
+
+    def tick(self):
+        """Fold the hashes since the last tick into the rates."""
+        now = time.time()
+        dt = now - self.last_tick
+        if dt <= 0:
+            return
+        h, _ = self.snapshot()
+        rate = (h - self.last_total) / dt
+        self.last_tick, self.last_total = now, h
+        self.ticks += 1
+        if self.ticks == 1:
+            # start from the first sample, not from zero
+            self.ewma = rate
+            self.rates = {name: rate for name, _ in RATE_WINDOWS}
+            return
+        self.ewma += (rate - self.ewma) * (1 - math.exp(-dt / EWMA_TAU))
+        for name, window in RATE_WINDOWS:
+            self.rates[name] += (rate - self.rates[name]) * (1 - math.exp(-dt / window))
+
+    def report(self, extra: str = "") -> str:
+        """tick() and format the [stats] line, plus one line per (address,
+        challenge) when several are mined."""
+        self.tick()
+        h, s = self.snapshot()
+        rates = "/".join(f"{self.rates[name]:.1f}" for name, _ in RATE_WINDOWS)
+        line = f"[stats] hashes={h} ({self.ewma:.1f} H/s, 1m/5m/15m {rates}) solutions={s}"
+        p50, p99 = self.latency_us(0.5), self.latency_us(0.99)
+        if p50 is not None:
+            line += f" latency/hash p50<{p50}us p99<{p99}us"
+        if extra:
+            line += " " + extra
+        submitted = submitter.report()
+        if submitted:
+            line += "\n" + submitted
+        keys = self.by_key()
+        if len(keys) > 1:
+            for (address, challenge_id), n in sorted(keys.items()):
+                line += f"\n[stats]   {address[:20]}... {challenge_id}: {n}"
+        return line
+
+class SharedStats:
+    """Stats of one --processes worker process, without a lock: each thread
+    counts into its own row (hashes, solutions) of an array in shared
+    memory, and the parent sums the rows of every process."""
+
+    def __init__(self, counters, first_row: int, rows: int):
+        self.counters = counters
+        self.first_row = first_row
+        self.rows = rows
+        self.next_row = 0
+        self.row_lock = threading.Lock()
+        self.local = threading.local()
+
+    def _row(self) -> int:
+        row = getattr(self.local, "row", None)
+        if row is None:
+            with self.row_lock:
+                row = 2 * (self.first_row + self.next_row % self.rows)
+                self.next_row += 1
+            self.local.row = row
+        return row
+
+    def add_hashes(self, n, key=None, seconds=None):
+        self.counters[self._row()] += n
+
+    def inc_solutions(self):
+        self.counters[self._row() + 1] += 1
+
+    def snapshot(self):
+        rows = self.counters[2 * self.first_row:2 * (self.first_row + self.rows)]
+        return sum(rows[0::2]), sum(rows[1::2])
+
+    def reset(self):
+        for i in range(2 * self.first_row, 2 * (self.first_row + self.rows)):
+            self.counters[i] = 0
 
 stats = Stats()
 stop_event = threading.Event()
@@ -141,6 +302,98 @@ def log_nonce_to_file(nonce: str, challenge_id: str, address: str, filename: str
         f.write(line)
         f.flush()
 
+def connect_daemon(host: str, port: int, timeout: float = SOCKET_TIMEOUT) -> socket.socket:
+    """Open a connection to the ashdaemon. The host string picks the transport:
+    "unix:/path/ash.sock" -> Unix domain socket (daemon started with --unix PATH)
+    "stdio:<command>"     -> spawn "<command> --stdio" as a private co-process and
+                             talk over its stdin/stdout (our end of a socketpair).
+                             Every connection gets its own daemon and ROM cache,
+                             so use it with few workers (e.g. --protocol binary).
+    anything else         -> TCP to host:port with TCP_NODELAY
+    """
+    if host.startswith("unix:"):
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.settimeout(timeout)
+        try:
+            s.connect(host[len("unix:"):])
+        except Exception:
+            s.close()
+            raise
+        return s
+    if host.startswith("stdio:"):
+        ours, theirs = socket.socketpair()
+        try:
+            subprocess.Popen(shlex.split(host[len("stdio:"):]) + ["--stdio"],
+                             stdin=theirs, stdout=theirs, close_fds=True)
+        finally:
+            theirs.close()
+        ours.settimeout(timeout)
+        return ours
+    s = socket.create_connection((host, port), timeout=timeout)
+    s.settimeout(timeout)
+    # requests are tiny and latency bound: disable Nagle
+    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return s
+
+def challenge_deadline(challenge: dict) -> float:
+    """latest_submission as a Unix timestamp (inf if missing or unparsable)."""
+    ls = challenge.get("latest_submission") or ""
+    try:
+        if ls.endswith("Z"):
+            ls = ls[:-1] + "+00:00"
+        return datetime.fromisoformat(ls).timestamp()
+    except Exception:
+        return float("inf")
+
+def challenge_is_open(challenge: dict) -> bool:
+    """True unless the challenge's latest_submission has passed."""
+    return challenge_deadline(challenge) > time.time()
+
+def send_rom_hints(host: str, port: int, challenges: List[dict], protocol: str = "line"):
+    """Ask the daemon to build the ROMs of these challenges in the background
+    ("#prepare"), so mining a new day's challenge does not start with a 1 GiB
+    ROM build that times out every worker. One hint per distinct open seed;
+    best effort, failures are only logged."""
+    seeds: Dict[str, str] = {}
+    for c in challenges:
+        rom = c.get("no_pre_mine") or ""
+        if rom and challenge_is_open(c):
+            seeds[rom] = max(seeds.get(rom, ""), c.get("latest_submission") or "")
+    if not seeds:
+        return
+    if protocol == "inproc":
+        # no daemon: warm ashpy's ROM cache instead (releases the GIL)
+        threading.Thread(target=lambda: [ashpy.rom(r) for r in seeds], daemon=True).start()
+        return
+    if host.startswith("stdio:"):
+        # every stdio connection has a private daemon: nothing to warm up
+        return
+    lines = "".join(f"#prepare {rom} {latest}".rstrip() + "\n" for rom, latest in seeds.items())
+    try:
+        s = connect_daemon(host, port)
+        try:
+            s.sendall(lines.encode("utf-8"))
+        finally:
+            s.close()
+        console.log(f"[cyan]Asked daemon to prebuild {len(seeds)} ROM(s)")
+    except Exception as e:
+        console.log(f"[yellow]Could not send ROM hints to daemon: {e}")
+
+def watch_challenge(base_url: str, host: str, port: int, protocol: str, interval: float = CHALLENGE_POLL):
+    """Background thread: poll /challenge and hint each newly seen seed."""
+    seen = set()
+    while True:
+        try:
+            sc, data = safe_get_challenge(base_url)
+            c = data.get("challenge", data) if sc == 200 and isinstance(data, dict) else None
+            rom = c.get("no_pre_mine") if isinstance(c, dict) else None
+            if rom and rom not in seen:
+                seen.add(rom)
+                send_rom_hints(host, port, [c], protocol)
+        except Exception as e:
+            console.log(f"[yellow]Challenge watch error: {e}")
+        time.sleep(interval)
+
 def build_preimage(nonce_hex: str, address: str, challenge: dict) -> str:
     """
     Build preimage EXACT order:
@@ -158,6 +411,36 @@ def build_preimage(nonce_hex: str, address: str, challenge: dict) -> str:
     ]
     return "".join(parts)
 
+class PreimageTemplate:
+    """The "<no_pre_mine>|<preimage>\\n" request line of one (challenge,
+    address), encoded once. next() writes the next nonce's 16 hex digits
+    into it in place, from a pool of random nonces drawn in bulk from
+    os.urandom, so a request costs no string building or encoding."""
+
+    POOL = 4096  # nonces per os.urandom call
+
+    def __init__(self, address: str, challenge: dict):
+        self.challenge = challenge
+        head = f"{challenge.get('no_pre_mine', '')}|".encode("utf-8")
+        self.line = bytearray(head + bytes(16) + build_preimage("", address, challenge).encode("utf-8") + b"\n")
+        self.at = len(head)
+        self.view = memoryview(self.line)
+        self.pool = memoryview(b"")
+        self.pos = 0
+
+    def next(self) -> memoryview:
+        """The request line with a fresh nonce patched in."""
+        if self.pos >= len(self.pool):
+            self.pool = memoryview(os.urandom(8 * self.POOL).hex().encode("ascii"))
+            self.pos = 0
+        self.line[self.at:self.at + 16] = self.pool[self.pos:self.pos + 16]
+        self.pos += 16
+        return self.view
+
+    def nonce(self) -> str:
+        """The nonce last patched in."""
+        return self.line[self.at:self.at + 16].decode("ascii")
+
 def hash_meets_difficulty(hash_hex: str, difficulty_hex: str) -> bool:
     """
     Reproduce the left-4-bytes zero-bit test used earlier:
@@ -175,6 +458,24 @@ def hash_meets_difficulty(hash_hex: str, difficulty_hex: str) -> bool:
         return False
     return (left4 & (~mask & 0xFFFFFFFF)) == 0
 
+class DifficultyMatcher:
+    """hash_meets_difficulty() compiled for one difficulty: the bits that
+    must be zero are parsed once."""
+
+    def __init__(self, difficulty_hex: str):
+        try:
+            self.zero_bits = ~int(difficulty_hex, 16) & 0xFFFFFFFF
+        except Exception:
+            self.zero_bits = None  # never matches, like hash_meets_difficulty
+
+    def __call__(self, hash_hex: str) -> bool:
+        if self.zero_bits is None or not hash_hex or len(hash_hex) < 8:
+            return False
+        try:
+            return int(hash_hex[:8], 16) & self.zero_bits == 0
+        except ValueError:
+            return False
+
 def read_challenges_from_csv(csv_file: str):
     """
     Read challenges from CSV file
@@ -235,9 +536,312 @@ def safe_get_challenge(base_url: str):
         print(f"[debug] safe_get_challenge: ERROR {e}")
         return None, {"error": str(e)}
 
+# ----------------- shared-memory ring -----------------
+# Layout and protocol in src/shmring.rs. The coordinator creates the file,
+# the daemon maps it after "#ring <path>" and its compute threads serve it.
+RING_MAGIC = b"ASHRING1"
+RING_HEADER, RING_JOB_SIZE, RING_JOB_SUFFIX = 512, 1024, 272
+RING_SUB_SIZE, RING_COMP_SIZE = 32, 96
+RING_JOB_SLOTS = 8
+RING_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+# header offsets
+RING_SUB_TAIL, RING_COMP_TAIL = 64, 192
+RING_SUB_BELL, RING_SUB_WAITERS = 256, 260
+RING_COMP_BELL, RING_COMP_WAITERS = 320, 324
+
+# futex(2) syscall numbers; other platforms fall back to short sleeps
+_FUTEX_NR = {"x86_64": 202, "aarch64": 98}.get(platform.machine()) if sys.platform.startswith("linux") else None
+FUTEX_WAIT, FUTEX_WAKE = 0, 1
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+_libc = ctypes.CDLL(None, use_errno=True) if _FUTEX_NR else None
+
+
+class ShmRing:
+    """Coordinator side of a shared-memory submission/completion ring.
+
+    Nonces are written straight into submission slots of a mmap'd file and
+    daemon compute threads write results back into completion slots; a futex
+    word in the header is the doorbell in each direction. Not thread safe:
+    one ring belongs to one worker.
+    """
+
+    def __init__(self, path: str, slots: int, job_slots: int = RING_JOB_SLOTS):
+        self.path = path
+        self.slots = slots
+        self.job_slots = job_slots
+        self.sub_off = RING_HEADER + job_slots * RING_JOB_SIZE
+        self.comp_off = self.sub_off + slots * RING_SUB_SIZE
+        size = self.comp_off + slots * RING_COMP_SIZE
+        fd = os.open(path, os.O_CREAT | os.O_RDWR | os.O_TRUNC, 0o600)
+        try:
+            os.ftruncate(fd, size)
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.mv = memoryview(self.mm)
+        self.u32 = self.mv.cast("I")
+        self.u64 = self.mv.cast("Q")
+        self.mv[0:8] = RING_MAGIC
+        self.u32[8 // 4] = slots
+        self.u32[12 // 4] = job_slots
+        self.sub_head = 0   # next submission index (only we write submissions)
+        self.comp_tail = 0  # next completion index (only we read completions)
+        self.jobs: Dict[tuple, int] = {}
+        self.next_job = 0
+        self._bells = None
+        if _FUTEX_NR:
+            self._bells = (ctypes.c_uint32.from_buffer(self.mm, RING_SUB_BELL),
+                           ctypes.c_uint32.from_buffer(self.mm, RING_COMP_BELL))
+
+    def close(self):
+        self._bells = None
+        for v in (self.u32, self.u64, self.mv):
+            v.release()
+        self.mm.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def job(self, rom: str, suffix: bytes, mask: int) -> int:
+        """Index of the job table entry for (rom, suffix, mask), writing it
+        if needed. Only call with no submissions in flight."""
+        key = (rom, suffix, mask)
+        idx = self.jobs.get(key)
+        if idx is not None:
+            return idx
+        rom_b = rom.encode("utf-8")
+        if len(rom_b) > RING_JOB_SUFFIX - 16 or len(suffix) > RING_JOB_SIZE - RING_JOB_SUFFIX:
+            raise ValueError("challenge too large for a ring job entry")
+        idx = self.next_job % self.job_slots
+        self.next_job += 1
+        self.jobs = {k: v for k, v in self.jobs.items() if v != idx}
+        off = RING_HEADER + idx * RING_JOB_SIZE
+        gen = self.u32[off // 4]
+        self.u32[off // 4] = gen + 1  # odd: entry being rewritten
+        self.u32[off // 4 + 1] = mask
+        self.u32[off // 4 + 2] = len(rom_b) | (len(suffix) << 16)
+        self.mv[off + 16:off + 16 + len(rom_b)] = rom_b
+        self.mv[off + RING_JOB_SUFFIX:off + RING_JOB_SUFFIX + len(suffix)] = suffix
+        self.u32[off // 4] = gen + 2
+        self.jobs[key] = idx
+        return idx
+
+    def submit(self, job: int, nonces: List[int]) -> int:
+        """Write one submission per nonce and ring the doorbell. Returns the
+        index of the first one; completion req_ids are these indexes."""
+        first = self.sub_head
+        mask = self.slots - 1
+        for nonce in nonces:
+            h = self.sub_head
+            while h - self.u64[RING_SUB_TAIL // 8] >= self.slots:
+                time.sleep(0)
+            q = (self.sub_off + (h & mask) * RING_SUB_SIZE) // 8
+            self.u64[q + 1] = h
+            self.u64[q + 2] = nonce
+            self.u32[(q + 3) * 2] = job
+            self.u32[(q + 3) * 2 + 1] = 0
+            self.u64[q] = h + 1  # publish
+            self.sub_head = h + 1
+        self.u32[RING_SUB_BELL // 4] = (self.u32[RING_SUB_BELL // 4] + 1) & 0xFFFFFFFF
+        if self._bells and self.u32[RING_SUB_WAITERS // 4]:
+            self._futex(self._bells[0], FUTEX_WAKE, 0x7FFFFFFF)
+        return first
+
+    def collect(self, count: int, timeout: float = SOCKET_TIMEOUT):
+        """Yield (req_id, matched, hash_bytes) for the next count completions.
+        hash_bytes is only filled in for matches."""
+        mask = self.slots - 1
+        deadline = time.time() + timeout
+        got = 0
+        spins = 0
+        while got < count:
+            ct = self.comp_tail
+            q = (self.comp_off + (ct & mask) * RING_COMP_SIZE) // 8
+            if self.u64[q] == ct + 1:
+                matched = self.u32[(q + 2) * 2]
+                hash_bytes = bytes(self.mv[(q + 4) * 8:(q + 12) * 8]) if matched else b""
+                req_id = self.u64[q + 1]
+                self.comp_tail = ct + 1
+                self.u64[RING_COMP_TAIL // 8] = ct + 1  # slot free for the daemon
+                got += 1
+                spins = 0
+                yield req_id, matched, hash_bytes
+                continue
+            spins += 1
+            if spins < 100:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError("no completions from daemon")
+            self._wait_completion(ct, q)
+
+    def _wait_completion(self, ct: int, q: int):
+        if not self._bells:
+            time.sleep(0.0005)
+            return
+        seen = self.u32[RING_COMP_BELL // 4]
+        self.u32[RING_COMP_WAITERS // 4] = 1
+        try:
+            if self.u64[q] != ct + 1:
+                self._futex(self._bells[1], FUTEX_WAIT, seen, 0.05)
+        finally:
+            self.u32[RING_COMP_WAITERS // 4] = 0
+
+    @staticmethod
+    def _futex(word, op: int, val: int, timeout: Optional[float] = None):
+        ts = None
+        if timeout is not None:
+            ts = ctypes.byref(_Timespec(int(timeout), int((timeout % 1) * 1e9)))
+        _libc.syscall(_FUTEX_NR, ctypes.byref(word), op, val, ts, None, 0)
+
+# ------------ solution submission ------------
+SUBMIT_QUEUE = 256  # solutions waiting for a submitter thread
+SUBMIT_THREADS = 4
+SUBMIT_ATTEMPTS = 3
+SUBMIT_BACKOFF = 1.0  # seconds before the first retry, doubled after each
+
+class SolutionSubmitter:
+    """POST found solutions from dedicated threads, so a worker hands a
+    winner over and goes straight back to mining. Solutions wait in a
+    bounded queue (submit() blocks only when it is full). A failed POST is
+    retried up to SUBMIT_ATTEMPTS times with exponential backoff; a retry
+    waits in the queue, not in a thread. Another winner for an (address,
+    challenge) being posted waits for that outcome, and is dropped as a
+    duplicate once one was accepted. submit() returns a Future that
+    resolves to True once the server accepted a solution for the pair
+    (201), or to False when every attempt failed. The time from submit()
+    to the outcome goes into a log2 histogram of milliseconds for
+    report()."""
+
+    def __init__(self, threads: int = SUBMIT_THREADS, capacity: int = SUBMIT_QUEUE):
+        self.threads = threads
+        self.capacity = capacity
+        self.cond = threading.Condition()
+        self.heap = []  # (due, seq, entry)
+        self.seq = 0
+        self.started = False
+        self.accepted_keys = set()  # (address, challenge_id)
+        self.posting_keys = set()
+        self.pending = 0  # submitted, outcome not known yet
+        self.accepted = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.latency = [0] * LATENCY_BUCKETS
+
+    def submit(self, base_url: str, address: str, challenge_id: str, nonce: str) -> Future:
+        fut = Future()
+        if (address, challenge_id) in self.accepted_keys:
+            # another winner for a solved pair: nothing to send
+            fut.set_result(True)
+            return fut
+        with self.cond:
+            if not self.started:
+                for i in range(self.threads):
+                    threading.Thread(target=self._run, name=f"submit-{i}", daemon=True).start()
+                self.started = True
+            while len(self.heap) >= self.capacity:
+                self.cond.wait()
+            self.pending += 1
+            entry = [base_url, address, challenge_id, nonce, 1, time.time(), fut]
+            self._push(time.time(), entry)
+        return fut
+
+    def _push(self, due: float, entry: list):
+        self.seq += 1
+        heapq.heappush(self.heap, (due, self.seq, entry))
+        self.cond.notify_all()
+
+    def _next(self) -> list:
+        with self.cond:
+            while True:
+                if self.heap and self.heap[0][0] <= time.time():
+                    entry = heapq.heappop(self.heap)[2]
+                    key = (entry[1], entry[2])
+                    if key in self.posting_keys:
+                        # wait for the outcome of the pair's current POST
+                        self._push(time.time() + 0.1, entry)
+                        continue
+                    self.posting_keys.add(key)
+                    self.cond.notify_all()
+                    return entry
+                self.cond.wait(self.heap[0][0] - time.time() if self.heap else None)
+
+    def _run(self):
+        while True:
+            entry = self._next()
+            try:
+                self._post(entry)
+            finally:
+                with self.cond:
+                    self.posting_keys.discard((entry[1], entry[2]))
+
+    def _post(self, entry: list):
+        base_url, address, challenge_id, nonce, attempt, queued, fut = entry
+        if (address, challenge_id) in self.accepted_keys:
+            self._finish(entry, True, duplicate=True)
+            return
+        sc, resp = post_solution(base_url, address, challenge_id, nonce)
+        print(f"[submit] {address} {challenge_id} attempt {attempt}/{SUBMIT_ATTEMPTS} returned: {sc} {resp}")
+        if sc == 201:
+            self.accepted_keys.add((address, challenge_id))
+            self._finish(entry, True)
+        elif attempt < SUBMIT_ATTEMPTS:
+            entry[4] = attempt + 1
+            with self.cond:
+                self._push(time.time() + SUBMIT_BACKOFF * 2 ** (attempt - 1), entry)
+        else:
+            print(f"[submit] ❌ FAILED TO SUBMIT VALID NONCE {nonce} for {address} {challenge_id}")
+            error_logger.log_error(address, challenge_id, nonce, f"not accepted after {attempt} attempts: {sc} {resp}")
+            self._finish(entry, False)
+
+    def _finish(self, entry: list, accepted: bool, duplicate: bool = False):
+        ms = int((time.time() - entry[5]) * 1000)
+        with self.cond:
+            self.pending -= 1
+            self.cond.notify_all()
+            if duplicate:
+                self.duplicates += 1
+            else:
+                self.latency[min(ms.bit_length(), LATENCY_BUCKETS - 1)] += 1
+                if accepted:
+                    self.accepted += 1
+                else:
+                    self.failed += 1
+        entry[6].set_result(accepted)
+
+    def wait_idle(self):
+        """Block until every submitted solution has its outcome."""
+        with self.cond:
+            while self.pending:
+                self.cond.wait()
+
+    def report(self) -> str:
+        """One [submit] line, empty before the first outcome."""
+        with self.cond:
+            total = self.accepted + self.failed
+            if not total and not self.heap:
+                return ""
+            line = (f"[submit] accepted={self.accepted} failed={self.failed} "
+                    f"duplicates={self.duplicates} queued={len(self.heap)}")
+            seen, p50, p99 = 0, None, None
+            for b, n in enumerate(self.latency):
+                seen += n
+                if p50 is None and seen >= 0.5 * total > 0:
+                    p50 = 1 << b
+                if p99 is None and seen >= 0.99 * total > 0:
+                    p99 = 1 << b
+        if p50 is not None:
+            line += f" latency p50<{p50}ms p99<{p99}ms"
+        return line
+
+submitter = SolutionSubmitter()
+
 # ----------------- worker -----------------
 class Worker:
-    def __init__(self, id:int, host:str, port:int, base_url:str, address:str, challenge_getter, submit_on_find:bool):
+    def __init__(self, id:int, host:str, port:int, base_url:str, address:str, challenge_getter, submit_on_find:bool, batch_size:int = HASH_BATCH, protocol:str = "line", nonce_mode:str = "counter", push:bool = False):
         self.id = id
         self.host = host
         self.port = port
@@ -245,44 +849,131 @@ class Worker:
         self.address = address
         self.challenge_getter = challenge_getter
         self.submit_on_find = submit_on_find
+        self.batch_size = max(1, batch_size)
+        self.protocol = protocol
+        # how the daemon picks nonces for #mine / OP_MINE: "counter" or "random"
+        self.nonce_mode = nonce_mode
+        # line protocol: let the daemon mine continuously and push results
+        self.push = push
         self.sock = None
         self.sock_lock = threading.Lock()
+        # binary protocol state, reset on every reconnect
+        self.rom_handles: Dict[str, int] = {}
+        self.rbuf = bytearray()
+        self.req_id = 0
+        # job templates registered on this connection (#job names or binary
+        # job handles), keyed by (rom, difficulty, suffix)
+        self.jobs: Dict[tuple, object] = {}
+        # name of the job this connection is subscribed to (push mode)
+        self.subscribed: Optional[str] = None
+        # shared-memory ring, only with protocol "shm"
+        self.ring: Optional[ShmRing] = None
+        # ROM seeds whose deadline this connection already reported
+        self.deadlines_sent = set()
+        # --batch-size 1: request line patched per nonce, reply buffer
+        self.template: Optional[PreimageTemplate] = None
+        self.matcher: Optional[DifficultyMatcher] = None
+        self.reply = bytearray(4096)
+        # challenges whose solution was accepted, for run() to #cancel
+        self.to_cancel = collections.deque()
 
     def _ensure_socket(self):
-        # maintain a persistent socket per worker to daemon
+        # maintain a persistent socket per worker to daemon (tcp, unix or stdio, see connect_daemon)
         if self.sock:
             return True
         try:
-            s = socket.create_connection((self.host, self.port), timeout=SOCKET_TIMEOUT)
-            s.settimeout(SOCKET_TIMEOUT)
+            s = connect_daemon(self.host, self.port)
             self.sock = s
+            self.rom_handles = {}
+            self.rbuf = bytearray()
+            self.jobs = {}
+            self.subscribed = None
+            self.deadlines_sent = set()
+            if self.protocol == "binary":
+                s.sendall(BIN_MAGIC)
+                if self._bin_recv_exact(4) != BIN_MAGIC:
+                    raise ConnectionError("daemon does not speak the binary protocol")
+            elif self.protocol == "shm":
+                self._attach_ring()
             return True
         except Exception as e:
             # print(f"[worker {self.id}] cannot connect daemon: {e}")
-            self.sock = None
+            self._drop_socket()
             return False
 
-    def _send_pre_and_recv_hash(self, preimage: str) -> Optional[str]:
+    def _drop_socket(self):
+        try:
+            self.sock.close()
+        except:
+            pass
+        self.sock = None
+        if self.ring:
+            self.ring.close()
+            self.ring = None
+
+    def _attach_ring(self):
+        """Create this worker's ring file and hand it to the daemon; the
+        socket stays open as the ring's lifetime/control channel."""
+        slots = 1 << max(4, (self.batch_size * 2 - 1).bit_length())
+        path = os.path.join(RING_DIR, f"ashring.{os.getpid()}.{self.id}")
+        self.ring = ShmRing(path, slots)
+        self.sock.sendall(f"#ring {path}\n".encode("utf-8"))
+        reply = bytearray()
+        while b"\n" not in reply:
+            b = self.sock.recv(256)
+            if not b:
+                raise ConnectionError("daemon closed")
+            reply.extend(b)
+        line = reply.split(b"\n", 1)[0].decode("utf-8").strip()
+        if not line.startswith("ok"):
+            raise ConnectionError(f"daemon refused ring: {line}")
+
+    def _send_shm_batch(self, challenge: dict, count: int):
+        """Submit count random nonces through the shared-memory ring and
+        collect their completions. Same return value as _send_bin_batch."""
+        if not self._ensure_socket():
+            time.sleep(0.1)
+            return None
+        try:
+            suffix = build_preimage("", self.address, challenge).encode("utf-8")
+            job = self.ring.job(challenge.get("no_pre_mine", ""), suffix, int(challenge["difficulty"], 16))
+            nonces = [random.getrandbits(64) for _ in range(count)]
+            first = self.ring.submit(job, nonces)
+            found = None
+            hashed = 0
+            # the first use of a seed may build the ROM in the daemon
+            for req_id, matched, hash_bytes in self.ring.collect(count, timeout=ROM_TIMEOUT):
+                hashed += 1
+                if matched and found is None:
+                    found = ("{:016x}".format(nonces[req_id - first]), hash_bytes.hex())
+            return hashed, found
+        except Exception:
+            self._drop_socket()
+            return None
+
+    def _send_pre_and_recv_hash(self, request) -> Optional[str]:
+        """Send one request line (bytes-like, see PreimageTemplate) and
+        return the hash the daemon replies with."""
         # ensure socket
         if not self._ensure_socket():
             # small backoff
             time.sleep(0.1)
             return None
         try:
-            # send line with newline
-            data = preimage + "\n"
             with self.sock_lock:
-                self.sock.sendall(data.encode("utf-8"))
-                # read until newline
-                buf = bytearray()
+                self.sock.sendall(request)
+                # read until newline, into the reusable reply buffer
+                view = memoryview(self.reply)
+                n = 0
                 while True:
-                    b = self.sock.recv(4096)
-                    if not b:
+                    got = self.sock.recv_into(view[n:])
+                    if not got:
                         raise ConnectionError("daemon closed")
-                    buf.extend(b)
-                    if b.find(b"\n") != -1:
+                    n += got
+                    end = self.reply.find(b"\n", 0, n)
+                    if end != -1:
                         break
-                line = buf.split(b"\n",1)[0].decode("utf-8").strip()
+                line = self.reply[:end].decode("utf-8").strip()
             return line
         except Exception:
             # drop socket, attempt reconnect next time
@@ -293,6 +984,293 @@ class Worker:
             self.sock = None
             return None
 
+    # ---- session job templates: the daemon keeps the preimage, we send nonces ----
+    @staticmethod
+    def _job_key(challenge: dict, suffix: str) -> tuple:
+        return (challenge.get("no_pre_mine", ""), challenge["difficulty"], suffix)
+
+    def _recv_line(self) -> str:
+        while b"\n" not in self.rbuf:
+            b = self.sock.recv(65536)
+            if not b:
+                raise ConnectionError("daemon closed")
+            self.rbuf.extend(b)
+        line, _, rest = bytes(self.rbuf).partition(b"\n")
+        self.rbuf = bytearray(rest)
+        return line.decode("utf-8").strip()
+
+    def _recv_reply(self) -> str:
+        """Next reply line, skipping "!" lines pushed by an old subscription."""
+        while True:
+            line = self._recv_line()
+            if not line.startswith("!"):
+                return line
+
+    def _line_job(self, challenge: dict) -> str:
+        """Register this challenge's preimage template once per connection
+        ("#job") and return its name."""
+        suffix = build_preimage("", self.address, challenge)
+        key = self._job_key(challenge, suffix)
+        name = self.jobs.get(key)
+        if name is not None:
+            return name
+        name = str(len(self.jobs))
+        self.sock.sendall(f"#job {name} {key[0]} {key[1]} {suffix}\n".encode("utf-8"))
+        # first use of a seed may build the ROM: allow much longer than a hash
+        self.sock.settimeout(ROM_TIMEOUT)
+        try:
+            reply = self._recv_reply()
+        finally:
+            self.sock.settimeout(SOCKET_TIMEOUT)
+        if reply != "ok":
+            raise ConnectionError(f"daemon refused job: {reply}")
+        self.jobs[key] = name
+        return name
+
+    def _send_job_mine(self, challenge: dict, count: int):
+        """Have the daemon hash count nonces of its own choosing with one
+        "#mine" line against this connection's job template. In counter mode
+        all workers share one daemon-side counter per (address, challenge),
+        so no nonce is hashed twice. The daemon checks the mask and only
+        returns winners. Same return value as _send_bin_batch."""
+        if not self._ensure_socket():
+            time.sleep(0.1)
+            return None
+        try:
+            with self.sock_lock:
+                name = self._line_job(challenge)
+                self.sock.sendall(f"#mine {name} {count} {self.nonce_mode}\n".encode("utf-8"))
+                reply = self._recv_line()
+            if reply.startswith("err"):
+                raise ConnectionError(reply)
+            parts = reply.split()
+            found = None
+            if len(parts) > 1:
+                nonce, hash_hex = parts[1].split(":")
+                found = (nonce, hash_hex)
+            return int(parts[0]), found
+        except Exception:
+            # drop socket (and its jobs), attempt reconnect next time
+            self._drop_socket()
+            return None
+
+    def _push_next(self, challenge: dict):
+        """Subscribe this connection to the challenge's job once
+        ("#subscribe") and return the next result the daemon pushes: hashes
+        done since the last one, or a winner. Same return value as
+        _send_bin_batch."""
+        if not self._ensure_socket():
+            time.sleep(0.1)
+            return None
+        try:
+            with self.sock_lock:
+                name = self._line_job(challenge)
+                if self.subscribed != name:
+                    if self.subscribed is not None:
+                        self.sock.sendall(f"#cancel {self.subscribed}\n".encode("utf-8"))
+                        self._recv_reply()
+                    self.sock.sendall(f"#subscribe {name} {self.nonce_mode}\n".encode("utf-8"))
+                    reply = self._recv_reply()
+                    if reply != "ok":
+                        raise ConnectionError(reply)
+                    self.subscribed = name
+                line = self._recv_line()
+            parts = line.split()
+            if parts[0] == "!found" and parts[1] == name:
+                nonce, hash_hex = parts[2].split(":")
+                return 0, (nonce, hash_hex)
+            if parts[0] == "!hashed" and parts[1] == name:
+                return int(parts[2]), None
+            if parts[0] == "!done" and parts[1] == name:
+                # cancelled (solved elsewhere): subscribe again next time
+                self.subscribed = None
+            return 0, None
+        except socket.timeout:
+            return 0, None
+        except Exception:
+            self._drop_socket()
+            return None
+
+    def _cancel_job(self, challenge: dict):
+        """Stop the daemon mining this challenge for our address on every
+        connection (#cancel / OP_CANCEL), e.g. once it has been solved."""
+        key = self._job_key(challenge, build_preimage("", self.address, challenge))
+        job = self.jobs.get(key)
+        if job is None or self.sock is None or self.protocol not in ("line", "binary"):
+            return
+        try:
+            with self.sock_lock:
+                if self.protocol == "binary":
+                    payload = struct.pack("<BQI", BIN_OP_CANCEL, self._bin_next_id(), job)
+                    self.sock.sendall(struct.pack("<I", len(payload)) + payload)
+                else:
+                    self.sock.sendall(f"#cancel {job}\n".encode("utf-8"))
+                    if not self.subscribed:
+                        self._recv_reply()
+        except Exception:
+            self._drop_socket()
+
+    # ---- binary protocol (length-prefixed frames, replies in completion order) ----
+    def _bin_recv_exact(self, n: int) -> bytes:
+        while len(self.rbuf) < n:
+            b = self.sock.recv(65536)
+            if not b:
+                raise ConnectionError("daemon closed")
+            self.rbuf.extend(b)
+        out = bytes(self.rbuf[:n])
+        del self.rbuf[:n]
+        return out
+
+    def _bin_recv_frame(self):
+        """Read one frame -> (op, req_id, payload)."""
+        (length,) = struct.unpack("<I", self._bin_recv_exact(4))
+        body = self._bin_recv_exact(length)
+        op = body[0]
+        req_id = struct.unpack_from("<Q", body, 1)[0] if len(body) >= 9 else 0
+        if op == BIN_OP_ERROR:
+            raise RuntimeError(f"daemon error for req {req_id}: {body[9:].decode('utf-8', 'replace')}")
+        return op, req_id, body[9:]
+
+    def _bin_next_id(self) -> int:
+        self.req_id += 1
+        return self.req_id
+
+    def _bin_rom_handle(self, rom: str) -> int:
+        """Register rom (no_pre_mine) on this connection once, return its handle."""
+        handle = self.rom_handles.get(rom)
+        if handle is not None:
+            return handle
+        rid = self._bin_next_id()
+        payload = struct.pack("<BQ", BIN_OP_ROM, rid) + rom.encode("utf-8")
+        self.sock.sendall(struct.pack("<I", len(payload)) + payload)
+        # first use of a seed may build the ROM: allow much longer than a hash
+        self.sock.settimeout(ROM_TIMEOUT)
+        try:
+            op, got, body = self._bin_recv_frame()
+        finally:
+            self.sock.settimeout(SOCKET_TIMEOUT)
+        if op != BIN_OP_ROM_OK or got != rid:
+            raise ConnectionError(f"unexpected reply 0x{op:02x} to ROM registration")
+        handle = struct.unpack_from("<I", body)[0]
+        self.rom_handles[rom] = handle
+        return handle
+
+    def _bin_job_handle(self, challenge: dict) -> int:
+        """Register this challenge's ROM, mask and preimage suffix as a job
+        template once per connection (OP_JOB), return its handle."""
+        suffix = build_preimage("", self.address, challenge)
+        key = self._job_key(challenge, suffix)
+        handle = self.jobs.get(key)
+        if handle is not None:
+            return handle
+        rom_handle = self._bin_rom_handle(key[0])
+        rid = self._bin_next_id()
+        payload = struct.pack("<BQII", BIN_OP_JOB, rid, rom_handle, int(key[1], 16)) + suffix.encode("utf-8")
+        self.sock.sendall(struct.pack("<I", len(payload)) + payload)
+        op, got, body = self._bin_recv_frame()
+        if op != BIN_OP_JOB_OK or got != rid:
+            raise ConnectionError(f"unexpected reply 0x{op:02x} to job registration")
+        handle = struct.unpack_from("<I", body)[0]
+        self.jobs[key] = handle
+        return handle
+
+    def _send_bin_batch(self, challenge: dict, count: int):
+        """Have the daemon hash count nonces of its own choosing (OP_MINE,
+        see _send_job_mine) and return only the winners. Returns
+        (hashed, (nonce, hash_hex) or None) or None on daemon/socket error."""
+        if not self._ensure_socket():
+            time.sleep(0.1)
+            return None
+        try:
+            with self.sock_lock:
+                handle = self._bin_job_handle(challenge)
+                rid = self._bin_next_id()
+                flags = BIN_FLAG_RANDOM if self.nonce_mode == "random" else 0
+                payload = struct.pack("<BQIIB", BIN_OP_MINE, rid, handle, count, flags)
+                self.sock.sendall(struct.pack("<I", len(payload)) + payload)
+                op, got, body = self._bin_recv_frame()
+            if op != BIN_OP_MINE_OK or got != rid:
+                raise ConnectionError(f"unexpected reply 0x{op:02x} req {got}")
+            hashed, winners = struct.unpack_from("<QI", body)
+            found = None
+            if winners:
+                nonce = struct.unpack_from("<Q", body, 12)[0]
+                found = ("{:016x}".format(nonce), body[20:84].hex())
+            return hashed, found
+        except Exception:
+            # drop socket (and its ROM handles), attempt reconnect next time
+            self._drop_socket()
+            return None
+
+    # ---- in-process hashing (ashpy extension, no daemon) ----
+    def _inproc_batch(self, challenge: dict, count: int):
+        """Hash count consecutive nonces from a random start with ashpy.
+        The GIL is released while hashing, so worker threads run in
+        parallel and share one ROM per seed. Same return value as
+        _send_bin_batch."""
+        try:
+            rom = ashpy.rom(challenge.get("no_pre_mine", ""))
+            suffix = build_preimage("", self.address, challenge).encode("utf-8")
+            mask = int(challenge["difficulty"], 16)
+            hashed, winners = ashpy.search(rom, suffix, mask, random.getrandbits(64), count)
+        except Exception as e:
+            console.log(f"[red][worker {self.id}] ashpy error: {e}")
+            time.sleep(0.1)
+            return None
+        found = None
+        if winners:
+            nonce, hash_bytes = winners[0]
+            found = ("{:016x}".format(nonce), hash_bytes.hex())
+        return hashed, found
+
+    def _note_deadline(self, challenge: dict):
+        """Tell the daemon until when this challenge's ROM is needed, so a
+        daemon with --rom-mem-budget evicts closed challenges first. Sent
+        once per ROM and connection; the daemon does not reply."""
+        rom = challenge.get("no_pre_mine", "")
+        latest = challenge.get("latest_submission", "")
+        if not rom or not latest or rom in self.deadlines_sent or not self._ensure_socket():
+            return
+        try:
+            if self.protocol == "binary":
+                payload = struct.pack("<BQ", BIN_OP_DEADLINE, self._bin_next_id()) + f"{rom} {latest}".encode("utf-8")
+                self.sock.sendall(struct.pack("<I", len(payload)) + payload)
+            else:
+                # line protocol, or the control connection of a shm ring
+                self.sock.sendall(f"#deadline {rom} {latest}\n".encode("utf-8"))
+            self.deadlines_sent.add(rom)
+        except Exception:
+            self._drop_socket()
+
+    def _next_hashes(self, challenge: dict):
+        """Hash the next batch_size random nonces for challenge.
+        Returns (hashed, (nonce, hash_hex) or None), or None if the daemon
+        did not answer."""
+        if self.protocol != "inproc":
+            self._note_deadline(challenge)
+        if self.protocol == "binary":
+            return self._send_bin_batch(challenge, self.batch_size)
+        if self.protocol == "shm":
+            return self._send_shm_batch(challenge, self.batch_size)
+        if self.protocol == "inproc":
+            return self._inproc_batch(challenge, self.batch_size)
+        if self.push:
+            return self._push_next(challenge)
+        if self.batch_size > 1:
+            return self._send_job_mine(challenge, self.batch_size)
+        # One full preimage per request, prefixed with the challenge's
+        # no_pre_mine so the daemon can initialize/reuse the ROM without
+        # separate --rom; only the nonce changes between requests.
+        if self.template is None or self.template.challenge is not challenge:
+            self.template = PreimageTemplate(self.address, challenge)
+            self.matcher = DifficultyMatcher(challenge["difficulty"])
+        hash_hex = self._send_pre_and_recv_hash(self.template.next())
+        if hash_hex is None:
+            return None
+        if not self.matcher(hash_hex):
+            return 1, None
+        return 1, (self.template.nonce(), hash_hex)
+
     def _save_challenge_to_csv(self, challenge):
         """Save challenge info to getchallenge.csv if not already exists"""
         csv_file = "getchallenge.csv"
@@ -373,6 +1351,7 @@ class Worker:
                 if challenge_obj:
                     print(f"[worker {self.id}] _fetch_and_save_challenge: extracted challenge_id={challenge_obj.get('challenge_id')}")
                     self._save_challenge_to_csv(challenge_obj)
+                    send_rom_hints(self.host, self.port, [challenge_obj], self.protocol)
                 else:
                     print(f"[worker {self.id}] _fetch_and_save_challenge: no valid challenge object to save ({sc})")
             except Exception as e:
@@ -381,6 +1360,15 @@ class Worker:
                 # mark fetched (even on error) to avoid repeated attempts by all workers
                 challenge_fetched.set()
 
+    def _submitted(self, challenge: dict, accepted: bool):
+        """Outcome of a winner handed to the submitter, on its thread. The
+        socket belongs to run(), so this only queues the #cancel for it. A
+        solution that is never accepted was logged by the submitter; the
+        workers keep mining for another."""
+        if accepted:
+            self.to_cancel.append(challenge)
+            stop_event.set()
+
     def run(self):
         # main loop: keep trying with current challenge until stop_event or new challenge
         print(f"[worker {self.id}] started")
@@ -399,7 +1387,6 @@ class Worker:
                 time.sleep(0.5)
                 continue
 
-            difficulty = challenge["difficulty"]
             challenge_id = challenge["challenge_id"]
             latest_submission = challenge["latest_submission"]
             # parse latest_submission time to epoch if needed to stop timely:
@@ -413,76 +1400,489 @@ class Worker:
             except Exception:
                 latest_ts = None
 
-            # inner loop: try many nonces
+            # inner loop: try many nonces, batch_size per daemon round trip
             tries = 0
-            for _ in range(NONCE_BATCH):
+            for _ in range(max(1, NONCE_BATCH // self.batch_size)):
                 if stop_event.is_set():
                     break
                 # quick time check
                 if latest_ts and time.time() > latest_ts:
                     # expired
                     break
-                nonce = hex64_nonce()
-                pre = build_preimage(nonce, self.address, challenge)
-                # Prefix the preimage with the challenge's no_pre_mine so the
-                # daemon can initialize/reuse the ROM without separate --rom.
-                rom = challenge.get("no_pre_mine", "")
-                pre_with_rom = f"{rom}|{pre}"
-                hash_hex = self._send_pre_and_recv_hash(pre_with_rom)
-                if hash_hex is None:
+                started = time.perf_counter()
+                results = self._next_hashes(challenge)
+                if results is None:
                     # no response from daemon, small backoff
                     time.sleep(0.01)
                     continue
-                tries += 1
-                stats.add_hashes(1)
-                # check difficulty
-                if hash_meets_difficulty(hash_hex, difficulty):
+                hashed, found = results
+                tries += hashed
+                stats.add_hashes(hashed, (self.address, challenge_id), time.perf_counter() - started)
+                # check difficulty (done by _next_hashes)
+                if found:
+                    nonce, hash_hex = found
                     print(f"[worker {self.id}] FOUND nonce={nonce} hash={hash_hex} challenge={challenge_id}")
                     stats.inc_solutions()
                     if self.submit_on_find:
-                        attempts = 0
-                        sc = None  # ensure sc exists
-
-                        while attempts < 3:
-                            try:
-                                sc, resp = post_solution(self.base_url, self.address, challenge_id, nonce)
-                                print(f"[worker {self.id}] submit returned: {sc} {resp}")
-
-                                if sc == 201:
-                                    stop_event.set()
-                                    break
-
-                                attempts += 1
-                                print(f"[worker {self.id}] submit retry {attempts}/3...")
-                                time.sleep(1)
-
-                            except Exception as e:
-                                attempts += 1
-                                print(f"[worker {self.id}] ERROR submit attempt {attempts}/3 — {e}")
-                                time.sleep(1)
-
-                        # Nếu sau 3 lần vẫn fail → dừng để tránh mất valid nonce
-                        if sc != 201:
-                            print(f"[worker {self.id}] ❌ FAILED TO SUBMIT VALID NONCE — STOPPING TO AVOID LOSING IT")
-                            stop_event.set()
-
-                    # optionally continue searching (do not stop others) or wait for orchestration to refresh challenge
-                    time.sleep(0.5)
+                        # hand the winner over and keep mining until it is accepted
+                        submitter.submit(self.base_url, self.address, challenge_id, nonce) \
+                            .add_done_callback(lambda fut, challenge=challenge: self._submitted(challenge, fut.result()))
                     break  # re-fetch challenge since server may rotate difficulty
 
             # small yield
             time.sleep(0.001)
+        # stop the other workers' hashing in the daemon now
+        while self.to_cancel:
+            self._cancel_job(self.to_cancel.popleft())
+        # closing the connection also stops its daemon-side subscriptions
+        self._drop_socket()
         print(f"[worker {self.id}] stopping")
 
+# ------------ multi-address mining ------------
+class MultiAddressMiner:
+    """Mine one challenge for many addresses at once with the daemon's
+    "#multi" job (see src/session.rs): one connection and one shared ROM,
+    with the compute threads rotating over the addresses still unsolved.
+    The daemon retires an address at its first winner; if the server does
+    not accept it, the address is mined again."""
+
+    def __init__(self, base_url, daemon_host, daemon_port, submit_on_find, nonce_mode="counter"):
+        self.base_url = base_url
+        self.daemon_host = daemon_host
+        self.daemon_port = daemon_port
+        self.submit_on_find = submit_on_find
+        self.nonce_mode = nonce_mode
+        self.sock = None
+        self.rbuf = bytearray()
+
+    def _recv_line(self) -> Optional[str]:
+        """Next line from the daemon, or None if none came within the timeout."""
+        while b"\n" not in self.rbuf:
+            try:
+                b = self.sock.recv(65536)
+            except socket.timeout:
+                return None
+            if not b:
+                raise ConnectionError("daemon closed")
+            self.rbuf.extend(b)
+        line, _, rest = bytes(self.rbuf).partition(b"\n")
+        self.rbuf = bytearray(rest)
+        return line.decode("utf-8").strip()
+
+    def run(self, challenge: dict, addresses: List[str], on_solved=None, stats_interval=10.0) -> set:
+        """Mine until every address is solved, the challenge closes or
+        stop_event is set, calling on_solved(address) for each solved one.
+        Returns the solved addresses."""
+        addresses = list(dict.fromkeys(addresses))
+        challenge_id = challenge["challenge_id"]
+        rom = challenge.get("no_pre_mine", "")
+        tail = build_preimage("", "", challenge)
+        solved = set()
+        claimed = set()  # indexes with a winner being submitted or accepted
+        submitting = {}  # future -> address index
+        self.sock = connect_daemon(self.daemon_host, self.daemon_port)
+        self.rbuf = bytearray()
+        try:
+            request = f"#deadline {rom} {challenge.get('latest_submission', '')}\n" \
+                      f"#multi m {rom} {challenge['difficulty']} {tail} {' '.join(addresses)}\n"
+            self.sock.sendall(request.encode("utf-8"))
+            # the first job on a new seed may build the ROM
+            self.sock.settimeout(ROM_TIMEOUT)
+            reply = self._recv_line()
+            if not reply or not reply.startswith("ok"):
+                raise ConnectionError(f"daemon refused multi-address job: {reply}")
+            self.sock.settimeout(0.5)
+            print(f"[multi] mining {len(addresses)} addresses for challenge {challenge_id}")
+            last_stats = time.time()
+            while len(solved) < len(addresses) and not stop_event.is_set() and challenge_is_open(challenge):
+                line = self._recv_line()
+                for fut in [f for f in submitting if f.done()]:
+                    i = submitting.pop(fut)
+                    if fut.result():
+                        solved.add(addresses[i])
+                        if on_solved:
+                            on_solved(addresses[i])
+                    else:
+                        console.log(f"[red]Solution for {addresses[i]} was not accepted, mining it again")
+                        claimed.discard(i)
+                        self.sock.sendall(f"#subscribe m.{i} {self.nonce_mode} once\n".encode("utf-8"))
+                if time.time() - last_stats >= stats_interval:
+                    print(stats.report(f"solved={len(solved)}/{len(addresses)}"))
+                    last_stats = time.time()
+                parts = line.split() if line else []
+                # anything else is the "ok" of a re-subscription
+                if len(parts) < 3 or not parts[1].startswith("m."):
+                    continue
+                i = int(parts[1][2:])
+                if parts[0] == "!hashed":
+                    stats.add_hashes(int(parts[2]), (addresses[i], challenge_id))
+                elif parts[0] == "!found" and i not in claimed:
+                    claimed.add(i)
+                    nonce, hash_hex = parts[2].split(":")
+                    print(f"[multi] FOUND nonce={nonce} hash={hash_hex} address={addresses[i]} challenge={challenge_id}")
+                    stats.inc_solutions()
+                    if self.submit_on_find:
+                        submitting[submitter.submit(self.base_url, addresses[i], challenge_id, nonce)] = i
+                    else:
+                        solved.add(addresses[i])
+                        if on_solved:
+                            on_solved(addresses[i])
+            for fut, i in submitting.items():
+                # challenge closed or stopped: still record what got accepted
+                if fut.result() and addresses[i] not in solved:
+                    solved.add(addresses[i])
+                    if on_solved:
+                        on_solved(addresses[i])
+        finally:
+            # closing the connection stops the remaining subscriptions
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+            self.sock = None
+        return solved
+
+# ------------ concurrent challenges ------------
+class ChallengeScheduler:
+    """Keep several challenges in flight at once, each mined for the whole
+    address list by its own MultiAddressMiner. Challenges are grouped by ROM
+    seed (no_pre_mine, shared by all challenges of a day): a free slot goes
+    to a challenge whose seed is already in flight if there is one, so the
+    running challenges all hit one resident ROM in the daemon, and the next
+    seed only starts as the previous group drains. Each challenge retires on
+    its own once its address set is done."""
+
+    def __init__(self, make_miner, max_in_flight: int):
+        self.make_miner = make_miner
+        self.max_in_flight = max(1, max_in_flight)
+
+    @staticmethod
+    def group_by_seed(challenges: List[dict]) -> List[dict]:
+        """Challenges reordered so those sharing a seed are adjacent; seeds
+        keep the order of their first challenge."""
+        groups: Dict[str, List[dict]] = {}
+        for c in challenges:
+            groups.setdefault(c.get("no_pre_mine", ""), []).append(c)
+        return [c for group in groups.values() for c in group]
+
+    def run(self, challenges: List[dict], addresses: List[str], on_done=None):
+        """Mine every challenge; on_done(challenge, solved_addresses) is
+        called as each one finishes."""
+        pending = self.group_by_seed(challenges)
+        in_flight = {}  # future -> challenge
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            while (pending or in_flight) and not stop_event.is_set():
+                while pending and len(in_flight) < self.max_in_flight:
+                    seeds = {c.get("no_pre_mine", "") for c in in_flight.values()}
+                    i = next((i for i, c in enumerate(pending) if c.get("no_pre_mine", "") in seeds), 0)
+                    challenge = pending.pop(i)
+                    if not challenge_is_open(challenge):
+                        console.log(f"[yellow]Challenge {challenge['challenge_id']} has closed, skipping")
+                        continue
+                    console.log(f"[bold green]Starting challenge {challenge['challenge_id']} ({len(in_flight) + 1} in flight)")
+                    in_flight[pool.submit(self.make_miner().run, challenge, addresses)] = challenge
+                if not in_flight:
+                    break
+                done, _ = wait(list(in_flight), timeout=1.0, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    challenge = in_flight.pop(fut)
+                    try:
+                        solved = fut.result()
+                    except Exception as e:
+                        console.log(f"[red]Challenge {challenge['challenge_id']} failed: {e}")
+                        solved = set()
+                    if on_done:
+                        on_done(challenge, solved)
+
+# ------------ deadline-aware scheduling ------------
+REPLAN_INTERVAL = 60.0  # seconds between re-plans while the hash rate settles
+RATE_WINDOW = 10.0  # seconds per hash-rate sample
+
+def required_zero_bits(difficulty_hex: str) -> int:
+    """Bits of the hash prefix hash_meets_difficulty() requires to be zero."""
+    return bin(~int(difficulty_hex, 16) & 0xFFFFFFFF).count("1")
+
+class DeadlineScheduler(MultiAddressMiner):
+    """Mine every (challenge, address) pair on one daemon connection, in the
+    order that lands the most solutions before their deadlines.
+
+    A pair is expected to take 2^z hashes, z being the zero bits its
+    difficulty requires, i.e. 2^z / H/s seconds at the hash rate measured
+    from the daemon's pushes. plan() walks the open pairs by deadline and
+    drops the longest one so far whenever the running total would miss the
+    current deadline (Moore-Hodgson: the most pairs finishing in time for
+    fixed durations). Dropped pairs follow, by deadline, and are mined only
+    if time is left. The first pairs_in_flight pairs of the plan are mined,
+    one once-subscription each (the second keeps the daemon busy while a
+    winner is submitted); the plan is redone whenever a pair is solved or
+    expires, and every REPLAN_INTERVAL."""
+
+    def __init__(self, base_url, daemon_host, daemon_port, submit_on_find, nonce_mode="counter", pairs_in_flight=2):
+        super().__init__(base_url, daemon_host, daemon_port, submit_on_find, nonce_mode)
+        self.pairs_in_flight = max(1, pairs_in_flight)
+        self.rate: Optional[float] = None  # measured H/s
+
+    def plan(self, pairs: List[tuple], open_pairs, now: float) -> List[int]:
+        """Indexes of the open pairs in the order to mine them."""
+        by_deadline = sorted(open_pairs, key=lambda i: (challenge_deadline(pairs[i][0]),
+                                                        required_zero_bits(pairs[i][0]["difficulty"])))
+        if not self.rate:
+            return by_deadline
+        kept = []  # heap of (-expected seconds, index)
+        late = []
+        total = 0.0
+        for i in by_deadline:
+            secs = (1 << required_zero_bits(pairs[i][0]["difficulty"])) / self.rate
+            heapq.heappush(kept, (-secs, i))
+            total += secs
+            if now + total > challenge_deadline(pairs[i][0]):
+                neg_secs, j = heapq.heappop(kept)
+                total += neg_secs
+                late.append(j)
+        on_time = sorted((i for _, i in kept), key=lambda i: challenge_deadline(pairs[i][0]))
+        return on_time + sorted(late, key=lambda i: challenge_deadline(pairs[i][0]))
+
+    def _start(self, i: int, challenge: dict, address: str, roms_noted: set):
+        rom = challenge.get("no_pre_mine", "")
+        lines = ""
+        if rom not in roms_noted:
+            lines += f"#deadline {rom} {challenge.get('latest_submission', '')}\n"
+            roms_noted.add(rom)
+        suffix = build_preimage("", address, challenge)
+        lines += f"#job p{i} {rom} {challenge['difficulty']} {suffix}\n#subscribe p{i} {self.nonce_mode} once\n"
+        self.sock.sendall(lines.encode("utf-8"))
+
+    def run(self, challenges: List[dict], addresses: List[str], on_challenge_done=None, stats_interval=10.0):
+        """Mine until every pair is solved or expired, or stop_event is set.
+        on_challenge_done(challenge, solved_addresses) is called as each
+        challenge has no pair left."""
+        addresses = list(dict.fromkeys(addresses))
+        pairs = [(c, a) for c in challenges for a in addresses]
+        open_pairs = set(range(len(pairs)))
+        running = set()
+        claimed = set()  # winner being submitted
+        submitting = {}  # future -> pair index
+        solved: Dict[str, set] = {}
+        roms_noted = set()
+        replan_at = 0.0
+        window_start, window_hashes = time.time(), 0
+        last_stats = time.time()
+
+        def retire(i, ok):
+            challenge, address = pairs[i]
+            open_pairs.discard(i)
+            if ok:
+                solved.setdefault(challenge["challenge_id"], set()).add(address)
+            if i in running:
+                running.discard(i)
+                self.sock.sendall(f"#drop p{i}\n".encode("utf-8"))
+            if on_challenge_done and not any(pairs[j][0] is challenge for j in open_pairs):
+                on_challenge_done(challenge, solved.get(challenge["challenge_id"], set()))
+
+        self.sock = connect_daemon(self.daemon_host, self.daemon_port)
+        self.rbuf = bytearray()
+        self.sock.settimeout(0.5)
+        try:
+            while open_pairs and not stop_event.is_set():
+                now = time.time()
+                for i in [i for i in open_pairs if challenge_deadline(pairs[i][0]) <= now and i not in claimed]:
+                    retire(i, False)
+                    replan_at = 0.0
+                for fut in [f for f in submitting if f.done()]:
+                    i = submitting.pop(fut)
+                    claimed.discard(i)
+                    if fut.result():
+                        retire(i, True)
+                    else:
+                        console.log(f"[red]Solution for {pairs[i][1]} / {pairs[i][0]['challenge_id']} was not accepted, mining it again")
+                        # its once-subscription has stopped: the next plan starts it anew
+                        running.discard(i)
+                    replan_at = 0.0
+                if now >= replan_at:
+                    order = self.plan(pairs, open_pairs - claimed, now)
+                    want = set(order[:self.pairs_in_flight])
+                    for i in running - want - claimed:
+                        running.discard(i)
+                        self.sock.sendall(f"#drop p{i}\n".encode("utf-8"))
+                    for i in order[:self.pairs_in_flight]:
+                        if i not in running:
+                            running.add(i)
+                            self._start(i, pairs[i][0], pairs[i][1], roms_noted)
+                    replan_at = now + REPLAN_INTERVAL
+                if now - window_start >= RATE_WINDOW and window_hashes:
+                    sample = window_hashes / (now - window_start)
+                    self.rate = sample if self.rate is None else 0.7 * self.rate + 0.3 * sample
+                    window_start, window_hashes = now, 0
+                if now - last_stats >= stats_interval:
+                    print(stats.report(f"open pairs={len(open_pairs)} mining={sorted(running)}"))
+                    last_stats = now
+
+                line = self._recv_line()
+                parts = line.split() if line else []
+                if parts and parts[0] == "err":
+                    console.log(f"[red]daemon: {line}")
+                # "ok" replies and "!done" carry nothing needed here
+                if len(parts) < 3 or not parts[1].startswith("p"):
+                    continue
+                i = int(parts[1][1:])
+                if parts[0] == "!hashed":
+                    stats.add_hashes(int(parts[2]), (pairs[i][1], pairs[i][0]["challenge_id"]))
+                    window_hashes += int(parts[2])
+                elif parts[0] == "!found" and i in open_pairs and i not in claimed:
+                    # also taken from a pair dropped a moment ago: still a winner
+                    challenge, address = pairs[i]
+                    nonce, hash_hex = parts[2].split(":")
+                    print(f"[sched] FOUND nonce={nonce} hash={hash_hex} address={address} challenge={challenge['challenge_id']}")
+                    stats.inc_solutions()
+                    if self.submit_on_find:
+                        claimed.add(i)
+                        submitting[submitter.submit(self.base_url, address, challenge["challenge_id"], nonce)] = i
+                    else:
+                        retire(i, True)
+                    # keep the daemon busy while the winner is submitted
+                    replan_at = 0.0
+            for fut, i in submitting.items():
+                if fut.result():
+                    retire(i, True)
+        finally:
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+            self.sock = None
+        return solved
+
+# ------------ asyncio coordinator ------------
+class AsyncMiner:
+    """Mine one (challenge, address) from a single thread with asyncio.
+    `streams` line connections to the daemon each keep `in_flight` "#mine"
+    requests queued, so the daemon always has the next batch waiting and a
+    handful of streams keep every compute thread busy, without the worker
+    threads' blocking round trips and their contention on the GIL. The
+    streams share the daemon-side job counter, as the workers do."""
+
+    def __init__(self, base_url, address, daemon_host, daemon_port, submit_on_find,
+                 streams=4, in_flight=4, batch_size=HASH_BATCH, nonce_mode="counter"):
+        self.base_url = base_url
+        self.address = address
+        self.daemon_host = daemon_host
+        self.daemon_port = daemon_port
+        self.submit_on_find = submit_on_find
+        self.streams = max(1, streams)
+        self.in_flight = max(1, in_flight)
+        self.batch_size = max(1, batch_size)
+        self.nonce_mode = nonce_mode
+        self.done: Optional[asyncio.Event] = None
+        self.submitting = False
+        self.solved = False
+
+    def run(self, challenge: dict, stats_interval=10.0) -> bool:
+        """Mine until a solution is accepted (True), the challenge closes or
+        stop_event is set."""
+        return asyncio.run(self._run(challenge, stats_interval))
+
+    async def _run(self, challenge: dict, stats_interval: float) -> bool:
+        self.done = asyncio.Event()
+        self.submitting = False
+        self.solved = False
+        tasks = [asyncio.create_task(self._stream(challenge)) for _ in range(self.streams)]
+        print(f"[async] {self.streams} streams x {self.in_flight} requests of {self.batch_size} nonces, challenge={challenge['challenge_id']}")
+        last_stats = time.time()
+        try:
+            while not self.done.is_set() and not stop_event.is_set() and challenge_is_open(challenge):
+                try:
+                    await asyncio.wait_for(self.done.wait(), 0.5)
+                except asyncio.TimeoutError:
+                    pass
+                if time.time() - last_stats >= stats_interval:
+                    print(stats.report())
+                    last_stats = time.time()
+        finally:
+            self.done.set()
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return self.solved
+
+    async def _stream(self, challenge: dict):
+        """One pipelined connection; reconnects until the miner is done."""
+        rom = challenge.get("no_pre_mine", "")
+        suffix = build_preimage("", self.address, challenge)
+        request = f"#mine a {self.batch_size} {self.nonce_mode}\n".encode("utf-8")
+        key = (self.address, challenge["challenge_id"])
+        while not self.done.is_set():
+            try:
+                reader, writer = await asyncio.open_connection(sock=connect_daemon(self.daemon_host, self.daemon_port))
+            except Exception:
+                await asyncio.sleep(0.5)
+                continue
+            try:
+                writer.write(f"#deadline {rom} {challenge.get('latest_submission', '')}\n"
+                             f"#job a {rom} {challenge['difficulty']} {suffix}\n".encode("utf-8"))
+                # the first job on a new seed may build the ROM
+                reply = await asyncio.wait_for(reader.readline(), ROM_TIMEOUT)
+                if reply.strip() != b"ok":
+                    raise ConnectionError(f"daemon refused job: {reply!r}")
+                writer.write(request * self.in_flight)
+                sent = collections.deque([time.perf_counter()] * self.in_flight)
+                while not self.done.is_set():
+                    reply = await asyncio.wait_for(reader.readline(), SOCKET_TIMEOUT)
+                    if not reply:
+                        raise ConnectionError("daemon closed")
+                    # refill the pipeline before looking at the reply
+                    writer.write(request)
+                    now = time.perf_counter()
+                    sent.append(now)
+                    parts = reply.decode("utf-8").split()
+                    if not parts or parts[0] == "err":
+                        raise ConnectionError(reply)
+                    stats.add_hashes(int(parts[0]), key, now - sent.popleft())
+                    if len(parts) > 1 and not self.submitting:
+                        nonce, hash_hex = parts[1].split(":")
+                        self._found(challenge, nonce, hash_hex, writer)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # reconnect; the job is registered again on the new connection
+                await asyncio.sleep(0.1)
+            finally:
+                writer.close()
+
+    def _found(self, challenge: dict, nonce: str, hash_hex: str, writer):
+        print(f"[async] FOUND nonce={nonce} hash={hash_hex} challenge={challenge['challenge_id']}")
+        stats.inc_solutions()
+        if not self.submit_on_find:
+            self.solved = True
+            self.done.set()
+            return
+        # one winner is enough: the others are ignored while it is submitted
+        self.submitting = True
+        asyncio.create_task(self._submit(challenge, nonce, writer))
+
+    async def _submit(self, challenge: dict, nonce: str, writer):
+        fut = submitter.submit(self.base_url, self.address, challenge["challenge_id"], nonce)
+        if await asyncio.wrap_future(fut):
+            self.solved = True
+            # stop the daemon's hashing on the job now, on every stream
+            writer.write(b"#cancel a\n")
+            self.done.set()
+        else:
+            # keep mining for another winner
+            self.submitting = False
+
 # --------------- orchestrator ---------------
 class Orchestrator:
-    def __init__(self, base_url, address, daemon_host, daemon_port, workers, submit_on_find):
+    def __init__(self, base_url, address, daemon_host, daemon_port, workers, submit_on_find, batch_size=HASH_BATCH, protocol="line", nonce_mode="counter", push=False):
         self.base_url = base_url
         self.address = address
         self.daemon_host = daemon_host
         self.daemon_port = daemon_port
         self.workers_count = workers
         self.submit_on_find = submit_on_find
+        self.batch_size = batch_size
+        self.protocol = protocol
+        self.nonce_mode = nonce_mode
+        self.push = push
         self.current_challenge = None
         self.challenge_lock = threading.Lock()
         self.workers = []
@@ -504,7 +1904,7 @@ class Orchestrator:
     def start_workers(self):
         self.executor = ThreadPoolExecutor(max_workers=self.workers_count)
         for i in range(self.workers_count):
-            w = Worker(i, self.daemon_host, self.daemon_port, self.base_url, self.address, self.challenge_getter, self.submit_on_find)
+            w = Worker(i, self.daemon_host, self.daemon_port, self.base_url, self.address, self.challenge_getter, self.submit_on_find, self.batch_size, self.protocol, self.nonce_mode, self.push)
             # run worker.run in thread
             self.executor.submit(w.run)
             self.workers.append(w)
@@ -545,11 +1945,7 @@ class Orchestrator:
                 # Just keep printing stats until interrupted
                 current_time = time.time()
                 if current_time - last_stats >= stats_interval:
-                    h, s = stats.snapshot()
-                    elapsed = max(0.001, current_time - stats.last_report)
-                    hps = h / elapsed if elapsed > 0 else 0
-                    print(f"[stats] hashes={h} ({hps:.1f} H/s) solutions={s}")
-                    stats.last_report = current_time
+                    print(stats.report())
                     last_stats = current_time
                 
                 # Small sleep to prevent busy waiting
@@ -563,16 +1959,99 @@ class Orchestrator:
             print("[orchestrator] Stopping workers...")
             self.stop_workers()
 
+# --------------- worker processes ---------------
+def _process_main(index, per_process, counters, stop, orch_args, challenge):
+    """Body of one --processes worker process: an Orchestrator with
+    per_process workers, counting into its own rows of counters. Runs until
+    the shared stop event is set, and sets it when its workers stop (a
+    solution was submitted)."""
+    global stats
+    stats = SharedStats(counters, index * per_process, per_process)
+    if index:
+        # the first process fetches and saves the challenge
+        challenge_fetched.set()
+    base_url, address, daemon_host, daemon_port, _, submit_on_find, *rest = orch_args
+    orch = Orchestrator(base_url, address, daemon_host, daemon_port, per_process, submit_on_find, *rest)
+    orch.set_challenge(challenge)
+    orch.start_workers()
+    try:
+        while not stop_event.is_set():
+            if stop.wait(0.05):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        orch.stop_workers()
+
+class ProcessOrchestrator:
+    """Orchestrator split over worker processes, so building preimages,
+    checking hashes and counting are not serialised by one interpreter's
+    GIL. Each process runs an equal slice of the workers with their own
+    daemon connections; counters live in a shared array (see SharedStats)
+    that the parent sums. A solution in any process, the challenge closing
+    or stop_event stops them all."""
+
+    def __init__(self, processes, base_url, address, daemon_host, daemon_port, workers, submit_on_find, *worker_args):
+        self.processes = max(1, processes)
+        self.per_process = max(1, -(-workers // self.processes))
+        self.orch_args = (base_url, address, daemon_host, daemon_port, workers, submit_on_find) + worker_args
+
+    def run(self, challenge: dict, stats_interval=5.0):
+        rows = self.processes * self.per_process
+        counters = multiprocessing.RawArray(ctypes.c_uint64, 2 * rows)
+        stop = multiprocessing.Event()
+        procs = [multiprocessing.Process(target=_process_main, daemon=True,
+                                         args=(i, self.per_process, counters, stop, self.orch_args, challenge))
+                 for i in range(self.processes)]
+        for p in procs:
+            p.start()
+        print(f"[orchestrator] started {self.processes} processes x {self.per_process} workers")
+        started = last_stats = time.time()
+        try:
+            while not stop_event.is_set() and challenge_is_open(challenge) and any(p.is_alive() for p in procs):
+                if stop.wait(0.1):
+                    break
+                if time.time() - last_stats >= stats_interval:
+                    h, s = sum(counters[0::2]), sum(counters[1::2])
+                    print(f"[stats] hashes={h} ({h / (time.time() - started):.1f} H/s) solutions={s}")
+                    last_stats = time.time()
+        except KeyboardInterrupt:
+            print("\n[orchestrator] Stopping...")
+        finally:
+            stop.set()
+            stop_event.set()
+            for p in procs:
+                # workers stop after their current batch
+                p.join(timeout=SOCKET_TIMEOUT)
+                if p.is_alive():
+                    p.terminate()
+            stats.add_hashes(sum(counters[0::2]))
+            for _ in range(sum(counters[1::2])):
+                stats.inc_solutions()
+
 # --------------- CLI ---------------
 def parse_args():
     p = argparse.ArgumentParser(description="Scavenger Mine Python Miner (uses local ashmaize daemon)")
     p.add_argument("--address", default="addr1q8cecrzfwenw6du5sflmq5svju9vv2m9nhlayq5rk33wqrhgg7emy76r8nrqhg76vfwlg74k5wsrfekal3ltqlyt8qxqqca792", 
                    help="Cardano address (default: addr1q8cecrzfwenw6du5sflmq5svju9vv2m9nhlayq5rk33wqrhgg7emy76r8nrqhg76vfwlg74k5wsrfekal3ltqlyt8qxqqca792)")
     p.add_argument("--base-url", default=BASE_URL, help="Scavenger API base URL")
-    p.add_argument("--daemon-host", default=DAEMON_HOST, help="Local ashmaize daemon host")
+    p.add_argument("--daemon-host", default=DAEMON_HOST, help="Local ashmaize daemon host, or unix:PATH / stdio:COMMAND for the Unix socket / co-process transports")
     p.add_argument("--daemon-port", default=DAEMON_PORT, type=int, help="Local ashmaize daemon port")
     p.add_argument("--workers", default=64, type=int, help="Number of worker threads (default: 8)")
     p.add_argument("--submit", action="store_true", default=True, help="Submit found solutions to server (default: True)")
+    p.add_argument("--batch-size", default=HASH_BATCH, type=int, help=f"Nonces per daemon round trip, 1 sends one full preimage per request (default: {HASH_BATCH})")
+    p.add_argument("--protocol", choices=["line", "binary", "shm", "inproc"], default="line", help="Daemon protocol: text lines, binary frames, a shared-memory ring (same host only), or inproc to hash in this process with the ashpy module (default: line)")
+    p.add_argument("--nonce-mode", choices=["counter", "random"], default="counter", help="How the daemon picks nonces with --protocol line/binary: a counter shared by all workers (no nonce hashed twice) or per-thread random streams (default: counter)")
+    p.add_argument("--processes", default=0, type=int, help="Split --workers over this many processes, with hash counters in shared memory, so the workers are not bound by one GIL (default: 0, threads only)")
+    p.add_argument("--asyncio", action="store_true", help="Mine each address from one thread with asyncio: a few daemon connections, each with several #mine requests queued, instead of worker threads")
+    p.add_argument("--streams", default=4, type=int, help="With --asyncio: daemon connections (default: 4)")
+    p.add_argument("--in-flight", default=4, type=int, help="With --asyncio: #mine requests queued per connection (default: 4)")
+    p.add_argument("--challenges-in-flight", default=1, type=int, help="Mine up to this many challenges at once, each for all addresses (implies --multi); challenges sharing a ROM seed run together (default: 1)")
+    p.add_argument("--deadline-schedule", action="store_true", help="Mine every (challenge, address) pair on one daemon connection, ordered to land the most solutions before their deadlines from each difficulty and the measured hash rate")
+    p.add_argument("--pairs-in-flight", default=2, type=int, help="With --deadline-schedule: pairs mined at once (default: 2)")
+    p.add_argument("--multi", action="store_true", help="Mine all addresses of a challenge at once in the daemon (one #multi job over the line protocol) instead of one address after another")
+    p.add_argument("--push", action="store_true", help="With --protocol line: subscribe each worker's connection to its job so the daemon mines continuously and pushes winners as they are found, instead of one #mine round trip per batch")
     # Default to the workspace CSV if present (was a Windows path). Use a relative path so the
     # script works inside this container/workspace.
     p.add_argument("--csv-file", default="./getchallenge.csv", help="CSV file containing challenges (default: ./getchallenge.csv)")
@@ -673,6 +2152,15 @@ def main():
     console = Console()
     
     args = parse_args()
+    if args.protocol == "inproc" and ashpy is None:
+        console.log("[red]--protocol inproc needs the ashpy module (cd ashpy && maturin develop --release)")
+        return
+    if args.asyncio and args.protocol != "line":
+        console.log(f"[red]--asyncio uses the line protocol, not --protocol {args.protocol}")
+        return
+    if (args.multi or args.challenges_in_flight > 1 or args.deadline_schedule) and args.protocol == "inproc":
+        console.log("[red]--multi needs the daemon, not --protocol inproc")
+        return
     
     # ✅ List address bạn cung cấp
     address_list = [
@@ -703,6 +2191,11 @@ def main():
         console.log(f"[red]Error loading challenges: {e}")
         return
 
+    # build every upcoming ROM in the daemon while earlier challenges mine
+    send_rom_hints(args.daemon_host, args.daemon_port, challenges, args.protocol)
+    threading.Thread(target=watch_challenge, daemon=True,
+                     args=(args.base_url, args.daemon_host, args.daemon_port, args.protocol)).start()
+
     print(f"✅ TOTAL challenges: {len(challenges)}")
     print(f"✅ TOTAL addresses: {len(address_list)}")
 
@@ -718,41 +2211,98 @@ def main():
 
         challenge_task = progress.add_task("Processing Challenges", total=len(challenges))
         
-        for c_idx, challenge in enumerate(challenges, start=1):
-            progress.update(challenge_task, description=f"Challenge {c_idx}/{len(challenges)}")
-            # Debug: Print the challenge object to see its structure
-            print(f"\nDebug - challenge object: {challenge}")
-            # Safely get challenge_id or use a default value
-            challenge_id = challenge.get('challenge_id', f'unknown_{c_idx}')
-            console.log(f"\n[bold green]Starting Challenge {c_idx}: {challenge_id}")
-
-            addr_task = progress.add_task("Processing Addresses", total=len(address_list))
-            for a_idx, addr in enumerate(address_list, start=1):
-                progress.update(addr_task, description=f"Addr {a_idx}/{len(address_list)}")
-                stop_event.clear()
-                stats.reset()
-
-                orch = Orchestrator(
-                    args.base_url,
-                    addr,
-                    args.daemon_host,
-                    args.daemon_port,
-                    args.workers,
-                    args.submit
+        if args.deadline_schedule or args.challenges_in_flight > 1:
+            def challenge_done(challenge, solved):
+                console.log(f"✅ Done Challenge {challenge['challenge_id']}: {len(solved)}/{len(set(address_list))} addresses solved")
+                progress.advance(challenge_task)
+
+            stop_event.clear()
+            stats.reset()
+            if args.deadline_schedule:
+                # every (challenge, address) pair, ordered by deadline and expected work
+                scheduler = DeadlineScheduler(args.base_url, args.daemon_host, args.daemon_port, args.submit, args.nonce_mode, pairs_in_flight=args.pairs_in_flight)
+            else:
+                # several challenges at once, grouped by ROM seed
+                scheduler = ChallengeScheduler(
+                    lambda: MultiAddressMiner(args.base_url, args.daemon_host, args.daemon_port, args.submit, args.nonce_mode),
+                    args.challenges_in_flight,
                 )
-                orch.set_challenge(challenge)
-                start_time = time.time()
-                orch.run(stats_interval=10.0)
-                elapsed = time.time() - start_time
-
-                console.log(f"✅ Done mining for address {addr} in {elapsed:.1f}s")
-                progress.advance(addr_task)
+            scheduler.run(challenges, address_list, challenge_done)
+        else:
+            for c_idx, challenge in enumerate(challenges, start=1):
+                progress.update(challenge_task, description=f"Challenge {c_idx}/{len(challenges)}")
+                # Debug: Print the challenge object to see its structure
+                print(f"\nDebug - challenge object: {challenge}")
+                # Safely get challenge_id or use a default value
+                challenge_id = challenge.get('challenge_id', f'unknown_{c_idx}')
+                console.log(f"\n[bold green]Starting Challenge {c_idx}: {challenge_id}")
+
+                addr_task = progress.add_task("Processing Addresses", total=len(address_list))
+                if args.multi:
+                    stop_event.clear()
+                    stats.reset()
+                    miner = MultiAddressMiner(args.base_url, args.daemon_host, args.daemon_port, args.submit, args.nonce_mode)
+                    start_time = time.time()
+                    try:
+                        solved = miner.run(challenge, address_list, on_solved=lambda a: progress.advance(addr_task))
+                    except Exception as e:
+                        console.log(f"[red]Multi-address job failed: {e}")
+                        solved = set()
+                    elapsed = time.time() - start_time
+                    console.log(f"✅ Solved {len(solved)}/{len(set(address_list))} addresses in {elapsed:.1f}s")
+                else:
+                    for a_idx, addr in enumerate(address_list, start=1):
+                        progress.update(addr_task, description=f"Addr {a_idx}/{len(address_list)}")
+                        stop_event.clear()
+                        stats.reset()
+
+                        start_time = time.time()
+                        if args.asyncio:
+                            miner = AsyncMiner(args.base_url, addr, args.daemon_host, args.daemon_port, args.submit,
+                                               args.streams, args.in_flight, args.batch_size, args.nonce_mode)
+                            miner.run(challenge, stats_interval=10.0)
+                        elif args.processes > 1:
+                            orch = ProcessOrchestrator(
+                                args.processes,
+                                args.base_url,
+                                addr,
+                                args.daemon_host,
+                                args.daemon_port,
+                                args.workers,
+                                args.submit,
+                                args.batch_size,
+                                args.protocol,
+                                args.nonce_mode,
+                                args.push and args.protocol == "line"
+                            )
+                            orch.run(challenge, stats_interval=10.0)
+                        else:
+                            orch = Orchestrator(
+                                args.base_url,
+                                addr,
+                                args.daemon_host,
+                                args.daemon_port,
+                                args.workers,
+                                args.submit,
+                                args.batch_size,
+                                args.protocol,
+                                args.nonce_mode,
+                                args.push and args.protocol == "line"
+                            )
+                            orch.set_challenge(challenge)
+                            orch.run(stats_interval=10.0)
+                        elapsed = time.time() - start_time
+
+                        console.log(f"✅ Done mining for address {addr} in {elapsed:.1f}s")
+                        progress.advance(addr_task)
+                        time.sleep(1)
+
+                console.log(f"✅ Done Challenge {challenge['challenge_id']}")
+                progress.advance(challenge_task)
                 time.sleep(1)
 
-            console.log(f"✅ Done Challenge {challenge['challenge_id']}")
-            progress.advance(challenge_task)
-            time.sleep(1)
-
+    # solutions still being submitted
+    submitter.wait_idle()
     console.log("\n✅✅ ALL COMPLETED ✅✅")
 
 if __name__ == "__main__":
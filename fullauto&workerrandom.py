@@ -1,630 +1,1552 @@
-#!/usr/bin/env python3
-"""
-python_miner.py
-
-Python coordinator for Scavenger Mine:
-- Read challenges from CSV file
-- spawn workers that talk to local AshMaize daemon (TCP) to get hash
-- check difficulty
-- POST /solution when found
-"""
-
-import argparse
-import requests
-import socket
-import threading
-import time
-import random
-import sys
-import csv
-import os
-import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Optional, Dict, List
-from datetime import datetime, timezone
-import argparse
-import threading
-import time
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
-from rich.console import Console
-from rich.progress import Progress, BarColumn, TextColumn, TimeElapsedColumn, TimeRemainingColumn
-
-# Initialize console for logging
-console = Console()
-
-# -------- CONFIG / defaults --------
-BASE_URL = "https://scavenger.prod.gd.midnighttge.io"
-DAEMON_HOST = "127.0.0.1"
-DAEMON_PORT = 4002
-SOCKET_TIMEOUT = 5.0  # seconds
-NONCE_BATCH = 1024  # number of nonces a worker loops before refreshing challenge check
-# -----------------------------------
-
-# thread-safe counters
-class Stats:
-    def __init__(self):
-        self.lock = threading.Lock()
-        self.hashes = 0
-        self.solutions = 0
-        self.starts = 0
-        self.last_report = time.time()
-
-    def add_hashes(self, n):
-        with self.lock:
-            self.hashes += n
-
-    def inc_solutions(self):
-        with self.lock:
-            self.solutions += 1
-
-    def snapshot(self):
-        with self.lock:
-            return self.hashes, self.solutions
-
-    def reset(self):
-        with self.lock:
-            self.hashes = 0
-            self.solutions = 0
-            self.starts = 0
-            self.last_report = time.time()
-
-stats = Stats()
-stop_event = threading.Event()
-
-# Error logging
-class ErrorLogger:
-    def __init__(self):
-        self.errors: List[Dict] = []
-        self.lock = threading.Lock()
-    
-    def log_error(self, address: str, challenge_id: str, nonce: str, error: str):
-        with self.lock:
-            self.errors.append({
-                'timestamp': now_iso(),
-                'address': address,
-                'challenge_id': challenge_id,
-                'nonce': nonce,
-                'error': error
-            })
-    
-    def save_errors_to_file(self, address: str):
-        if not self.errors:
-            return
-            
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{address}.{timestamp}.txt"
-        
-        try:
-            with open(filename, 'w') as f:
-                for error in self.errors:
-                    f.write(f"{error['timestamp']} - {error['address']}/{error['challenge_id']}/{error['nonce']} - {error['error']}\n")
-            print(f"Saved {len(self.errors)} error logs to {filename}")
-        except Exception as e:
-            print(f"Failed to save error log: {e}")
-
-error_logger = ErrorLogger()
-
-# ----------------- utilities -----------------
-def hex64_nonce():
-    """Return 64-bit hex nonce (16 hex chars)"""
-    return "{:016x}".format(random.getrandbits(64))
-
-def now_iso():
-    return datetime.now(timezone.utc).isoformat()
-
-def post_solution(base_url: str, address: str, challenge_id: str, nonce: str):
-    url = f"{base_url.rstrip('/')}/solution/{address}/{challenge_id}/{nonce}"
-    try:
-        r = requests.post(url, json={}, timeout=10)
-        try:
-            return r.status_code, r.json()
-        except:
-            return r.status_code, r.text
-    except Exception as e:
-        error_msg = str(e)
-        error_logger.log_error(address, challenge_id, nonce, error_msg)
-        return None, {"error": error_msg}
-
-def build_preimage(nonce_hex: str, address: str, challenge: dict) -> str:
-    """
-    Build preimage EXACT order:
-    nonce + address + challenge_id + difficulty + no_pre_mine + latest_submission + no_pre_mine_hour
-    All concatenated as plain UTF-8 strings (no delimiters).
-    """
-    parts = [
-        nonce_hex,
-        address,
-        challenge["challenge_id"],
-        challenge["difficulty"],
-        challenge["no_pre_mine"],
-        challenge["latest_submission"],
-        str(challenge.get("no_pre_mine_hour", "")),
-    ]
-    return "".join(parts)
-
-def hash_meets_difficulty(hash_hex: str, difficulty_hex: str) -> bool:
-    """
-    Reproduce the left-4-bytes zero-bit test used earlier:
-    Convert left 4 bytes of hash to uint32 = left4
-    Convert difficulty_hex to uint32 = mask
-    Requirement used: bits that are zero in mask MUST be zero in left4
-    Equivalent: (left4 & (~mask & 0xFFFFFFFF)) == 0
-    """
-    if not hash_hex or len(hash_hex) < 8:
-        return False
-    try:
-        left4 = int(hash_hex[0:8], 16)
-        mask = int(difficulty_hex, 16)
-    except Exception:
-        return False
-    return (left4 & (~mask & 0xFFFFFFFF)) == 0
-
-def read_challenges_from_csv(csv_file: str):
-    """
-    Read challenges from CSV file
-    CSV format: 
-    Column A: challengeId
-    Column B: difficulty
-    Column C: noPreMine
-    Column D: noPreMineHour
-    Column E: latest_submission (NEW)
-    
-    Returns list of challenge dicts
-    """
-    challenges = []
-    try:
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            header = next(reader)  # Read header row
-            
-            for row in reader:
-                if len(row) < 5:  # At least 4 columns required
-                    continue
-                    
-                # Map CSV columns to challenge dict
-                challenge = {
-                    "challenge_id": row[0].strip() if len(row) > 0 else "",
-                    "difficulty": row[1].strip() if len(row) > 1 else "",
-                    "no_pre_mine": row[2].strip() if len(row) > 2 else "",
-                    "no_pre_mine_hour": row[3].strip() if len(row) > 3 else "",
-                    "latest_submission": row[4].strip() if len(row) > 4 else "2099-12-31T23:59:59.000Z"
-                }
-                
-                # Validate required fields
-                if challenge["challenge_id"] and challenge["difficulty"] and challenge["no_pre_mine"]:
-                    challenges.append(challenge)
-                    
-        print(f"Loaded {len(challenges)} challenges from {csv_file}")
-    except Exception as e:
-        print(f"Error reading CSV file: {e}")
-        sys.exit(1)
-    return challenges
-
-# --------------- Worker ---------------
-import random
-
-class Worker:
-    def __init__(self, worker_id, daemon_host, daemon_port, base_url, address, 
-                 challenge_getter, submit_on_find, start_nonce=None, end_nonce=None):
-        self.worker_id = worker_id
-        self.daemon_host = daemon_host
-        self.daemon_port = daemon_port
-        self.base_url = base_url
-        self.address = address
-        self.challenge_getter = challenge_getter
-        self.submit_on_find = submit_on_find
-        self.start_nonce = start_nonce if start_nonce is not None else 0
-        self.end_nonce = end_nonce if end_nonce is not None else 2**64
-        
-    def run(self):
-        """Worker main loop - gửi range đến daemon để search"""
-        print(f"[worker {self.worker_id}] Starting with search range: "
-              f"{hex(self.start_nonce)} → {hex(self.end_nonce)}")
-        
-        while not stop_event.is_set():
-            challenge = self.challenge_getter()
-            if not challenge:
-                time.sleep(0.1)
-                continue
-            
-            try:
-                # ✅ GỬI REQUEST với start/end nonce range
-                response = self.call_daemon_with_range(challenge)
-                
-                if response and 'nonce' in response:
-                    nonce_found = response['nonce']
-                    print(f"[worker {self.worker_id}] FOUND nonce={nonce_found}")
-                    stats.increment_solutions()
-                    
-                    if self.submit_on_find:
-                        self.submit_solution(challenge, nonce_found)
-                    
-                    # Found nonce → stop để lấy challenge mới
-                    break
-                    
-            except Exception as e:
-                print(f"[worker {self.worker_id}] Error: {e}")
-                time.sleep(0.5)
-    
-    def call_daemon_with_range(self, challenge):
-        """Gọi daemon với nonce range cụ thể"""
-        import socket
-        import json
-        
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect((self.daemon_host, self.daemon_port))
-            
-            # Gửi request với range
-            request = {
-                "challenge": challenge,
-                "start_nonce": self.start_nonce,
-                "end_nonce": self.end_nonce,
-                "worker_id": self.worker_id,
-                "address": self.address
-            }
-            
-            sock.sendall(json.dumps(request).encode() + b'\n')
-            
-            # Nhận response
-            response_data = b''
-            while not stop_event.is_set():
-                chunk = sock.recv(4096)
-                if not chunk:
-                    break
-                response_data += chunk
-                stats.increment_hashes(1000)  # Estimate hashes
-                
-            sock.close()
-            
-            if response_data:
-                return json.loads(response_data.decode())
-                
-        except Exception as e:
-            print(f"[worker {self.worker_id}] Daemon call error: {e}")
-            return None
-    
-    def submit_solution(self, challenge, nonce):
-        """Submit solution to server"""
-        import requests
-        
-        try:
-            challenge_id = challenge.get('challenge_id', 'unknown')
-            url = f"{self.base_url}/submit"
-            
-            payload = {
-                "challenge_id": challenge_id,
-                "nonce": nonce,
-                "address": self.address
-            }
-            
-            response = requests.post(url, json=payload, timeout=10)
-            
-            if response.status_code == 200:
-                result = response.json()
-                print(f"[worker {self.worker_id}] ✅ Submit SUCCESS: {result}")
-            else:
-                print(f"[worker {self.worker_id}] ❌ Submit FAILED: {response.status_code}")
-                
-        except Exception as e:
-            print(f"[worker {self.worker_id}] Submit error: {e}")
-
-# --------------- orchestrator ---------------
-class Orchestrator:
-    def __init__(self, base_url, address, daemon_host, daemon_port, workers, submit_on_find):
-        self.base_url = base_url
-        self.address = address
-        self.daemon_host = daemon_host
-        self.daemon_port = daemon_port
-        self.workers_count = workers
-        self.submit_on_find = submit_on_find
-        self.current_challenge = None
-        self.challenge_lock = threading.Lock()
-        self.workers = []
-        self.executor = None
-
-    def challenge_getter(self):
-        with self.challenge_lock:
-            return self.current_challenge
-
-    def set_challenge(self, challenge):
-        """Set current challenge for workers"""
-        with self.challenge_lock:
-            print(f"[debug] Setting challenge: {challenge}")
-            if isinstance(challenge, dict):
-                print(f"[debug] Challenge keys: {list(challenge.keys())}")
-            self.current_challenge = challenge
-
-    def start_workers(self):
-        """✅ BẢN MỚI - CHIA ĐỀU SEARCH SPACE CHO CÁC WORKERS"""
-        self.executor = ThreadPoolExecutor(max_workers=self.workers_count)
-        
-        # ✅ TÍNH TOÁN SEARCH RANGE CHO MỖI WORKER
-        TOTAL_NONCE_SPACE = 2**64
-        chunk_size = TOTAL_NONCE_SPACE // self.workers_count
-        
-        print(f"\n[orchestrator] ===== STARTING {self.workers_count} WORKERS =====")
-        print(f"[orchestrator] Total search space: {hex(TOTAL_NONCE_SPACE)}")
-        print(f"[orchestrator] Chunk per worker: {hex(chunk_size)}\n")
-        
-        for i in range(self.workers_count):
-            # ✅ MỖI WORKER CÓ RANGE RIÊNG BIỆT
-            start_nonce = i * chunk_size
-            
-            # Worker cuối cùng search đến hết space
-            if i == self.workers_count - 1:
-                end_nonce = TOTAL_NONCE_SPACE
-            else:
-                end_nonce = (i + 1) * chunk_size
-            
-            # ✅ THÊM RANDOM OFFSET để tránh workers cùng bắt đầu từ đầu chunk
-            random_offset = random.randint(0, chunk_size // 100)  # 1% random
-            start_nonce += random_offset
-            
-            w = Worker(
-                worker_id=i,
-                daemon_host=self.daemon_host,
-                daemon_port=self.daemon_port,
-                base_url=self.base_url,
-                address=self.address,
-                challenge_getter=self.challenge_getter,
-                submit_on_find=self.submit_on_find,
-                start_nonce=start_nonce,  # ✅ THÊM RANGE
-                end_nonce=end_nonce        # ✅ THÊM RANGE
-            )
-            
-            self.executor.submit(w.run)
-            self.workers.append(w)
-            
-            # Debug log
-            print(f"[orchestrator] Worker {i}: {hex(start_nonce)} → {hex(end_nonce)} "
-                  f"(size: {hex(end_nonce - start_nonce)})")
-        
-        print(f"\n[orchestrator] ===== ALL WORKERS STARTED =====\n")
-
-    def stop_workers(self):
-        stop_event.set()
-        if self.executor:
-            print("[orchestrator] Shutting down workers...")
-            self.executor.shutdown(wait=True)
-            print("[orchestrator] All workers stopped")
-
-    def run(self, stats_interval=5.0):
-        """Run orchestrator with current challenge"""
-        timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
-        
-        ch = self.current_challenge
-        if not ch:
-            print(f"[{timestamp}] [orchestrator] No challenge set")
-            return
-        
-        # Debug: Print the challenge object structure
-        print(f"[debug] Challenge object keys: {list(ch.keys())}")
-        print(f"[debug] Challenge object: {ch}")
-        
-        # Safely get values with fallbacks
-        challenge_id = ch.get('challenge_id', 'unknown')
-        difficulty = ch.get('difficulty', 'unknown')
-        expires = ch.get('latest_submission', 'N/A')
-        
-        print(f"[{timestamp}] [orchestrator] Starting with challenge: id={challenge_id} "
-              f"difficulty={difficulty} expires={expires}")
-        
-        # ✅ Start workers với range đã chia
-        self.start_workers()
-        last_stats = time.time()
-        
-        try:
-            while not stop_event.is_set():
-                # Print stats
-                current_time = time.time()
-                if current_time - last_stats >= stats_interval:
-                    h, s = stats.snapshot()
-                    elapsed = max(0.001, current_time - stats.last_report)
-                    hps = h / elapsed if elapsed > 0 else 0
-                    print(f"[stats] hashes={h} ({hps:.1f} H/s) solutions={s}")
-                    stats.last_report = current_time
-                    last_stats = current_time
-                
-                # Small sleep to prevent busy waiting
-                time.sleep(0.1)
-                
-        except KeyboardInterrupt:
-            print("\n[orchestrator] Stopping...")
-        except Exception as e:
-            print(f"[orchestrator] Error: {e}")
-        finally:
-            print("[orchestrator] Stopping workers...")
-            self.stop_workers()
-
-        
-        # Start workers
-        self.start_workers()
-        last_stats = time.time()
-        
-        try:
-            while not stop_event.is_set():
-                # Just keep printing stats until interrupted
-                current_time = time.time()
-                if current_time - last_stats >= stats_interval:
-                    h, s = stats.snapshot()
-                    elapsed = max(0.001, current_time - stats.last_report)
-                    hps = h / elapsed if elapsed > 0 else 0
-                    print(f"[stats] hashes={h} ({hps:.1f} H/s) solutions={s}")
-                    stats.last_report = current_time
-                    last_stats = current_time
-                
-                # Small sleep to prevent busy waiting
-                time.sleep(0.1)
-                
-        except KeyboardInterrupt:
-            print("\n[orchestrator] Stopping...")
-        except Exception as e:
-            print(f"[orchestrator] Error: {e}")
-        finally:
-            print("[orchestrator] Stopping workers...")
-            self.stop_workers()
-
-# --------------- CLI ---------------
-def parse_args():
-    p = argparse.ArgumentParser(description="Scavenger Mine Python Miner (uses local ashmaize daemon)")
-    p.add_argument("--address", default="addr1q8cecrzfwenw6du5sflmq5svju9vv2m9nhlayq5rk33wqrhgg7emy76r8nrqhg76vfwlg74k5wsrfekal3ltqlyt8qxqqca792", 
-                   help="Cardano address (default: addr1q8cecrzfwenw6du5sflmq5svju9vv2m9nhlayq5rk33wqrhgg7emy76r8nrqhg76vfwlg74k5wsrfekal3ltqlyt8qxqqca792)")
-    p.add_argument("--base-url", default=BASE_URL, help="Scavenger API base URL")
-    p.add_argument("--daemon-host", default=DAEMON_HOST, help="Local ashmaize daemon host")
-    p.add_argument("--daemon-port", default=DAEMON_PORT, type=int, help="Local ashmaize daemon port")
-    p.add_argument("--workers", default=8, type=int, help="Number of worker threads (default: 8)")
-    p.add_argument("--submit", action="store_true", default=True, help="Submit found solutions to server (default: True)")
-    p.add_argument("--csv-file", default=r"D:\midnight\getchallenge.csv", help="CSV file containing challenges (default: D:\\midnight\\getchallenge.csv)")
-    return p.parse_args()
-
-# ---------------- CSV Reader ----------------
-def read_challenges_from_csv(file_path, console):
-    import csv
-    challenges = []
-    try:
-        with open(file_path, newline="", encoding="utf-8") as csvfile:
-            # Read the first line to check if it's a header
-            first_line = csvfile.readline()
-            csvfile.seek(0)  # Reset file pointer to beginning
-            
-            if 'challenge_id' not in first_line:
-                # If no header, add the header row
-                reader = csv.DictReader(csvfile, fieldnames=[
-                    'challenge_id', 'difficulty', 'no_pre_mine', 
-                    'no_pre_mine_hour', 'latest_submission'
-                ])
-            else:
-                # If header exists, use it
-                reader = csv.DictReader(csvfile)
-            
-            for row in reader:
-                # Clean up keys by removing BOM and extra quotes/whitespace
-                cleaned_row = {}
-                for k, v in row.items():
-                    # Remove BOM and extra quotes/whitespace from keys
-                    clean_key = k.strip('"\'\ufeff ')
-                    cleaned_row[clean_key] = v
-                challenges.append(cleaned_row)
-                
-            console.log(f"[green]Successfully loaded {len(challenges)} challenges from CSV")
-            if challenges:
-                console.log(f"[dim]First challenge: {challenges[0]}")
-                
-    except Exception as e:
-        console.log(f"[red][ERROR] Failed to read CSV: {e}")
-        raise  # Re-raise the exception to stop execution
-        
-    if not challenges:
-        raise ValueError("No challenges found in the CSV file")
-        
-    return challenges
-
-# --------------- main ---------------
-def main():
-    # Initialize console
-    console = Console()
-    
-    args = parse_args()
-    
-    # ✅ List address bạn cung cấp
-    address_list = [
-    "addr1q9fhk5c40yndvu980g86nhqfyp6nnfezwzuj4qa7p7cjytysszyvma8p94zc850du9xfnvwq0tw5luq4k7gn3g5jalss3rcwq3",
-    "addr1qy3758ga98ccaztylrnue8ej63ynskmgurrljaddsjq5tpwe7dncxgt6cnppgkjn2x3r48s26tu2nwphygep9fzm3kusyayuqf",
-    "addr1qywhtq522evxxjx7h6h5xxqhvz8wvtu0tytmfzlt8gzy0rathsfku293m6p7d00yat90qng90qp8qadwrtes7zvwq36qf6nxp7",
-    "addr1q9fkdnrldlsug8rg2m7ttj6xyg80qhln36uffnsgvnfd55udx0gae2m5q9r0fm37svhkj4dl0mcfh7j7s7ucrkrjn8cqq9jwl9",
-    "addr1q8cecrzfwenw6du5sflmq5svju9vv2m9nhlayq5rk33wqrhgg7emy76r8nrqhg76vfwlg74k5wsrfekal3ltqlyt8qxqqca792",
-    "addr1q9zny6jp7q5qpvsau4kxm5zej2jkqyl636z5r0vr8zv5jgxfsmrypree946u3c4n4mdk9yxna42d3q8kphp2feze7zjst9cg39",
-    "addr1qyl2rwjccaddqyfc349csr6ncyctl8r0y55hew000emdlj0tqgtur6wyxm9ga8q5n64x0x88az8ynsleh4ux8h9kwsnqjudc20",
-    "addr1qxykvjrygtq2seaukx3365xehmf3d6vjrjd827qxk7dppjzy8kvwk4tz59l4t89zpend0825jx3fj62qwjlvyqml7juqurly9a",
-    "addr1q9g5trnvtpwh2svwjzttz4kr4rjxxwu4627zrnqlmcn0j5s59y0hma20lnne3xfcnx3rz35fgtdkveqhggk4ft770cqsswfut5",
-    "addr1q9h53yserrylwdy5884s603vxx5vcdzde85c237ux4nkp86tfvq49ukm536m8mdk7v457ffqp5gxl55jw9ekh3a2mfdsdpq670",
-    "addr1q8wh05mzkuevknvj7qntjz2lhvqdehw4r2lvywlj4sk9fs3ls46ux04j58v6t06mqph0p4q09z4gsvlw6hx52ademcys89he6t",
-    "addr1q8x0pahx00vu9c86w365dunm8rmy0rg4fuq0g3zxmz4zavyj626uuqqvgk39syqksc6jx5u49qzkt8h7pz0px82usz9q8tcwnv",
-    "addr1qydf4f3wvr02tfrd77uc5j0kqer0mvh6hxpnk6psel9pmgy84s0m063g0qjf5u8hsfu4tsm2xwlwx3erwzcnwyp7u8astpkrrn",
-    "addr1qypzt0yuehh7903n03yfsrgmldvg0ek9etktagwgnunfulf6692udw27m5lhqvxw5ayw085em8wr6ejyuuqjqe4c9pws9ytg3d",
-    "addr1qxj2d0tnnuprevdh5xumj36c2rj0gchrw2kr8qsna6a8g8242smpmfh7pvtur99e6nc7pgahhwvhqt566srdq3f5tdpsx3w4lf",
-    "addr1qyaqtgqlds95r3ajsn2e73l9nx9ywzhysyntaavk7087z33j7n2uyqnvpxdeh6mlasnlkmymyt3uv3yr2avypdmz5hgst6c22f",
-    "addr1q8x0pahx00vu9c86w365dunm8rmy0rg4fuq0g3zxmz4zavyj626uuqqvgk39syqksc6jx5u49qzkt8h7pz0px82usz9q8tcwnv",
-    "addr1qxeastf6h0qlzmwpk4eq4j0k2pp6fzchzlzlz4humeyrn0fv0rhkpjr90ml3dd9rl6rnc7xgerwpc647euep93vykreq704hp8",
-    "addr1qypkwzcq24y2ma0w7l8v0vv6524nv2fh8raulqchq6suj7f6lj02e8ehjdf3ed8npdv72yk8ppp7l8757sfq9zyn48kscyusqu",
-    "addr1qy7eycs367w56qk7qtjzwtejjaz4nzd5ah6gqd5svq5vn88gwa4rem8mqeqlrtudkyj23hg4gzncm2dp5rqrlx9sjzvqguw4fa",
-    "addr1qy3csmd20n5v6ncc779jerzfqsvxw9xly3vmjfr8spx0npkxthj9g2s0cgecdpsjlr55vtdjmm2squk69p95cklncv2qeu0cm0",
-    "addr1q9hgm8vn3tz7hn64tnezsctjwgxuw4vgl2803ekc06fu4mvz446fd46z4ze2czy85nnd2lealnuzsrtft0hs35vjknhscf5ffw",
-    "addr1qyrr03yzez8yps9na8n7xtgnfknshzp4gqzyzyq9y45rke3nuhvu9qvwetv6v3kxd5qkzxwrwpn8xelejhd0r0td2z3qcqpkcf",
-    "addr1q93tzy3dm8r7t2x8nttjsdufql35gzqvnnmxt2qwq7h2jrzgxm7hcz868mdrkrag9luefz3hqxavc5h87gx0ydv07fuse88pe2"
-    ]
-
-    # Register cleanup
-    import atexit
-    atexit.register(lambda: error_logger.save_errors_to_file("MULTIADDR"))
-
-    try:
-        challenges = read_challenges_from_csv(args.csv_file, console)
-        if not challenges:
-            console.log("[red]No challenges found in CSV")
-            return
-            
-        # Debug: Print the first challenge to see its structure
-        if challenges:
-            console.log(f"[yellow]First challenge in list: {challenges[0]}")
-            console.log(f"[yellow]Challenge keys: {list(challenges[0].keys())}")
-    except Exception as e:
-        console.log(f"[red]Error loading challenges: {e}")
-        return
-
-    print(f"✅ TOTAL challenges: {len(challenges)}")
-    print(f"✅ TOTAL addresses: {len(address_list)}")
-
-    # ---------------- Progress Loop ----------------
-    with Progress(
-        TextColumn("[bold blue]{task.description}"),
-        BarColumn(),
-        "[progress.percentage]{task.percentage:>3.0f}%",
-        TimeElapsedColumn(),
-        TimeRemainingColumn(),
-        console=console
-    ) as progress:
-
-        challenge_task = progress.add_task("Processing Challenges", total=len(challenges))
-        
-        for c_idx, challenge in enumerate(challenges, start=1):
-            progress.update(challenge_task, description=f"Challenge {c_idx}/{len(challenges)}")
-            # Debug: Print the challenge object to see its structure
-            print(f"\nDebug - challenge object: {challenge}")
-            # Safely get challenge_id or use a default value
-            challenge_id = challenge.get('challenge_id', f'unknown_{c_idx}')
-            console.log(f"\n[bold green]Starting Challenge {c_idx}: {challenge_id}")
-
-            addr_task = progress.add_task("Processing Addresses", total=len(address_list))
-            for a_idx, addr in enumerate(address_list, start=1):
-                progress.update(addr_task, description=f"Addr {a_idx}/{len(address_list)}")
-                stop_event.clear()
-                stats.reset()
-
-                orch = Orchestrator(
-                    args.base_url,
-                    addr,
-                    args.daemon_host,
-                    args.daemon_port,
-                    args.workers,
-                    args.submit
-                )
-                orch.set_challenge(challenge)
-                start_time = time.time()
-                orch.run(stats_interval=10.0)
-                elapsed = time.time() - start_time
-
-                console.log(f"✅ Done mining for address {addr} in {elapsed:.1f}s")
-                progress.advance(addr_task)
-                time.sleep(1)
-
-            console.log(f"✅ Done Challenge {challenge['challenge_id']}")
-            progress.advance(challenge_task)
-            time.sleep(1)
-
-    console.log("\n✅✅ ALL COMPLETED ✅✅")
-
-if __name__ == "__main__":
+#!/usr/bin/env python3
+"""
+python_miner.py
+
+Python coordinator for Scavenger Mine:
+- Read challenges from CSV file
+- spawn workers that talk to local AshMaize daemon (TCP) to get hash
+- check difficulty
+- POST /solution when found
+"""
+
+import argparse
+import asyncio
+import requests
+import socket
+import threading
+import time
+import random
+import sys
+import csv
+import os
+import json
+import collections
+import math
+import multiprocessing
+import heapq
+import shlex
+import subprocess
+import ctypes
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from typing import Optional, Dict, List
+from datetime import datetime, timezone
+import argparse
+import threading
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from rich.console import Console
+from rich.progress import Progress, BarColumn, TextColumn, TimeElapsedColumn, TimeRemainingColumn
+
+# Initialize console for logging
+console = Console()
+
+# -------- CONFIG / defaults --------
+BASE_URL = "https://scavenger.prod.gd.midnighttge.io"
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 4002
+SOCKET_TIMEOUT = 5.0  # seconds
+NONCE_BATCH = 1024  # number of nonces a worker loops before refreshing challenge check
+ROM_TIMEOUT = 300.0  # seconds to wait for the daemon to build a 1 GiB ROM
+HASH_BATCH = 256  # nonces per "#mine" request with --asyncio
+# -----------------------------------
+
+LATENCY_BUCKETS = 32  # log2 buckets of microseconds per hash
+EWMA_TAU = 10.0  # seconds
+RATE_WINDOWS = (("1m", 60.0), ("5m", 300.0), ("15m", 900.0))
+
+class _Slot:
+    """One thread's counters; only that thread writes them."""
+    __slots__ = ("epoch", "hashes", "solutions", "by_key", "latency")
+
+    def __init__(self, epoch: int):
+        self.epoch = epoch
+        self.hashes = 0
+        self.solutions = 0
+        self.by_key: Dict[tuple, int] = {}
+        self.latency = [0] * LATENCY_BUCKETS
+
+# per-thread counters
+class Stats:
+    """Hash and solution counts with no lock on the hot path: each thread
+    counts into its own slot, which only it writes, and the reporting
+    thread sums the slots. report() also keeps an EWMA and 1m/5m/15m
+    rates (decayed like load averages), hashes per (address, challenge)
+    and a log2 histogram of the time per hash for p50/p99."""
+
+    def __init__(self):
+        self.lock = threading.Lock()  # slot registration and reset only
+        self.local = threading.local()
+        self.epoch = 0
+        self.slots: List[_Slot] = []
+        self.reset()
+
+    def _slot(self) -> _Slot:
+        slot = getattr(self.local, "slot", None)
+        if slot is None or slot.epoch != self.epoch:
+            with self.lock:
+                slot = _Slot(self.epoch)
+                self.slots.append(slot)
+            self.local.slot = slot
+        return slot
+
+    def add_hashes(self, n, key=None, seconds=None):
+        """Count n hashes done by this thread. key, (address, challenge_id),
+        feeds the breakdown; seconds, the time they took, the latency
+        histogram."""
+        slot = self._slot()
+        slot.hashes += n
+        if key is not None:
+            slot.by_key[key] = slot.by_key.get(key, 0) + n
+        if seconds is not None and n > 0:
+            us = int(seconds * 1e6 / n)
+            slot.latency[min(us.bit_length(), LATENCY_BUCKETS - 1)] += n
+
+    def inc_solutions(self):
+        self._slot().solutions += 1
+
+    def snapshot(self):
+        slots = self.slots
+        return sum(s.hashes for s in slots), sum(s.solutions for s in slots)
+
+    def reset(self):
+        with self.lock:
+            self.epoch += 1
+            self.slots = []
+        self.last_tick = time.time()
+        self.last_total = 0
+        self.ticks = 0
+        self.ewma = 0.0
+        self.rates = {name: 0.0 for name, _ in RATE_WINDOWS}
+
+    def by_key(self) -> Dict[tuple, int]:
+        totals: Dict[tuple, int] = {}
+        for s in self.slots:
+            for key, n in list(s.by_key.items()):
+                totals[key] = totals.get(key, 0) + n
+        return totals
+
+    def latency_us(self, q: float) -> Optional[int]:
+        """Upper bound in microseconds of the time per hash at quantile q,
+        None before any timed hash."""
+        buckets = [sum(col) for col in zip(*(s.latency for s in self.slots))]
+        total = sum(buckets)
+        seen = 0
+        for b, n in enumerate(buckets):
+            seen += n
+            if seen >= q * total > 0:
+                return 1 << b  # bucket b holds [2^(b-1), 2^b) us
+        return None
+
+    def tick(self):
+        """Fold the hashes since the last tick into the rates."""
+        now = time.time()
+        dt = now - self.last_tick
+        if dt <= 0:
+            return
+        h, _ = self.snapshot()
+        rate = (h - self.last_total) / dt
+        self.last_tick, self.last_total = now, h
+        self.ticks += 1
+        if self.ticks == 1:
+            # start from the first sample, not from zero
+            self.ewma = rate
+            self.rates = {name: rate for name, _ in RATE_WINDOWS}
+            return
+        self.ewma += (rate - self.ewma) * (1 - math.exp(-dt / EWMA_TAU))
+        for name, window in RATE_WINDOWS:
+            self.rates[name] += (rate - self.rates[name]) * (1 - math.exp(-dt / window))
+
+    def report(self, extra: str = "") -> str:
+        """tick() and format the [stats] line, plus one line per (address,
+        challenge) when several are mined."""
+        self.tick()
+        h, s = self.snapshot()
+        rates = "/".join(f"{self.rates[name]:.1f}" for name, _ in RATE_WINDOWS)
+        line = f"[stats] hashes={h} ({self.ewma:.1f} H/s, 1m/5m/15m {rates}) solutions={s}"
+        p50, p99 = self.latency_us(0.5), self.latency_us(0.99)
+        if p50 is not None:
+            line += f" latency/hash p50<{p50}us p99<{p99}us"
+        if extra:
+            line += " " + extra
+        submitted = submitter.report()
+        if submitted:
+            line += "\n" + submitted
+        keys = self.by_key()
+        if len(keys) > 1:
+            for (address, challenge_id), n in sorted(keys.items()):
+                line += f"\n[stats]   {address[:20]}... {challenge_id}: {n}"
+        return line
+
+class SharedStats:
+    """Stats of one --processes worker process, without a lock: each thread
+    counts into its own row (hashes, solutions) of an array in shared
+    memory, and the parent sums the rows of every process."""
+
+    def __init__(self, counters, first_row: int, rows: int):
+        self.counters = counters
+        self.first_row = first_row
+        self.rows = rows
+        self.next_row = 0
+        self.row_lock = threading.Lock()
+        self.local = threading.local()
+
+    def _row(self) -> int:
+        row = getattr(self.local, "row", None)
+        if row is None:
+            with self.row_lock:
+                row = 2 * (self.first_row + self.next_row % self.rows)
+                self.next_row += 1
+            self.local.row = row
+        return row
+
+    def add_hashes(self, n, key=None, seconds=None):
+        self.counters[self._row()] += n
+
+    def inc_solutions(self):
+        self.counters[self._row() + 1] += 1
+
+    def snapshot(self):
+        rows = self.counters[2 * self.first_row:2 * (self.first_row + self.rows)]
+        return sum(rows[0::2]), sum(rows[1::2])
+
+    def reset(self):
+        for i in range(2 * self.first_row, 2 * (self.first_row + self.rows)):
+            self.counters[i] = 0
+
+stats = Stats()
+stop_event = threading.Event()
+
+# Error logging
+class ErrorLogger:
+    def __init__(self):
+        self.errors: List[Dict] = []
+        self.lock = threading.Lock()
+    
+    def log_error(self, address: str, challenge_id: str, nonce: str, error: str):
+        with self.lock:
+            self.errors.append({
+                'timestamp': now_iso(),
+                'address': address,
+                'challenge_id': challenge_id,
+                'nonce': nonce,
+                'error': error
+            })
+    
+    def save_errors_to_file(self, address: str):
+        if not self.errors:
+            return
+            
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"{address}.{timestamp}.txt"
+        
+        try:
+            with open(filename, 'w') as f:
+                for error in self.errors:
+                    f.write(f"{error['timestamp']} - {error['address']}/{error['challenge_id']}/{error['nonce']} - {error['error']}\n")
+            print(f"Saved {len(self.errors)} error logs to {filename}")
+        except Exception as e:
+            print(f"Failed to save error log: {e}")
+
+error_logger = ErrorLogger()
+
+# ----------------- utilities -----------------
+def hex64_nonce():
+    """Return 64-bit hex nonce (16 hex chars)"""
+    return "{:016x}".format(random.getrandbits(64))
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+def post_solution(base_url: str, address: str, challenge_id: str, nonce: str):
+    url = f"{base_url.rstrip('/')}/solution/{address}/{challenge_id}/{nonce}"
+    try:
+        r = requests.post(url, json={}, timeout=10)
+        try:
+            return r.status_code, r.json()
+        except:
+            return r.status_code, r.text
+    except Exception as e:
+        error_msg = str(e)
+        error_logger.log_error(address, challenge_id, nonce, error_msg)
+        return None, {"error": error_msg}
+
+def connect_daemon(host: str, port: int, timeout: float = SOCKET_TIMEOUT) -> socket.socket:
+    """Open a connection to the ashdaemon. The host string picks the transport:
+    "unix:/path/ash.sock" -> Unix domain socket (daemon started with --unix PATH)
+    "stdio:<command>"     -> spawn "<command> --stdio" as a private co-process and
+                             talk over its stdin/stdout (our end of a socketpair).
+                             Every connection gets its own daemon and ROM cache,
+                             so use it with few workers (e.g. --protocol binary).
+    anything else         -> TCP to host:port with TCP_NODELAY
+    """
+    if host.startswith("unix:"):
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.settimeout(timeout)
+        try:
+            s.connect(host[len("unix:"):])
+        except Exception:
+            s.close()
+            raise
+        return s
+    if host.startswith("stdio:"):
+        ours, theirs = socket.socketpair()
+        try:
+            subprocess.Popen(shlex.split(host[len("stdio:"):]) + ["--stdio"],
+                             stdin=theirs, stdout=theirs, close_fds=True)
+        finally:
+            theirs.close()
+        ours.settimeout(timeout)
+        return ours
+    s = socket.create_connection((host, port), timeout=timeout)
+    s.settimeout(timeout)
+    # requests are tiny and latency bound: disable Nagle
+    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return s
+
+def challenge_deadline(challenge: dict) -> float:
+    """latest_submission as a Unix timestamp (inf if missing or unparsable)."""
+    ls = challenge.get("latest_submission") or ""
+    try:
+        if ls.endswith("Z"):
+            ls = ls[:-1] + "+00:00"
+        return datetime.fromisoformat(ls).timestamp()
+    except Exception:
+        return float("inf")
+
+def challenge_is_open(challenge: dict) -> bool:
+    """True unless the challenge's latest_submission has passed."""
+    return challenge_deadline(challenge) > time.time()
+
+def send_rom_hints(host: str, port: int, challenges: List[dict]):
+    """Ask the daemon to build the ROMs of these challenges in the background
+    ("#prepare"), one hint per distinct open seed. Best effort."""
+    seeds: Dict[str, str] = {}
+    for c in challenges:
+        rom = c.get("no_pre_mine") or ""
+        if rom and challenge_is_open(c):
+            seeds[rom] = max(seeds.get(rom, ""), c.get("latest_submission") or "")
+    if not seeds or host.startswith("stdio:"):
+        return
+    lines = "".join(f"#prepare {rom} {latest}".rstrip() + "\n" for rom, latest in seeds.items())
+    try:
+        s = connect_daemon(host, port)
+        try:
+            s.sendall(lines.encode("utf-8"))
+        finally:
+            s.close()
+        console.log(f"[cyan]Asked daemon to prebuild {len(seeds)} ROM(s)")
+    except Exception as e:
+        console.log(f"[yellow]Could not send ROM hints to daemon: {e}")
+
+def build_preimage(nonce_hex: str, address: str, challenge: dict) -> str:
+    """
+    Build preimage EXACT order:
+    nonce + address + challenge_id + difficulty + no_pre_mine + latest_submission + no_pre_mine_hour
+    All concatenated as plain UTF-8 strings (no delimiters).
+    """
+    parts = [
+        nonce_hex,
+        address,
+        challenge["challenge_id"],
+        challenge["difficulty"],
+        challenge["no_pre_mine"],
+        challenge["latest_submission"],
+        str(challenge.get("no_pre_mine_hour", "")),
+    ]
+    return "".join(parts)
+
+def hash_meets_difficulty(hash_hex: str, difficulty_hex: str) -> bool:
+    """
+    Reproduce the left-4-bytes zero-bit test used earlier:
+    Convert left 4 bytes of hash to uint32 = left4
+    Convert difficulty_hex to uint32 = mask
+    Requirement used: bits that are zero in mask MUST be zero in left4
+    Equivalent: (left4 & (~mask & 0xFFFFFFFF)) == 0
+    """
+    if not hash_hex or len(hash_hex) < 8:
+        return False
+    try:
+        left4 = int(hash_hex[0:8], 16)
+        mask = int(difficulty_hex, 16)
+    except Exception:
+        return False
+    return (left4 & (~mask & 0xFFFFFFFF)) == 0
+
+def read_challenges_from_csv(csv_file: str):
+    """
+    Read challenges from CSV file
+    CSV format: 
+    Column A: challengeId
+    Column B: difficulty
+    Column C: noPreMine
+    Column D: noPreMineHour
+    Column E: latest_submission (NEW)
+    
+    Returns list of challenge dicts
+    """
+    challenges = []
+    try:
+        with open(csv_file, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            header = next(reader)  # Read header row
+            
+            for row in reader:
+                if len(row) < 5:  # At least 4 columns required
+                    continue
+                    
+                # Map CSV columns to challenge dict
+                challenge = {
+                    "challenge_id": row[0].strip() if len(row) > 0 else "",
+                    "difficulty": row[1].strip() if len(row) > 1 else "",
+                    "no_pre_mine": row[2].strip() if len(row) > 2 else "",
+                    "no_pre_mine_hour": row[3].strip() if len(row) > 3 else "",
+                    "latest_submission": row[4].strip() if len(row) > 4 else "2099-12-31T23:59:59.000Z"
+                }
+                
+                # Validate required fields
+                if challenge["challenge_id"] and challenge["difficulty"] and challenge["no_pre_mine"]:
+                    challenges.append(challenge)
+                    
+        print(f"Loaded {len(challenges)} challenges from {csv_file}")
+    except Exception as e:
+        print(f"Error reading CSV file: {e}")
+        sys.exit(1)
+    return challenges
+
+# ------------ solution submission ------------
+SUBMIT_QUEUE = 256  # solutions waiting for a submitter thread
+SUBMIT_THREADS = 4
+SUBMIT_ATTEMPTS = 3
+SUBMIT_BACKOFF = 1.0  # seconds before the first retry, doubled after each
+
+class SolutionSubmitter:
+    """POST found solutions from dedicated threads, so a worker hands a
+    winner over and goes straight back to mining. Solutions wait in a
+    bounded queue (submit() blocks only when it is full). A failed POST is
+    retried up to SUBMIT_ATTEMPTS times with exponential backoff; a retry
+    waits in the queue, not in a thread. Another winner for an (address,
+    challenge) being posted waits for that outcome, and is dropped as a
+    duplicate once one was accepted. submit() returns a Future that
+    resolves to True once the server accepted a solution for the pair
+    (201), or to False when every attempt failed. The time from submit()
+    to the outcome goes into a log2 histogram of milliseconds for
+    report()."""
+
+    def __init__(self, threads: int = SUBMIT_THREADS, capacity: int = SUBMIT_QUEUE):
+        self.threads = threads
+        self.capacity = capacity
+        self.cond = threading.Condition()
+        self.heap = []  # (due, seq, entry)
+        self.seq = 0
+        self.started = False
+        self.accepted_keys = set()  # (address, challenge_id)
+        self.posting_keys = set()
+        self.pending = 0  # submitted, outcome not known yet
+        self.accepted = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.latency = [0] * LATENCY_BUCKETS
+
+    def submit(self, base_url: str, address: str, challenge_id: str, nonce: str) -> Future:
+        fut = Future()
+        if (address, challenge_id) in self.accepted_keys:
+            # another winner for a solved pair: nothing to send
+            fut.set_result(True)
+            return fut
+        with self.cond:
+            if not self.started:
+                for i in range(self.threads):
+                    threading.Thread(target=self._run, name=f"submit-{i}", daemon=True).start()
+                self.started = True
+            while len(self.heap) >= self.capacity:
+                self.cond.wait()
+            self.pending += 1
+            entry = [base_url, address, challenge_id, nonce, 1, time.time(), fut]
+            self._push(time.time(), entry)
+        return fut
+
+    def _push(self, due: float, entry: list):
+        self.seq += 1
+        heapq.heappush(self.heap, (due, self.seq, entry))
+        self.cond.notify_all()
+
+    def _next(self) -> list:
+        with self.cond:
+            while True:
+                if self.heap and self.heap[0][0] <= time.time():
+                    entry = heapq.heappop(self.heap)[2]
+                    key = (entry[1], entry[2])
+                    if key in self.posting_keys:
+                        # wait for the outcome of the pair's current POST
+                        self._push(time.time() + 0.1, entry)
+                        continue
+                    self.posting_keys.add(key)
+                    self.cond.notify_all()
+                    return entry
+                self.cond.wait(self.heap[0][0] - time.time() if self.heap else None)
+
+    def _run(self):
+        while True:
+            entry = self._next()
+            try:
+                self._post(entry)
+            finally:
+                with self.cond:
+                    self.posting_keys.discard((entry[1], entry[2]))
+
+    def _post(self, entry: list):
+        base_url, address, challenge_id, nonce, attempt, queued, fut = entry
+        if (address, challenge_id) in self.accepted_keys:
+            self._finish(entry, True, duplicate=True)
+            return
+        sc, resp = post_solution(base_url, address, challenge_id, nonce)
+        print(f"[submit] {address} {challenge_id} attempt {attempt}/{SUBMIT_ATTEMPTS} returned: {sc} {resp}")
+        if sc == 201:
+            self.accepted_keys.add((address, challenge_id))
+            self._finish(entry, True)
+        elif attempt < SUBMIT_ATTEMPTS:
+            entry[4] = attempt + 1
+            with self.cond:
+                self._push(time.time() + SUBMIT_BACKOFF * 2 ** (attempt - 1), entry)
+        else:
+            print(f"[submit] ❌ FAILED TO SUBMIT VALID NONCE {nonce} for {address} {challenge_id}")
+            error_logger.log_error(address, challenge_id, nonce, f"not accepted after {attempt} attempts: {sc} {resp}")
+            self._finish(entry, False)
+
+    def _finish(self, entry: list, accepted: bool, duplicate: bool = False):
+        ms = int((time.time() - entry[5]) * 1000)
+        with self.cond:
+            self.pending -= 1
+            self.cond.notify_all()
+            if duplicate:
+                self.duplicates += 1
+            else:
+                self.latency[min(ms.bit_length(), LATENCY_BUCKETS - 1)] += 1
+                if accepted:
+                    self.accepted += 1
+                else:
+                    self.failed += 1
+        entry[6].set_result(accepted)
+
+    def wait_idle(self):
+        """Block until every submitted solution has its outcome."""
+        with self.cond:
+            while self.pending:
+                self.cond.wait()
+
+    def report(self) -> str:
+        """One [submit] line, empty before the first outcome."""
+        with self.cond:
+            total = self.accepted + self.failed
+            if not total and not self.heap:
+                return ""
+            line = (f"[submit] accepted={self.accepted} failed={self.failed} "
+                    f"duplicates={self.duplicates} queued={len(self.heap)}")
+            seen, p50, p99 = 0, None, None
+            for b, n in enumerate(self.latency):
+                seen += n
+                if p50 is None and seen >= 0.5 * total > 0:
+                    p50 = 1 << b
+                if p99 is None and seen >= 0.99 * total > 0:
+                    p99 = 1 << b
+        if p50 is not None:
+            line += f" latency p50<{p50}ms p99<{p99}ms"
+        return line
+
+submitter = SolutionSubmitter()
+
+# --------------- Worker ---------------
+import random
+
+class Worker:
+    def __init__(self, worker_id, daemon_host, daemon_port, base_url, address, 
+                 challenge_getter, submit_on_find, start_nonce=None, end_nonce=None):
+        self.worker_id = worker_id
+        self.daemon_host = daemon_host
+        self.daemon_port = daemon_port
+        self.base_url = base_url
+        self.address = address
+        self.challenge_getter = challenge_getter
+        self.submit_on_find = submit_on_find
+        self.start_nonce = start_nonce if start_nonce is not None else 0
+        self.end_nonce = end_nonce if end_nonce is not None else 2**64
+        
+    def run(self):
+        """Worker main loop - gửi range đến daemon để search"""
+        print(f"[worker {self.worker_id}] Starting with search range: "
+              f"{hex(self.start_nonce)} → {hex(self.end_nonce)}")
+        
+        while not stop_event.is_set():
+            challenge = self.challenge_getter()
+            if not challenge:
+                time.sleep(0.1)
+                continue
+            
+            try:
+                # ✅ GỬI REQUEST với start/end nonce range
+                response = self.call_daemon_with_range(challenge)
+                
+                if response and 'nonce' in response:
+                    nonce_found = response['nonce']
+                    print(f"[worker {self.worker_id}] FOUND nonce={nonce_found} hash={response.get('hash')}")
+                    stats.inc_solutions()
+                    
+                    if not self.submit_on_find:
+                        # Found nonce → stop để lấy challenge mới
+                        break
+
+                    # The submitter posts it while this worker searches on
+                    # past the winner; an accepted solution stops every worker,
+                    # a rejected one leaves them mining.
+                    submitter.submit(self.base_url, self.address, challenge.get('challenge_id', 'unknown'), nonce_found) \
+                        .add_done_callback(lambda fut: fut.result() and stop_event.set())
+                    self.start_nonce = int(nonce_found, 16) + 1
+                    continue
+
+                if response and response.get('done'):
+                    # whole range searched without a winner
+                    print(f"[worker {self.worker_id}] range exhausted after {response.get('hashes')} hashes")
+                    break
+
+                if response and 'error' in response:
+                    print(f"[worker {self.worker_id}] Daemon rejected job: {response['error']}")
+                    time.sleep(0.5)
+                    
+            except Exception as e:
+                print(f"[worker {self.worker_id}] Error: {e}")
+                time.sleep(0.5)
+    
+    def call_daemon_with_range(self, challenge):
+        """Gọi daemon với nonce range cụ thể.
+
+        The daemon searches [start_nonce, end_nonce) itself and streams back
+        JSON lines: {"progress": n} periodically, {"nonce": .., "hash": ..} per
+        winner, {"done": true, "hashes": n} at the end or {"error": ..}.
+        Returns the first winner/done/error message, or None on stop/error.
+        """
+        sock = None
+        try:
+            sock = connect_daemon(self.daemon_host, self.daemon_port)
+            # short timeout so we can notice stop_event while the daemon hashes
+            sock.settimeout(0.5)
+            
+            # Gửi request với range
+            request = {
+                "challenge": challenge,
+                "start_nonce": self.start_nonce,
+                "end_nonce": self.end_nonce,
+                "worker_id": self.worker_id,
+                "address": self.address
+            }
+            
+            sock.sendall(json.dumps(request).encode() + b'\n')
+            
+            # Nhận response (one JSON object per line)
+            buf = bytearray()
+            reported = 0
+            key = (self.address, challenge.get("challenge_id"))
+            last = time.perf_counter()
+            while not stop_event.is_set():
+                try:
+                    chunk = sock.recv(4096)
+                except socket.timeout:
+                    continue
+                if not chunk:
+                    raise ConnectionError("daemon closed")
+                buf.extend(chunk)
+                while b"\n" in buf:
+                    line, _, rest = bytes(buf).partition(b"\n")
+                    buf = bytearray(rest)
+                    if not line.strip():
+                        continue
+                    msg = json.loads(line.decode("utf-8"))
+                    done = msg.get("progress", msg.get("hashes"))
+                    if done is not None and done > reported:
+                        now = time.perf_counter()
+                        stats.add_hashes(done - reported, key, now - last)
+                        reported, last = done, now
+                    if "progress" not in msg:
+                        return msg
+            return None
+                
+        except Exception as e:
+            print(f"[worker {self.worker_id}] Daemon call error: {e}")
+            return None
+        finally:
+            if sock:
+                try:
+                    sock.close()
+                except Exception:
+                    pass
+    
+# ------------ multi-address mining ------------
+class MultiAddressMiner:
+    """Mine one challenge for many addresses at once with the daemon's
+    "#multi" job (see src/session.rs): one connection and one shared ROM,
+    with the compute threads rotating over the addresses still unsolved.
+    The daemon retires an address at its first winner; if the server does
+    not accept it, the address is mined again."""
+
+    def __init__(self, base_url, daemon_host, daemon_port, submit_on_find, nonce_mode="counter"):
+        self.base_url = base_url
+        self.daemon_host = daemon_host
+        self.daemon_port = daemon_port
+        self.submit_on_find = submit_on_find
+        self.nonce_mode = nonce_mode
+        self.sock = None
+        self.rbuf = bytearray()
+
+    def _recv_line(self) -> Optional[str]:
+        """Next line from the daemon, or None if none came within the timeout."""
+        while b"\n" not in self.rbuf:
+            try:
+                b = self.sock.recv(65536)
+            except socket.timeout:
+                return None
+            if not b:
+                raise ConnectionError("daemon closed")
+            self.rbuf.extend(b)
+        line, _, rest = bytes(self.rbuf).partition(b"\n")
+        self.rbuf = bytearray(rest)
+        return line.decode("utf-8").strip()
+
+    def run(self, challenge: dict, addresses: List[str], on_solved=None, stats_interval=10.0) -> set:
+        """Mine until every address is solved, the challenge closes or
+        stop_event is set, calling on_solved(address) for each solved one.
+        Returns the solved addresses."""
+        addresses = list(dict.fromkeys(addresses))
+        challenge_id = challenge["challenge_id"]
+        rom = challenge.get("no_pre_mine", "")
+        tail = build_preimage("", "", challenge)
+        solved = set()
+        claimed = set()  # indexes with a winner being submitted or accepted
+        submitting = {}  # future -> address index
+        self.sock = connect_daemon(self.daemon_host, self.daemon_port)
+        self.rbuf = bytearray()
+        try:
+            request = f"#deadline {rom} {challenge.get('latest_submission', '')}\n" \
+                      f"#multi m {rom} {challenge['difficulty']} {tail} {' '.join(addresses)}\n"
+            self.sock.sendall(request.encode("utf-8"))
+            # the first job on a new seed may build the ROM
+            self.sock.settimeout(ROM_TIMEOUT)
+            reply = self._recv_line()
+            if not reply or not reply.startswith("ok"):
+                raise ConnectionError(f"daemon refused multi-address job: {reply}")
+            self.sock.settimeout(0.5)
+            print(f"[multi] mining {len(addresses)} addresses for challenge {challenge_id}")
+            last_stats = time.time()
+            while len(solved) < len(addresses) and not stop_event.is_set() and challenge_is_open(challenge):
+                line = self._recv_line()
+                for fut in [f for f in submitting if f.done()]:
+                    i = submitting.pop(fut)
+                    if fut.result():
+                        solved.add(addresses[i])
+                        if on_solved:
+                            on_solved(addresses[i])
+                    else:
+                        console.log(f"[red]Solution for {addresses[i]} was not accepted, mining it again")
+                        claimed.discard(i)
+                        self.sock.sendall(f"#subscribe m.{i} {self.nonce_mode} once\n".encode("utf-8"))
+                if time.time() - last_stats >= stats_interval:
+                    print(stats.report(f"solved={len(solved)}/{len(addresses)}"))
+                    last_stats = time.time()
+                parts = line.split() if line else []
+                # anything else is the "ok" of a re-subscription
+                if len(parts) < 3 or not parts[1].startswith("m."):
+                    continue
+                i = int(parts[1][2:])
+                if parts[0] == "!hashed":
+                    stats.add_hashes(int(parts[2]), (addresses[i], challenge_id))
+                elif parts[0] == "!found" and i not in claimed:
+                    claimed.add(i)
+                    nonce, hash_hex = parts[2].split(":")
+                    print(f"[multi] FOUND nonce={nonce} hash={hash_hex} address={addresses[i]} challenge={challenge_id}")
+                    stats.inc_solutions()
+                    if self.submit_on_find:
+                        submitting[submitter.submit(self.base_url, addresses[i], challenge_id, nonce)] = i
+                    else:
+                        solved.add(addresses[i])
+                        if on_solved:
+                            on_solved(addresses[i])
+            for fut, i in submitting.items():
+                # challenge closed or stopped: still record what got accepted
+                if fut.result() and addresses[i] not in solved:
+                    solved.add(addresses[i])
+                    if on_solved:
+                        on_solved(addresses[i])
+        finally:
+            # closing the connection stops the remaining subscriptions
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+            self.sock = None
+        return solved
+
+# ------------ concurrent challenges ------------
+class ChallengeScheduler:
+    """Keep several challenges in flight at once, each mined for the whole
+    address list by its own MultiAddressMiner. Challenges are grouped by ROM
+    seed (no_pre_mine, shared by all challenges of a day): a free slot goes
+    to a challenge whose seed is already in flight if there is one, so the
+    running challenges all hit one resident ROM in the daemon, and the next
+    seed only starts as the previous group drains. Each challenge retires on
+    its own once its address set is done."""
+
+    def __init__(self, make_miner, max_in_flight: int):
+        self.make_miner = make_miner
+        self.max_in_flight = max(1, max_in_flight)
+
+    @staticmethod
+    def group_by_seed(challenges: List[dict]) -> List[dict]:
+        """Challenges reordered so those sharing a seed are adjacent; seeds
+        keep the order of their first challenge."""
+        groups: Dict[str, List[dict]] = {}
+        for c in challenges:
+            groups.setdefault(c.get("no_pre_mine", ""), []).append(c)
+        return [c for group in groups.values() for c in group]
+
+    def run(self, challenges: List[dict], addresses: List[str], on_done=None):
+        """Mine every challenge; on_done(challenge, solved_addresses) is
+        called as each one finishes."""
+        pending = self.group_by_seed(challenges)
+        in_flight = {}  # future -> challenge
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            while (pending or in_flight) and not stop_event.is_set():
+                while pending and len(in_flight) < self.max_in_flight:
+                    seeds = {c.get("no_pre_mine", "") for c in in_flight.values()}
+                    i = next((i for i, c in enumerate(pending) if c.get("no_pre_mine", "") in seeds), 0)
+                    challenge = pending.pop(i)
+                    if not challenge_is_open(challenge):
+                        console.log(f"[yellow]Challenge {challenge['challenge_id']} has closed, skipping")
+                        continue
+                    console.log(f"[bold green]Starting challenge {challenge['challenge_id']} ({len(in_flight) + 1} in flight)")
+                    in_flight[pool.submit(self.make_miner().run, challenge, addresses)] = challenge
+                if not in_flight:
+                    break
+                done, _ = wait(list(in_flight), timeout=1.0, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    challenge = in_flight.pop(fut)
+                    try:
+                        solved = fut.result()
+                    except Exception as e:
+                        console.log(f"[red]Challenge {challenge['challenge_id']} failed: {e}")
+                        solved = set()
+                    if on_done:
+                        on_done(challenge, solved)
+
+# ------------ deadline-aware scheduling ------------
+REPLAN_INTERVAL = 60.0  # seconds between re-plans while the hash rate settles
+RATE_WINDOW = 10.0  # seconds per hash-rate sample
+
+def required_zero_bits(difficulty_hex: str) -> int:
+    """Bits of the hash prefix hash_meets_difficulty() requires to be zero."""
+    return bin(~int(difficulty_hex, 16) & 0xFFFFFFFF).count("1")
+
+class DeadlineScheduler(MultiAddressMiner):
+    """Mine every (challenge, address) pair on one daemon connection, in the
+    order that lands the most solutions before their deadlines.
+
+    A pair is expected to take 2^z hashes, z being the zero bits its
+    difficulty requires, i.e. 2^z / H/s seconds at the hash rate measured
+    from the daemon's pushes. plan() walks the open pairs by deadline and
+    drops the longest one so far whenever the running total would miss the
+    current deadline (Moore-Hodgson: the most pairs finishing in time for
+    fixed durations). Dropped pairs follow, by deadline, and are mined only
+    if time is left. The first pairs_in_flight pairs of the plan are mined,
+    one once-subscription each (the second keeps the daemon busy while a
+    winner is submitted); the plan is redone whenever a pair is solved or
+    expires, and every REPLAN_INTERVAL."""
+
+    def __init__(self, base_url, daemon_host, daemon_port, submit_on_find, nonce_mode="counter", pairs_in_flight=2):
+        super().__init__(base_url, daemon_host, daemon_port, submit_on_find, nonce_mode)
+        self.pairs_in_flight = max(1, pairs_in_flight)
+        self.rate: Optional[float] = None  # measured H/s
+
+    def plan(self, pairs: List[tuple], open_pairs, now: float) -> List[int]:
+        """Indexes of the open pairs in the order to mine them."""
+        by_deadline = sorted(open_pairs, key=lambda i: (challenge_deadline(pairs[i][0]),
+                                                        required_zero_bits(pairs[i][0]["difficulty"])))
+        if not self.rate:
+            return by_deadline
+        kept = []  # heap of (-expected seconds, index)
+        late = []
+        total = 0.0
+        for i in by_deadline:
+            secs = (1 << required_zero_bits(pairs[i][0]["difficulty"])) / self.rate
+            heapq.heappush(kept, (-secs, i))
+            total += secs
+            if now + total > challenge_deadline(pairs[i][0]):
+                neg_secs, j = heapq.heappop(kept)
+                total += neg_secs
+                late.append(j)
+        on_time = sorted((i for _, i in kept), key=lambda i: challenge_deadline(pairs[i][0]))
+        return on_time + sorted(late, key=lambda i: challenge_deadline(pairs[i][0]))
+
+    def _start(self, i: int, challenge: dict, address: str, roms_noted: set):
+        rom = challenge.get("no_pre_mine", "")
+        lines = ""
+        if rom not in roms_noted:
+            lines += f"#deadline {rom} {challenge.get('latest_submission', '')}\n"
+            roms_noted.add(rom)
+        suffix = build_preimage("", address, challenge)
+        lines += f"#job p{i} {rom} {challenge['difficulty']} {suffix}\n#subscribe p{i} {self.nonce_mode} once\n"
+        self.sock.sendall(lines.encode("utf-8"))
+
+    def run(self, challenges: List[dict], addresses: List[str], on_challenge_done=None, stats_interval=10.0):
+        """Mine until every pair is solved or expired, or stop_event is set.
+        on_challenge_done(challenge, solved_addresses) is called as each
+        challenge has no pair left."""
+        addresses = list(dict.fromkeys(addresses))
+        pairs = [(c, a) for c in challenges for a in addresses]
+        open_pairs = set(range(len(pairs)))
+        running = set()
+        claimed = set()  # winner being submitted
+        submitting = {}  # future -> pair index
+        solved: Dict[str, set] = {}
+        roms_noted = set()
+        replan_at = 0.0
+        window_start, window_hashes = time.time(), 0
+        last_stats = time.time()
+
+        def retire(i, ok):
+            challenge, address = pairs[i]
+            open_pairs.discard(i)
+            if ok:
+                solved.setdefault(challenge["challenge_id"], set()).add(address)
+            if i in running:
+                running.discard(i)
+                self.sock.sendall(f"#drop p{i}\n".encode("utf-8"))
+            if on_challenge_done and not any(pairs[j][0] is challenge for j in open_pairs):
+                on_challenge_done(challenge, solved.get(challenge["challenge_id"], set()))
+
+        self.sock = connect_daemon(self.daemon_host, self.daemon_port)
+        self.rbuf = bytearray()
+        self.sock.settimeout(0.5)
+        try:
+            while open_pairs and not stop_event.is_set():
+                now = time.time()
+                for i in [i for i in open_pairs if challenge_deadline(pairs[i][0]) <= now and i not in claimed]:
+                    retire(i, False)
+                    replan_at = 0.0
+                for fut in [f for f in submitting if f.done()]:
+                    i = submitting.pop(fut)
+                    claimed.discard(i)
+                    if fut.result():
+                        retire(i, True)
+                    else:
+                        console.log(f"[red]Solution for {pairs[i][1]} / {pairs[i][0]['challenge_id']} was not accepted, mining it again")
+                        # its once-subscription has stopped: the next plan starts it anew
+                        running.discard(i)
+                    replan_at = 0.0
+                if now >= replan_at:
+                    order = self.plan(pairs, open_pairs - claimed, now)
+                    want = set(order[:self.pairs_in_flight])
+                    for i in running - want - claimed:
+                        running.discard(i)
+                        self.sock.sendall(f"#drop p{i}\n".encode("utf-8"))
+                    for i in order[:self.pairs_in_flight]:
+                        if i not in running:
+                            running.add(i)
+                            self._start(i, pairs[i][0], pairs[i][1], roms_noted)
+                    replan_at = now + REPLAN_INTERVAL
+                if now - window_start >= RATE_WINDOW and window_hashes:
+                    sample = window_hashes / (now - window_start)
+                    self.rate = sample if self.rate is None else 0.7 * self.rate + 0.3 * sample
+                    window_start, window_hashes = now, 0
+                if now - last_stats >= stats_interval:
+                    print(stats.report(f"open pairs={len(open_pairs)} mining={sorted(running)}"))
+                    last_stats = now
+
+                line = self._recv_line()
+                parts = line.split() if line else []
+                if parts and parts[0] == "err":
+                    console.log(f"[red]daemon: {line}")
+                # "ok" replies and "!done" carry nothing needed here
+                if len(parts) < 3 or not parts[1].startswith("p"):
+                    continue
+                i = int(parts[1][1:])
+                if parts[0] == "!hashed":
+                    stats.add_hashes(int(parts[2]), (pairs[i][1], pairs[i][0]["challenge_id"]))
+                    window_hashes += int(parts[2])
+                elif parts[0] == "!found" and i in open_pairs and i not in claimed:
+                    # also taken from a pair dropped a moment ago: still a winner
+                    challenge, address = pairs[i]
+                    nonce, hash_hex = parts[2].split(":")
+                    print(f"[sched] FOUND nonce={nonce} hash={hash_hex} address={address} challenge={challenge['challenge_id']}")
+                    stats.inc_solutions()
+                    if self.submit_on_find:
+                        claimed.add(i)
+                        submitting[submitter.submit(self.base_url, address, challenge["challenge_id"], nonce)] = i
+                    else:
+                        retire(i, True)
+                    # keep the daemon busy while the winner is submitted
+                    replan_at = 0.0
+            for fut, i in submitting.items():
+                if fut.result():
+                    retire(i, True)
+        finally:
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+            self.sock = None
+        return solved
+
+# ------------ asyncio coordinator ------------
+class AsyncMiner:
+    """Mine one (challenge, address) from a single thread with asyncio.
+    `streams` line connections to the daemon each keep `in_flight` "#mine"
+    requests queued, so the daemon always has the next batch waiting and a
+    handful of streams keep every compute thread busy, without the worker
+    threads' blocking round trips and their contention on the GIL. The
+    streams share the daemon-side job counter, as the workers do."""
+
+    def __init__(self, base_url, address, daemon_host, daemon_port, submit_on_find,
+                 streams=4, in_flight=4, batch_size=HASH_BATCH, nonce_mode="counter"):
+        self.base_url = base_url
+        self.address = address
+        self.daemon_host = daemon_host
+        self.daemon_port = daemon_port
+        self.submit_on_find = submit_on_find
+        self.streams = max(1, streams)
+        self.in_flight = max(1, in_flight)
+        self.batch_size = max(1, batch_size)
+        self.nonce_mode = nonce_mode
+        self.done: Optional[asyncio.Event] = None
+        self.submitting = False
+        self.solved = False
+
+    def run(self, challenge: dict, stats_interval=10.0) -> bool:
+        """Mine until a solution is accepted (True), the challenge closes or
+        stop_event is set."""
+        return asyncio.run(self._run(challenge, stats_interval))
+
+    async def _run(self, challenge: dict, stats_interval: float) -> bool:
+        self.done = asyncio.Event()
+        self.submitting = False
+        self.solved = False
+        tasks = [asyncio.create_task(self._stream(challenge)) for _ in range(self.streams)]
+        print(f"[async] {self.streams} streams x {self.in_flight} requests of {self.batch_size} nonces, challenge={challenge['challenge_id']}")
+        last_stats = time.time()
+        try:
+            while not self.done.is_set() and not stop_event.is_set() and challenge_is_open(challenge):
+                try:
+                    await asyncio.wait_for(self.done.wait(), 0.5)
+                except asyncio.TimeoutError:
+                    pass
+                if time.time() - last_stats >= stats_interval:
+                    print(stats.report())
+                    last_stats = time.time()
+        finally:
+            self.done.set()
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return self.solved
+
+    async def _stream(self, challenge: dict):
+        """One pipelined connection; reconnects until the miner is done."""
+        rom = challenge.get("no_pre_mine", "")
+        suffix = build_preimage("", self.address, challenge)
+        request = f"#mine a {self.batch_size} {self.nonce_mode}\n".encode("utf-8")
+        key = (self.address, challenge["challenge_id"])
+        while not self.done.is_set():
+            try:
+                reader, writer = await asyncio.open_connection(sock=connect_daemon(self.daemon_host, self.daemon_port))
+            except Exception:
+                await asyncio.sleep(0.5)
+                continue
+            try:
+                writer.write(f"#deadline {rom} {challenge.get('latest_submission', '')}\n"
+                             f"#job a {rom} {challenge['difficulty']} {suffix}\n".encode("utf-8"))
+                # the first job on a new seed may build the ROM
+                reply = await asyncio.wait_for(reader.readline(), ROM_TIMEOUT)
+                if reply.strip() != b"ok":
+                    raise ConnectionError(f"daemon refused job: {reply!r}")
+                writer.write(request * self.in_flight)
+                sent = collections.deque([time.perf_counter()] * self.in_flight)
+                while not self.done.is_set():
+                    reply = await asyncio.wait_for(reader.readline(), SOCKET_TIMEOUT)
+                    if not reply:
+                        raise ConnectionError("daemon closed")
+                    # refill the pipeline before looking at the reply
+                    writer.write(request)
+                    now = time.perf_counter()
+                    sent.append(now)
+                    parts = reply.decode("utf-8").split()
+                    if not parts or parts[0] == "err":
+                        raise ConnectionError(reply)
+                    stats.add_hashes(int(parts[0]), key, now - sent.popleft())
+                    if len(parts) > 1 and not self.submitting:
+                        nonce, hash_hex = parts[1].split(":")
+                        self._found(challenge, nonce, hash_hex, writer)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # reconnect; the job is registered again on the new connection
+                await asyncio.sleep(0.1)
+            finally:
+                writer.close()
+
+    def _found(self, challenge: dict, nonce: str, hash_hex: str, writer):
+        print(f"[async] FOUND nonce={nonce} hash={hash_hex} challenge={challenge['challenge_id']}")
+        stats.inc_solutions()
+        if not self.submit_on_find:
+            self.solved = True
+            self.done.set()
+            return
+        # one winner is enough: the others are ignored while it is submitted
+        self.submitting = True
+        asyncio.create_task(self._submit(challenge, nonce, writer))
+
+    async def _submit(self, challenge: dict, nonce: str, writer):
+        fut = submitter.submit(self.base_url, self.address, challenge["challenge_id"], nonce)
+        if await asyncio.wrap_future(fut):
+            self.solved = True
+            # stop the daemon's hashing on the job now, on every stream
+            writer.write(b"#cancel a\n")
+            self.done.set()
+        else:
+            # keep mining for another winner
+            self.submitting = False
+
+# --------------- orchestrator ---------------
+class Orchestrator:
+    def __init__(self, base_url, address, daemon_host, daemon_port, workers, submit_on_find):
+        self.base_url = base_url
+        self.address = address
+        self.daemon_host = daemon_host
+        self.daemon_port = daemon_port
+        self.workers_count = workers
+        self.submit_on_find = submit_on_find
+        self.current_challenge = None
+        self.challenge_lock = threading.Lock()
+        self.workers = []
+        self.executor = None
+
+    def challenge_getter(self):
+        with self.challenge_lock:
+            return self.current_challenge
+
+    def set_challenge(self, challenge):
+        """Set current challenge for workers"""
+        with self.challenge_lock:
+            print(f"[debug] Setting challenge: {challenge}")
+            if isinstance(challenge, dict):
+                print(f"[debug] Challenge keys: {list(challenge.keys())}")
+            self.current_challenge = challenge
+
+    def start_workers(self):
+        """✅ BẢN MỚI - CHIA ĐỀU SEARCH SPACE CHO CÁC WORKERS"""
+        self.executor = ThreadPoolExecutor(max_workers=self.workers_count)
+        
+        # ✅ TÍNH TOÁN SEARCH RANGE CHO MỖI WORKER
+        TOTAL_NONCE_SPACE = 2**64
+        chunk_size = TOTAL_NONCE_SPACE // self.workers_count
+        
+        print(f"\n[orchestrator] ===== STARTING {self.workers_count} WORKERS =====")
+        print(f"[orchestrator] Total search space: {hex(TOTAL_NONCE_SPACE)}")
+        print(f"[orchestrator] Chunk per worker: {hex(chunk_size)}\n")
+        
+        for i in range(self.workers_count):
+            # ✅ MỖI WORKER CÓ RANGE RIÊNG BIỆT
+            start_nonce = i * chunk_size
+            
+            # Worker cuối cùng search đến hết space
+            if i == self.workers_count - 1:
+                end_nonce = TOTAL_NONCE_SPACE
+            else:
+                end_nonce = (i + 1) * chunk_size
+            
+            # ✅ THÊM RANDOM OFFSET để tránh workers cùng bắt đầu từ đầu chunk
+            random_offset = random.randint(0, chunk_size // 100)  # 1% random
+            start_nonce += random_offset
+            
+            w = Worker(
+                worker_id=i,
+                daemon_host=self.daemon_host,
+                daemon_port=self.daemon_port,
+                base_url=self.base_url,
+                address=self.address,
+                challenge_getter=self.challenge_getter,
+                submit_on_find=self.submit_on_find,
+                start_nonce=start_nonce,  # ✅ THÊM RANGE
+                end_nonce=end_nonce        # ✅ THÊM RANGE
+            )
+            
+            self.executor.submit(w.run)
+            self.workers.append(w)
+            
+            # Debug log
+            print(f"[orchestrator] Worker {i}: {hex(start_nonce)} → {hex(end_nonce)} "
+                  f"(size: {hex(end_nonce - start_nonce)})")
+        
+        print(f"\n[orchestrator] ===== ALL WORKERS STARTED =====\n")
+
+    def stop_workers(self):
+        stop_event.set()
+        if self.executor:
+            print("[orchestrator] Shutting down workers...")
+            self.executor.shutdown(wait=True)
+            print("[orchestrator] All workers stopped")
+
+    def run(self, stats_interval=5.0):
+        """Run orchestrator with current challenge"""
+        timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+        
+        ch = self.current_challenge
+        if not ch:
+            print(f"[{timestamp}] [orchestrator] No challenge set")
+            return
+        
+        # Debug: Print the challenge object structure
+        print(f"[debug] Challenge object keys: {list(ch.keys())}")
+        print(f"[debug] Challenge object: {ch}")
+        
+        # Safely get values with fallbacks
+        challenge_id = ch.get('challenge_id', 'unknown')
+        difficulty = ch.get('difficulty', 'unknown')
+        expires = ch.get('latest_submission', 'N/A')
+        
+        print(f"[{timestamp}] [orchestrator] Starting with challenge: id={challenge_id} "
+              f"difficulty={difficulty} expires={expires}")
+        
+        # ✅ Start workers với range đã chia
+        self.start_workers()
+        last_stats = time.time()
+        
+        try:
+            while not stop_event.is_set():
+                # Print stats
+                current_time = time.time()
+                if current_time - last_stats >= stats_interval:
+                    print(stats.report())
+                    last_stats = current_time
+                
+                # Small sleep to prevent busy waiting
+                time.sleep(0.1)
+                
+        except KeyboardInterrupt:
+            print("\n[orchestrator] Stopping...")
+        except Exception as e:
+            print(f"[orchestrator] Error: {e}")
+        finally:
+            print("[orchestrator] Stopping workers...")
+            self.stop_workers()
+
+        
+        # Start workers
+        self.start_workers()
+        last_stats = time.time()
+        
+        try:
+            while not stop_event.is_set():
+                # Just keep printing stats until interrupted
+                current_time = time.time()
+                if current_time - last_stats >= stats_interval:
+                    print(stats.report())
+                    last_stats = current_time
+                
+                # Small sleep to prevent busy waiting
+                time.sleep(0.1)
+                
+        except KeyboardInterrupt:
+            print("\n[orchestrator] Stopping...")
+        except Exception as e:
+            print(f"[orchestrator] Error: {e}")
+        finally:
+            print("[orchestrator] Stopping workers...")
+            self.stop_workers()
+
+# --------------- worker processes ---------------
+def _process_main(index, per_process, counters, stop, orch_args, challenge):
+    """Body of one --processes worker process: an Orchestrator with
+    per_process workers, counting into its own rows of counters. Runs until
+    the shared stop event is set, and sets it when its workers stop (a
+    solution was submitted)."""
+    global stats
+    stats = SharedStats(counters, index * per_process, per_process)
+    base_url, address, daemon_host, daemon_port, _, submit_on_find, *rest = orch_args
+    orch = Orchestrator(base_url, address, daemon_host, daemon_port, per_process, submit_on_find, *rest)
+    orch.set_challenge(challenge)
+    orch.start_workers()
+    try:
+        while not stop_event.is_set():
+            if stop.wait(0.05):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        orch.stop_workers()
+
+class ProcessOrchestrator:
+    """Orchestrator split over worker processes, so building preimages,
+    checking hashes and counting are not serialised by one interpreter's
+    GIL. Each process runs an equal slice of the workers with their own
+    daemon connections; counters live in a shared array (see SharedStats)
+    that the parent sums. A solution in any process, the challenge closing
+    or stop_event stops them all."""
+
+    def __init__(self, processes, base_url, address, daemon_host, daemon_port, workers, submit_on_find, *worker_args):
+        self.processes = max(1, processes)
+        self.per_process = max(1, -(-workers // self.processes))
+        self.orch_args = (base_url, address, daemon_host, daemon_port, workers, submit_on_find) + worker_args
+
+    def run(self, challenge: dict, stats_interval=5.0):
+        rows = self.processes * self.per_process
+        counters = multiprocessing.RawArray(ctypes.c_uint64, 2 * rows)
+        stop = multiprocessing.Event()
+        procs = [multiprocessing.Process(target=_process_main, daemon=True,
+                                         args=(i, self.per_process, counters, stop, self.orch_args, challenge))
+                 for i in range(self.processes)]
+        for p in procs:
+            p.start()
+        print(f"[orchestrator] started {self.processes} processes x {self.per_process} workers")
+        started = last_stats = time.time()
+        try:
+            while not stop_event.is_set() and challenge_is_open(challenge) and any(p.is_alive() for p in procs):
+                if stop.wait(0.1):
+                    break
+                if time.time() - last_stats >= stats_interval:
+                    h, s = sum(counters[0::2]), sum(counters[1::2])
+                    print(f"[stats] hashes={h} ({h / (time.time() - started):.1f} H/s) solutions={s}")
+                    last_stats = time.time()
+        except KeyboardInterrupt:
+            print("\n[orchestrator] Stopping...")
+        finally:
+            stop.set()
+            stop_event.set()
+            for p in procs:
+                # workers stop after their current batch
+                p.join(timeout=SOCKET_TIMEOUT)
+                if p.is_alive():
+                    p.terminate()
+            stats.add_hashes(sum(counters[0::2]))
+            for _ in range(sum(counters[1::2])):
+                stats.inc_solutions()
+
+# --------------- CLI ---------------
+def parse_args():
+    p = argparse.ArgumentParser(description="Scavenger Mine Python Miner (uses local ashmaize daemon)")
+    p.add_argument("--address", default="addr1q8cecrzfwenw6du5sflmq5svju9vv2m9nhlayq5rk33wqrhgg7emy76r8nrqhg76vfwlg74k5wsrfekal3ltqlyt8qxqqca792", 
+                   help="Cardano address (default: addr1q8cecrzfwenw6du5sflmq5svju9vv2m9nhlayq5rk33wqrhgg7emy76r8nrqhg76vfwlg74k5wsrfekal3ltqlyt8qxqqca792)")
+    p.add_argument("--base-url", default=BASE_URL, help="Scavenger API base URL")
+    p.add_argument("--daemon-host", default=DAEMON_HOST, help="Local ashmaize daemon host, or unix:PATH / stdio:COMMAND for the Unix socket / co-process transports")
+    p.add_argument("--daemon-port", default=DAEMON_PORT, type=int, help="Local ashmaize daemon port")
+    p.add_argument("--workers", default=8, type=int, help="Number of worker threads (default: 8)")
+    p.add_argument("--submit", action="store_true", default=True, help="Submit found solutions to server (default: True)")
+    p.add_argument("--processes", default=0, type=int, help="Split --workers over this many processes, with hash counters in shared memory, so the workers are not bound by one GIL (default: 0, threads only)")
+    p.add_argument("--asyncio", action="store_true", help="Mine each address from one thread with asyncio: a few daemon connections, each with several #mine requests queued, instead of worker threads")
+    p.add_argument("--streams", default=4, type=int, help="With --asyncio: daemon connections (default: 4)")
+    p.add_argument("--in-flight", default=4, type=int, help="With --asyncio: #mine requests queued per connection (default: 4)")
+    p.add_argument("--challenges-in-flight", default=1, type=int, help="Mine up to this many challenges at once, each for all addresses (implies --multi); challenges sharing a ROM seed run together (default: 1)")
+    p.add_argument("--deadline-schedule", action="store_true", help="Mine every (challenge, address) pair on one daemon connection, ordered to land the most solutions before their deadlines from each difficulty and the measured hash rate")
+    p.add_argument("--pairs-in-flight", default=2, type=int, help="With --deadline-schedule: pairs mined at once (default: 2)")
+    p.add_argument("--multi", action="store_true", help="Mine all addresses of a challenge at once in the daemon (one #multi job) instead of one address after another")
+    p.add_argument("--csv-file", default=r"D:\midnight\getchallenge.csv", help="CSV file containing challenges (default: D:\\midnight\\getchallenge.csv)")
+    return p.parse_args()
+
+# ---------------- CSV Reader ----------------
+def read_challenges_from_csv(file_path, console):
+    import csv
+    challenges = []
+    try:
+        with open(file_path, newline="", encoding="utf-8") as csvfile:
+            # Read the first line to check if it's a header
+            first_line = csvfile.readline()
+            csvfile.seek(0)  # Reset file pointer to beginning
+            
+            if 'challenge_id' not in first_line:
+                # If no header, add the header row
+                reader = csv.DictReader(csvfile, fieldnames=[
+                    'challenge_id', 'difficulty', 'no_pre_mine', 
+                    'no_pre_mine_hour', 'latest_submission'
+                ])
+            else:
+                # If header exists, use it
+                reader = csv.DictReader(csvfile)
+            
+            for row in reader:
+                # Clean up keys by removing BOM and extra quotes/whitespace
+                cleaned_row = {}
+                for k, v in row.items():
+                    # Remove BOM and extra quotes/whitespace from keys
+                    clean_key = k.strip('"\'\ufeff ')
+                    cleaned_row[clean_key] = v
+                challenges.append(cleaned_row)
+                
+            console.log(f"[green]Successfully loaded {len(challenges)} challenges from CSV")
+            if challenges:
+                console.log(f"[dim]First challenge: {challenges[0]}")
+                
+    except Exception as e:
+        console.log(f"[red][ERROR] Failed to read CSV: {e}")
+        raise  # Re-raise the exception to stop execution
+        
+    if not challenges:
+        raise ValueError("No challenges found in the CSV file")
+        
+    return challenges
+
+# --------------- main ---------------
+def main():
+    # Initialize console
+    console = Console()
+    
+    args = parse_args()
+    
+    # ✅ List address bạn cung cấp
+    address_list = [
+    "addr1q9fhk5c40yndvu980g86nhqfyp6nnfezwzuj4qa7p7cjytysszyvma8p94zc850du9xfnvwq0tw5luq4k7gn3g5jalss3rcwq3",
+    "addr1qy3758ga98ccaztylrnue8ej63ynskmgurrljaddsjq5tpwe7dncxgt6cnppgkjn2x3r48s26tu2nwphygep9fzm3kusyayuqf",
+    "addr1qywhtq522evxxjx7h6h5xxqhvz8wvtu0tytmfzlt8gzy0rathsfku293m6p7d00yat90qng90qp8qadwrtes7zvwq36qf6nxp7",
+    "addr1q9fkdnrldlsug8rg2m7ttj6xyg80qhln36uffnsgvnfd55udx0gae2m5q9r0fm37svhkj4dl0mcfh7j7s7ucrkrjn8cqq9jwl9",
+    "addr1q8cecrzfwenw6du5sflmq5svju9vv2m9nhlayq5rk33wqrhgg7emy76r8nrqhg76vfwlg74k5wsrfekal3ltqlyt8qxqqca792",
+    "addr1q9zny6jp7q5qpvsau4kxm5zej2jkqyl636z5r0vr8zv5jgxfsmrypree946u3c4n4mdk9yxna42d3q8kphp2feze7zjst9cg39",
+    "addr1qyl2rwjccaddqyfc349csr6ncyctl8r0y55hew000emdlj0tqgtur6wyxm9ga8q5n64x0x88az8ynsleh4ux8h9kwsnqjudc20",
+    "addr1qxykvjrygtq2seaukx3365xehmf3d6vjrjd827qxk7dppjzy8kvwk4tz59l4t89zpend0825jx3fj62qwjlvyqml7juqurly9a",
+    "addr1q9g5trnvtpwh2svwjzttz4kr4rjxxwu4627zrnqlmcn0j5s59y0hma20lnne3xfcnx3rz35fgtdkveqhggk4ft770cqsswfut5",
+    "addr1q9h53yserrylwdy5884s603vxx5vcdzde85c237ux4nkp86tfvq49ukm536m8mdk7v457ffqp5gxl55jw9ekh3a2mfdsdpq670",
+    "addr1q8wh05mzkuevknvj7qntjz2lhvqdehw4r2lvywlj4sk9fs3ls46ux04j58v6t06mqph0p4q09z4gsvlw6hx52ademcys89he6t",
+    "addr1q8x0pahx00vu9c86w365dunm8rmy0rg4fuq0g3zxmz4zavyj626uuqqvgk39syqksc6jx5u49qzkt8h7pz0px82usz9q8tcwnv",
+    "addr1qydf4f3wvr02tfrd77uc5j0kqer0mvh6hxpnk6psel9pmgy84s0m063g0qjf5u8hsfu4tsm2xwlwx3erwzcnwyp7u8astpkrrn",
+    "addr1qypzt0yuehh7903n03yfsrgmldvg0ek9etktagwgnunfulf6692udw27m5lhqvxw5ayw085em8wr6ejyuuqjqe4c9pws9ytg3d",
+    "addr1qxj2d0tnnuprevdh5xumj36c2rj0gchrw2kr8qsna6a8g8242smpmfh7pvtur99e6nc7pgahhwvhqt566srdq3f5tdpsx3w4lf",
+    "addr1qyaqtgqlds95r3ajsn2e73l9nx9ywzhysyntaavk7087z33j7n2uyqnvpxdeh6mlasnlkmymyt3uv3yr2avypdmz5hgst6c22f",
+    "addr1q8x0pahx00vu9c86w365dunm8rmy0rg4fuq0g3zxmz4zavyj626uuqqvgk39syqksc6jx5u49qzkt8h7pz0px82usz9q8tcwnv",
+    "addr1qxeastf6h0qlzmwpk4eq4j0k2pp6fzchzlzlz4humeyrn0fv0rhkpjr90ml3dd9rl6rnc7xgerwpc647euep93vykreq704hp8",
+    "addr1qypkwzcq24y2ma0w7l8v0vv6524nv2fh8raulqchq6suj7f6lj02e8ehjdf3ed8npdv72yk8ppp7l8757sfq9zyn48kscyusqu",
+    "addr1qy7eycs367w56qk7qtjzwtejjaz4nzd5ah6gqd5svq5vn88gwa4rem8mqeqlrtudkyj23hg4gzncm2dp5rqrlx9sjzvqguw4fa",
+    "addr1qy3csmd20n5v6ncc779jerzfqsvxw9xly3vmjfr8spx0npkxthj9g2s0cgecdpsjlr55vtdjmm2squk69p95cklncv2qeu0cm0",
+    "addr1q9hgm8vn3tz7hn64tnezsctjwgxuw4vgl2803ekc06fu4mvz446fd46z4ze2czy85nnd2lealnuzsrtft0hs35vjknhscf5ffw",
+    "addr1qyrr03yzez8yps9na8n7xtgnfknshzp4gqzyzyq9y45rke3nuhvu9qvwetv6v3kxd5qkzxwrwpn8xelejhd0r0td2z3qcqpkcf",
+    "addr1q93tzy3dm8r7t2x8nttjsdufql35gzqvnnmxt2qwq7h2jrzgxm7hcz868mdrkrag9luefz3hqxavc5h87gx0ydv07fuse88pe2"
+    ]
+
+    # Register cleanup
+    import atexit
+    atexit.register(lambda: error_logger.save_errors_to_file("MULTIADDR"))
+
+    try:
+        challenges = read_challenges_from_csv(args.csv_file, console)
+        if not challenges:
+            console.log("[red]No challenges found in CSV")
+            return
+            
+        # Debug: Print the first challenge to see its structure
+        if challenges:
+            console.log(f"[yellow]First challenge in list: {challenges[0]}")
+            console.log(f"[yellow]Challenge keys: {list(challenges[0].keys())}")
+    except Exception as e:
+        console.log(f"[red]Error loading challenges: {e}")
+        return
+
+    # build every upcoming ROM in the daemon while earlier challenges mine
+    send_rom_hints(args.daemon_host, args.daemon_port, challenges)
+
+    print(f"✅ TOTAL challenges: {len(challenges)}")
+    print(f"✅ TOTAL addresses: {len(address_list)}")
+
+    # ---------------- Progress Loop ----------------
+    with Progress(
+        TextColumn("[bold blue]{task.description}"),
+        BarColumn(),
+        "[progress.percentage]{task.percentage:>3.0f}%",
+        TimeElapsedColumn(),
+        TimeRemainingColumn(),
+        console=console
+    ) as progress:
+
+        challenge_task = progress.add_task("Processing Challenges", total=len(challenges))
+        
+        if args.deadline_schedule or args.challenges_in_flight > 1:
+            def challenge_done(challenge, solved):
+                console.log(f"✅ Done Challenge {challenge['challenge_id']}: {len(solved)}/{len(set(address_list))} addresses solved")
+                progress.advance(challenge_task)
+
+            stop_event.clear()
+            stats.reset()
+            if args.deadline_schedule:
+                # every (challenge, address) pair, ordered by deadline and expected work
+                scheduler = DeadlineScheduler(args.base_url, args.daemon_host, args.daemon_port, args.submit, pairs_in_flight=args.pairs_in_flight)
+            else:
+                # several challenges at once, grouped by ROM seed
+                scheduler = ChallengeScheduler(
+                    lambda: MultiAddressMiner(args.base_url, args.daemon_host, args.daemon_port, args.submit),
+                    args.challenges_in_flight,
+                )
+            scheduler.run(challenges, address_list, challenge_done)
+        else:
+            for c_idx, challenge in enumerate(challenges, start=1):
+                progress.update(challenge_task, description=f"Challenge {c_idx}/{len(challenges)}")
+                # Debug: Print the challenge object to see its structure
+                print(f"\nDebug - challenge object: {challenge}")
+                # Safely get challenge_id or use a default value
+                challenge_id = challenge.get('challenge_id', f'unknown_{c_idx}')
+                console.log(f"\n[bold green]Starting Challenge {c_idx}: {challenge_id}")
+
+                addr_task = progress.add_task("Processing Addresses", total=len(address_list))
+                if args.multi:
+                    stop_event.clear()
+                    stats.reset()
+                    miner = MultiAddressMiner(args.base_url, args.daemon_host, args.daemon_port, args.submit)
+                    start_time = time.time()
+                    try:
+                        solved = miner.run(challenge, address_list, on_solved=lambda a: progress.advance(addr_task))
+                    except Exception as e:
+                        console.log(f"[red]Multi-address job failed: {e}")
+                        solved = set()
+                    elapsed = time.time() - start_time
+                    console.log(f"✅ Solved {len(solved)}/{len(set(address_list))} addresses in {elapsed:.1f}s")
+                else:
+                    for a_idx, addr in enumerate(address_list, start=1):
+                        progress.update(addr_task, description=f"Addr {a_idx}/{len(address_list)}")
+                        stop_event.clear()
+                        stats.reset()
+
+                        start_time = time.time()
+                        if args.asyncio:
+                            miner = AsyncMiner(args.base_url, addr, args.daemon_host, args.daemon_port, args.submit,
+                                               args.streams, args.in_flight)
+                            miner.run(challenge, stats_interval=10.0)
+                        elif args.processes > 1:
+                            orch = ProcessOrchestrator(
+                                args.processes,
+                                args.base_url,
+                                addr,
+                                args.daemon_host,
+                                args.daemon_port,
+                                args.workers,
+                                args.submit
+                            )
+                            orch.run(challenge, stats_interval=10.0)
+                        else:
+                            orch = Orchestrator(
+                                args.base_url,
+                                addr,
+                                args.daemon_host,
+                                args.daemon_port,
+                                args.workers,
+                                args.submit
+                            )
+                            orch.set_challenge(challenge)
+                            orch.run(stats_interval=10.0)
+                        elapsed = time.time() - start_time
+
+                        console.log(f"✅ Done mining for address {addr} in {elapsed:.1f}s")
+                        progress.advance(addr_task)
+                        time.sleep(1)
+
+                console.log(f"✅ Done Challenge {challenge['challenge_id']}")
+                progress.advance(challenge_task)
+                time.sleep(1)
+
+    # solutions still being submitted
+    submitter.wait_idle()
+    console.log("\n✅✅ ALL COMPLETED ✅✅")
+
+if __name__ == "__main__":
     main()
\ No newline at end of file
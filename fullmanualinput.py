@@ -138,6 +138,36 @@ def build_preimage(nonce_hex: str, address: str, challenge: dict) -> str:
     ]
     return "".join(parts)
 
+class PreimageTemplate:
+    """The "<no_pre_mine>|<preimage>\\n" request line of one (challenge,
+    address), encoded once. next() writes the next nonce's 16 hex digits
+    into it in place, from a pool of random nonces drawn in bulk from
+    os.urandom, so a request costs no string building or encoding."""
+
+    POOL = 4096  # nonces per os.urandom call
+
+    def __init__(self, address: str, challenge: dict):
+        self.challenge = challenge
+        head = f"{challenge.get('no_pre_mine', '')}|".encode("utf-8")
+        self.line = bytearray(head + bytes(16) + build_preimage("", address, challenge).encode("utf-8") + b"\n")
+        self.at = len(head)
+        self.view = memoryview(self.line)
+        self.pool = memoryview(b"")
+        self.pos = 0
+
+    def next(self) -> memoryview:
+        """The request line with a fresh nonce patched in."""
+        if self.pos >= len(self.pool):
+            self.pool = memoryview(os.urandom(8 * self.POOL).hex().encode("ascii"))
+            self.pos = 0
+        self.line[self.at:self.at + 16] = self.pool[self.pos:self.pos + 16]
+        self.pos += 16
+        return self.view
+
+    def nonce(self) -> str:
+        """The nonce last patched in."""
+        return self.line[self.at:self.at + 16].decode("ascii")
+
 def hash_meets_difficulty(hash_hex: str, difficulty_hex: str) -> bool:
     if not hash_hex or len(hash_hex) < 8:
         return False
@@ -148,6 +178,24 @@ def hash_meets_difficulty(hash_hex: str, difficulty_hex: str) -> bool:
         return False
     return (left4 & (~mask & 0xFFFFFFFF)) == 0
 
+class DifficultyMatcher:
+    """hash_meets_difficulty() compiled for one difficulty: the bits that
+    must be zero are parsed once."""
+
+    def __init__(self, difficulty_hex: str):
+        try:
+            self.zero_bits = ~int(difficulty_hex, 16) & 0xFFFFFFFF
+        except Exception:
+            self.zero_bits = None  # never matches, like hash_meets_difficulty
+
+    def __call__(self, hash_hex: str) -> bool:
+        if self.zero_bits is None or not hash_hex or len(hash_hex) < 8:
+            return False
+        try:
+            return int(hash_hex[:8], 16) & self.zero_bits == 0
+        except ValueError:
+            return False
+
 def read_challenges_from_csv(csv_file: str):
     challenges = []
     try:
@@ -184,6 +232,9 @@ class Worker:
         self.submit_on_find = submit_on_find
         self.sock = None
         self.sock_lock = threading.Lock()
+        self.template: Optional[PreimageTemplate] = None
+        self.matcher: Optional[DifficultyMatcher] = None
+        self.reply = bytearray(4096)
 
     def _ensure_socket(self):
         if self.sock:
@@ -197,23 +248,27 @@ class Worker:
             self.sock = None
             return False
 
-    def _send_pre_and_recv_hash(self, preimage: str) -> Optional[str]:
+    def _send_pre_and_recv_hash(self, request) -> Optional[str]:
+        """Send one request line (bytes-like, see PreimageTemplate) and
+        return the hash the daemon replies with."""
         if not self._ensure_socket():
             time.sleep(0.1)
             return None
         try:
-            data = preimage + "\n"
             with self.sock_lock:
-                self.sock.sendall(data.encode("utf-8"))
-                buf = bytearray()
+                self.sock.sendall(request)
+                # read the reply into the reusable buffer until its newline
+                view = memoryview(self.reply)
+                n = 0
                 while True:
-                    b = self.sock.recv(4096)
-                    if not b:
+                    got = self.sock.recv_into(view[n:])
+                    if not got:
                         raise ConnectionError("daemon closed")
-                    buf.extend(b)
-                    if b.find(b"\n") != -1:
+                    n += got
+                    end = self.reply.find(b"\n", 0, n)
+                    if end != -1:
                         break
-                line = buf.split(b"\n",1)[0].decode("utf-8").strip()
+                line = self.reply[:end].decode("utf-8").strip()
             return line
         except:
             try:
@@ -251,17 +306,17 @@ class Worker:
                     break
                 if latest_ts and time.time() > latest_ts:
                     break
-                nonce = hex64_nonce()
-                pre = build_preimage(nonce, self.address, challenge)
-                rom = challenge.get("no_pre_mine", "")
-                pre_with_rom = f"{rom}|{pre}"
-                hash_hex = self._send_pre_and_recv_hash(pre_with_rom)
+                if self.template is None or self.template.challenge is not challenge:
+                    self.template = PreimageTemplate(self.address, challenge)
+                    self.matcher = DifficultyMatcher(difficulty)
+                hash_hex = self._send_pre_and_recv_hash(self.template.next())
                 if hash_hex is None:
                     time.sleep(0.01)
                     continue
                 tries += 1
                 stats.add_hashes(1)
-                if hash_meets_difficulty(hash_hex, difficulty):
+                if self.matcher(hash_hex):
+                    nonce = self.template.nonce()
                     print(f"[worker {self.id}] FOUND nonce={nonce} hash={hash_hex} challenge={challenge_id}")
                     stats.inc_solutions()
                     if self.submit_on_find:
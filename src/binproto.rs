@@ -0,0 +1,591 @@
+//! Length-prefixed binary protocol, served next to the line protocol.
+//!
+//! A connection switches to this protocol by sending `MAGIC` as its first
+//! bytes; the daemon answers with the same 4 bytes. After that every message
+//! is a frame: `u32 body_len` followed by `body_len` bytes, whose first byte is
+//! the opcode. All integers are little-endian.
+//!
+//! Client -> daemon:
+//!   OP_ROM   u64 req_id, rom_init bytes (the challenge's no_pre_mine)
+//!   OP_HASH  u64 req_id, u32 rom_handle, u32 mask, u8 flags, u64 nonce, suffix
+//!   OP_DEADLINE  u64 req_id, "<rom_init> <latest_submission>" (no reply,
+//!            see --rom-mem-budget)
+//!   OP_JOB   u64 req_id, u32 rom_handle, u32 mask, suffix
+//!   OP_NONCE u64 req_id, u32 job_handle, u8 flags, u64 nonce
+//!   OP_MINE  u64 req_id, u32 job_handle, u32 count, u8 flags
+//!   OP_SUBSCRIBE  u64 req_id, u32 job_handle, u8 flags
+//!   OP_CANCEL     u64 req_id, u32 job_handle (no reply)
+//!
+//! Daemon -> client:
+//!   OP_ROM_OK   u64 req_id, u32 rom_handle
+//!   OP_JOB_OK   u64 req_id, u32 job_handle
+//!   OP_MINE_OK  u64 req_id, u64 hashed, u32 n, n x (u64 nonce, 64 hash bytes)
+//!   OP_FOUND    u64 req_id, u64 nonce, 64 hash bytes
+//!   OP_HASH_OK  u64 req_id, u8 matched, hash bytes
+//!   OP_ERROR    u64 req_id, utf-8 message
+//!
+//! OP_HASH hashes `hex16(nonce) + suffix` (the same preimage build_preimage()
+//! makes in Python) with the ROM behind `rom_handle` and tests `mask` like
+//! hash_meets_difficulty(). OP_JOB registers the ROM, mask and suffix once
+//! as a job template (see session); OP_NONCE then carries only the nonce and
+//! is answered like OP_HASH. OP_MINE has the daemon pick `count` nonces itself
+//! (a shared counter, or per-thread random streams with FLAG_RANDOM; see
+//! session) and returns only the winners. OP_SUBSCRIBE mines the job until
+//! it is cancelled or this connection closes. OP_CANCEL takes a job handle of
+//! this connection, but like `#cancel` it stops mining of that job's ROM and
+//! suffix everywhere (see session). A subscription pushes an OP_FOUND with
+//! its req_id per winner and a final OP_MINE_OK with the total hashed and no
+//! winners; with FLAG_ONCE it stops at its first winner. Many addresses are mined at once (see "#multi" in
+//! session) with one OP_JOB and a FLAG_ONCE subscription per address.
+//!
+//! With FLAG_SHORT the reply carries only the first 4 hash bytes unless the
+//! hash matched, in which case the full 64 bytes are sent. Hash requests run
+//! on the shared compute pool and are answered in completion order, so
+//! clients must match replies by req_id.
+//!
+//! At most MAX_IN_FLIGHT OP_HASH, OP_NONCE, OP_MINE and OP_SUBSCRIBE requests
+//! of a connection wait for their final reply at a time. At the cap the
+//! daemon stops reading frames until the writer has sent one of those
+//! replies, so a client that sends faster than it reads is held back by TCP
+//! instead of piling up pool tasks and replies in the daemon.
+
+use std::io::{self, BufRead, Write};
+use std::sync::atomic::{AtomicBool, Ordering};
+use std::sync::mpsc;
+use std::sync::{Arc, Condvar, Mutex};
+use std::thread;
+
+use crate::session::{Event, JobTemplate, Mined, MAX_JOBS};
+use crate::{hash_meets_difficulty, job_hasher, note_rom_deadline, pool, DaemonMode, JobHasher, MAX_BATCH};
+
+/// Connection preamble. The first byte is not printable ASCII, so it can
+/// never start a line-protocol request.
+pub const MAGIC: [u8; 4] = [0xA5, b'A', b'S', b'H'];
+
+pub const OP_ROM: u8 = 0x01;
+pub const OP_HASH: u8 = 0x02;
+pub const OP_DEADLINE: u8 = 0x03;
+pub const OP_JOB: u8 = 0x04;
+pub const OP_NONCE: u8 = 0x05;
+pub const OP_MINE: u8 = 0x06;
+pub const OP_SUBSCRIBE: u8 = 0x07;
+pub const OP_CANCEL: u8 = 0x08;
+pub const OP_ROM_OK: u8 = 0x81;
+pub const OP_HASH_OK: u8 = 0x82;
+pub const OP_JOB_OK: u8 = 0x84;
+pub const OP_MINE_OK: u8 = 0x86;
+pub const OP_FOUND: u8 = 0x87;
+pub const OP_ERROR: u8 = 0xFF;
+
+/// Reply with 4 hash bytes instead of 64 unless the hash matched the mask.
+pub const FLAG_SHORT: u8 = 0x01;
+/// OP_MINE, OP_SUBSCRIBE: random nonces instead of the shared counter.
+pub const FLAG_RANDOM: u8 = 0x02;
+/// OP_SUBSCRIBE: stop at the first winner.
+pub const FLAG_ONCE: u8 = 0x04;
+
+/// Largest frame accepted from a client.
+const MAX_FRAME: usize = 1 << 20;
+/// Most ROM handles a single connection may register.
+const MAX_ROMS: usize = 256;
+/// Most requests of one connection waiting for their final reply.
+const MAX_IN_FLIGHT: usize = 4096;
+/// Fixed part of an OP_HASH body after the opcode.
+const HASH_HEADER: usize = 8 + 4 + 4 + 1 + 8;
+/// Fixed part of an OP_JOB body after the opcode.
+const JOB_HEADER: usize = 8 + 4 + 4;
+/// OP_NONCE body after the opcode.
+const NONCE_BODY: usize = 8 + 4 + 1 + 8;
+/// OP_MINE body after the opcode.
+const MINE_BODY: usize = 8 + 4 + 4 + 1;
+/// OP_SUBSCRIBE body after the opcode; OP_CANCEL is the same without flags.
+const SUBSCRIBE_BODY: usize = 8 + 4 + 1;
+
+/// One OP_HASH or OP_NONCE request handed to the compute pool.
+struct HashJob {
+    req_id: u64,
+    template: Arc<JobTemplate>,
+    flags: u8,
+    nonce: u64,
+}
+
+/// Slots for a connection's requests in flight: taken by the reader before it
+/// hands a request to the pool, given back by the writer once the request's
+/// final reply frame (OP_HASH_OK or OP_MINE_OK) is written.
+struct InFlight {
+    /// (requests in flight, writer gone)
+    state: Mutex<(usize, bool)>,
+    freed: Condvar,
+}
+
+impl InFlight {
+    fn new() -> InFlight {
+        InFlight { state: Mutex::new((0, false)), freed: Condvar::new() }
+    }
+
+    /// Wait for a free slot and take it. False once the writer is gone.
+    fn take(&self) -> bool {
+        let mut st = self.state.lock().unwrap();
+        while st.0 >= MAX_IN_FLIGHT && !st.1 {
+            st = self.freed.wait(st).unwrap();
+        }
+        st.0 += 1;
+        !st.1
+    }
+
+    fn give_back(&self) {
+        let mut st = self.state.lock().unwrap();
+        st.0 = st.0.saturating_sub(1);
+        self.freed.notify_one();
+    }
+
+    fn close(&self) {
+        self.state.lock().unwrap().1 = true;
+        self.freed.notify_all();
+    }
+}
+
+/// True if the buffered first byte of a connection selects this protocol.
+pub fn is_binary(first: &[u8]) -> bool {
+    first.first() == Some(&MAGIC[0])
+}
+
+/// Serve one binary-protocol connection. `reader` must still hold the magic.
+/// Frames are parsed on this thread, hashed on the compute pool and written
+/// back by a writer thread as soon as each result is ready.
+pub fn serve<R, W>(
+    mut reader: R,
+    writer: W,
+    mode: Arc<DaemonMode>,
+    peer: &str,
+) -> io::Result<()>
+where
+    R: BufRead,
+    W: Write + Send + 'static,
+{
+    let mut magic = [0u8; 4];
+    reader.read_exact(&mut magic)?;
+    if magic != MAGIC {
+        return Err(io::Error::new(io::ErrorKind::InvalidData, "bad binary protocol magic"));
+    }
+
+    let (reply_tx, reply_rx) = mpsc::channel::<Vec<u8>>();
+    let in_flight = Arc::new(InFlight::new());
+    let slots = in_flight.clone();
+    let writer_thread = thread::spawn(move || {
+        write_replies(writer, reply_rx, &slots);
+        slots.close();
+    });
+    let _ = reply_tx.send(MAGIC.to_vec());
+
+    let result = read_frames(&mut reader, &mode, &reply_tx, &in_flight, peer);
+
+    // Queued hashes still hold senders; the writer ends after the last one.
+    drop(reply_tx);
+    let _ = writer_thread.join();
+    result
+}
+
+fn read_frames<R: BufRead>(
+    reader: &mut R,
+    mode: &DaemonMode,
+    replies: &mpsc::Sender<Vec<u8>>,
+    in_flight: &InFlight,
+    peer: &str,
+) -> io::Result<()> {
+    let mut roms: Vec<(String, JobHasher)> = Vec::new();
+    let mut jobs: Vec<Arc<JobTemplate>> = Vec::new();
+    let mut subs = Subscriptions(Vec::new());
+    let mut len_buf = [0u8; 4];
+    loop {
+        match reader.read_exact(&mut len_buf) {
+            Ok(()) => {}
+            Err(e) if e.kind() == io::ErrorKind::UnexpectedEof => return Ok(()),
+            Err(e) => return Err(e),
+        }
+        let len = u32::from_le_bytes(len_buf) as usize;
+        if len == 0 || len > MAX_FRAME {
+            return Err(io::Error::new(io::ErrorKind::InvalidData, format!("bad frame length {}", len)));
+        }
+        let mut body = vec![0u8; len];
+        reader.read_exact(&mut body)?;
+
+        let req_id = if body.len() >= 9 { le_u64(&body[1..9]) } else { 0 };
+        let reply = match body[0] {
+            OP_ROM if body.len() >= 9 => {
+                let rom_init = String::from_utf8_lossy(&body[9..]).into_owned();
+                if roms.len() >= MAX_ROMS {
+                    Some(error_frame(req_id, "too many ROM handles on this connection"))
+                } else {
+                    match job_hasher(mode, rom_init.trim()) {
+                        Ok(h) => {
+                            roms.push((rom_init.trim().to_string(), h));
+                            let mut f = frame_start(OP_ROM_OK, req_id);
+                            f.extend_from_slice(&((roms.len() - 1) as u32).to_le_bytes());
+                            Some(finish_frame(f))
+                        }
+                        Err(e) => Some(error_frame(req_id, &e.to_string())),
+                    }
+                }
+            }
+            OP_HASH if body.len() >= 1 + HASH_HEADER => {
+                let handle = le_u32(&body[9..13]) as usize;
+                match roms.get(handle) {
+                    // at the cap this waits until the writer frees a slot
+                    Some(_) if !in_flight.take() => return Ok(()),
+                    Some((_, h)) => {
+                        // a one-off template: the suffix comes with every request
+                        let template = JobTemplate::new(h.clone(), le_u32(&body[13..17]), body[26..].to_vec());
+                        let job = HashJob {
+                            req_id,
+                            template: Arc::new(template),
+                            flags: body[17],
+                            nonce: le_u64(&body[18..26]),
+                        };
+                        spawn_hash(job, replies);
+                        None
+                    }
+                    None => Some(error_frame(req_id, "unknown ROM handle")),
+                }
+            }
+            OP_JOB if body.len() >= 1 + JOB_HEADER => {
+                let handle = le_u32(&body[9..13]) as usize;
+                match roms.get(handle) {
+                    Some(_) if jobs.len() >= MAX_JOBS => {
+                        Some(error_frame(req_id, "too many jobs on this connection"))
+                    }
+                    Some((rom, h)) => {
+                        let template = JobTemplate::for_rom(h.clone(), rom, le_u32(&body[13..17]), body[17..].to_vec());
+                        jobs.push(Arc::new(template));
+                        let mut f = frame_start(OP_JOB_OK, req_id);
+                        f.extend_from_slice(&((jobs.len() - 1) as u32).to_le_bytes());
+                        Some(finish_frame(f))
+                    }
+                    None => Some(error_frame(req_id, "unknown ROM handle")),
+                }
+            }
+            OP_NONCE if body.len() == 1 + NONCE_BODY => {
+                match jobs.get(le_u32(&body[9..13]) as usize) {
+                    Some(_) if !in_flight.take() => return Ok(()),
+                    Some(t) => {
+                        let job = HashJob { req_id, template: t.clone(), flags: body[13], nonce: le_u64(&body[14..22]) };
+                        spawn_hash(job, replies);
+                        None
+                    }
+                    None => Some(error_frame(req_id, "unknown job handle")),
+                }
+            }
+            OP_MINE if body.len() == 1 + MINE_BODY => {
+                let count = le_u32(&body[13..17]) as u64;
+                match jobs.get(le_u32(&body[9..13]) as usize) {
+                    Some(_) if count > MAX_BATCH as u64 => Some(error_frame(req_id, "count too large")),
+                    Some(_) if !in_flight.take() => return Ok(()),
+                    Some(t) => {
+                        let tx = replies.clone();
+                        t.mine(count, body[17] & FLAG_RANDOM != 0, move |mined| {
+                            let _ = tx.send(mine_frame(req_id, &mined));
+                        });
+                        None
+                    }
+                    None => Some(error_frame(req_id, "unknown job handle")),
+                }
+            }
+            OP_SUBSCRIBE if body.len() == 1 + SUBSCRIBE_BODY => match jobs.get(le_u32(&body[9..13]) as usize) {
+                Some(_) if !in_flight.take() => return Ok(()),
+                Some(t) => {
+                    let stop = Arc::new(AtomicBool::new(false));
+                    subs.0.retain(|s| Arc::strong_count(s) > 1);
+                    subs.0.push(stop.clone());
+                    let tx = replies.clone();
+                    let (random, once) = (body[13] & FLAG_RANDOM != 0, body[13] & FLAG_ONCE != 0);
+                    t.subscribe(random, once, stop, move |e| {
+                        let f = match e {
+                            Event::Found(nonce, h) => {
+                                let mut f = frame_start(OP_FOUND, req_id);
+                                f.extend_from_slice(&nonce.to_le_bytes());
+                                f.extend_from_slice(&h);
+                                finish_frame(f)
+                            }
+                            Event::Hashed(_) => return,
+                            Event::Done(hashed) => mine_frame(req_id, &(hashed, Vec::new())),
+                        };
+                        let _ = tx.send(f);
+                    });
+                    None
+                }
+                None => Some(error_frame(req_id, "unknown job handle")),
+            },
+            OP_CANCEL if body.len() == SUBSCRIBE_BODY => match jobs.get(le_u32(&body[9..13]) as usize) {
+                Some(t) => {
+                    t.cancel();
+                    None
+                }
+                None => Some(error_frame(req_id, "unknown job handle")),
+            },
+            OP_DEADLINE if body.len() >= 9 => {
+                let text = String::from_utf8_lossy(&body[9..]);
+                if let Some((rom, latest)) = text.trim().split_once(' ') {
+                    note_rom_deadline(mode, rom, latest.trim());
+                }
+                None
+            }
+            op => {
+                eprintln!("Bad binary frame from {}: op=0x{:02x} len={}", peer, op, len);
+                Some(error_frame(req_id, "bad frame"))
+            }
+        };
+        if let Some(r) = reply {
+            if replies.send(r).is_err() {
+                return Ok(());
+            }
+        }
+    }
+}
+
+/// Stop flags of a connection's subscriptions, set when it ends: the
+/// subscriptions hold reply senders, so the writer would wait for them.
+struct Subscriptions(Vec<Arc<AtomicBool>>);
+
+impl Drop for Subscriptions {
+    fn drop(&mut self) {
+        for stop in &self.0 {
+            stop.store(true, Ordering::Relaxed);
+        }
+    }
+}
+
+fn spawn_hash(job: HashJob, replies: &mpsc::Sender<Vec<u8>>) {
+    let tx = replies.clone();
+    pool::spawn(move || {
+        let _ = tx.send(compute(job));
+    });
+}
+
+/// Hash one request and build its OP_HASH_OK frame.
+fn compute(job: HashJob) -> Vec<u8> {
+    let h = job.template.hash_nonce(job.nonce);
+    let matched = hash_meets_difficulty(&h, job.template.mask);
+    let n = if job.flags & FLAG_SHORT != 0 && !matched { 4 } else { h.len() };
+
+    let mut f = frame_start(OP_HASH_OK, job.req_id);
+    f.push(matched as u8);
+    f.extend_from_slice(&h[..n]);
+    finish_frame(f)
+}
+
+fn mine_frame(req_id: u64, (hashed, winners): &Mined) -> Vec<u8> {
+    let mut f = frame_start(OP_MINE_OK, req_id);
+    f.extend_from_slice(&hashed.to_le_bytes());
+    f.extend_from_slice(&(winners.len() as u32).to_le_bytes());
+    for (nonce, h) in winners {
+        f.extend_from_slice(&nonce.to_le_bytes());
+        f.extend_from_slice(h);
+    }
+    finish_frame(f)
+}
+
+/// Write reply frames as they complete, batching whatever is already queued
+/// into a single flush, and give back the in-flight slot of each final reply.
+fn write_replies<W: Write>(mut writer: W, replies: mpsc::Receiver<Vec<u8>>, in_flight: &InFlight) {
+    let write = |writer: &mut W, f: &[u8]| {
+        writer.write_all(f)?;
+        if matches!(f.get(4), Some(&OP_HASH_OK) | Some(&OP_MINE_OK)) {
+            in_flight.give_back();
+        }
+        io::Result::Ok(())
+    };
+    while let Ok(first) = replies.recv() {
+        if write(&mut writer, &first).is_err() {
+            return;
+        }
+        while let Ok(more) = replies.try_recv() {
+            if write(&mut writer, &more).is_err() {
+                return;
+            }
+        }
+        if writer.flush().is_err() {
+            return;
+        }
+    }
+}
+
+/// Start a frame: reserve the length prefix, then opcode and req_id.
+fn frame_start(op: u8, req_id: u64) -> Vec<u8> {
+    let mut f = Vec::with_capacity(4 + 1 + 8 + 1 + 64);
+    f.extend_from_slice(&[0u8; 4]);
+    f.push(op);
+    f.extend_from_slice(&req_id.to_le_bytes());
+    f
+}
+
+/// Fill in the length prefix reserved by frame_start.
+fn finish_frame(mut f: Vec<u8>) -> Vec<u8> {
+    let len = (f.len() - 4) as u32;
+    f[..4].copy_from_slice(&len.to_le_bytes());
+    f
+}
+
+fn error_frame(req_id: u64, msg: &str) -> Vec<u8> {
+    let mut f = frame_start(OP_ERROR, req_id);
+    f.extend_from_slice(msg.as_bytes());
+    finish_frame(f)
+}
+
+fn le_u32(b: &[u8]) -> u32 {
+    u32::from_le_bytes([b[0], b[1], b[2], b[3]])
+}
+
+fn le_u64(b: &[u8]) -> u64 {
+    let mut a = [0u8; 8];
+    a.copy_from_slice(&b[..8]);
+    u64::from_le_bytes(a)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::collections::HashMap;
+    use std::io::Cursor;
+    use std::sync::Mutex;
+
+    /// Writer the test can read back after serve() has joined its thread.
+    #[derive(Clone, Default)]
+    struct Sink(Arc<Mutex<Vec<u8>>>);
+
+    impl Write for Sink {
+        fn write(&mut self, b: &[u8]) -> io::Result<usize> {
+            self.0.lock().unwrap().extend_from_slice(b);
+            Ok(b.len())
+        }
+
+        fn flush(&mut self) -> io::Result<()> {
+            Ok(())
+        }
+    }
+
+    fn frame(op: u8, req_id: u64, rest: &[u8]) -> Vec<u8> {
+        let mut f = frame_start(op, req_id);
+        f.extend_from_slice(rest);
+        finish_frame(f)
+    }
+
+    /// Run a connection sending `frames` in demo mode; returns serve()'s
+    /// result and the reply frames by req_id as (op, payload after req_id).
+    fn run(frames: &[Vec<u8>]) -> (io::Result<()>, HashMap<u64, (u8, Vec<u8>)>) {
+        let mut input = MAGIC.to_vec();
+        for f in frames {
+            input.extend_from_slice(f);
+        }
+        let sink = Sink::default();
+        let result = serve(Cursor::new(input), sink.clone(), Arc::new(DaemonMode::Demo), "test");
+        let out = sink.0.lock().unwrap().clone();
+        assert_eq!(out[..4], MAGIC);
+        let mut replies = HashMap::new();
+        let mut rest = &out[4..];
+        while !rest.is_empty() {
+            let len = le_u32(rest) as usize;
+            let body = &rest[4..4 + len];
+            replies.insert(le_u64(&body[1..9]), (body[0], body[9..].to_vec()));
+            rest = &rest[4 + len..];
+        }
+        (result, replies)
+    }
+
+    fn hash_request(handle: u32, mask: u32, flags: u8, nonce: u64, suffix: &[u8]) -> Vec<u8> {
+        let mut b = Vec::new();
+        b.extend_from_slice(&handle.to_le_bytes());
+        b.extend_from_slice(&mask.to_le_bytes());
+        b.push(flags);
+        b.extend_from_slice(&nonce.to_le_bytes());
+        b.extend_from_slice(suffix);
+        b
+    }
+
+    #[test]
+    fn answers_rom_and_hash_frames_by_req_id() {
+        let (result, replies) = run(&[
+            frame(OP_ROM, 1, b"seed"),
+            frame(OP_HASH, 2, &hash_request(0, u32::MAX, 0, 5, b"abc")),
+            frame(OP_HASH, 3, &hash_request(0, 0, FLAG_SHORT, 5, b"abc")),
+        ]);
+        result.unwrap();
+        assert_eq!(replies[&1], (OP_ROM_OK, 0u32.to_le_bytes().to_vec()));
+
+        let h = crate::demo_hash(b"0000000000000005abc");
+        let (op, body) = &replies[&2];
+        assert_eq!((*op, body[0], &body[1..]), (OP_HASH_OK, 1, &h[..]));
+        // no match under a zero mask (unless the hash starts with 4 zero
+        // bytes), so FLAG_SHORT trims the reply to the 4-byte prefix
+        let (op, body) = &replies[&3];
+        assert_eq!((*op, body[0], &body[1..]), (OP_HASH_OK, 0, &h[..4]));
+    }
+
+    #[test]
+    fn rejects_unknown_handles_and_opcodes() {
+        let (result, replies) = run(&[
+            frame(OP_HASH, 1, &hash_request(7, u32::MAX, 0, 0, b"")),
+            frame(OP_NONCE, 2, &[0u8; NONCE_BODY - 8]),
+            frame(0x7E, 3, b""),
+            // one byte short of an OP_MINE body
+            frame(OP_MINE, 4, &[0u8; MINE_BODY - 9]),
+        ]);
+        result.unwrap();
+        assert_eq!(replies[&1], (OP_ERROR, b"unknown ROM handle".to_vec()));
+        assert_eq!(replies[&2], (OP_ERROR, b"unknown job handle".to_vec()));
+        assert_eq!(replies[&3], (OP_ERROR, b"bad frame".to_vec()));
+        assert_eq!(replies[&4], (OP_ERROR, b"bad frame".to_vec()));
+    }
+
+    #[test]
+    fn bad_frame_length_ends_the_connection() {
+        for len in [0u32, MAX_FRAME as u32 + 1] {
+            let (result, replies) = run(&[len.to_le_bytes().to_vec()]);
+            assert_eq!(result.unwrap_err().kind(), io::ErrorKind::InvalidData);
+            assert!(replies.is_empty());
+        }
+    }
+
+    #[test]
+    fn truncated_frame_is_an_error_but_eof_between_frames_is_not() {
+        let mut f = frame(OP_ROM, 1, b"seed");
+        f.pop();
+        assert_eq!(run(&[f]).0.unwrap_err().kind(), io::ErrorKind::UnexpectedEof);
+        assert!(run(&[]).0.is_ok());
+    }
+
+    #[test]
+    fn more_requests_than_the_cap_are_all_answered() {
+        let mut frames = vec![frame(OP_ROM, 0, b"seed")];
+        for id in 1..=MAX_IN_FLIGHT as u64 + 100 {
+            frames.push(frame(OP_HASH, id, &hash_request(0, u32::MAX, FLAG_SHORT, id, b"x")));
+        }
+        let (result, replies) = run(&frames);
+        result.unwrap();
+        assert_eq!(replies.len(), MAX_IN_FLIGHT + 101);
+        assert!((1..=MAX_IN_FLIGHT as u64 + 100).all(|id| replies[&id].0 == OP_HASH_OK));
+    }
+
+    #[test]
+    fn reader_waits_at_the_cap_until_the_writer_frees_a_slot() {
+        let slots = Arc::new(InFlight::new());
+        for _ in 0..MAX_IN_FLIGHT {
+            assert!(slots.take());
+        }
+        let reader = {
+            let slots = slots.clone();
+            thread::spawn(move || slots.take())
+        };
+        thread::sleep(std::time::Duration::from_millis(50));
+        assert!(!reader.is_finished());
+        slots.give_back();
+        assert!(reader.join().unwrap());
+
+        // a writer that went away releases a waiting reader
+        let reader = {
+            let slots = slots.clone();
+            thread::spawn(move || slots.take())
+        };
+        slots.close();
+        assert!(!reader.join().unwrap());
+    }
+}
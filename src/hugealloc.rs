@@ -0,0 +1,421 @@
+//! Huge-page backed, prefaulted and optionally locked memory for ROMs.
+//!
+//! AshMaize reads its 1 GiB ROM at random, so with 4 KiB pages nearly every
+//! read misses the TLB. ashmaize allocates the ROM itself, so ROM builds run
+//! inside `with_rom_block`, which maps a block for the ROM up front:
+//!
+//! - on explicit huge pages (MAP_HUGETLB, 2 MiB) when the host has reserved
+//!   them (vm.nr_hugepages), otherwise 2 MiB aligned and marked for
+//!   transparent huge pages (MADV_HUGEPAGE);
+//! - placed on a given NUMA node (ROM replicas, see numa);
+//! - prefaulted by several threads at once, so neither the ROM build nor
+//!   the first hashes afterwards take page faults one at a time;
+//! - optionally mlock'ed, so a ROM is never swapped out.
+//!
+//! The global allocator wrapper only hands that block to the build's
+//! allocation of its size and unmaps it again on free. It does no mapping,
+//! faulting, locking or logging itself, and every other allocation, large
+//! or small, goes to the inner allocator.
+//!
+//! Configure with `configure` before ROMs are built; the defaults are
+//! `Pages::Auto`, no prefault and no mlock.
+
+use std::alloc::{GlobalAlloc, Layout};
+use std::cell::Cell;
+use std::ptr;
+use std::sync::atomic::{AtomicBool, AtomicU64, AtomicU8, AtomicUsize, Ordering};
+use std::sync::{Mutex, PoisonError};
+
+/// Only allocations this large and up can be ROMs.
+const HUGE_MIN: usize = 64 << 20;
+const HUGE_PAGE: usize = 2 << 20;
+const SMALL_PAGE: usize = 4096;
+
+/// Page setup for ROM blocks.
+#[derive(Clone, Copy, PartialEq, Eq, Debug)]
+pub enum Pages {
+    /// 4 KiB pages, transparent huge pages refused (for comparison).
+    Off = 0,
+    /// Transparent huge pages only.
+    Thp = 1,
+    /// Explicit huge pages, falling back to transparent ones.
+    Auto = 2,
+}
+
+impl Pages {
+    pub fn parse(s: &str) -> Option<Pages> {
+        match s {
+            "off" => Some(Pages::Off),
+            "thp" => Some(Pages::Thp),
+            "auto" => Some(Pages::Auto),
+            _ => None,
+        }
+    }
+}
+
+static PAGES: AtomicU8 = AtomicU8::new(Pages::Auto as u8);
+static PREFAULT_THREADS: AtomicUsize = AtomicUsize::new(0);
+static MLOCK: AtomicBool = AtomicBool::new(false);
+
+// Bytes currently mapped by backing, for stats.
+static EXPLICIT_BYTES: AtomicU64 = AtomicU64::new(0);
+static THP_BYTES: AtomicU64 = AtomicU64::new(0);
+static SMALL_BYTES: AtomicU64 = AtomicU64::new(0);
+static LOCKED_BYTES: AtomicU64 = AtomicU64::new(0);
+static WARNED_EXPLICIT: AtomicBool = AtomicBool::new(false);
+static WARNED_MLOCK: AtomicBool = AtomicBool::new(false);
+
+#[derive(Clone, Copy, PartialEq, Eq)]
+enum Backing {
+    Explicit,
+    Thp,
+    Small,
+}
+
+/// A mapped block: address, mapped length, backing, locked.
+#[derive(Clone, Copy)]
+struct Block(usize, usize, Backing, bool);
+
+/// Blocks handed out to finished ROM builds.
+static BLOCKS: Mutex<Vec<Block>> = Mutex::new(Vec::new());
+
+thread_local! {
+    /// The block with_rom_block mapped for this thread's ROM build, until
+    /// the build allocates it.
+    static RESERVED: Cell<Option<Block>> = const { Cell::new(None) };
+    /// That block once allocated, until with_rom_block moves it to BLOCKS.
+    static TAKEN: Cell<Option<Block>> = const { Cell::new(None) };
+}
+
+/// Run the ROM build `build` with a block of `size` bytes mapped for the
+/// ROM beforehand (see the module docs), on NUMA node `node` (kernel node
+/// number) if given. The build's first allocation of that size gets the
+/// block; if there is none, the block is unmapped again afterwards.
+pub fn with_rom_block<R>(size: usize, node: Option<u32>, build: impl FnOnce() -> R) -> R {
+    // also runs if build() panics
+    struct Finish;
+    impl Drop for Finish {
+        fn drop(&mut self) {
+            if let Some(b) = RESERVED.with(|r| r.take()) {
+                unsafe { unmap(b) };
+            }
+            if let Some(b) = TAKEN.with(|t| t.take()) {
+                BLOCKS.lock().unwrap_or_else(PoisonError::into_inner).push(b);
+            }
+        }
+    }
+    let block = unsafe { reserve(size, node) };
+    RESERVED.with(|r| r.set(block));
+    let _finish = Finish;
+    build()
+}
+
+/// Page setup for ROM blocks reserved from now on. `prefault_threads` of 0
+/// leaves faulting to first use.
+pub fn configure(pages: Pages, prefault_threads: usize, mlock: bool) {
+    PAGES.store(pages as u8, Ordering::Relaxed);
+    PREFAULT_THREADS.store(prefault_threads, Ordering::Relaxed);
+    MLOCK.store(mlock, Ordering::Relaxed);
+}
+
+/// Bytes of ROM blocks currently mapped, by backing.
+#[cfg(feature = "native_ashmaize")]
+pub struct Stats {
+    pub explicit_bytes: u64,
+    /// Asked for transparent huge pages; see `thp_backed_bytes`.
+    pub thp_bytes: u64,
+    pub small_bytes: u64,
+    pub locked_bytes: u64,
+    /// Anonymous memory of the process the kernel actually backs with
+    /// transparent huge pages (AnonHugePages).
+    pub thp_backed_bytes: u64,
+}
+
+#[cfg(feature = "native_ashmaize")]
+pub fn stats() -> Stats {
+    Stats {
+        explicit_bytes: EXPLICIT_BYTES.load(Ordering::Relaxed),
+        thp_bytes: THP_BYTES.load(Ordering::Relaxed),
+        small_bytes: SMALL_BYTES.load(Ordering::Relaxed),
+        locked_bytes: LOCKED_BYTES.load(Ordering::Relaxed),
+        thp_backed_bytes: anon_huge_pages().unwrap_or(0),
+    }
+}
+
+#[cfg(feature = "native_ashmaize")]
+fn anon_huge_pages() -> Option<u64> {
+    let s = std::fs::read_to_string("/proc/self/smaps_rollup").ok()?;
+    let line = s.lines().find(|l| l.starts_with("AnonHugePages:"))?;
+    let kb: u64 = line.split_whitespace().nth(1)?.parse().ok()?;
+    Some(kb << 10)
+}
+
+/// Global allocator: reserved ROM blocks as described above, the rest from `A`.
+pub struct HugeAlloc<A>(pub A);
+
+fn is_large(l: &Layout) -> bool {
+    l.size() >= HUGE_MIN && l.align() <= HUGE_PAGE
+}
+
+unsafe impl<A: GlobalAlloc> GlobalAlloc for HugeAlloc<A> {
+    unsafe fn alloc(&self, l: Layout) -> *mut u8 {
+        match take_reserved(&l) {
+            Some(p) => p,
+            None => self.0.alloc(l),
+        }
+    }
+
+    unsafe fn alloc_zeroed(&self, l: Layout) -> *mut u8 {
+        // a reserved block is fresh anonymous memory, zero already
+        match take_reserved(&l) {
+            Some(p) => p,
+            None => self.0.alloc_zeroed(l),
+        }
+    }
+
+    unsafe fn dealloc(&self, p: *mut u8, l: Layout) {
+        if !(is_large(&l) && release(p)) {
+            self.0.dealloc(p, l)
+        }
+    }
+
+    unsafe fn realloc(&self, p: *mut u8, l: Layout, new_size: usize) -> *mut u8 {
+        let nl = Layout::from_size_align_unchecked(new_size, l.align());
+        if !is_large(&l) && !is_large(&nl) {
+            return self.0.realloc(p, l, new_size);
+        }
+        let n = self.alloc(nl);
+        if !n.is_null() {
+            ptr::copy_nonoverlapping(p, n, l.size().min(new_size));
+            self.dealloc(p, l);
+        }
+        n
+    }
+}
+
+/// Map, place, prefault and lock a block for a ROM of `size` bytes. None
+/// if it cannot be mapped; the build then uses the inner allocator.
+unsafe fn reserve(size: usize, node: Option<u32>) -> Option<Block> {
+    let len = size.next_multiple_of(HUGE_PAGE);
+    let pages = PAGES.load(Ordering::Relaxed);
+    let mut block = None;
+    if pages == Pages::Auto as u8 {
+        let p = mmap(len, libc::MAP_HUGETLB | libc::MAP_HUGE_2MB);
+        if p.is_null() {
+            if !WARNED_EXPLICIT.swap(true, Ordering::Relaxed) {
+                eprintln!("No free explicit huge pages for a ROM (see vm.nr_hugepages); using transparent huge pages");
+            }
+        } else {
+            block = Some((p, Backing::Explicit));
+        }
+    }
+    let (p, backing) = match block {
+        Some(b) => b,
+        None => {
+            let p = mmap_aligned(len);
+            if p.is_null() {
+                return None;
+            }
+            if pages == Pages::Off as u8 {
+                libc::madvise(p as *mut libc::c_void, len, libc::MADV_NOHUGEPAGE);
+                (p, Backing::Small)
+            } else {
+                libc::madvise(p as *mut libc::c_void, len, libc::MADV_HUGEPAGE);
+                (p, Backing::Thp)
+            }
+        }
+    };
+
+    if let Some(node) = node {
+        prefer_node(p, len, node);
+    }
+    let threads = PREFAULT_THREADS.load(Ordering::Relaxed);
+    if threads > 0 {
+        prefault(p, len, threads);
+    }
+    let locked = MLOCK.load(Ordering::Relaxed) && {
+        let ok = libc::mlock(p as *const libc::c_void, len) == 0;
+        if !ok && !WARNED_MLOCK.swap(true, Ordering::Relaxed) {
+            eprintln!("Could not mlock a ROM (raise RLIMIT_MEMLOCK / ulimit -l): {}", std::io::Error::last_os_error());
+        }
+        ok
+    };
+
+    counter(backing).fetch_add(len as u64, Ordering::Relaxed);
+    if locked {
+        LOCKED_BYTES.fetch_add(len as u64, Ordering::Relaxed);
+    }
+    Some(Block(p as usize, len, backing, locked))
+}
+
+/// This thread's reserved block, if `l` is the ROM allocation it was
+/// reserved for.
+fn take_reserved(l: &Layout) -> Option<*mut u8> {
+    if !is_large(l) {
+        return None;
+    }
+    RESERVED
+        .try_with(|r| match r.get() {
+            Some(b) if l.size().next_multiple_of(HUGE_PAGE) == b.1 => {
+                r.set(None);
+                TAKEN.with(|t| t.set(Some(b)));
+                Some(b.0 as *mut u8)
+            }
+            _ => None,
+        })
+        .ok()
+        .flatten()
+}
+
+/// Unmap `p` if it is one of our blocks. False if it is not, i.e. it came
+/// from the inner allocator.
+unsafe fn release(p: *mut u8) -> bool {
+    let taken = TAKEN
+        .try_with(|t| match t.get() {
+            Some(b) if b.0 == p as usize => t.take(),
+            _ => None,
+        })
+        .ok()
+        .flatten();
+    let block = taken.or_else(|| {
+        let mut blocks = BLOCKS.lock().unwrap_or_else(PoisonError::into_inner);
+        let i = blocks.iter().position(|b| b.0 == p as usize)?;
+        Some(blocks.swap_remove(i))
+    });
+    match block {
+        Some(b) => {
+            unmap(b);
+            true
+        }
+        None => false,
+    }
+}
+
+unsafe fn unmap(Block(addr, len, backing, locked): Block) {
+    libc::munmap(addr as *mut libc::c_void, len);
+    counter(backing).fetch_sub(len as u64, Ordering::Relaxed);
+    if locked {
+        LOCKED_BYTES.fetch_sub(len as u64, Ordering::Relaxed);
+    }
+}
+
+fn counter(b: Backing) -> &'static AtomicU64 {
+    match b {
+        Backing::Explicit => &EXPLICIT_BYTES,
+        Backing::Thp => &THP_BYTES,
+        Backing::Small => &SMALL_BYTES,
+    }
+}
+
+unsafe fn mmap(len: usize, flags: libc::c_int) -> *mut u8 {
+    let p = libc::mmap(
+        ptr::null_mut(),
+        len,
+        libc::PROT_READ | libc::PROT_WRITE,
+        libc::MAP_PRIVATE | libc::MAP_ANONYMOUS | flags,
+        -1,
+        0,
+    );
+    if p == libc::MAP_FAILED { ptr::null_mut() } else { p as *mut u8 }
+}
+
+/// Anonymous mapping of `len` bytes starting on a HUGE_PAGE boundary, so
+/// every 2 MiB of it can become one transparent huge page.
+unsafe fn mmap_aligned(len: usize) -> *mut u8 {
+    let raw = mmap(len + HUGE_PAGE, 0);
+    if raw.is_null() {
+        return raw;
+    }
+    let start = (raw as usize).next_multiple_of(HUGE_PAGE);
+    let head = start - raw as usize;
+    if head > 0 {
+        libc::munmap(raw as *mut libc::c_void, head);
+    }
+    let tail = HUGE_PAGE - head;
+    if tail > 0 {
+        libc::munmap((start + len) as *mut libc::c_void, tail);
+    }
+    start as *mut u8
+}
+
+/// Ask the kernel to back [p, p+len) from `node`'s memory. Must run before
+/// the pages are first touched; other nodes are still used if it is full.
+unsafe fn prefer_node(p: *mut u8, len: usize, node: u32) {
+    const MPOL_PREFERRED: libc::c_long = 1;
+    let mut mask = [0u64; 16];
+    if node as usize >= mask.len() * 64 {
+        return;
+    }
+    mask[node as usize / 64] |= 1 << (node % 64);
+    let r = libc::syscall(
+        libc::SYS_mbind,
+        p as *mut libc::c_void,
+        len,
+        MPOL_PREFERRED,
+        mask.as_ptr(),
+        (mask.len() * 64) as libc::c_ulong,
+        0 as libc::c_uint,
+    );
+    if r != 0 {
+        eprintln!("Could not place a ROM on NUMA node {}: {}", node, std::io::Error::last_os_error());
+    }
+}
+
+/// Touch every page of [p, p+len) from `threads` threads.
+unsafe fn prefault(p: *mut u8, len: usize, threads: usize) {
+    let base = p as usize;
+    let chunk = (len / threads).next_multiple_of(HUGE_PAGE).max(HUGE_PAGE);
+    let touch = move |from: usize| {
+        let to = (from + chunk).min(len);
+        let mut off = from;
+        while off < to {
+            // writing the zero that is already there faults the page in
+            unsafe { ptr::write_volatile((base + off) as *mut u8, 0) };
+            off += SMALL_PAGE;
+        }
+    };
+    std::thread::scope(|s| {
+        for from in (chunk..len).step_by(chunk) {
+            if std::thread::Builder::new().spawn_scoped(s, move || touch(from)).is_err() {
+                touch(from);
+            }
+        }
+        touch(0);
+    });
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn ours(p: *const u8) -> bool {
+        BLOCKS.lock().unwrap().iter().any(|b| b.0 == p as usize)
+    }
+
+    fn mapped_bytes() -> u64 {
+        [&EXPLICIT_BYTES, &THP_BYTES, &SMALL_BYTES].iter().map(|c| c.load(Ordering::Relaxed)).sum()
+    }
+
+    // one test: the counters and BLOCKS are global
+    #[test]
+    fn only_the_rom_allocation_gets_the_reserved_block() {
+        let before = mapped_bytes();
+
+        let rom = with_rom_block(HUGE_MIN, None, || vec![0u8; HUGE_MIN]);
+        assert!(ours(rom.as_ptr()));
+        assert_eq!(rom.as_ptr() as usize % HUGE_PAGE, 0);
+        assert_eq!(mapped_bytes(), before + HUGE_MIN as u64);
+        drop(rom);
+        assert_eq!(mapped_bytes(), before);
+
+        // large, but not in a ROM build: the inner allocator's, freed there
+        let other = vec![1u8; HUGE_MIN];
+        assert!(!ours(other.as_ptr()));
+        drop(other);
+
+        // a build that allocates no ROM of that size gives the block back
+        let small = with_rom_block(HUGE_MIN, None, || vec![2u8; HUGE_MIN / 2]);
+        assert!(!ours(small.as_ptr()));
+        assert_eq!(mapped_bytes(), before);
+    }
+}
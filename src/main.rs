@@ -1,306 +1,1331 @@
-#[global_allocator]
-static GLOBAL: mimalloc::MiMalloc = mimalloc::MiMalloc;
-
-use std::env;
-use std::io::{BufRead, BufReader, Write};
-use std::net::{TcpListener, TcpStream};
-use std::process::{Command, Stdio};
-use std::sync::Arc;
-use std::collections::HashMap;
-use std::sync::Mutex;
-use std::thread;
-use std::time::Duration;
-
-/// Add these imports for native ashmaize
-use hex;
-use anyhow::{Result, anyhow};
-
-// If using local crate name; adjust if the crate name differs in ce-ashmaize.
-#[cfg(feature = "native_ashmaize")]
-use ashmaize::{Rom, RomGenerationType, hash};
-
-// Simple in-memory ROM cache keyed by rom_init hex string. Feature-gated.
-#[cfg(feature = "native_ashmaize")]
-fn rom_cache() -> &'static Mutex<HashMap<String, std::sync::Arc<Rom>>> {
-    use std::sync::OnceLock;
-    static CACHE: OnceLock<Mutex<HashMap<String, std::sync::Arc<Rom>>>> = OnceLock::new();
-    CACHE.get_or_init(|| Mutex::new(HashMap::new()))
-}
-
-fn handle_client(mut stream: TcpStream, mode: Arc<DaemonMode>) {
-    let peer = stream.peer_addr().ok();
-    let r = stream.try_clone();
-    if r.is_err() {
-        eprintln!("Failed clone stream");
-        return;
-    }
-    let mut reader = BufReader::new(stream.try_clone().unwrap());
-
-    loop {
-        let mut line = String::new();
-        match reader.read_line(&mut line) {
-            Ok(0) => {
-                // EOF
-                break;
-            }
-            Ok(_) => {
-                let pre = line.trim_end_matches(&['\r','\n'][..]).to_string();
-                if pre.len() == 0 {
-                    // ignore empty
-                    continue;
-                }
-
-                let hash_hex = match &*mode {
-                    DaemonMode::Demo => {
-                        // demo hasher: sha256(pre) + sha512(...) -> hex
-                        demo_hash_hex(pre.as_bytes())
-                    }
-                    DaemonMode::External { bin } => {
-                        // call external binary with preimage as arg
-                        match call_external_hash(bin, &pre) {
-                            Ok(h) => h,
-                            Err(e) => {
-                                eprintln!("External hash failed: {:?}", e);
-                                "err".to_string()
-                            }
-                        }
-                    }
-            DaemonMode::Native { rom_init } => {
-                // Native: allow client to optionally prefix the preimage with
-                // a rom hex and '|' separator: "<rom_hex>|<preimage>". If the
-                // prefix is present we'll use that rom init for this hash.
-                let (maybe_rom, actual_pre) = if let Some(pos) = pre.find('|') {
-                    let (r, p) = pre.split_at(pos);
-                    // skip the '|' char for p
-                    (Some(r.trim()), p[1..].trim())
-                } else {
-                    (rom_init.as_deref(), pre.as_str())
-                };
-
-                // 👇 Log ROM prefix info
-// Thêm biến static để đảm bảo chỉ in 1 lần
-                use std::sync::Once;
-                static PRINTED_ROM: Once = Once::new();
-
-                if let Some(rhex) = maybe_rom {
-                    if !rhex.is_empty() {
-                        PRINTED_ROM.call_once(|| {
-                            println!(
-                                "[client {:?}] received ROM prefix (printed once):\n\
-                                ────────────────────────────────────────────────\n\
-                                len = {}\n\
-                                first 64 chars = {}\n\
-                                ────────────────────────────────────────────────",
-                                peer,
-                                rhex.len(),
-                                &rhex[..rhex.len().min(64)]
-                            );
-                        });
-                    }
-                }
-
-
-                        // Compute
-                        match native_hash_hex(actual_pre, maybe_rom) {
-                            Ok(h) => h,
-                            Err(e) => {
-                                eprintln!("Native hash failed: {:?}", e);
-                                "err".to_string()
-                            }
-                        }
-                    }
-                };
-
-                if let Err(e) = writeln!(stream, "{}", hash_hex) {
-                    eprintln!("Failed write to client {:?}: {:?}", peer, e);
-                    break;
-                }
-                if let Err(e) = stream.flush() {
-                    eprintln!("Flush error: {:?}", e);
-                    break;
-                }
-            }
-            Err(e) => {
-                eprintln!("Read error from client {:?}: {:?}", peer, e);
-                break;
-            }
-        }
-    }
-}
-
-fn demo_hash_hex(pre: &[u8]) -> String {
-    use sha2::{Digest, Sha256, Sha512};
-    let mut d1 = Sha256::new();
-    d1.update(pre);
-    let d1b = d1.finalize();
-
-    let mut d2 = Sha512::new();
-    d2.update(&d1b);
-    d2.update(pre);
-    let out = d2.finalize();
-
-    hex::encode(out)
-}
-
-fn call_external_hash(bin: &str, pre: &str) -> Result<String, Box<dyn std::error::Error>> {
-    let out = Command::new(bin)
-        .arg(pre)
-        .stdout(Stdio::piped())
-        .stderr(Stdio::null())
-        .spawn()?
-        .wait_with_output()?;
-    let s = String::from_utf8_lossy(&out.stdout).trim().to_string();
-    Ok(s)
-}
-
-enum DaemonMode {
-    Demo,
-    External { bin: String },
-    /// Native holds optional rom init hex string (no_pre_mine).
-    Native { rom_init: Option<String> },
-}
-
-fn main() -> anyhow::Result<()> {
-    let args: Vec<String> = env::args().collect();
-    let mut mode = DaemonMode::Demo;
-    let mut port = 4002u16;
-
-    let mut i = 1;
-    while i < args.len() {
-        match args[i].as_str() {
-            "--mode" => {
-                i += 1;
-                if i >= args.len() { break; }
-                match args[i].as_str() {
-                    "demo" => mode = DaemonMode::Demo,
-                    "external" => mode = DaemonMode::External { bin: "ashmaize-cli".to_string() },
-                    "native" => mode = DaemonMode::Native { rom_init: None },
-                    _ => {}
-                }
-            }
-            "--bin" => {
-                i += 1;
-                if i >= args.len() { break; }
-                let b = args[i].clone();
-                mode = DaemonMode::External { bin: b };
-            }
-            "--port" => {
-                i += 1;
-                if i >= args.len() { break; }
-                port = args[i].parse().unwrap_or(4000);
-            }
-            "--rom" => {
-                // allow passing no_pre_mine hex directly to daemon for native init
-                i += 1;
-                if i >= args.len() { break; }
-                let hexs = args[i].clone();
-                mode = match mode {
-                    DaemonMode::Native { .. } => DaemonMode::Native { rom_init: Some(hexs) },
-                    _ => DaemonMode::Native { rom_init: Some(hexs) },
-                };
-            }
-            _ => {}
-        }
-        i += 1;
-    }
-
-    println!("Starting ashdaemon on 127.0.0.1:{} mode={}", port,
-        match &mode {
-            DaemonMode::Demo => "demo",
-            DaemonMode::External{..} => "external",
-            DaemonMode::Native { .. } => "native",
-        });
-
-    // If native mode with rom init provided, try to validate the ROM init hex once (optional)
-    if let DaemonMode::Native { rom_init } = &mode {
-        if let Some(hexs) = rom_init {
-            // Validate that provided --rom is valid hex; fail fast if it's not.
-            match hex::decode(hexs) {
-                Ok(_) => println!("Native mode: preloading ROM init (len {})", hexs.len()),
-                Err(e) => {
-                    eprintln!("Invalid --rom hex provided: {}", e);
-                    return Err(anyhow!("Invalid --rom hex: {}", e));
-                }
-            }
-            // We do not keep the AshMaize instance global here because the library
-            // may require thread-local state; instead we will create/initialize per-hash
-            // or implement a global instance if library API supports it.
-        }
-    }
-
-    let mode_arc = Arc::new(mode);
-    let listener = TcpListener::bind(("127.0.0.1", port))?;
-
-    for stream in listener.incoming() {
-        match stream {
-            Ok(s) => {
-                let mode_c = mode_arc.clone();
-                thread::spawn(move || handle_client(s, mode_c));
-            }
-            Err(e) => {
-                eprintln!("Listener error: {:?}", e);
-                thread::sleep(Duration::from_millis(100));
-            }
-        }
-    }
-    Ok(())
-}
-
-/// Compute AshMaize hash hex using ce-ashmaize crate (native implementation).
-/// 'rom_init_hex' is optional hex string (no_pre_mine) required by algorithm init.
-/// Return lowercase hex string of hash bytes.
-fn native_hash_hex(pre: &str, rom_init_hex: Option<&str>) -> Result<String> {
-    let pre_bytes = pre.as_bytes();
-
-    #[cfg(feature = "native_ashmaize")]
-    {
-        let key = rom_init_hex.unwrap_or("default").to_string();
-
-        let rom_arc = {
-            let cache = rom_cache();
-            let mut m = cache.lock().unwrap();
-
-            if let Some(r) = m.get(&key) {
-                r.clone()
-            } else {
-                    let seed = if let Some(s) = rom_init_hex {
-            // Scavenger gửi raw bytes → lấy nguyên bytes
-            let bytes = s.as_bytes().to_vec();
-            println!(
-                "[native_hash_hex] Using RAW ROM init ({} bytes)",
-                bytes.len()
-            );
-            bytes
-        } else {
-            b"default_seed".to_vec()
-        };
-
-
-                // init ROM
-                let rom = Rom::new(
-                    &seed,
-                    RomGenerationType::TwoStep {
-                        pre_size: 16 * 1024 * 1024, // 16MB
-                        mixing_numbers: 4,
-                    },
-                    1024 * 1024 * 1024, // 1GB
-                );
-
-                let arc = std::sync::Arc::new(rom);
-                m.insert(key.clone(), arc.clone());
-                arc
-            }
-        };
-
-        let hash_bytes = hash(pre_bytes, &rom_arc, 8, 256);
-        return Ok(hex::encode(hash_bytes));
-    }
-
-    #[cfg(not(feature = "native_ashmaize"))]
-    {
-        anyhow::bail!(
-            "Native AshMaize not enabled. Compile with --features native_ashmaize"
-        );
-    }
-}
-
+// ROM-sized blocks go on huge pages (see hugealloc), the rest to mimalloc.
+#[cfg(target_os = "linux")]
+#[global_allocator]
+static GLOBAL: hugealloc::HugeAlloc<mimalloc::MiMalloc> = hugealloc::HugeAlloc(mimalloc::MiMalloc);
+#[cfg(not(target_os = "linux"))]
+#[global_allocator]
+static GLOBAL: mimalloc::MiMalloc = mimalloc::MiMalloc;
+
+use std::env;
+use std::io::{BufRead, BufReader, BufWriter, Write};
+use std::io::Read;
+use std::net::{TcpListener, TcpStream};
+use std::sync::atomic::{AtomicBool, Ordering};
+use std::process::{Command, Stdio};
+use std::sync::{Arc, Mutex};
+use std::thread;
+use std::time::Duration;
+
+/// Set in --stdio mode, where stdout carries protocol replies.
+static STDOUT_IS_PROTOCOL: AtomicBool = AtomicBool::new(false);
+
+/// println! that moves to stderr when stdout is the protocol channel.
+macro_rules! info {
+    ($($arg:tt)*) => {
+        if $crate::STDOUT_IS_PROTOCOL.load(::std::sync::atomic::Ordering::Relaxed) {
+            eprintln!($($arg)*);
+        } else {
+            println!($($arg)*);
+        }
+    };
+}
+
+mod binproto;
+// Only native ROM builds reserve blocks (with_rom_block); without them the
+// allocator just passes everything through.
+#[cfg(target_os = "linux")]
+#[cfg_attr(not(feature = "native_ashmaize"), allow(dead_code))]
+mod hugealloc;
+mod numa;
+mod pool;
+#[cfg(feature = "native_ashmaize")]
+mod prebuild;
+// Without native ROMs only --bench-registry uses the registry; deadlines,
+// eviction and stats stay compiled for it and its tests.
+#[cfg_attr(not(feature = "native_ashmaize"), allow(dead_code))]
+mod romreg;
+mod session;
+// The store itself needs no ashmaize, so its tests run in every build.
+#[cfg(all(unix, any(test, all(feature = "native_ashmaize", feature = "rom_disk"))))]
+#[cfg_attr(not(all(feature = "native_ashmaize", feature = "rom_disk")), allow(dead_code))]
+mod romstore;
+#[cfg(unix)]
+mod shmring;
+
+/// Add these imports for native ashmaize
+use hex;
+use anyhow::{Result, anyhow};
+
+// If using local crate name; adjust if the crate name differs in ce-ashmaize.
+#[cfg(feature = "native_ashmaize")]
+use ashmaize::{Rom, RomGenerationType, hash};
+
+// In-memory ROM registries keyed by rom_init string (see romreg), one per
+// NUMA node: every node keeps its own replica of a ROM, allocated there, and
+// the memory budget is split evenly between nodes, but never below one ROM
+// per node. Feature-gated.
+#[cfg(feature = "native_ashmaize")]
+fn rom_registries() -> &'static [romreg::Registry<Rom>] {
+    use std::sync::OnceLock;
+    static REGISTRIES: OnceLock<Vec<romreg::Registry<Rom>>> = OnceLock::new();
+    REGISTRIES.get_or_init(|| {
+        let nodes = numa::nodes().len() as u64;
+        let budget = match ROM_MEM_BUDGET.get() {
+            Some(&b) if b / nodes < ROM_SIZE as u64 => {
+                eprintln!(
+                    "--rom-mem-budget {} MiB is less than one ROM per NUMA node; keeping one ROM on each of {} nodes",
+                    b >> 20,
+                    nodes
+                );
+                ROM_SIZE as u64
+            }
+            Some(&b) => b / nodes,
+            None => 0,
+        };
+        (0..nodes).map(|_| romreg::Registry::new(ROM_SIZE as u64, budget)).collect()
+    })
+}
+
+/// The ROM registry of the node this thread runs on.
+#[cfg(feature = "native_ashmaize")]
+fn rom_registry() -> &'static romreg::Registry<Rom> {
+    &rom_registries()[numa::current()]
+}
+
+#[cfg(feature = "native_ashmaize")]
+thread_local! {
+    /// This thread's view of rom_registry(), for lock-free hits.
+    static LOCAL_ROMS: std::cell::RefCell<romreg::Local<Rom>> = std::cell::RefCell::new(romreg::Local::new());
+}
+
+/// Most bytes of ROMs kept in memory (--rom-mem-budget); unset = no limit.
+static ROM_MEM_BUDGET: std::sync::OnceLock<u64> = std::sync::OnceLock::new();
+
+/// Directory of the on-disk ROM cache (--rom-dir), if enabled.
+static ROM_DIR: std::sync::OnceLock<std::path::PathBuf> = std::sync::OnceLock::new();
+
+/// Upper bound on preimages in one "#batch" frame.
+const MAX_BATCH: usize = 65536;
+
+fn handle_client(stream: TcpStream, mode: Arc<DaemonMode>) {
+    let peer = match stream.peer_addr() {
+        Ok(a) => a.to_string(),
+        Err(_) => "tcp".to_string(),
+    };
+    // Replies are small and latency bound: never let Nagle hold them back.
+    if let Err(e) = stream.set_nodelay(true) {
+        eprintln!("Failed to set TCP_NODELAY for {}: {:?}", peer, e);
+    }
+    let r = stream.try_clone();
+    if r.is_err() {
+        eprintln!("Failed clone stream");
+        return;
+    }
+    serve_connection(r.unwrap(), stream, mode, &peer);
+}
+
+/// Serve one client over any transport (TCP, Unix socket, stdio pipes).
+/// `input` and `output` are the two directions of the same connection.
+fn serve_connection<R, W>(input: R, output: W, mode: Arc<DaemonMode>, peer: &str)
+where
+    R: Read,
+    W: Write + Send + 'static,
+{
+    let mut reader = BufReader::new(input);
+
+    // The first byte picks the protocol for the whole connection, so the
+    // line-protocol scripts keep working next to binary clients.
+    match reader.fill_buf() {
+        Ok(first) if binproto::is_binary(first) => {
+            if let Err(e) = binproto::serve(reader, BufWriter::new(output), mode, peer) {
+                eprintln!("Binary client {} error: {:?}", peer, e);
+            }
+            return;
+        }
+        Ok(_) => {}
+        Err(e) => {
+            eprintln!("Read error from client {}: {:?}", peer, e);
+            return;
+        }
+    }
+    // shared with the thread that writes subscription pushes (see session)
+    let writer = Arc::new(Mutex::new(BufWriter::new(output)));
+    let mut session = session::Session::default();
+
+    loop {
+        let mut line = String::new();
+        match reader.read_line(&mut line) {
+            Ok(0) => {
+                // EOF
+                break;
+            }
+            Ok(_) => {
+                let pre = line.trim_end_matches(&['\r','\n'][..]).to_string();
+                if pre.len() == 0 {
+                    // ignore empty
+                    continue;
+                }
+
+                // JSON line = nonce range search job (see RangeJob). The daemon
+                // loops the range itself and only replies with winners/progress.
+                if pre.starts_with('{') {
+                    if let Err(e) = run_range_job(&mut *writer.lock().unwrap(), &pre, &mode) {
+                        eprintln!("Range job for client {} stopped: {:?}", peer, e);
+                        break;
+                    }
+                    continue;
+                }
+
+                // "#deadline <rom> <latest_submission>": no reply.
+                if pre.starts_with("#deadline") {
+                    handle_deadline_line(&mode, &pre);
+                    continue;
+                }
+
+                // "#prepare <rom> [<latest_submission>]": build that ROM in
+                // the background; no reply.
+                if pre.starts_with("#prepare") {
+                    handle_prepare_line(&mode, &pre);
+                    continue;
+                }
+
+                // "#ring <path>": this connection becomes the control channel
+                // of a shared-memory ring; it is served until EOF.
+                if pre.starts_with("#ring") {
+                    serve_ring(&mut reader, &mut *writer.lock().unwrap(), &pre, &mode, peer);
+                    break;
+                }
+
+                let res = if session::Session::is_session_line(&pre) {
+                    session.handle(&pre, &mode, &writer)
+                } else if pre.starts_with("#batch") {
+                    handle_batch(&mut reader, &mut *writer.lock().unwrap(), &pre, &mode, peer)
+                } else if pre == "#stats" {
+                    writeln!(writer.lock().unwrap(), "{}", rom_stats_json())
+                } else {
+                    let (mode_c, peer_c) = (mode.clone(), peer.to_string());
+                    let hash_hex = pool::run(move || hash_line(&mode_c, &pre, &peer_c));
+                    writeln!(writer.lock().unwrap(), "{}", hash_hex)
+                };
+                if let Err(e) = res {
+                    eprintln!("Failed write to client {}: {:?}", peer, e);
+                    break;
+                }
+
+                // Pipelined clients may already have sent more requests: keep
+                // coalescing replies and only flush once the input runs dry.
+                if reader.buffer().is_empty() {
+                    if let Err(e) = writer.lock().unwrap().flush() {
+                        eprintln!("Flush error: {:?}", e);
+                        break;
+                    }
+                }
+            }
+            Err(e) => {
+                eprintln!("Read error from client {}: {:?}", peer, e);
+                break;
+            }
+        }
+    }
+}
+
+/// Hash one request line ("<rom_hex>|<preimage>" or "<preimage>") and return
+/// the reply: lowercase hash hex, or "err".
+fn hash_line(mode: &DaemonMode, pre: &str, peer: &str) -> String {
+    match mode {
+        DaemonMode::Demo => {
+            // demo hasher: sha256(pre) + sha512(...) -> hex
+            demo_hash_hex(pre.as_bytes())
+        }
+        DaemonMode::External { bin } => {
+            // call external binary with preimage as arg
+            match call_external_hash(bin, pre) {
+                Ok(h) => h,
+                Err(e) => {
+                    eprintln!("External hash failed: {:?}", e);
+                    "err".to_string()
+                }
+            }
+        }
+        DaemonMode::Native { rom_init } => {
+            // Native: allow client to optionally prefix the preimage with
+            // a rom hex and '|' separator: "<rom_hex>|<preimage>". If the
+            // prefix is present we'll use that rom init for this hash.
+            let (maybe_rom, actual_pre) = split_rom_prefix(pre, rom_init.as_deref());
+
+            // 👇 Log ROM prefix info
+            // Thêm biến static để đảm bảo chỉ in 1 lần
+            use std::sync::Once;
+            static PRINTED_ROM: Once = Once::new();
+
+            if let Some(rhex) = maybe_rom {
+                if !rhex.is_empty() {
+                    PRINTED_ROM.call_once(|| {
+                        info!(
+                            "[client {}] received ROM prefix (printed once):\n\
+                            ────────────────────────────────────────────────\n\
+                            len = {}\n\
+                            first 64 chars = {}\n\
+                            ────────────────────────────────────────────────",
+                            peer,
+                            rhex.len(),
+                            &rhex[..rhex.len().min(64)]
+                        );
+                    });
+                }
+            }
+
+            // Compute
+            match native_hash_hex(actual_pre, maybe_rom) {
+                Ok(h) => h,
+                Err(e) => {
+                    eprintln!("Native hash failed: {:?}", e);
+                    "err".to_string()
+                }
+            }
+        }
+    }
+}
+
+/// Split an optional "<rom_hex>|" prefix off a request line.
+fn split_rom_prefix<'a>(pre: &'a str, default_rom: Option<&'a str>) -> (Option<&'a str>, &'a str) {
+    if let Some(pos) = pre.find('|') {
+        let (r, p) = pre.split_at(pos);
+        // skip the '|' char for p
+        (Some(r.trim()), p[1..].trim())
+    } else {
+        (default_rom, pre)
+    }
+}
+
+/// "#deadline <rom> <latest_submission>": the ROM for `rom` is needed until
+/// the challenge closes, which --rom-mem-budget eviction takes into account.
+fn handle_deadline_line(mode: &DaemonMode, line: &str) {
+    let mut parts = line.split_whitespace().skip(1);
+    match (parts.next(), parts.next()) {
+        (Some(rom), Some(latest)) => note_rom_deadline(mode, rom, latest),
+        _ => eprintln!("Bad deadline line: {:?}", line),
+    }
+}
+
+/// "#prepare <rom> [<latest_submission>]": queue the ROM of an upcoming
+/// challenge for a low-priority background build (see prebuild).
+fn handle_prepare_line(mode: &DaemonMode, line: &str) {
+    let mut parts = line.split_whitespace().skip(1);
+    let rom = match parts.next() {
+        Some(r) => r,
+        None => {
+            eprintln!("Bad prepare line: {:?}", line);
+            return;
+        }
+    };
+    if let Some(latest) = parts.next() {
+        note_rom_deadline(mode, rom, latest);
+    }
+    #[cfg(feature = "native_ashmaize")]
+    if let DaemonMode::Native { .. } = mode {
+        prebuild::request(rom);
+    }
+}
+
+/// Record until when the ROM for `rom_init` is needed (latest_submission).
+fn note_rom_deadline(mode: &DaemonMode, rom_init: &str, latest_submission: &str) {
+    #[cfg(feature = "native_ashmaize")]
+    if let DaemonMode::Native { rom_init: default_rom } = mode {
+        // same key as job_hasher()/native_rom()
+        let key = if rom_init.is_empty() { default_rom.as_deref() } else { Some(rom_init) };
+        match romreg::parse_utc_timestamp(latest_submission) {
+            Some(t) => {
+                for reg in rom_registries() {
+                    reg.set_deadline(key.unwrap_or("default"), t);
+                }
+            }
+            None => eprintln!("Ignoring bad ROM deadline {:?}", latest_submission),
+        }
+    }
+    #[cfg(not(feature = "native_ashmaize"))]
+    let _ = (mode, rom_init, latest_submission);
+}
+
+/// Reply to "#stats": ROM residency and cache counters as one JSON line.
+fn rom_stats_json() -> serde_json::Value {
+    #[cfg(feature = "native_ashmaize")]
+    {
+        // totals over the per-node registries; each ROM is listed per replica
+        let (mut resident, mut building, mut bytes, mut budget) = (0, 0, 0, 0);
+        let (mut hits, mut misses, mut builds, mut evictions, mut in_use) = (0, 0, 0, 0, 0);
+        let mut roms = Vec::new();
+        for (reg, node) in rom_registries().iter().zip(numa::nodes()) {
+            let s = reg.stats();
+            resident += s.entries.len();
+            building += s.building;
+            in_use += s.evicted_in_use;
+            bytes += (s.entries.len() + s.evicted_in_use) as u64 * s.entry_bytes;
+            budget += s.budget;
+            hits += s.hits;
+            misses += s.misses;
+            builds += s.builds;
+            evictions += s.evictions;
+            roms.extend(s.entries.iter().map(|e| serde_json::json!({
+                "seed": e.key, "node": node.id, "deadline": e.deadline, "idle_ms": e.idle_ms,
+            })));
+        }
+        let nodes: Vec<_> = numa::stats().iter()
+            .map(|n| serde_json::json!({
+                "node": n.id, "cpus": n.cpus, "threads": n.threads, "hashes": n.hashes, "hps": n.rate,
+            }))
+            .collect();
+        return serde_json::json!({
+            "resident": resident,
+            "building": building,
+            "prepare_queued": prebuild::pending(),
+            "resident_bytes": bytes,
+            "budget_bytes": budget,
+            "hits": hits,
+            "misses": misses,
+            "builds": builds,
+            "evictions": evictions,
+            "evicted_in_use": in_use,
+            "pages": rom_pages_json(),
+            "nodes": nodes,
+            "roms": roms,
+        });
+    }
+    #[cfg(not(feature = "native_ashmaize"))]
+    serde_json::json!({ "error": "native ROMs not enabled" })
+}
+
+/// How resident ROM memory is backed (see hugealloc).
+#[cfg(feature = "native_ashmaize")]
+fn rom_pages_json() -> serde_json::Value {
+    #[cfg(target_os = "linux")]
+    {
+        let p = hugealloc::stats();
+        return serde_json::json!({
+            "explicit_bytes": p.explicit_bytes,
+            "thp_bytes": p.thp_bytes,
+            "thp_backed_bytes": p.thp_backed_bytes,
+            "small_bytes": p.small_bytes,
+            "locked_bytes": p.locked_bytes,
+        });
+    }
+    #[cfg(not(target_os = "linux"))]
+    serde_json::Value::Null
+}
+
+/// Attach the shared-memory ring named in "#ring <path>" and feed it to the
+/// compute pool until the control connection is closed.
+#[cfg(unix)]
+fn serve_ring<R: BufRead, W: Write>(reader: &mut R, writer: &mut W, header: &str, mode: &Arc<DaemonMode>, peer: &str) {
+    let path = header["#ring".len()..].trim();
+    let ring = match shmring::Ring::open(path) {
+        Ok(r) => Arc::new(r),
+        Err(e) => {
+            eprintln!("Client {} ring {:?} rejected: {:?}", peer, path, e);
+            let _ = writeln!(writer, "err {}", e);
+            let _ = writer.flush();
+            return;
+        }
+    };
+    if writeln!(writer, "ok {}", ring.slots()).and_then(|_| writer.flush()).is_err() {
+        return;
+    }
+    info!("[client {}] serving shared-memory ring {} ({} slots)", peer, path, ring.slots());
+
+    let stop = Arc::new(AtomicBool::new(false));
+    let dispatcher = shmring::serve(ring, mode.clone(), stop.clone());
+
+    // Only ROM deadlines are expected on the control channel until EOF.
+    let mut line = String::new();
+    while matches!(reader.read_line(&mut line), Ok(n) if n > 0) {
+        if line.starts_with("#deadline") {
+            handle_deadline_line(mode, line.trim_end());
+        }
+        line.clear();
+    }
+    stop.store(true, Ordering::Relaxed);
+    let _ = dispatcher.join();
+}
+
+#[cfg(not(unix))]
+fn serve_ring<R: BufRead, W: Write>(_reader: &mut R, writer: &mut W, _header: &str, _mode: &Arc<DaemonMode>, _peer: &str) {
+    let _ = writeln!(writer, "err shared-memory rings need a Unix platform");
+    let _ = writer.flush();
+}
+
+/// Batch frame: header line "#batch <n> [<rom_hex>]" followed by n preimage
+/// lines. Replies with n hash lines in request order, written as one chunk.
+/// With a ROM in the header it is resolved once for the whole batch; lines
+/// may still carry their own "<rom_hex>|" prefix. The lines are hashed on
+/// the compute pool, split evenly over its threads.
+fn handle_batch<R: BufRead, W: Write>(
+    reader: &mut R,
+    writer: &mut W,
+    header: &str,
+    mode: &Arc<DaemonMode>,
+    peer: &str,
+) -> std::io::Result<()> {
+    let mut parts = header.split_whitespace().skip(1);
+    let count = parts.next().and_then(|n| n.parse::<usize>().ok());
+    let batch_rom = parts.next().unwrap_or("").to_string();
+    let count = match count {
+        Some(n) if n <= MAX_BATCH => n,
+        _ => {
+            eprintln!("Bad batch header from {}: {:?}", peer, header);
+            return writeln!(writer, "err");
+        }
+    };
+
+    let mut pres = Vec::with_capacity(count);
+    for _ in 0..count {
+        let mut line = String::new();
+        if reader.read_line(&mut line)? == 0 {
+            return Err(std::io::ErrorKind::UnexpectedEof.into());
+        }
+        line.truncate(line.trim_end_matches(&['\r', '\n'][..]).len());
+        pres.push(line);
+    }
+
+    // One hasher for the batch when the mode supports it (demo/native). In
+    // native mode only when the batch has a ROM to bind it to: without a
+    // header ROM or --rom each line names its own.
+    let hasher = match &**mode {
+        DaemonMode::External { .. } => None,
+        DaemonMode::Native { rom_init: None } if batch_rom.is_empty() => None,
+        _ => job_hasher(mode, &batch_rom).ok(),
+    };
+
+    let (mode, peer) = (mode.clone(), peer.to_string());
+    let hashes = pool::map(pres, move |pre: String| match &hasher {
+        Some(h) if !pre.contains('|') => hex::encode(h(pre.as_bytes())),
+        _ => {
+            let (rom, p) = split_rom_prefix(&pre, Some(batch_rom.as_str()).filter(|r| !r.is_empty()));
+            let full = match rom {
+                Some(r) => format!("{}|{}", r, p),
+                None => p.to_string(),
+            };
+            hash_line(&mode, &full, &peer)
+        }
+    });
+    for h in hashes {
+        writeln!(writer, "{}", h)?;
+    }
+    Ok(())
+}
+
+/// How often a running range job reports its hash count to the client.
+const PROGRESS_INTERVAL: Duration = Duration::from_millis(500);
+/// Nonces per compute-pool task of a range job.
+const RANGE_CHUNK: u64 = 256;
+
+/// Hash function bound to one ROM: preimage bytes -> raw 64-byte hash.
+/// Shared between threads by range jobs, batches and binary connections.
+type JobHasher = Arc<dyn Fn(&[u8]) -> [u8; 64] + Send + Sync>;
+
+/// Nonce range search job, sent by the Python side as one JSON line:
+/// {"challenge": {...}, "address": "...", "start_nonce": N, "end_nonce": M}
+/// The preimage is the 16-char hex nonce followed by a fixed suffix, so the
+/// suffix is built once and only the nonce bytes are rewritten per hash.
+struct RangeJob {
+    suffix: Vec<u8>,
+    rom_init: String,
+    latest_submission: String,
+    mask: u32,
+    start: u64,
+    /// Exclusive upper bound.
+    end: u64,
+}
+
+impl RangeJob {
+    fn parse(line: &str) -> Result<RangeJob> {
+        let v: serde_json::Value = serde_json::from_str(line)?;
+        let ch = v.get("challenge")
+            .filter(|c| c.is_object())
+            .ok_or_else(|| anyhow!("job has no challenge object"))?;
+        let field = |k: &str| -> String {
+            match ch.get(k) {
+                Some(serde_json::Value::String(s)) => s.clone(),
+                Some(serde_json::Value::Null) | None => String::new(),
+                Some(other) => other.to_string(),
+            }
+        };
+        let address = v.get("address")
+            .and_then(|a| a.as_str())
+            .ok_or_else(|| anyhow!("job has no address"))?;
+
+        let difficulty = field("difficulty");
+        let mask = u32::from_str_radix(difficulty.trim(), 16)
+            .map_err(|e| anyhow!("bad difficulty {:?}: {}", difficulty, e))?;
+        let rom_init = field("no_pre_mine");
+        let latest_submission = field("latest_submission");
+
+        // Same order as build_preimage() on the Python side (after the nonce).
+        let mut suffix = String::new();
+        suffix.push_str(address);
+        suffix.push_str(&field("challenge_id"));
+        suffix.push_str(&difficulty);
+        suffix.push_str(&rom_init);
+        suffix.push_str(&latest_submission);
+        suffix.push_str(&field("no_pre_mine_hour"));
+
+        let start = json_nonce(v.get("start_nonce"))?.unwrap_or(0);
+        let end = json_nonce(v.get("end_nonce"))?.unwrap_or(u64::MAX);
+
+        Ok(RangeJob { suffix: suffix.into_bytes(), rom_init, latest_submission, mask, start, end })
+    }
+}
+
+/// Nonces may come as JSON numbers or hex strings. Python sends the end of
+/// the space as 2**64, which only fits in a float, so numbers saturate.
+fn json_nonce(v: Option<&serde_json::Value>) -> Result<Option<u64>> {
+    match v {
+        None | Some(serde_json::Value::Null) => Ok(None),
+        Some(serde_json::Value::Number(n)) => Ok(Some(
+            n.as_u64().unwrap_or_else(|| n.as_f64().map(|f| f as u64).unwrap_or(0)),
+        )),
+        Some(serde_json::Value::String(s)) => {
+            let digits = s.trim().trim_start_matches("0x");
+            u64::from_str_radix(digits, 16)
+                .map(Some)
+                .map_err(|e| anyhow!("bad nonce {:?}: {}", s, e))
+        }
+        Some(other) => Err(anyhow!("bad nonce {}", other)),
+    }
+}
+
+/// Write `nonce` as 16 lowercase hex chars, same as hex64_nonce() in Python.
+fn write_nonce_hex(dst: &mut [u8], nonce: u64) {
+    const HEX: &[u8; 16] = b"0123456789abcdef";
+    for i in 0..16 {
+        dst[i] = HEX[((nonce >> (60 - 4 * i)) & 0xf) as usize];
+    }
+}
+
+/// Left 4 bytes of the hash as big-endian u32; bits that are zero in the
+/// difficulty mask must be zero in the hash (same test as the Python side).
+fn hash_meets_difficulty(hash: &[u8], mask: u32) -> bool {
+    if hash.len() < 4 {
+        return false;
+    }
+    let left4 = u32::from_be_bytes([hash[0], hash[1], hash[2], hash[3]]);
+    left4 & !mask == 0
+}
+
+fn job_hasher(mode: &DaemonMode, rom_init: &str) -> Result<JobHasher> {
+    match mode {
+        DaemonMode::Demo => Ok(Arc::new(|pre: &[u8]| demo_hash(pre))),
+        DaemonMode::External { .. } => {
+            Err(anyhow!("range jobs are not supported in external mode"))
+        }
+        DaemonMode::Native { rom_init: default_rom } => {
+            #[cfg(feature = "native_ashmaize")]
+            {
+                let key = if rom_init.is_empty() { default_rom.as_deref() } else { Some(rom_init) };
+                let key = key.map(str::to_string);
+                // Build the ROM now, so a job waits for it at registration,
+                // but do not hold on to it: each hash finds its node's
+                // replica through its thread's registry view, so an evicted
+                // ROM is freed instead of staying pinned by live jobs.
+                drop(native_rom(key.as_deref()));
+                return Ok(Arc::new(move |pre: &[u8]| native_hash(pre, key.as_deref())));
+            }
+            #[cfg(not(feature = "native_ashmaize"))]
+            {
+                let _ = (rom_init, default_rom);
+                anyhow::bail!(
+                    "Native AshMaize not enabled. Compile with --features native_ashmaize"
+                );
+            }
+        }
+    }
+}
+
+/// Run a nonce range search job on this connection. Replies are JSON lines:
+/// {"nonce": .., "hash": .., "hashes": n} per winner, {"progress": n} every
+/// PROGRESS_INTERVAL and {"done": true, "hashes": n} once the range is
+/// exhausted. A failed write means the client went away, which ends the job.
+/// The job shares its cancel epoch with session templates for the same ROM
+/// and suffix, so `#cancel` or OP_CANCEL on any connection stops it too; it
+/// then ends with {"done": true, "hashes": n, "cancelled": true}.
+///
+/// The range is cut into RANGE_CHUNK nonce tasks for the compute pool, at
+/// most one per pool thread in flight, so concurrent jobs share the pool
+/// instead of each running on its own thread.
+fn run_range_job<W: Write>(stream: &mut W, line: &str, mode: &DaemonMode) -> std::io::Result<()> {
+    let prepared = RangeJob::parse(line).and_then(|job| {
+        if !job.latest_submission.is_empty() {
+            note_rom_deadline(mode, &job.rom_init, &job.latest_submission);
+        }
+        job_hasher(mode, &job.rom_init).map(|h| (job, h))
+    });
+    let (job, hasher) = match prepared {
+        Ok(p) => p,
+        Err(e) => {
+            eprintln!("Rejected range job: {:?}", e);
+            writeln!(stream, "{}", serde_json::json!({ "error": e.to_string() }))?;
+            return stream.flush();
+        }
+    };
+
+    let template = Arc::new(session::JobTemplate::for_rom(hasher, &job.rom_init, job.mask, job.suffix.clone()));
+    let epoch = template.epoch();
+    // Set when the client is gone, so queued chunks return without hashing.
+    let cancel = Arc::new(AtomicBool::new(false));
+    let (tx, rx) = std::sync::mpsc::channel::<(u64, Vec<(u64, [u8; 64])>)>();
+    let mut next = job.start;
+    let mut in_flight = 0usize;
+
+    let result = (|| {
+        let mut hashes: u64 = 0;
+        let mut last_report = std::time::Instant::now();
+        loop {
+            while in_flight < pool::threads() && next < job.end && !template.cancelled(epoch) {
+                let end = next.saturating_add(RANGE_CHUNK).min(job.end);
+                let (template, cancel, tx) = (template.clone(), cancel.clone(), tx.clone());
+                let start = next;
+                pool::spawn(move || {
+                    let stop = || cancel.load(Ordering::Relaxed) || template.cancelled(epoch);
+                    let _ = tx.send(template.search(start, end, &stop));
+                });
+                next = end;
+                in_flight += 1;
+            }
+            if in_flight == 0 {
+                break;
+            }
+
+            let wait = PROGRESS_INTERVAL.saturating_sub(last_report.elapsed());
+            if let Ok((n, winners)) = rx.recv_timeout(wait) {
+                in_flight -= 1;
+                hashes += n;
+                for (nonce, h) in winners {
+                    let msg = serde_json::json!({
+                        "nonce": format!("{:016x}", nonce),
+                        "hash": hex::encode(h),
+                        "hashes": hashes,
+                    });
+                    writeln!(stream, "{}", msg)?;
+                    stream.flush()?;
+                }
+            }
+            if last_report.elapsed() >= PROGRESS_INTERVAL {
+                writeln!(stream, "{}", serde_json::json!({ "progress": hashes }))?;
+                stream.flush()?;
+                last_report = std::time::Instant::now();
+            }
+        }
+        let done = if template.cancelled(epoch) {
+            serde_json::json!({ "done": true, "hashes": hashes, "cancelled": true })
+        } else {
+            serde_json::json!({ "done": true, "hashes": hashes })
+        };
+        writeln!(stream, "{}", done)?;
+        stream.flush()
+    })();
+
+    cancel.store(true, Ordering::Relaxed);
+    result
+}
+
+fn demo_hash(pre: &[u8]) -> [u8; 64] {
+    use sha2::{Digest, Sha256, Sha512};
+    let mut d1 = Sha256::new();
+    d1.update(pre);
+    let d1b = d1.finalize();
+
+    let mut d2 = Sha512::new();
+    d2.update(&d1b);
+    d2.update(pre);
+    d2.finalize().into()
+}
+
+fn demo_hash_hex(pre: &[u8]) -> String {
+    hex::encode(demo_hash(pre))
+}
+
+fn call_external_hash(bin: &str, pre: &str) -> Result<String, Box<dyn std::error::Error>> {
+    let out = Command::new(bin)
+        .arg(pre)
+        .stdout(Stdio::piped())
+        .stderr(Stdio::null())
+        .spawn()?
+        .wait_with_output()?;
+    let s = String::from_utf8_lossy(&out.stdout).trim().to_string();
+    Ok(s)
+}
+
+enum DaemonMode {
+    Demo,
+    External { bin: String },
+    /// Native holds optional rom init hex string (no_pre_mine).
+    Native { rom_init: Option<String> },
+}
+
+fn main() -> anyhow::Result<()> {
+    let args: Vec<String> = env::args().collect();
+    let mut mode = DaemonMode::Demo;
+    let mut port = 4002u16;
+    let mut unix_path: Option<String> = None;
+    let mut stdio = false;
+    let mut threads = pool::physical_cores();
+    let mut huge_pages = "auto".to_string();
+    let mut prefault_threads: Option<usize> = None;
+    let mut mlock_roms = false;
+    let mut numa_on = true;
+    let mut bench_rom: Option<u64> = None;
+
+    let mut i = 1;
+    while i < args.len() {
+        match args[i].as_str() {
+            "--mode" => {
+                i += 1;
+                if i >= args.len() { break; }
+                match args[i].as_str() {
+                    "demo" => mode = DaemonMode::Demo,
+                    "external" => mode = DaemonMode::External { bin: "ashmaize-cli".to_string() },
+                    "native" => mode = DaemonMode::Native { rom_init: None },
+                    _ => {}
+                }
+            }
+            "--bin" => {
+                i += 1;
+                if i >= args.len() { break; }
+                let b = args[i].clone();
+                mode = DaemonMode::External { bin: b };
+            }
+            "--port" => {
+                i += 1;
+                if i >= args.len() { break; }
+                port = args[i].parse().unwrap_or(4000);
+            }
+            "--unix" => {
+                // serve on a Unix domain socket instead of TCP
+                i += 1;
+                if i >= args.len() { break; }
+                unix_path = Some(args[i].clone());
+            }
+            "--stdio" => {
+                // co-process mode: one client on stdin/stdout, exit on EOF
+                stdio = true;
+                STDOUT_IS_PROTOCOL.store(true, Ordering::Relaxed);
+            }
+            "--threads" => {
+                // size of the compute pool shared by all connections
+                i += 1;
+                if i >= args.len() { break; }
+                threads = args[i].parse().unwrap_or(threads);
+            }
+            "--bench-registry" => {
+                // ROM registry contention benchmark, then exit
+                let threads = args.get(i + 1).and_then(|t| t.parse().ok()).unwrap_or(64);
+                romreg::bench(threads);
+                return Ok(());
+            }
+            "--bench-rom" => {
+                // hashing H/s for each ROM page setup, then exit
+                bench_rom = Some(args.get(i + 1).and_then(|t| t.parse().ok()).unwrap_or(10));
+            }
+            "--huge-pages" => {
+                // auto (explicit, else transparent), thp, off
+                i += 1;
+                if i >= args.len() { break; }
+                huge_pages = args[i].clone();
+            }
+            "--prefault-threads" => {
+                // threads touching a new ROM's pages (0 = fault on first use)
+                i += 1;
+                if i >= args.len() { break; }
+                prefault_threads = args[i].parse().ok();
+            }
+            "--mlock-roms" => {
+                // keep ROMs in RAM (needs RLIMIT_MEMLOCK / ulimit -l)
+                mlock_roms = true;
+            }
+            "--numa" => {
+                // on (default): per-node ROM replicas and pinned threads; off
+                i += 1;
+                if i >= args.len() { break; }
+                numa_on = args[i] != "off";
+            }
+            "--rom-mem-budget" => {
+                // e.g. 8G, 4096M or plain bytes
+                i += 1;
+                if i >= args.len() { break; }
+                match parse_size(&args[i]) {
+                    Some(b) => { let _ = ROM_MEM_BUDGET.set(b); }
+                    None => return Err(anyhow!("Invalid --rom-mem-budget {:?}", args[i])),
+                }
+            }
+            "--rom-dir" => {
+                // on-disk ROM cache shared across restarts and daemons
+                i += 1;
+                if i >= args.len() { break; }
+                let _ = ROM_DIR.set(std::path::PathBuf::from(&args[i]));
+            }
+            "--rom" => {
+                // allow passing no_pre_mine hex directly to daemon for native init
+                i += 1;
+                if i >= args.len() { break; }
+                let hexs = args[i].clone();
+                mode = match mode {
+                    DaemonMode::Native { .. } => DaemonMode::Native { rom_init: Some(hexs) },
+                    _ => DaemonMode::Native { rom_init: Some(hexs) },
+                };
+            }
+            _ => {}
+        }
+        i += 1;
+    }
+
+    let listen_on = if stdio {
+        "stdio".to_string()
+    } else if let Some(p) = &unix_path {
+        format!("unix:{}", p)
+    } else {
+        format!("127.0.0.1:{}", port)
+    };
+    info!("Starting ashdaemon on {} mode={}", listen_on,
+        match &mode {
+            DaemonMode::Demo => "demo",
+            DaemonMode::External{..} => "external",
+            DaemonMode::Native { .. } => "native",
+        });
+
+    // If native mode with rom init provided, try to validate the ROM init hex once (optional)
+    if let DaemonMode::Native { rom_init } = &mode {
+        if let Some(hexs) = rom_init {
+            // Validate that provided --rom is valid hex; fail fast if it's not.
+            match hex::decode(hexs) {
+                Ok(_) => info!("Native mode: preloading ROM init (len {})", hexs.len()),
+                Err(e) => {
+                    eprintln!("Invalid --rom hex provided: {}", e);
+                    return Err(anyhow!("Invalid --rom hex: {}", e));
+                }
+            }
+            // We do not keep the AshMaize instance global here because the library
+            // may require thread-local state; instead we will create/initialize per-hash
+            // or implement a global instance if library API supports it.
+        }
+    }
+
+    if let Some(dir) = ROM_DIR.get() {
+        if cfg!(all(unix, feature = "native_ashmaize", feature = "rom_disk")) {
+            info!("ROM cache directory: {}", dir.display());
+        } else {
+            eprintln!("--rom-dir ignored: build with --features rom_disk to store ROMs on disk");
+        }
+    }
+
+    #[cfg(feature = "native_ashmaize")]
+    if let Some(budget) = ROM_MEM_BUDGET.get() {
+        info!("ROM memory budget: {} MiB ({} ROMs)", budget >> 20, budget / ROM_SIZE as u64);
+        // drop ROMs of closed challenges even when nothing new is built
+        thread::spawn(|| loop {
+            thread::sleep(ROM_SWEEP_INTERVAL);
+            for reg in rom_registries() {
+                reg.evict_expired();
+            }
+        });
+    }
+
+    numa::configure(numa_on);
+    pool::init(threads);
+    info!("Compute pool: {} threads", pool::threads());
+    if numa::nodes().len() > 1 {
+        let nodes: Vec<String> = numa::stats().iter()
+            .map(|n| format!("node {}: {} CPUs, {} threads", n.id, n.cpus, n.threads))
+            .collect();
+        info!("NUMA: ROM replica per node; {}", nodes.join("; "));
+    }
+    numa::spawn_rate_thread();
+
+    #[cfg(target_os = "linux")]
+    {
+        let pages = hugealloc::Pages::parse(&huge_pages)
+            .ok_or_else(|| anyhow!("Invalid --huge-pages {:?} (auto, thp, off)", huge_pages))?;
+        let prefault = prefault_threads.unwrap_or(pool::threads());
+        hugealloc::configure(pages, prefault, mlock_roms);
+        info!("ROM pages: {:?}, prefault threads {}, mlock {}", pages, prefault, mlock_roms);
+    }
+    #[cfg(not(target_os = "linux"))]
+    if huge_pages != "auto" || prefault_threads.is_some() || mlock_roms {
+        eprintln!("--huge-pages, --prefault-threads and --mlock-roms only apply on Linux");
+    }
+
+    if let Some(secs) = bench_rom {
+        #[cfg(all(target_os = "linux", feature = "native_ashmaize"))]
+        bench_rom_pages(secs, prefault_threads.unwrap_or(pool::threads()));
+        #[cfg(not(all(target_os = "linux", feature = "native_ashmaize")))]
+        eprintln!("--bench-rom {} needs Linux and the native_ashmaize feature", secs);
+        return Ok(());
+    }
+
+    let mode_arc = Arc::new(mode);
+
+    if stdio {
+        let (input, output) = stdio_pipes();
+        serve_connection(input, output, mode_arc, "stdio");
+        return Ok(());
+    }
+    if let Some(path) = unix_path {
+        return serve_unix(&path, mode_arc);
+    }
+
+    let listener = TcpListener::bind(("127.0.0.1", port))?;
+
+    for stream in listener.incoming() {
+        match stream {
+            Ok(s) => {
+                let mode_c = mode_arc.clone();
+                thread::spawn(move || handle_client(s, mode_c));
+            }
+            Err(e) => {
+                eprintln!("Listener error: {:?}", e);
+                thread::sleep(Duration::from_millis(100));
+            }
+        }
+    }
+    Ok(())
+}
+
+/// Accept clients on a Unix domain socket; same protocols as TCP, without
+/// the TCP stack. A stale socket file from a previous run is replaced.
+#[cfg(unix)]
+fn serve_unix(path: &str, mode: Arc<DaemonMode>) -> anyhow::Result<()> {
+    use std::os::unix::net::UnixListener;
+
+    let _ = std::fs::remove_file(path);
+    let listener = UnixListener::bind(path)?;
+    for stream in listener.incoming() {
+        match stream {
+            Ok(s) => {
+                let mode_c = mode.clone();
+                let peer = format!("unix:{}", path);
+                match s.try_clone() {
+                    Ok(r) => {
+                        thread::spawn(move || serve_connection(r, s, mode_c, &peer));
+                    }
+                    Err(e) => eprintln!("Failed clone unix stream: {:?}", e),
+                }
+            }
+            Err(e) => {
+                eprintln!("Listener error: {:?}", e);
+                thread::sleep(Duration::from_millis(100));
+            }
+        }
+    }
+    Ok(())
+}
+
+#[cfg(not(unix))]
+fn serve_unix(_path: &str, _mode: Arc<DaemonMode>) -> anyhow::Result<()> {
+    anyhow::bail!("--unix is only supported on Unix platforms")
+}
+
+/// Raw stdin/stdout for --stdio. On Unix the file descriptors are used
+/// directly so replies skip Stdout's line buffering and locking.
+#[cfg(unix)]
+fn stdio_pipes() -> (std::fs::File, std::fs::File) {
+    use std::os::unix::io::FromRawFd;
+    // SAFETY: fds 0 and 1 stay open for the life of the process and nothing
+    // else in the daemon reads stdin or writes stdout in --stdio mode.
+    unsafe { (std::fs::File::from_raw_fd(0), std::fs::File::from_raw_fd(1)) }
+}
+
+#[cfg(not(unix))]
+fn stdio_pipes() -> (std::io::Stdin, std::io::Stdout) {
+    (std::io::stdin(), std::io::stdout())
+}
+
+/// Look up (or build and cache) this node's replica of the ROM for
+/// `rom_init_hex` (no_pre_mine). Only callers that need it wait while it is
+/// being built.
+#[cfg(feature = "native_ashmaize")]
+fn native_rom(rom_init_hex: Option<&str>) -> Arc<Rom> {
+    let key = rom_init_hex.unwrap_or("default");
+    let node = numa::current();
+    let rom = LOCAL_ROMS.with(|local| {
+        rom_registry().get_or_build(key, &mut local.borrow_mut(), || build_rom_replica(node, rom_init_hex))
+    });
+    finish_rom_build(key, Some(&rom));
+    rom
+}
+
+/// Build the replica of the ROM for `rom_init_hex` for NUMA node `node`, in
+/// that node's memory. With `rom_bytes`, a replica another node already has
+/// is copied, a memcpy instead of a generation. Without it (an ashmaize that
+/// does not expose the ROM bytes) every replica is generated in full.
+#[cfg(feature = "native_ashmaize")]
+fn build_rom_replica(node: usize, rom_init_hex: Option<&str>) -> Rom {
+    #[cfg(feature = "rom_bytes")]
+    {
+        let key = rom_init_hex.unwrap_or("default");
+        let copy = rom_registries().iter().enumerate().find_map(|(i, reg)| (i != node).then(|| reg.peek(key)).flatten());
+        if let Some(src) = copy {
+            let started = std::time::Instant::now();
+            let rom = numa::alloc_on(node, || Rom::from_bytes(src.as_bytes()));
+            info!("Copied ROM {} to NUMA node {} in {:?}",
+                &key[..key.len().min(16)], numa::nodes()[node].id, started.elapsed());
+            return rom;
+        }
+    }
+    numa::alloc_on(node, || build_native_rom(rom_init_hex))
+}
+
+/// Hash `pre` with this node's replica of the ROM for `rom_init_hex`. Hits
+/// borrow the ROM from this thread's registry view: no registry lock and no
+/// shared refcount traffic per hash.
+#[cfg(feature = "native_ashmaize")]
+fn native_hash(pre: &[u8], rom_init_hex: Option<&str>) -> [u8; 64] {
+    let key = rom_init_hex.unwrap_or("default");
+    let hit = LOCAL_ROMS.with(|local| rom_registry().with(key, &mut local.borrow_mut(), |rom| hash(pre, rom, 8, 256)));
+    let h = match hit {
+        Some(h) => h,
+        None => hash(pre, &native_rom(rom_init_hex), 8, 256),
+    };
+    numa::count_hash();
+    h
+}
+
+#[cfg(feature = "native_ashmaize")]
+fn build_native_rom(rom_init_hex: Option<&str>) -> Rom {
+    let seed = if let Some(s) = rom_init_hex {
+        // Scavenger gửi raw bytes → lấy nguyên bytes
+        let bytes = s.as_bytes().to_vec();
+        info!(
+            "[native_hash_hex] Using RAW ROM init ({} bytes)",
+            bytes.len()
+        );
+        bytes
+    } else {
+        b"default_seed".to_vec()
+    };
+
+    #[cfg(all(unix, feature = "rom_disk"))]
+    if let Some(dir) = ROM_DIR.get() {
+        return load_or_generate_rom(dir, &seed);
+    }
+
+    generate_rom(&seed)
+}
+
+/// How often ROMs of closed challenges are evicted under --rom-mem-budget.
+#[cfg(feature = "native_ashmaize")]
+const ROM_SWEEP_INTERVAL: Duration = Duration::from_secs(30);
+
+/// "8G", "512M", "1024K" or plain bytes.
+fn parse_size(s: &str) -> Option<u64> {
+    let s = s.trim();
+    let (digits, shift) = match s.char_indices().last()? {
+        (i, 'G' | 'g') => (&s[..i], 30),
+        (i, 'M' | 'm') => (&s[..i], 20),
+        (i, 'K' | 'k') => (&s[..i], 10),
+        _ => (s, 0),
+    };
+    digits.trim().parse::<u64>().ok().map(|n| n << shift)
+}
+
+#[cfg(feature = "native_ashmaize")]
+const ROM_PRE_SIZE: usize = 16 * 1024 * 1024; // 16MB
+#[cfg(feature = "native_ashmaize")]
+const ROM_MIXING_NUMBERS: usize = 4;
+#[cfg(feature = "native_ashmaize")]
+const ROM_SIZE: usize = 1024 * 1024 * 1024; // 1GB
+
+#[cfg(feature = "native_ashmaize")]
+fn generate_rom(seed: &[u8]) -> Rom {
+    Rom::new(
+        seed,
+        RomGenerationType::TwoStep {
+            pre_size: ROM_PRE_SIZE,
+            mixing_numbers: ROM_MIXING_NUMBERS,
+        },
+        ROM_SIZE,
+    )
+}
+
+/// --bench-rom: hash for `secs` seconds on every compute thread against a
+/// fresh ROM in each page setup, and print the throughput.
+#[cfg(all(target_os = "linux", feature = "native_ashmaize"))]
+fn bench_rom_pages(secs: u64, prefault: usize) {
+    use hugealloc::Pages;
+    let setups = [
+        ("4 KiB pages, faulted on use", Pages::Off, 0, false),
+        ("transparent huge pages, prefaulted", Pages::Thp, prefault, false),
+        ("explicit huge pages, prefaulted", Pages::Auto, prefault, false),
+        ("explicit huge pages, prefaulted, mlocked", Pages::Auto, prefault, true),
+    ];
+    info!("ROM page benchmark: {} s per setup on {} threads", secs, pool::threads());
+    for (name, pages, prefault, mlock) in setups {
+        hugealloc::configure(pages, prefault, mlock);
+        let started = std::time::Instant::now();
+        let rom = Arc::new(numa::alloc_on(numa::current(), || generate_rom(b"ashdaemon-bench-rom")));
+        let built = started.elapsed();
+        let st = hugealloc::stats();
+        let faults = minor_faults();
+
+        let started = std::time::Instant::now();
+        let deadline = started + Duration::from_secs(secs);
+        let counts = pool::map((0..pool::threads() as u64).collect(), move |t| {
+            let mut pre = *b"0000000000000000addr1benchpreimage";
+            let mut n = 0u64;
+            while std::time::Instant::now() < deadline {
+                for _ in 0..64 {
+                    write_nonce_hex(&mut pre, (t << 48) | n);
+                    std::hint::black_box(hash(&pre, &rom, 8, 256));
+                    n += 1;
+                }
+            }
+            n
+        });
+        let hashes: u64 = counts.iter().sum();
+        info!(
+            "{:<42} build {:>8.2?}  {:>10.0} H/s  {} minor faults  (explicit {} MiB, thp {} MiB backed {} MiB, 4k {} MiB, locked {} MiB)",
+            name,
+            built,
+            hashes as f64 / started.elapsed().as_secs_f64(),
+            minor_faults() - faults,
+            st.explicit_bytes >> 20,
+            st.thp_bytes >> 20,
+            st.thp_backed_bytes >> 20,
+            st.small_bytes >> 20,
+            st.locked_bytes >> 20,
+        );
+    }
+}
+
+#[cfg(all(target_os = "linux", feature = "native_ashmaize"))]
+fn minor_faults() -> u64 {
+    let mut ru: libc::rusage = unsafe { std::mem::zeroed() };
+    unsafe { libc::getrusage(libc::RUSAGE_SELF, &mut ru) };
+    ru.ru_minflt as u64
+}
+
+/// Load the stored ROM for `seed` from the --rom-dir cache, or generate it
+/// and store it there for the next start (and for other daemons). A load
+/// copies the data out of the file's mapping (Rom owns its memory) after
+/// checking only the header; finish_rom_build() verifies the data.
+///
+/// Needs an ashmaize build that exposes the ROM bytes (`Rom::as_bytes` and
+/// `Rom::from_bytes`); enable with `--features rom_disk`.
+#[cfg(all(unix, feature = "native_ashmaize", feature = "rom_disk"))]
+fn load_or_generate_rom(dir: &std::path::Path, seed: &[u8]) -> Rom {
+    let params = romstore::RomParams {
+        size: ROM_SIZE as u64,
+        pre_size: ROM_PRE_SIZE as u64,
+        mixing_numbers: ROM_MIXING_NUMBERS as u32,
+    };
+    let started = std::time::Instant::now();
+    match romstore::load(dir, seed, &params) {
+        Ok(Some(file)) => {
+            let rom = Rom::from_bytes(file.data());
+            let path = romstore::path_for(dir, seed, &params);
+            info!("Loaded stored ROM from {} in {:?}", path.display(), started.elapsed());
+            ROM_FOLLOW_UP.with(|f| f.replace(Some(RomFollowUp::Verify { path, checksum: file.data_checksum() })));
+            return rom;
+        }
+        Ok(None) => {}
+        Err(e) => eprintln!("Stored ROM unusable, regenerating: {}", e),
+    }
+
+    let rom = generate_rom(seed);
+    info!("Generated ROM in {:?}", started.elapsed());
+    ROM_FOLLOW_UP.with(|f| f.replace(Some(RomFollowUp::Store(seed.to_vec()))));
+    rom
+}
+
+/// What a ROM build under --rom-dir leaves for finish_rom_build().
+#[cfg(all(unix, feature = "native_ashmaize", feature = "rom_disk"))]
+enum RomFollowUp {
+    /// Generated from this seed: write it to the store.
+    Store(Vec<u8>),
+    /// Loaded from this file: check its data against the stored checksum.
+    Verify { path: std::path::PathBuf, checksum: u64 },
+}
+
+#[cfg(all(unix, feature = "native_ashmaize", feature = "rom_disk"))]
+thread_local! {
+    /// Left by the last ROM build on this thread until finish_rom_build()
+    /// takes it.
+    static ROM_FOLLOW_UP: std::cell::RefCell<Option<RomFollowUp>> = const { std::cell::RefCell::new(None) };
+}
+
+/// After a registry build of `key` on this thread, once the ROM is
+/// published: under --rom-dir, write a generated `rom` to the store, or
+/// check a loaded one against its stored data checksum, on a background
+/// thread, so callers waiting for the build do not also wait for 1 GiB of
+/// disk writes or reads. A ROM that fails the check is evicted on every node
+/// and its file deleted, so the next request rebuilds it. Pass None if the
+/// ROM is gone already.
+#[cfg(feature = "native_ashmaize")]
+fn finish_rom_build(key: &str, rom: Option<&Arc<Rom>>) {
+    #[cfg(all(unix, feature = "rom_disk"))]
+    {
+        // seeds being written; another node's replica of the same seed
+        // would write the same temporary file
+        static STORING: Mutex<Vec<Vec<u8>>> = Mutex::new(Vec::new());
+
+        let (Some(follow_up), Some(dir), Some(rom)) = (ROM_FOLLOW_UP.with(|f| f.take()), ROM_DIR.get(), rom) else {
+            return;
+        };
+        let seed = match follow_up {
+            RomFollowUp::Store(seed) => seed,
+            RomFollowUp::Verify { path, checksum } => {
+                let (key, rom) = (key.to_string(), rom.clone());
+                thread::spawn(move || {
+                    if romstore::checksum(rom.as_bytes()) == checksum {
+                        return;
+                    }
+                    eprintln!("Stored ROM {} is damaged (data checksum mismatch): deleting it and rebuilding", path.display());
+                    let _ = std::fs::remove_file(&path);
+                    for reg in rom_registries() {
+                        reg.remove(&key);
+                    }
+                });
+                return;
+            }
+        };
+        {
+            let mut storing = STORING.lock().unwrap();
+            if storing.contains(&seed) {
+                return;
+            }
+            storing.push(seed.clone());
+        }
+        let params = romstore::RomParams {
+            size: ROM_SIZE as u64,
+            pre_size: ROM_PRE_SIZE as u64,
+            mixing_numbers: ROM_MIXING_NUMBERS as u32,
+        };
+        let rom = rom.clone();
+        thread::spawn(move || {
+            match romstore::store(dir, &seed, &params, rom.as_bytes()) {
+                Ok(path) => info!("Stored ROM at {}", path.display()),
+                Err(e) => eprintln!("Failed to store ROM in {}: {}", dir.display(), e),
+            }
+            STORING.lock().unwrap().retain(|s| *s != seed);
+        });
+    }
+    #[cfg(not(all(unix, feature = "rom_disk")))]
+    let _ = (key, rom);
+}
+
+/// Compute AshMaize hash hex using ce-ashmaize crate (native implementation).
+/// 'rom_init_hex' is optional hex string (no_pre_mine) required by algorithm init.
+/// Return lowercase hex string of hash bytes.
+fn native_hash_hex(pre: &str, rom_init_hex: Option<&str>) -> Result<String> {
+    let pre_bytes = pre.as_bytes();
+
+    #[cfg(feature = "native_ashmaize")]
+    {
+        return Ok(hex::encode(native_hash(pre_bytes, rom_init_hex)));
+    }
+
+    #[cfg(not(feature = "native_ashmaize"))]
+    {
+        anyhow::bail!(
+            "Native AshMaize not enabled. Compile with --features native_ashmaize"
+        );
+    }
+}
+
@@ -0,0 +1,218 @@
+//! NUMA topology, node-pinned compute threads and per-node hash counts.
+//!
+//! On a multi-socket host every compute thread is pinned to the CPUs of one
+//! node (threads are split evenly across nodes in order), and each node
+//! keeps its own replica of every ROM, allocated on that node (see
+//! rom_registry() in main.rs), so hashing never reads a ROM across the
+//! interconnect. On a single-node host, or with `--numa off`, there is one
+//! node and nothing is pinned.
+
+use std::cell::Cell;
+use std::sync::atomic::{AtomicBool, AtomicU64, AtomicUsize, Ordering};
+use std::sync::OnceLock;
+use std::time::{Duration, Instant};
+
+/// Hashes are counted per thread and added to the node's counter in
+/// batches of this many.
+#[cfg(feature = "native_ashmaize")]
+const COUNT_FLUSH: u64 = 64;
+/// Interval of the per-node rate behind `stats()` and the log line.
+pub const RATE_INTERVAL: Duration = Duration::from_secs(10);
+
+pub struct Node {
+    /// Kernel node number.
+    pub id: u32,
+    pub cpus: Vec<usize>,
+    /// Compute threads pinned here.
+    threads: AtomicUsize,
+    hashes: Padded,
+    /// Hashes per second over the last RATE_INTERVAL.
+    rate: AtomicU64,
+}
+
+/// A counter on its own cache line, so nodes do not share one.
+#[repr(align(128))]
+struct Padded(AtomicU64);
+
+static ENABLED: AtomicBool = AtomicBool::new(true);
+static NODES: OnceLock<Vec<Node>> = OnceLock::new();
+
+thread_local! {
+    /// Index into nodes() of the node this thread is pinned to.
+    static CURRENT: Cell<usize> = const { Cell::new(0) };
+    #[cfg(feature = "native_ashmaize")]
+    static PENDING: Cell<u64> = const { Cell::new(0) };
+}
+
+/// `--numa off`: treat the host as one node. Call before nodes() is used.
+pub fn configure(enabled: bool) {
+    ENABLED.store(enabled, Ordering::Relaxed);
+}
+
+/// The nodes with CPUs, in kernel order; a single node covering every CPU
+/// when the topology is unknown or NUMA handling is off.
+pub fn nodes() -> &'static [Node] {
+    NODES.get_or_init(|| {
+        let mut nodes = if ENABLED.load(Ordering::Relaxed) { read_topology() } else { Vec::new() };
+        if nodes.is_empty() {
+            nodes.push(node(0, Vec::new()));
+        }
+        nodes
+    })
+}
+
+fn node(id: u32, cpus: Vec<usize>) -> Node {
+    Node { id, cpus, threads: AtomicUsize::new(0), hashes: Padded(AtomicU64::new(0)), rate: AtomicU64::new(0) }
+}
+
+#[cfg(target_os = "linux")]
+fn read_topology() -> Vec<Node> {
+    let mut nodes = Vec::new();
+    let dir = match std::fs::read_dir("/sys/devices/system/node") {
+        Ok(d) => d,
+        Err(_) => return nodes,
+    };
+    for entry in dir.flatten() {
+        let name = entry.file_name().to_string_lossy().into_owned();
+        let id = match name.strip_prefix("node").and_then(|n| n.parse::<u32>().ok()) {
+            Some(id) => id,
+            None => continue,
+        };
+        let cpus = std::fs::read_to_string(entry.path().join("cpulist"))
+            .map(|s| parse_cpulist(&s))
+            .unwrap_or_default();
+        if !cpus.is_empty() {
+            nodes.push(node(id, cpus));
+        }
+    }
+    nodes.sort_by_key(|n| n.id);
+    nodes
+}
+
+#[cfg(not(target_os = "linux"))]
+fn read_topology() -> Vec<Node> {
+    Vec::new()
+}
+
+/// "0-3,8-11" -> [0, 1, 2, 3, 8, 9, 10, 11]
+fn parse_cpulist(s: &str) -> Vec<usize> {
+    let mut cpus = Vec::new();
+    for part in s.trim().split(',').filter(|p| !p.is_empty()) {
+        let (a, b) = part.split_once('-').unwrap_or((part, part));
+        if let (Ok(a), Ok(b)) = (a.trim().parse::<usize>(), b.trim().parse::<usize>()) {
+            cpus.extend(a..=b);
+        }
+    }
+    cpus
+}
+
+/// Index of the node this thread runs on (0 unless pinned).
+#[cfg(feature = "native_ashmaize")]
+pub fn current() -> usize {
+    CURRENT.with(|c| c.get())
+}
+
+/// Called by compute thread `i` of `threads` as it starts: pin it to its
+/// node. No-op on a single node.
+pub fn enter_compute_thread(i: usize, threads: usize) {
+    let nodes = nodes();
+    let idx = i * nodes.len() / threads.max(1);
+    nodes[idx].threads.fetch_add(1, Ordering::Relaxed);
+    if nodes.len() < 2 {
+        return;
+    }
+    CURRENT.with(|c| c.set(idx));
+    #[cfg(target_os = "linux")]
+    unsafe {
+        let mut set: libc::cpu_set_t = std::mem::zeroed();
+        for &cpu in &nodes[idx].cpus {
+            libc::CPU_SET(cpu, &mut set);
+        }
+        if libc::sched_setaffinity(0, std::mem::size_of::<libc::cpu_set_t>(), &set) != 0 {
+            eprintln!("Could not pin compute thread {} to node {}: {}",
+                i, nodes[idx].id, std::io::Error::last_os_error());
+        }
+    }
+}
+
+/// Run the ROM build `f` with the ROM's memory mapped beforehand on node
+/// `idx` (see hugealloc::with_rom_block).
+#[cfg(feature = "native_ashmaize")]
+pub fn alloc_on<R>(idx: usize, f: impl FnOnce() -> R) -> R {
+    #[cfg(target_os = "linux")]
+    {
+        let node = (nodes().len() > 1).then(|| nodes()[idx].id);
+        return crate::hugealloc::with_rom_block(crate::ROM_SIZE, node, f);
+    }
+    #[cfg(not(target_os = "linux"))]
+    {
+        let _ = idx;
+        f()
+    }
+}
+
+/// Count one hash for this thread's node.
+#[cfg(feature = "native_ashmaize")]
+pub fn count_hash() {
+    PENDING.with(|p| {
+        let n = p.get() + 1;
+        if n >= COUNT_FLUSH {
+            nodes()[current()].hashes.0.fetch_add(n, Ordering::Relaxed);
+            p.set(0);
+        } else {
+            p.set(n);
+        }
+    });
+}
+
+/// Update every node's rate every RATE_INTERVAL, logging them on
+/// multi-node hosts.
+pub fn spawn_rate_thread() {
+    std::thread::spawn(|| {
+        let nodes = nodes();
+        let mut last: Vec<u64> = nodes.iter().map(|n| n.hashes.0.load(Ordering::Relaxed)).collect();
+        let mut at = Instant::now();
+        loop {
+            std::thread::sleep(RATE_INTERVAL);
+            let secs = at.elapsed().as_secs_f64();
+            at = Instant::now();
+            let mut line = String::new();
+            for (n, prev) in nodes.iter().zip(last.iter_mut()) {
+                let now = n.hashes.0.load(Ordering::Relaxed);
+                let rate = ((now - *prev) as f64 / secs) as u64;
+                n.rate.store(rate, Ordering::Relaxed);
+                *prev = now;
+                line.push_str(&format!("  node {}: {} H/s", n.id, rate));
+            }
+            if nodes.len() > 1 {
+                info!("Hash rate by node:{}", line);
+            }
+        }
+    });
+}
+
+/// Per-node snapshot for #stats.
+pub struct NodeStats {
+    pub id: u32,
+    pub cpus: usize,
+    pub threads: usize,
+    #[cfg(feature = "native_ashmaize")]
+    pub hashes: u64,
+    #[cfg(feature = "native_ashmaize")]
+    pub rate: u64,
+}
+
+pub fn stats() -> Vec<NodeStats> {
+    nodes()
+        .iter()
+        .map(|n| NodeStats {
+            id: n.id,
+            cpus: n.cpus.len(),
+            threads: n.threads.load(Ordering::Relaxed),
+            #[cfg(feature = "native_ashmaize")]
+            hashes: n.hashes.0.load(Ordering::Relaxed),
+            #[cfg(feature = "native_ashmaize")]
+            rate: n.rate.load(Ordering::Relaxed),
+        })
+        .collect()
+}
@@ -0,0 +1,143 @@
+//! Fixed compute pool shared by every connection.
+//!
+//! Connection threads only parse requests and write replies; all hashing is
+//! queued here and runs on `--threads` threads (default: physical cores), so
+//! the number of busy hashing threads does not grow with the client count.
+//! Tasks must not wait on other pool tasks.
+
+use std::sync::mpsc;
+use std::sync::{Arc, Mutex, OnceLock};
+use std::thread;
+
+type Task = Box<dyn FnOnce() + Send + 'static>;
+
+struct Pool {
+    tasks: mpsc::Sender<Task>,
+    threads: usize,
+}
+
+static POOL: OnceLock<Pool> = OnceLock::new();
+
+/// Start the pool with `threads` compute threads. Later calls are ignored.
+pub fn init(threads: usize) {
+    POOL.get_or_init(|| {
+        let threads = threads.max(1);
+        let (tx, rx) = mpsc::channel::<Task>();
+        let rx = Arc::new(Mutex::new(rx));
+        for i in 0..threads {
+            let rx = rx.clone();
+            thread::Builder::new()
+                .name(format!("ash-compute-{}", i))
+                .spawn(move || {
+                    // pinned to one NUMA node, reading that node's ROMs
+                    crate::numa::enter_compute_thread(i, threads);
+                    loop {
+                        let task = match rx.lock().unwrap().recv() {
+                            Ok(t) => t,
+                            Err(_) => return,
+                        };
+                        task();
+                    }
+                })
+                .expect("failed to spawn compute thread");
+        }
+        Pool { tasks: tx, threads }
+    });
+}
+
+fn pool() -> &'static Pool {
+    if let Some(p) = POOL.get() {
+        return p;
+    }
+    // Normally started from main with --threads; fall back to the default.
+    init(physical_cores());
+    POOL.get().unwrap()
+}
+
+/// Number of compute threads.
+pub fn threads() -> usize {
+    pool().threads
+}
+
+/// Queue `f` on the pool without waiting for it.
+pub fn spawn<F: FnOnce() + Send + 'static>(f: F) {
+    let _ = pool().tasks.send(Box::new(f));
+}
+
+/// Run `f` on the pool and wait for its result.
+pub fn run<R, F>(f: F) -> R
+where
+    R: Send + 'static,
+    F: FnOnce() -> R + Send + 'static,
+{
+    let (tx, rx) = mpsc::channel();
+    spawn(move || {
+        let _ = tx.send(f());
+    });
+    rx.recv().expect("compute task panicked")
+}
+
+/// Apply `f` to every item, split into one chunk per compute thread, and
+/// return the results in input order.
+pub fn map<T, R, F>(items: Vec<T>, f: F) -> Vec<R>
+where
+    T: Send + 'static,
+    R: Send + 'static,
+    F: Fn(T) -> R + Send + Sync + 'static,
+{
+    if items.is_empty() {
+        return Vec::new();
+    }
+    let f = Arc::new(f);
+    let chunk = items.len().div_ceil(threads());
+    let (tx, rx) = mpsc::channel();
+    let mut items = items.into_iter();
+    let mut chunks = 0;
+    loop {
+        let part: Vec<T> = items.by_ref().take(chunk).collect();
+        if part.is_empty() {
+            break;
+        }
+        let (f, tx, idx) = (f.clone(), tx.clone(), chunks);
+        spawn(move || {
+            let out: Vec<R> = part.into_iter().map(|t| f(t)).collect();
+            let _ = tx.send((idx, out));
+        });
+        chunks += 1;
+    }
+    drop(tx);
+    let mut parts: Vec<Option<Vec<R>>> = (0..chunks).map(|_| None).collect();
+    for (idx, out) in rx {
+        parts[idx] = Some(out);
+    }
+    parts
+        .into_iter()
+        .flat_map(|p| p.expect("compute task panicked"))
+        .collect()
+}
+
+/// Physical core count (SMT siblings counted once), capped by the CPUs this
+/// process may run on.
+pub fn physical_cores() -> usize {
+    let logical = thread::available_parallelism().map(|n| n.get()).unwrap_or(4);
+    #[cfg(target_os = "linux")]
+    if let Ok(info) = std::fs::read_to_string("/proc/cpuinfo") {
+        let mut cores = std::collections::HashSet::new();
+        let mut package = String::new();
+        for line in info.lines() {
+            if let Some((k, v)) = line.split_once(':') {
+                match k.trim() {
+                    "physical id" => package = v.trim().to_string(),
+                    "core id" => {
+                        cores.insert((package.clone(), v.trim().to_string()));
+                    }
+                    _ => {}
+                }
+            }
+        }
+        if !cores.is_empty() {
+            return cores.len().min(logical);
+        }
+    }
+    logical
+}
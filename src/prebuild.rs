@@ -0,0 +1,108 @@
+//! Background ROM builds for upcoming challenges ("#prepare <rom>").
+//!
+//! Coordinators announce the no_pre_mine seeds they are about to mine. One
+//! builder thread, at the lowest CPU priority, builds them through the ROM
+//! registry while hashing goes on, so the first hash request for a new day's
+//! ROM finds it ready, or joins the build already under way, instead of
+//! starting a 1 GiB build on the hot path.
+//!
+//! On NUMA hosts every node's replica is built. Under --rom-mem-budget a
+//! hint never evicts the ROM of an open challenge: it waits until there is
+//! room or an older challenge has closed.
+
+use std::collections::VecDeque;
+use std::sync::{Condvar, Mutex, OnceLock};
+use std::thread;
+use std::time::{Duration, Instant};
+
+/// How often a hint that is waiting for room is retried.
+const RETRY_INTERVAL: Duration = Duration::from_secs(30);
+
+struct Queue {
+    seeds: Mutex<VecDeque<String>>,
+    wake: Condvar,
+}
+
+static QUEUE: OnceLock<Queue> = OnceLock::new();
+
+/// Queue the ROM for `seed` to be built in the background. Seeds that are
+/// already queued are ignored; resident ones are skipped by the builder.
+pub fn request(seed: &str) {
+    let q = QUEUE.get_or_init(|| {
+        thread::Builder::new()
+            .name("ash-prebuild".to_string())
+            .spawn(builder)
+            .expect("failed to spawn ROM prebuild thread");
+        Queue { seeds: Mutex::new(VecDeque::new()), wake: Condvar::new() }
+    });
+    let mut seeds = q.seeds.lock().unwrap();
+    if !seeds.iter().any(|s| s == seed) {
+        seeds.push_back(seed.to_string());
+        q.wake.notify_one();
+    }
+}
+
+/// Number of hints not yet built.
+pub fn pending() -> usize {
+    QUEUE.get().map_or(0, |q| q.seeds.lock().unwrap().len())
+}
+
+fn builder() {
+    lower_priority();
+    let q = loop {
+        // request() publishes the queue right after spawning us
+        match QUEUE.get() {
+            Some(q) => break q,
+            None => thread::sleep(Duration::from_millis(1)),
+        }
+    };
+    let mut local = crate::romreg::Local::new();
+    loop {
+        let seed = {
+            let mut seeds = q.seeds.lock().unwrap();
+            while seeds.is_empty() {
+                seeds = q.wake.wait(seeds).unwrap();
+            }
+            seeds.front().unwrap().clone()
+        };
+        let started = Instant::now();
+        let mut built = false;
+        let mut done = true;
+        // one replica per NUMA node, each allocated on its node
+        for (node, reg) in crate::rom_registries().iter().enumerate() {
+            let mut generated = false;
+            done &= reg.prebuild(&seed, || {
+                generated = true;
+                crate::build_rom_replica(node, Some(&seed))
+            });
+            if generated {
+                built = true;
+                crate::finish_rom_build(&seed, reg.get(&seed, &mut local).as_ref());
+            }
+        }
+        let mut seeds = q.seeds.lock().unwrap();
+        if done {
+            if built {
+                info!("Prebuilt ROM {} in {:?}", &seed[..seed.len().min(16)], started.elapsed());
+            }
+            seeds.retain(|s| *s != seed);
+        } else {
+            // no room yet: try the others, and this one again later
+            seeds.retain(|s| *s != seed);
+            seeds.push_back(seed);
+            drop(q.wake.wait_timeout(seeds, RETRY_INTERVAL).unwrap());
+        }
+    }
+}
+
+/// Run this thread at nice 19, so ROM builds only use CPU time the compute
+/// threads leave idle. Linux applies the nice value per thread.
+fn lower_priority() {
+    #[cfg(target_os = "linux")]
+    unsafe {
+        let tid = libc::syscall(libc::SYS_gettid) as libc::id_t;
+        if libc::setpriority(libc::PRIO_PROCESS, tid, 19) != 0 {
+            eprintln!("Could not lower ROM prebuild priority: {}", std::io::Error::last_os_error());
+        }
+    }
+}
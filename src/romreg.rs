@@ -0,0 +1,876 @@
+//! ROM registry: lock-free lookups of ready ROMs and single-flight builds.
+//!
+//! Ready entries live in an immutable snapshot that is replaced (copy on
+//! write) whenever an entry is added or removed, and every change bumps an
+//! epoch counter. Each thread keeps its own copy of the snapshot in a
+//! `Local`; a lookup is one atomic load of the epoch plus a scan of that copy
+//! under the thread's own view lock, which only an eviction ever contends,
+//! so hits never touch the registry lock or a shared reference count.
+//!
+//! A miss takes the registry lock only to register or join the build of its
+//! key. The build itself runs outside the lock, and only callers asking for
+//! that key wait for it, so a 1 GiB ROM build does not stall hashing with
+//! other ROMs.
+//!
+//! With a memory budget, room for a new entry is made before it is built:
+//! entries whose deadline (the challenge's latest_submission) has passed go
+//! first, then entries with no known deadline, then open ones, least
+//! recently used first within each group. An eviction then drops every
+//! thread's stale snapshot (waiting for a lookup in progress to finish), so
+//! the evicted ROM is freed at once unless a caller still holds an `Arc` of
+//! it from `get`. Such evicted-but-held entries count against the budget
+//! until they are dropped.
+
+use std::collections::HashMap;
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::sync::{Arc, Condvar, Mutex, Weak};
+use std::time::{Instant, SystemTime, UNIX_EPOCH};
+
+/// Hits are counted per thread and added to the shared counter in batches
+/// of this many, or at least every HIT_FLUSH_MS.
+const HIT_FLUSH: u64 = 256;
+const HIT_FLUSH_MS: u64 = 1000;
+/// An entry's last-use time is only rewritten when it is older than this,
+/// so hits mostly just read it.
+const TOUCH_MS: u64 = 1000;
+/// Deadlines are kept this long past latest_submission before a ROM counts
+/// as expired.
+pub const EXPIRY_GRACE_SECS: u64 = 60;
+
+struct Entry<V> {
+    key: String,
+    value: Arc<V>,
+    /// Milliseconds since the registry was created.
+    last_used: AtomicU64,
+}
+
+type Entries<V> = Arc<Vec<Arc<Entry<V>>>>;
+
+/// One in-progress build that other callers can wait on.
+struct Flight<V> {
+    /// None while building; Some(None) if the build panicked.
+    result: Mutex<Option<Option<Arc<V>>>>,
+    done: Condvar,
+}
+
+struct State<V> {
+    ready: Entries<V>,
+    building: HashMap<String, Arc<Flight<V>>>,
+    /// Unix seconds until which a key is needed; may precede its build.
+    deadlines: HashMap<String, u64>,
+    /// Evicted values, which hold memory until their last `Arc` is dropped.
+    evicted: Vec<Weak<V>>,
+}
+
+/// What a `Local` sees: the snapshot and the epoch it was taken at.
+struct View<V> {
+    epoch: u64,
+    entries: Entries<V>,
+}
+
+impl<V> View<V> {
+    fn empty() -> View<V> {
+        // epoch 0 is never current, so the next lookup refreshes
+        View { epoch: 0, entries: Arc::new(Vec::new()) }
+    }
+}
+
+static NEXT_REGISTRY: AtomicU64 = AtomicU64::new(1);
+
+pub struct Registry<V> {
+    /// Tells registries apart in `Local::registry`.
+    id: u64,
+    epoch: AtomicU64,
+    state: Mutex<State<V>>,
+    /// The views of all `Local`s that looked here, to drop their stale
+    /// snapshots on eviction. Never locked together with `state`.
+    views: Mutex<Vec<Weak<Mutex<View<V>>>>>,
+    started: Instant,
+    entry_bytes: u64,
+    /// 0 = unlimited.
+    budget: u64,
+    hits: AtomicU64,
+    misses: AtomicU64,
+    builds: AtomicU64,
+    evictions: AtomicU64,
+}
+
+/// A thread's copy of the ready entries. Keep one per thread (thread_local!).
+pub struct Local<V> {
+    view: Arc<Mutex<View<V>>>,
+    /// Id of the registry `view` is registered with, 0 if none yet.
+    registry: u64,
+    hits: u64,
+    flushed_ms: u64,
+}
+
+impl<V> Local<V> {
+    pub fn new() -> Local<V> {
+        Local { view: Arc::new(Mutex::new(View::empty())), registry: 0, hits: 0, flushed_ms: 0 }
+    }
+}
+
+/// Snapshot of one resident entry for stats.
+pub struct EntryStats {
+    pub key: String,
+    /// Unix seconds, 0 if unknown.
+    pub deadline: u64,
+    pub idle_ms: u64,
+}
+
+/// Counters and residency, see Registry::stats.
+pub struct Stats {
+    pub entries: Vec<EntryStats>,
+    pub building: usize,
+    /// Evicted entries still held by a caller; they count against the budget.
+    pub evicted_in_use: usize,
+    pub entry_bytes: u64,
+    pub budget: u64,
+    pub hits: u64,
+    pub misses: u64,
+    pub builds: u64,
+    pub evictions: u64,
+}
+
+impl<V> Registry<V> {
+    /// Registry whose entries weigh `entry_bytes` each, holding at most
+    /// `budget` bytes (0 = unlimited).
+    pub fn new(entry_bytes: u64, budget: u64) -> Registry<V> {
+        Registry {
+            id: NEXT_REGISTRY.fetch_add(1, Ordering::Relaxed),
+            epoch: AtomicU64::new(1),
+            state: Mutex::new(State {
+                ready: Arc::new(Vec::new()),
+                building: HashMap::new(),
+                deadlines: HashMap::new(),
+                evicted: Vec::new(),
+            }),
+            views: Mutex::new(Vec::new()),
+            started: Instant::now(),
+            entry_bytes,
+            budget,
+            hits: AtomicU64::new(0),
+            misses: AtomicU64::new(0),
+            builds: AtomicU64::new(0),
+            evictions: AtomicU64::new(0),
+        }
+    }
+
+    fn now_ms(&self) -> u64 {
+        self.started.elapsed().as_millis() as u64
+    }
+
+    /// Find `key` in this thread's snapshot, call `f` with it while the
+    /// snapshot cannot be dropped, and account for the hit.
+    fn lookup<R>(&self, key: &str, local: &mut Local<V>, f: impl FnOnce(&Arc<V>) -> R) -> Option<R> {
+        if local.registry != self.id {
+            *local.view.lock().unwrap() = View::empty();
+            let mut views = self.views.lock().unwrap();
+            views.retain(|v| v.strong_count() > 0);
+            views.push(Arc::downgrade(&local.view));
+            local.registry = self.id;
+        }
+        let now = self.now_ms();
+        let r = {
+            let mut view = local.view.lock().unwrap();
+            if view.epoch != self.epoch.load(Ordering::Acquire) {
+                let st = self.state.lock().unwrap();
+                view.entries = st.ready.clone();
+                view.epoch = self.epoch.load(Ordering::Acquire);
+            }
+            let e = view.entries.iter().find(|e| e.key == key)?;
+            if now.saturating_sub(e.last_used.load(Ordering::Relaxed)) >= TOUCH_MS {
+                e.last_used.store(now, Ordering::Relaxed);
+            }
+            f(&e.value)
+        };
+        local.hits += 1;
+        if local.hits >= HIT_FLUSH || now.saturating_sub(local.flushed_ms) >= HIT_FLUSH_MS {
+            self.hits.fetch_add(local.hits, Ordering::Relaxed);
+            local.hits = 0;
+            local.flushed_ms = now;
+        }
+        Some(r)
+    }
+
+    /// Call `f` with the ready value for `key`, without taking the registry
+    /// lock unless the registry changed since this thread last looked. An
+    /// eviction waits for `f` to return.
+    pub fn with<R>(&self, key: &str, local: &mut Local<V>, f: impl FnOnce(&V) -> R) -> Option<R> {
+        self.lookup(key, local, |v| f(v))
+    }
+
+    /// The ready value for `key`, if any. Holding on to it keeps it in
+    /// memory, and within the budget, after it is evicted.
+    pub fn get(&self, key: &str, local: &mut Local<V>) -> Option<Arc<V>> {
+        self.lookup(key, local, Arc::clone)
+    }
+
+    /// The ready value for `key`, if any, without a thread's view: for
+    /// occasional lookups from other threads.
+    #[cfg_attr(not(feature = "rom_bytes"), allow(dead_code))]
+    pub fn peek(&self, key: &str) -> Option<Arc<V>> {
+        let st = self.state.lock().unwrap();
+        st.ready.iter().find(|e| e.key == key).map(|e| e.value.clone())
+    }
+
+    /// The value for `key`, running `build` if nobody has built it yet.
+    /// Concurrent callers for the same key wait for the one build; callers
+    /// for other keys are not blocked by it.
+    pub fn get_or_build(&self, key: &str, local: &mut Local<V>, build: impl FnOnce() -> V) -> Arc<V> {
+        if let Some(v) = self.get(key, local) {
+            return v;
+        }
+        self.misses.fetch_add(1, Ordering::Relaxed);
+        let mut build = Some(build);
+        loop {
+            let flight = {
+                let mut st = self.state.lock().unwrap();
+                if let Some(e) = st.ready.iter().find(|e| e.key == key) {
+                    return e.value.clone();
+                }
+                match st.building.get(key) {
+                    Some(f) => f.clone(),
+                    None => {
+                        let evicted = self.make_room(&mut st);
+                        let f = Arc::new(Flight { result: Mutex::new(None), done: Condvar::new() });
+                        st.building.insert(key.to_string(), f.clone());
+                        drop(st);
+                        if evicted {
+                            self.drop_stale_views();
+                        }
+                        return self.run_build(key, f, build.take().unwrap());
+                    }
+                }
+            };
+            let mut r = flight.result.lock().unwrap();
+            while r.is_none() {
+                r = flight.done.wait(r).unwrap();
+            }
+            if let Some(Some(v)) = r.as_ref() {
+                return v.clone();
+            }
+            // that build panicked: try again, possibly building ourselves
+        }
+    }
+
+    /// Build `key` ahead of demand, if that does not push out an entry that
+    /// is still needed: with a budget, only free room or entries of closed
+    /// challenges may be evicted for it. Keys whose own deadline has passed
+    /// are not built. Returns false if the build has to wait for room, true
+    /// once there is nothing left to do for `key`. Callers that ask for the
+    /// key meanwhile wait for this build instead of starting their own.
+    pub fn prebuild(&self, key: &str, build: impl FnOnce() -> V) -> bool {
+        let flight = {
+            let mut st = self.state.lock().unwrap();
+            if st.building.contains_key(key) || st.ready.iter().any(|e| e.key == key) {
+                return true;
+            }
+            let now = unix_now();
+            let expired = |k: &str| matches!(st.deadlines.get(k), Some(&d) if d + EXPIRY_GRACE_SECS < now);
+            if expired(key) {
+                return true;
+            }
+            if self.budget != 0 {
+                let reclaimable = st.ready.iter().filter(|e| expired(&e.key)).count();
+                let needed = st.ready.len() + st.building.len() + live_evicted(&mut st.evicted) + 1 - reclaimable;
+                if needed as u64 * self.entry_bytes > self.budget {
+                    return false;
+                }
+            }
+            let evicted = self.make_room(&mut st);
+            let f = Arc::new(Flight { result: Mutex::new(None), done: Condvar::new() });
+            st.building.insert(key.to_string(), f.clone());
+            (f, evicted)
+        };
+        if flight.1 {
+            self.drop_stale_views();
+        }
+        self.run_build(key, flight.0, build);
+        true
+    }
+
+    fn run_build(&self, key: &str, flight: Arc<Flight<V>>, build: impl FnOnce() -> V) -> Arc<V> {
+        // Wakes waiters with "failed" if build() panics.
+        struct Abort<'a, V> {
+            reg: &'a Registry<V>,
+            key: &'a str,
+            flight: &'a Flight<V>,
+            armed: bool,
+        }
+        impl<V> Drop for Abort<'_, V> {
+            fn drop(&mut self) {
+                if self.armed {
+                    self.reg.state.lock().unwrap().building.remove(self.key);
+                    *self.flight.result.lock().unwrap() = Some(None);
+                    self.flight.done.notify_all();
+                }
+            }
+        }
+        let mut abort = Abort { reg: self, key, flight: &flight, armed: true };
+
+        let v = Arc::new(build());
+        self.builds.fetch_add(1, Ordering::Relaxed);
+        {
+            let mut st = self.state.lock().unwrap();
+            st.building.remove(key);
+            let mut entries: Vec<_> = st.ready.iter().cloned().collect();
+            entries.push(Arc::new(Entry {
+                key: key.to_string(),
+                value: v.clone(),
+                last_used: AtomicU64::new(self.now_ms()),
+            }));
+            st.ready = Arc::new(entries);
+            self.epoch.fetch_add(1, Ordering::AcqRel);
+        }
+        abort.armed = false;
+        *flight.result.lock().unwrap() = Some(Some(v.clone()));
+        flight.done.notify_all();
+        v
+    }
+
+    /// Record that `key` is needed until `deadline` (unix seconds). The
+    /// latest deadline seen for a key wins.
+    pub fn set_deadline(&self, key: &str, deadline: u64) {
+        let mut st = self.state.lock().unwrap();
+        let d = st.deadlines.entry(key.to_string()).or_insert(0);
+        *d = (*d).max(deadline);
+    }
+
+    /// Evict entries until one more entry fits the budget, counting
+    /// evicted entries that are still held. Lock held; returns whether
+    /// anything was evicted, in which case the caller must drop_stale_views()
+    /// once the lock is released.
+    fn make_room(&self, st: &mut State<V>) -> bool {
+        if self.budget == 0 {
+            return false;
+        }
+        let now = unix_now();
+        // entries evicted below are only held by snapshots, which the caller drops
+        let held = live_evicted(&mut st.evicted);
+        let mut evicted = false;
+        while !st.ready.is_empty()
+            && (st.ready.len() + st.building.len() + held + 1) as u64 * self.entry_bytes > self.budget
+        {
+            // (group, order): expired by deadline, then unknown, then open by LRU
+            let rank = |e: &Entry<V>| match st.deadlines.get(&e.key) {
+                Some(&d) if d + EXPIRY_GRACE_SECS < now => (0, d),
+                None => (1, e.last_used.load(Ordering::Relaxed)),
+                Some(_) => (2, e.last_used.load(Ordering::Relaxed)),
+            };
+            let victim = st.ready.iter().min_by_key(|e| rank(e)).unwrap().clone();
+            let why = match rank(&victim).0 {
+                0 => "challenge closed",
+                1 => "least recently used, no known deadline",
+                _ => "least recently used, challenge still open: budget too small",
+            };
+            info!("Evicting ROM {} ({})", short_key(&victim.key), why);
+            self.remove_locked(st, &victim.key);
+            evicted = true;
+        }
+        if (st.ready.len() + st.building.len() + held + 1) as u64 * self.entry_bytes > self.budget {
+            eprintln!(
+                "ROM budget exceeded: {} evicted ROM(s) still in use, {} building",
+                held,
+                st.building.len()
+            );
+        }
+        evicted
+    }
+
+    /// Drop every thread's snapshot that is older than the current epoch, so
+    /// that evicted entries are freed now rather than at that thread's next
+    /// lookup. Waits for lookups in progress. Registry lock not held.
+    fn drop_stale_views(&self) {
+        let views: Vec<_> = self.views.lock().unwrap().iter().filter_map(Weak::upgrade).collect();
+        let epoch = self.epoch.load(Ordering::Acquire);
+        for view in views {
+            let mut view = view.lock().unwrap();
+            if view.epoch != epoch {
+                *view = View::empty();
+            }
+        }
+    }
+
+    /// Evict every entry whose deadline has passed. Only with a budget: an
+    /// unlimited registry keeps everything, as before.
+    pub fn evict_expired(&self) {
+        if self.budget == 0 {
+            return;
+        }
+        let now = unix_now();
+        let mut st = self.state.lock().unwrap();
+        let expired: Vec<String> = st
+            .ready
+            .iter()
+            .filter(|e| matches!(st.deadlines.get(&e.key), Some(&d) if d + EXPIRY_GRACE_SECS < now))
+            .map(|e| e.key.clone())
+            .collect();
+        for key in &expired {
+            info!("Evicting ROM {} (challenge closed)", short_key(key));
+            self.remove_locked(&mut st, key);
+        }
+        st.deadlines.retain(|_, d| *d + EXPIRY_GRACE_SECS >= now);
+        drop(st);
+        if !expired.is_empty() {
+            self.drop_stale_views();
+        }
+    }
+
+    /// Evict `key` now, e.g. because its value turned out to be damaged.
+    /// Returns whether it was resident.
+    #[cfg_attr(not(all(unix, feature = "rom_disk")), allow(dead_code))]
+    pub fn remove(&self, key: &str) -> bool {
+        let mut st = self.state.lock().unwrap();
+        if !st.ready.iter().any(|e| e.key == key) {
+            return false;
+        }
+        info!("Evicting ROM {} (removed)", short_key(key));
+        self.remove_locked(&mut st, key);
+        drop(st);
+        self.drop_stale_views();
+        true
+    }
+
+    fn remove_locked(&self, st: &mut State<V>, key: &str) {
+        let mut entries = Vec::with_capacity(st.ready.len());
+        for e in st.ready.iter() {
+            if e.key == key {
+                st.evicted.push(Arc::downgrade(&e.value));
+            } else {
+                entries.push(e.clone());
+            }
+        }
+        st.ready = Arc::new(entries);
+        self.evictions.fetch_add(1, Ordering::Relaxed);
+        self.epoch.fetch_add(1, Ordering::AcqRel);
+    }
+
+    /// Residency and counters. Hit counts lag slightly (see HIT_FLUSH).
+    pub fn stats(&self) -> Stats {
+        let mut st = self.state.lock().unwrap();
+        let evicted_in_use = live_evicted(&mut st.evicted);
+        let now = self.now_ms();
+        Stats {
+            entries: st
+                .ready
+                .iter()
+                .map(|e| EntryStats {
+                    key: e.key.clone(),
+                    deadline: st.deadlines.get(&e.key).copied().unwrap_or(0),
+                    idle_ms: now.saturating_sub(e.last_used.load(Ordering::Relaxed)),
+                })
+                .collect(),
+            building: st.building.len(),
+            evicted_in_use,
+            entry_bytes: self.entry_bytes,
+            budget: self.budget,
+            hits: self.hits.load(Ordering::Relaxed),
+            misses: self.misses.load(Ordering::Relaxed),
+            builds: self.builds.load(Ordering::Relaxed),
+            evictions: self.evictions.load(Ordering::Relaxed),
+        }
+    }
+}
+
+/// How many evicted values are still held, forgetting the freed ones.
+fn live_evicted<V>(evicted: &mut Vec<Weak<V>>) -> usize {
+    evicted.retain(|w| w.strong_count() > 0);
+    evicted.len()
+}
+
+fn unix_now() -> u64 {
+    SystemTime::now().duration_since(UNIX_EPOCH).map(|d| d.as_secs()).unwrap_or(0)
+}
+
+fn short_key(key: &str) -> &str {
+    &key[..key.len().min(16)]
+}
+
+/// Parse a UTC timestamp like latest_submission ("2025-11-10T21:59:59.000Z")
+/// into unix seconds. Fractional seconds are dropped.
+pub fn parse_utc_timestamp(s: &str) -> Option<u64> {
+    let s = s.trim().trim_end_matches('Z');
+    let (date, time) = s.split_once('T').or_else(|| s.split_once(' '))?;
+    let mut d = date.splitn(3, '-').map(|p| p.parse::<i64>().ok());
+    let (y, m, day) = (d.next()??, d.next()??, d.next()??);
+    let time = time.split('.').next()?;
+    let mut t = time.splitn(3, ':').map(|p| p.parse::<i64>().ok());
+    let (hh, mm) = (t.next()??, t.next()??);
+    let ss = t.next().flatten().unwrap_or(0);
+    if !(1..=12).contains(&m) || !(1..=31).contains(&day) || hh > 23 || mm > 59 || ss > 60 {
+        return None;
+    }
+    // days from civil (Howard Hinnant's algorithm)
+    let y = if m <= 2 { y - 1 } else { y };
+    let era = y.div_euclid(400);
+    let yoe = y - era * 400;
+    let mp = (m + 9) % 12;
+    let doy = (153 * mp + 2) / 5 + day - 1;
+    let doe = yoe * 365 + yoe / 4 - yoe / 100 + doy;
+    let days = era * 146097 + doe - 719468;
+    let secs = days * 86400 + hh * 3600 + mm * 60 + ss;
+    u64::try_from(secs).ok()
+}
+
+/// `--bench-registry [threads]`: lookup throughput and worst-case lookup
+/// latency during a slow build, for the old global `Mutex<HashMap>` cache
+/// and for Registry, with `threads` client threads.
+pub fn bench(threads: usize) {
+    use std::cell::RefCell;
+    use std::hint::black_box;
+    use std::sync::atomic::AtomicBool;
+    use std::thread;
+    use std::time::{Duration, Instant};
+
+    const RUN: Duration = Duration::from_secs(1);
+    const BUILD: Duration = Duration::from_millis(500);
+    type Val = [u8; 64];
+
+    thread_local! {
+        static LOCAL: RefCell<Local<Val>> = RefCell::new(Local::new());
+    }
+
+    // 64-char keys like real no_pre_mine values
+    let keys: Arc<Vec<String>> = Arc::new((0..4u64).map(|i| format!("{:064x}", i.wrapping_mul(0x9E37_79B9_7F4A_7C15))).collect());
+    let slow_key = format!("{:064x}", 0xdead_beefu64);
+
+    // Run `lookup` on every thread for RUN; meanwhile one extra thread calls
+    // `slow` (a build of a new key). Returns (lookups/s, max lookup latency).
+    fn run(
+        threads: usize,
+        keys: &Arc<Vec<String>>,
+        lookup: Arc<dyn Fn(&str) + Send + Sync>,
+        slow: Box<dyn FnOnce() + Send>,
+    ) -> (f64, Duration) {
+        let stop = Arc::new(AtomicBool::new(false));
+        let started = Instant::now();
+        let handles: Vec<_> = (0..threads)
+            .map(|t| {
+                let (keys, lookup, stop) = (keys.clone(), lookup.clone(), stop.clone());
+                thread::spawn(move || {
+                    let (mut n, mut worst) = (0u64, Duration::ZERO);
+                    while !stop.load(Ordering::Relaxed) {
+                        let t0 = Instant::now();
+                        lookup(&keys[(t + n as usize) % keys.len()]);
+                        worst = worst.max(t0.elapsed());
+                        n += 1;
+                    }
+                    (n, worst)
+                })
+            })
+            .collect();
+        thread::sleep(RUN / 4);
+        let builder = thread::spawn(slow);
+        thread::sleep(RUN * 3 / 4);
+        stop.store(true, Ordering::Relaxed);
+        let _ = builder.join();
+        let elapsed = started.elapsed();
+        let (mut total, mut worst) = (0u64, Duration::ZERO);
+        for h in handles {
+            let (n, w) = h.join().unwrap();
+            total += n;
+            worst = worst.max(w);
+        }
+        (total as f64 / elapsed.as_secs_f64(), worst)
+    }
+
+    println!("ROM registry contention: {} client threads, {} ROMs, one {:?} build mid-run", threads, keys.len(), BUILD);
+
+    // Old cache: lock, hash the key, clone the Arc; builds hold the lock.
+    let old: Arc<Mutex<HashMap<String, Arc<Val>>>> = Arc::new(Mutex::new(
+        keys.iter().map(|k| (k.clone(), Arc::new([7u8; 64]))).collect(),
+    ));
+    let (o1, o2, sk) = (old.clone(), old.clone(), slow_key.clone());
+    let (rate, worst) = run(
+        threads,
+        &keys,
+        Arc::new(move |k: &str| {
+            let v = o1.lock().unwrap().get(k).cloned();
+            black_box(v);
+        }),
+        Box::new(move || {
+            let mut m = o2.lock().unwrap();
+            thread::sleep(BUILD);
+            m.insert(sk, Arc::new([1u8; 64]));
+        }),
+    );
+    println!("  mutex hashmap : {:>12.0} lookups/s, worst lookup {:?}", rate, worst);
+
+    let reg: Arc<Registry<Val>> = Arc::new(Registry::new(64, 0));
+    LOCAL.with(|l| {
+        for k in keys.iter() {
+            reg.get_or_build(k, &mut l.borrow_mut(), || [7u8; 64]);
+        }
+    });
+    let (r1, r2) = (reg.clone(), reg.clone());
+    let (rate, worst) = run(
+        threads,
+        &keys,
+        Arc::new(move |k: &str| {
+            LOCAL.with(|l| black_box(r1.with(k, &mut l.borrow_mut(), |v| v[0])));
+        }),
+        Box::new(move || {
+            LOCAL.with(|l| {
+                r2.get_or_build(&slow_key, &mut l.borrow_mut(), || {
+                    thread::sleep(BUILD);
+                    [1u8; 64]
+                });
+            });
+        }),
+    );
+    println!("  registry      : {:>12.0} lookups/s, worst lookup {:?}", rate, worst);
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::sync::atomic::AtomicUsize;
+    use std::sync::{mpsc, Barrier};
+    use std::thread;
+    use std::time::Duration;
+
+    fn keys<V>(reg: &Registry<V>) -> Vec<String> {
+        let mut keys: Vec<String> = reg.stats().entries.into_iter().map(|e| e.key).collect();
+        keys.sort();
+        keys
+    }
+
+    /// Build `key` with a distinct last-use time from the previous build.
+    fn build(reg: &Registry<u8>, local: &mut Local<u8>, key: &str) {
+        thread::sleep(Duration::from_millis(2));
+        reg.get_or_build(key, local, || 0);
+    }
+
+    #[test]
+    fn parses_latest_submission() {
+        assert_eq!(parse_utc_timestamp("1970-01-01T00:00:00Z"), Some(0));
+        assert_eq!(parse_utc_timestamp("2025-11-10T21:59:59.000Z"), Some(1762811999));
+        assert_eq!(parse_utc_timestamp("2000-02-29T12:00:00Z"), Some(951825600));
+        assert_eq!(parse_utc_timestamp(" 2024-12-31 23:59:59 "), Some(1735689599));
+        assert_eq!(parse_utc_timestamp("2025-11-10T21:59Z"), Some(1762811940));
+    }
+
+    #[test]
+    fn rejects_bad_timestamps() {
+        for s in ["", "2025-11-10", "2025-13-01T00:00:00Z", "2025-11-32T00:00:00Z",
+                  "2025-11-10T24:00:00Z", "2025-11-10T21:60:00Z", "tomorrow", "1969-12-31T23:59:59Z"] {
+            assert_eq!(parse_utc_timestamp(s), None, "{:?}", s);
+        }
+    }
+
+    #[test]
+    fn evicts_closed_then_unknown_then_least_recently_used() {
+        let reg: Registry<u8> = Registry::new(1, 3);
+        let mut local = Local::new();
+        let now = unix_now();
+        for key in ["a", "b", "c"] {
+            build(&reg, &mut local, key);
+        }
+        reg.set_deadline("a", now + 3600);
+        reg.set_deadline("b", now - EXPIRY_GRACE_SECS - 10);
+
+        build(&reg, &mut local, "d");
+        assert_eq!(keys(&reg), ["a", "c", "d"], "closed challenge first");
+        reg.set_deadline("d", now + 3600);
+
+        build(&reg, &mut local, "e");
+        assert_eq!(keys(&reg), ["a", "d", "e"], "then no known deadline");
+        reg.set_deadline("e", now + 3600);
+
+        build(&reg, &mut local, "f");
+        assert_eq!(keys(&reg), ["d", "e", "f"], "then least recently used");
+        assert_eq!(reg.stats().evictions, 3);
+    }
+
+    #[test]
+    fn prebuild_only_evicts_closed_challenges() {
+        let now = unix_now();
+        for (a_deadline, built, left) in [
+            (now + 3600, false, vec!["a", "b"]),
+            (now - EXPIRY_GRACE_SECS - 10, true, vec!["b", "c"]),
+        ] {
+            let reg: Registry<u8> = Registry::new(1, 2);
+            let mut local = Local::new();
+            build(&reg, &mut local, "a");
+            build(&reg, &mut local, "b");
+            reg.set_deadline("a", a_deadline);
+            reg.set_deadline("b", now + 3600);
+            assert_eq!(reg.prebuild("c", || 0), built);
+            assert_eq!(keys(&reg), left);
+        }
+    }
+
+    #[test]
+    fn evict_expired_only_with_a_budget() {
+        let now = unix_now();
+        for (budget, left) in [(0, vec!["a", "b"]), (4, vec!["b"])] {
+            let reg: Registry<u8> = Registry::new(1, budget);
+            let mut local = Local::new();
+            build(&reg, &mut local, "a");
+            build(&reg, &mut local, "b");
+            reg.set_deadline("a", now - EXPIRY_GRACE_SECS - 10);
+            reg.set_deadline("b", now + 3600);
+            reg.evict_expired();
+            assert_eq!(keys(&reg), left, "budget {}", budget);
+        }
+    }
+
+    #[test]
+    fn concurrent_misses_share_one_build() {
+        const THREADS: usize = 8;
+        let reg: Arc<Registry<u8>> = Arc::new(Registry::new(1, 0));
+        let runs = Arc::new(AtomicUsize::new(0));
+        let start = Arc::new(Barrier::new(THREADS));
+        let handles: Vec<_> = (0..THREADS)
+            .map(|_| {
+                let (reg, runs, start) = (reg.clone(), runs.clone(), start.clone());
+                thread::spawn(move || {
+                    start.wait();
+                    reg.get_or_build("k", &mut Local::new(), || {
+                        runs.fetch_add(1, Ordering::SeqCst);
+                        thread::sleep(Duration::from_millis(50));
+                        7
+                    })
+                })
+            })
+            .collect();
+        let values: Vec<Arc<u8>> = handles.into_iter().map(|h| h.join().unwrap()).collect();
+        assert_eq!(runs.load(Ordering::SeqCst), 1);
+        assert!(values.iter().all(|v| Arc::ptr_eq(v, &values[0])));
+        assert_eq!(reg.stats().builds, 1);
+    }
+
+    #[test]
+    fn a_slow_build_does_not_block_other_keys() {
+        let reg: Arc<Registry<u8>> = Arc::new(Registry::new(1, 0));
+        let mut local = Local::new();
+        build(&reg, &mut local, "ready");
+        let (started_tx, started_rx) = mpsc::channel();
+        let (finish_tx, finish_rx) = mpsc::channel::<()>();
+        let slow = {
+            let reg = reg.clone();
+            thread::spawn(move || {
+                reg.get_or_build("slow", &mut Local::new(), || {
+                    started_tx.send(()).unwrap();
+                    finish_rx.recv().unwrap();
+                    1
+                })
+            })
+        };
+        started_rx.recv().unwrap();
+        // both return while "slow" is still building
+        assert_eq!(reg.with("ready", &mut local, |v| *v), Some(0));
+        assert_eq!(*reg.get_or_build("other", &mut local, || 2), 2);
+        assert_eq!(reg.stats().building, 1);
+        finish_tx.send(()).unwrap();
+        assert_eq!(*slow.join().unwrap(), 1);
+    }
+
+    #[test]
+    fn hits_do_not_take_the_registry_lock() {
+        let reg: Arc<Registry<u8>> = Arc::new(Registry::new(1, 0));
+        let mut local = Local::new();
+        build(&reg, &mut local, "a");
+        // the build changed the registry; this lookup catches up with it
+        assert_eq!(reg.with("a", &mut local, |v| *v), Some(0));
+        let (tx, rx) = mpsc::channel();
+        let guard = reg.state.lock().unwrap();
+        let hit = {
+            let reg = reg.clone();
+            thread::spawn(move || tx.send(reg.with("a", &mut local, |v| *v)).unwrap())
+        };
+        assert_eq!(rx.recv_timeout(Duration::from_secs(5)), Ok(Some(0)));
+        drop(guard);
+        hit.join().unwrap();
+    }
+
+    #[test]
+    fn a_panicking_build_wakes_waiters_and_the_next_caller_rebuilds() {
+        let reg: Arc<Registry<u8>> = Arc::new(Registry::new(1, 0));
+        let (started_tx, started_rx) = mpsc::channel();
+        let (fail_tx, fail_rx) = mpsc::channel::<()>();
+        let failing = {
+            let reg = reg.clone();
+            thread::spawn(move || {
+                reg.get_or_build("k", &mut Local::new(), || {
+                    started_tx.send(()).unwrap();
+                    fail_rx.recv().unwrap();
+                    panic!("build failed");
+                })
+            })
+        };
+        started_rx.recv().unwrap();
+        let waiter = {
+            let reg = reg.clone();
+            thread::spawn(move || reg.get_or_build("k", &mut Local::new(), || 5))
+        };
+        // let the waiter join the failing build before it panics
+        thread::sleep(Duration::from_millis(50));
+        fail_tx.send(()).unwrap();
+        assert!(failing.join().is_err());
+        assert_eq!(*waiter.join().unwrap(), 5);
+        assert_eq!(reg.stats().building, 0);
+        assert_eq!(reg.get("k", &mut Local::new()).as_deref(), Some(&5));
+        assert_eq!(reg.stats().builds, 1);
+    }
+
+    #[test]
+    fn eviction_frees_entries_in_idle_threads_snapshots() {
+        let reg: Arc<Registry<Vec<u8>>> = Arc::new(Registry::new(1, 1));
+        let mut local = Local::new();
+        let a = Arc::downgrade(&reg.get_or_build("a", &mut local, || vec![1]));
+        let (looked_tx, looked_rx) = mpsc::channel();
+        let (exit_tx, exit_rx) = mpsc::channel::<()>();
+        let idle = {
+            let reg = reg.clone();
+            thread::spawn(move || {
+                let mut local = Local::new();
+                assert_eq!(reg.with("a", &mut local, |v| v[0]), Some(1));
+                looked_tx.send(()).unwrap();
+                // idle, with a snapshot that still lists "a"
+                exit_rx.recv().unwrap();
+            })
+        };
+        looked_rx.recv().unwrap();
+        reg.get_or_build("b", &mut local, || vec![2]);
+        assert!(a.upgrade().is_none(), "evicted ROM still alive");
+        assert_eq!(reg.stats().evicted_in_use, 0);
+        exit_tx.send(()).unwrap();
+        idle.join().unwrap();
+    }
+
+    #[test]
+    fn remove_frees_the_entry_and_allows_a_rebuild() {
+        let reg: Registry<Vec<u8>> = Registry::new(1, 0);
+        let mut local = Local::new();
+        let a = Arc::downgrade(&reg.get_or_build("a", &mut local, || vec![1]));
+        assert_eq!(reg.with("a", &mut local, |v| v[0]), Some(1));
+        assert!(reg.remove("a"));
+        assert!(!reg.remove("a"));
+        assert!(a.upgrade().is_none());
+        assert_eq!(*reg.get_or_build("a", &mut local, || vec![2]), vec![2]);
+    }
+
+    #[test]
+    fn evicted_entries_still_held_count_against_the_budget() {
+        let reg: Registry<u8> = Registry::new(1, 2);
+        let mut local = Local::new();
+        build(&reg, &mut local, "a");
+        let held = reg.get("a", &mut local);
+        build(&reg, &mut local, "b");
+        build(&reg, &mut local, "c");
+        assert_eq!(keys(&reg), ["b", "c"]);
+        assert_eq!(reg.stats().evicted_in_use, 1);
+
+        // "a" still takes one of the two slots
+        build(&reg, &mut local, "d");
+        assert_eq!(keys(&reg), ["d"]);
+        assert!(!reg.prebuild("e", || 0));
+
+        drop(held);
+        assert_eq!(reg.stats().evicted_in_use, 0);
+        assert!(reg.prebuild("e", || 0));
+        assert_eq!(keys(&reg), ["d", "e"]);
+    }
+}
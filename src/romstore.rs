@@ -0,0 +1,297 @@
+//! On-disk ROM cache (`--rom-dir`).
+//!
+//! Every generated ROM is written once to `<dir>/rom-<id>.bin`, where `id` is
+//! derived from the seed and generation parameters. Later lookups, from this
+//! daemon after a restart or from any other daemon on the host, copy the data
+//! out of a read-only mapping instead of regenerating 1 GiB. ashmaize's `Rom`
+//! owns its memory, so a loaded ROM is a private copy: the mapping is only
+//! the copy's source and is dropped afterwards. Files are written to a
+//! temporary name, synced and renamed into place, so readers never see a
+//! partial ROM.
+//!
+//! `load` checks the header (magic, parameters, seed, header checksum) and
+//! the file size, not the data: checksumming 1 GiB would double the cost of
+//! a load. Callers verify the data against `RomFile::data_checksum` off the
+//! hot path, once the ROM is in use.
+//!
+//! ```text
+//! 0     magic "ASHROM01"
+//! 8     u32 header_len (DATA_OFFSET)   12  u32 seed_len
+//! 16    u64 rom_size   24  u64 pre_size   32  u32 mixing_numbers
+//! 40    u64 data checksum (see checksum())
+//! 48    u64 header checksum (bytes 0..48 and the seed)
+//! 64    seed bytes
+//! 4096  ROM data
+//! ```
+//! All integers are little-endian.
+
+use std::fs::{self, File, OpenOptions};
+use std::io::{self, Write};
+use std::os::unix::io::AsRawFd;
+use std::path::{Path, PathBuf};
+
+use sha2::{Digest, Sha256};
+
+const MAGIC: &[u8; 8] = b"ASHROM01";
+/// ROM data starts on its own page.
+const DATA_OFFSET: usize = 4096;
+const SEED_OFFSET: usize = 64;
+const MAX_SEED: usize = DATA_OFFSET - SEED_OFFSET;
+
+/// Generation parameters stored with a ROM; a file only matches a lookup
+/// with the same seed and parameters.
+pub struct RomParams {
+    pub size: u64,
+    pub pre_size: u64,
+    pub mixing_numbers: u32,
+}
+
+/// A read-only mapping of a ROM file whose header checked out. Unmapped on
+/// drop.
+pub struct RomFile {
+    base: *mut u8,
+    len: usize,
+    data_sum: u64,
+}
+
+impl RomFile {
+    /// The ROM data (without the header).
+    pub fn data(&self) -> &[u8] {
+        unsafe { std::slice::from_raw_parts(self.base.add(DATA_OFFSET), self.len - DATA_OFFSET) }
+    }
+
+    /// checksum() of the data as stored, for verifying it after loading.
+    pub fn data_checksum(&self) -> u64 {
+        self.data_sum
+    }
+}
+
+impl Drop for RomFile {
+    fn drop(&mut self) {
+        unsafe {
+            libc::munmap(self.base as *mut libc::c_void, self.len);
+        }
+    }
+}
+
+/// File that holds the ROM for `seed` under `dir`.
+pub fn path_for(dir: &Path, seed: &[u8], params: &RomParams) -> PathBuf {
+    let mut d = Sha256::new();
+    d.update(seed);
+    d.update(params.size.to_le_bytes());
+    d.update(params.pre_size.to_le_bytes());
+    d.update(params.mixing_numbers.to_le_bytes());
+    dir.join(format!("rom-{}.bin", hex::encode(&d.finalize()[..16])))
+}
+
+/// Map the stored ROM for `seed` and check its header and size. Ok(None) if
+/// there is none; an error if a file exists but is truncated, its header is
+/// damaged or it does not match `seed` and `params`.
+pub fn load(dir: &Path, seed: &[u8], params: &RomParams) -> io::Result<Option<RomFile>> {
+    let path = path_for(dir, seed, params);
+    let file = match File::open(&path) {
+        Ok(f) => f,
+        Err(e) if e.kind() == io::ErrorKind::NotFound => return Ok(None),
+        Err(e) => return Err(e),
+    };
+    let len = file.metadata()?.len() as usize;
+    if len != DATA_OFFSET + params.size as usize {
+        return Err(bad(&path, "wrong size"));
+    }
+    let base = unsafe {
+        libc::mmap(
+            std::ptr::null_mut(),
+            len,
+            libc::PROT_READ,
+            libc::MAP_SHARED,
+            file.as_raw_fd(),
+            0,
+        )
+    };
+    if base == libc::MAP_FAILED {
+        return Err(io::Error::last_os_error());
+    }
+    let head = unsafe { std::slice::from_raw_parts(base as *const u8, DATA_OFFSET) };
+    let data_sum = le_u64(&head[40..48]);
+    let rom = RomFile { base: base as *mut u8, len, data_sum };
+    if seed.len() > MAX_SEED || head[..SEED_OFFSET + seed.len()] != encode_header(seed, params, data_sum)[..] {
+        return Err(bad(&path, "header damaged or does not match seed/parameters"));
+    }
+    unsafe {
+        // the whole file is about to be read: start the readahead now
+        libc::madvise(base, len, libc::MADV_WILLNEED);
+    }
+    Ok(Some(rom))
+}
+
+/// Write `data` as the stored ROM for `seed`, atomically replacing any
+/// existing file.
+pub fn store(dir: &Path, seed: &[u8], params: &RomParams, data: &[u8]) -> io::Result<PathBuf> {
+    if seed.len() > MAX_SEED {
+        return Err(io::Error::new(io::ErrorKind::InvalidInput, "ROM seed too long to store"));
+    }
+    fs::create_dir_all(dir)?;
+    let path = path_for(dir, seed, params);
+    let tmp = path.with_extension(format!("tmp.{}", std::process::id()));
+
+    let result = (|| {
+        let mut f = OpenOptions::new().write(true).create(true).truncate(true).open(&tmp)?;
+        let mut header = encode_header(seed, params, checksum(data));
+        header.resize(DATA_OFFSET, 0);
+        f.write_all(&header)?;
+        f.write_all(data)?;
+        f.sync_all()?;
+        fs::rename(&tmp, &path)
+    })();
+    if result.is_err() {
+        let _ = fs::remove_file(&tmp);
+    }
+    result.map(|_| path)
+}
+
+/// Header bytes up to the end of the seed.
+fn encode_header(seed: &[u8], params: &RomParams, data_sum: u64) -> Vec<u8> {
+    let mut h = Vec::with_capacity(SEED_OFFSET + seed.len());
+    h.extend_from_slice(MAGIC);
+    h.extend_from_slice(&(DATA_OFFSET as u32).to_le_bytes());
+    h.extend_from_slice(&(seed.len() as u32).to_le_bytes());
+    h.extend_from_slice(&params.size.to_le_bytes());
+    h.extend_from_slice(&params.pre_size.to_le_bytes());
+    h.extend_from_slice(&params.mixing_numbers.to_le_bytes());
+    h.extend_from_slice(&[0u8; 4]);
+    h.extend_from_slice(&data_sum.to_le_bytes());
+    let mut hs = checksum(&h);
+    hs ^= checksum(seed).rotate_left(17);
+    h.extend_from_slice(&hs.to_le_bytes());
+    h.resize(SEED_OFFSET, 0);
+    h.extend_from_slice(seed);
+    h
+}
+
+/// Fast 64-bit checksum for catching torn or corrupted files (not a
+/// cryptographic hash): four independent multiply-xor lanes over u64 words,
+/// so it runs near memory bandwidth on a 1 GiB ROM.
+pub fn checksum(data: &[u8]) -> u64 {
+    const K: u64 = 0x9E37_79B9_7F4A_7C15;
+    let mut lanes = [K, K ^ 1, K ^ 2, K ^ 3];
+    let mut chunks = data.chunks_exact(32);
+    for c in &mut chunks {
+        for (i, lane) in lanes.iter_mut().enumerate() {
+            let w = le_u64(&c[i * 8..i * 8 + 8]);
+            *lane = (*lane ^ w).wrapping_mul(K).rotate_left(29);
+        }
+    }
+    let mut h = data.len() as u64;
+    for lane in lanes {
+        h = (h ^ lane).wrapping_mul(K).rotate_left(31);
+    }
+    for &b in chunks.remainder() {
+        h = (h ^ b as u64).wrapping_mul(K);
+    }
+    h ^ (h >> 32)
+}
+
+fn le_u64(b: &[u8]) -> u64 {
+    let mut a = [0u8; 8];
+    a.copy_from_slice(&b[..8]);
+    u64::from_le_bytes(a)
+}
+
+fn bad(path: &Path, msg: &str) -> io::Error {
+    io::Error::new(io::ErrorKind::InvalidData, format!("{}: {}", path.display(), msg))
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    const SEED: &[u8] = b"0019c96b5f8e4b2d";
+
+    fn params(size: usize) -> RomParams {
+        RomParams { size: size as u64, pre_size: 64, mixing_numbers: 4 }
+    }
+
+    fn rom_data(size: usize) -> Vec<u8> {
+        (0..size).map(|i| (i * 31 % 251) as u8).collect()
+    }
+
+    /// A fresh directory per test, removed again on drop.
+    struct TempDir(PathBuf);
+
+    impl TempDir {
+        fn new(name: &str) -> TempDir {
+            let dir = std::env::temp_dir().join(format!("romstore-{}-{}", name, std::process::id()));
+            let _ = fs::remove_dir_all(&dir);
+            TempDir(dir)
+        }
+    }
+
+    impl Drop for TempDir {
+        fn drop(&mut self) {
+            let _ = fs::remove_dir_all(&self.0);
+        }
+    }
+
+    /// Overwrite the bytes at `at` in the stored ROM file.
+    fn patch(path: &Path, at: usize, bytes: &[u8]) {
+        let mut raw = fs::read(path).unwrap();
+        raw[at..at + bytes.len()].copy_from_slice(bytes);
+        fs::write(path, raw).unwrap();
+    }
+
+    #[test]
+    fn store_then_load_round_trips() {
+        let dir = TempDir::new("round-trip");
+        let (p, data) = (params(3 * 4096 + 5), rom_data(3 * 4096 + 5));
+        assert!(load(&dir.0, SEED, &p).unwrap().is_none());
+
+        let path = store(&dir.0, SEED, &p, &data).unwrap();
+        assert_eq!(path, path_for(&dir.0, SEED, &p));
+        assert_eq!(fs::read_dir(&dir.0).unwrap().count(), 1, "temporary file left behind");
+
+        let file = load(&dir.0, SEED, &p).unwrap().unwrap();
+        assert_eq!(file.data(), &data[..]);
+        assert_eq!(file.data_checksum(), checksum(&data));
+    }
+
+    #[test]
+    fn damaged_header_checksum_is_rejected() {
+        let dir = TempDir::new("header");
+        let p = params(4096);
+        let path = store(&dir.0, SEED, &p, &rom_data(4096)).unwrap();
+        patch(&path, 48, &[0u8; 8]);
+        assert_eq!(load(&dir.0, SEED, &p).err().unwrap().kind(), io::ErrorKind::InvalidData);
+    }
+
+    #[test]
+    fn torn_data_file_is_rejected() {
+        let dir = TempDir::new("torn");
+        let p = params(8192);
+        let path = store(&dir.0, SEED, &p, &rom_data(8192)).unwrap();
+        let f = OpenOptions::new().write(true).open(&path).unwrap();
+        f.set_len((DATA_OFFSET + 4096) as u64).unwrap();
+        assert_eq!(load(&dir.0, SEED, &p).err().unwrap().kind(), io::ErrorKind::InvalidData);
+    }
+
+    #[test]
+    fn params_mismatch_is_rejected() {
+        let dir = TempDir::new("params");
+        let (stored, other) = (params(4096), RomParams { mixing_numbers: 5, ..params(4096) });
+        let path = store(&dir.0, SEED, &stored, &rom_data(4096)).unwrap();
+        // other parameters look for another file...
+        assert!(load(&dir.0, SEED, &other).unwrap().is_none());
+        // ...and do not accept this one under that name
+        fs::rename(&path, path_for(&dir.0, SEED, &other)).unwrap();
+        assert_eq!(load(&dir.0, SEED, &other).err().unwrap().kind(), io::ErrorKind::InvalidData);
+    }
+
+    #[test]
+    fn damaged_data_is_left_to_the_data_checksum() {
+        let dir = TempDir::new("data");
+        let (p, data) = (params(4096), rom_data(4096));
+        let path = store(&dir.0, SEED, &p, &data).unwrap();
+        patch(&path, DATA_OFFSET + 100, &[data[100] ^ 0xFF]);
+        let file = load(&dir.0, SEED, &p).unwrap().unwrap();
+        assert_ne!(checksum(file.data()), file.data_checksum());
+    }
+}
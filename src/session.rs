@@ -0,0 +1,673 @@
+//! Per-connection job templates ("set job"), so clients send only nonces.
+//!
+//! A template is everything about a hash request except the nonce: the
+//! hasher for its ROM (built at registration), the difficulty mask
+//! and the preimage suffix, i.e. build_preimage() on the Python side without
+//! the nonce. Hashing a nonce writes its 16 hex digits in front of the suffix
+//! in a per-thread buffer that keeps the suffix from the last template it
+//! hashed, so most hashes copy only the nonce.
+//!
+//! Line protocol (one Session per connection):
+//!   #job <name> <rom> <mask_hex> <suffix>   -> "ok" | "err <reason>"
+//!   #nonces <name> <nonce_hex>...           -> one hash hex line per nonce
+//!   #search <name> <start_hex> <count>      -> "<hashed> [<nonce>:<hash> ...]"
+//!   #mine <name> <count> [counter|random]   -> "<hashed> [<nonce>:<hash> ...]"
+//!   #progress <name>                        -> "<hashed> <start_hex> <next_hex>"
+//!   #subscribe <name> [counter|random] [once]
+//!                                           -> "ok", then pushed lines (below)
+//!   #cancel <name>                          -> "ok"
+//!   #drop <name>                            -> "ok"
+//!   #multi <name> <rom> <mask_hex> <tail> <address>...
+//!                                           -> "ok <n>", then pushed lines
+//!
+//! `#search` hashes `count` consecutive nonces and lists only those that meet
+//! the mask. `#mine` picks the nonces itself, so clients generate none:
+//!
+//! - counter mode (default): every template with the same ROM and suffix,
+//!   on any connection, shares one nonce counter that starts at a random
+//!   point. Each compute task claims the next slice of it, so workers and
+//!   coordinator processes mining the same (address, challenge) never hash
+//!   a nonce twice, and `#progress` reports exactly what was covered.
+//! - random mode: each compute thread draws nonces from its own SplitMix64
+//!   stream.
+//!
+//! `#subscribe` mines the job like an endless `#mine` and pushes results on
+//! the connection as they happen, between replies to other requests:
+//!
+//!   !found <name> <nonce>:<hash>   as soon as a nonce meets the mask
+//!   !hashed <name> <n>             nonces hashed since the last one, at most
+//!                                  every PROGRESS_INTERVAL
+//!   !done <name> <hashed>          the subscription has stopped
+//!
+//! With `once` the subscription stops at its first winner.
+//!
+//! `#multi` mines one challenge for many addresses at once: it registers the
+//! job `<name>.<i>` for the i-th address (suffix `<address><tail>`, where the
+//! tail is the preimage after the address, all sharing one ROM) and
+//! subscribes to each with `once`. Subscription tasks requeue behind each
+//! other, so the compute threads rotate over the addresses still unsolved,
+//! and each address retires as soon as it has a winner. Pushes name the
+//! per-address job; a client whose submission failed resumes an address
+//! with `#subscribe <name>.<i> counter once`.
+//!
+//! `#cancel` stops every `#mine` and subscription on the job, i.e. on its
+//! ROM and suffix, on any connection, within one hash; the next request on
+//! the job runs normally again. `#drop` only forgets the job on this
+//! connection, stopping this connection's subscriptions on it; closing a
+//! connection stops all of them the same way.
+//!
+//! The binary protocol uses the same templates (OP_JOB, OP_NONCE, OP_MINE,
+//! OP_SUBSCRIBE, OP_CANCEL).
+
+use std::cell::{Cell, RefCell};
+use std::collections::HashMap;
+use std::io::{self, Write};
+use std::sync::atomic::{AtomicBool, AtomicU64, AtomicUsize, Ordering};
+use std::sync::mpsc::{self, RecvTimeoutError};
+use std::sync::{Arc, Mutex, OnceLock};
+use std::thread;
+use std::time::{Instant, SystemTime, UNIX_EPOCH};
+
+use crate::{
+    hash_meets_difficulty, job_hasher, pool, write_nonce_hex, DaemonMode, JobHasher, MAX_BATCH, PROGRESS_INTERVAL,
+};
+
+/// Most templates one connection may register.
+pub const MAX_JOBS: usize = 256;
+/// Nonces per compute-pool task of a "#search" or "#mine".
+const SEARCH_CHUNK: u64 = 256;
+
+static NEXT_SERIAL: AtomicU64 = AtomicU64::new(1);
+
+thread_local! {
+    /// (serial of the template whose suffix is in the buffer, preimage)
+    static PREIMAGE: RefCell<(u64, Vec<u8>)> = const { RefCell::new((0, Vec::new())) };
+    /// This thread's SplitMix64 state for random-mode nonces (0 = unseeded).
+    static RNG: Cell<u64> = const { Cell::new(0) };
+}
+
+/// Nonce counter shared by all templates with the same ROM and suffix.
+pub struct NonceCounter {
+    start: u64,
+    next: AtomicU64,
+    hashed: AtomicU64,
+    /// Bumped by `cancel`; mining started under an older value stops.
+    epoch: AtomicU64,
+}
+
+/// Hashes found by one mining request: (hashed, winners).
+pub type Mined = (u64, Vec<(u64, [u8; 64])>);
+
+/// What a subscription reports, from compute threads.
+pub enum Event {
+    Found(u64, [u8; 64]),
+    Hashed(u64),
+    /// Stopped, after this many hashes in total. Always the last event.
+    Done(u64),
+}
+
+/// Counters by ROM and suffix. They live as long as the daemon: one per
+/// (address, challenge) ever mined, a few hundred bytes each.
+fn counter_for(rom: &str, suffix: &[u8]) -> Arc<NonceCounter> {
+    static COUNTERS: OnceLock<Mutex<HashMap<(String, Vec<u8>), Arc<NonceCounter>>>> = OnceLock::new();
+    let mut map = COUNTERS.get_or_init(Default::default).lock().unwrap();
+    map.entry((rom.to_string(), suffix.to_vec()))
+        .or_insert_with(|| {
+            // a random start, so a restarted daemon does not redo old nonces
+            let start = splitmix64(&mut seed_from_clock());
+            Arc::new(NonceCounter {
+                start,
+                next: AtomicU64::new(start),
+                hashed: AtomicU64::new(0),
+                epoch: AtomicU64::new(0),
+            })
+        })
+        .clone()
+}
+
+fn seed_from_clock() -> u64 {
+    let t = SystemTime::now().duration_since(UNIX_EPOCH).map(|d| d.as_nanos() as u64).unwrap_or(1);
+    t ^ ((std::process::id() as u64) << 32) ^ NEXT_SERIAL.fetch_add(1, Ordering::Relaxed)
+}
+
+fn splitmix64(state: &mut u64) -> u64 {
+    *state = state.wrapping_add(0x9E37_79B9_7F4A_7C15);
+    let mut z = *state;
+    z = (z ^ (z >> 30)).wrapping_mul(0xBF58_476D_1CE4_E5B9);
+    z = (z ^ (z >> 27)).wrapping_mul(0x94D0_49BB_1331_11EB);
+    z ^ (z >> 31)
+}
+
+pub struct JobTemplate {
+    /// Tells templates apart in the per-thread preimage buffers.
+    serial: u64,
+    hasher: JobHasher,
+    pub mask: u32,
+    suffix: Vec<u8>,
+    /// Nonce source for `mine`, shared with same-ROM-and-suffix templates.
+    counter: OnceLock<Arc<NonceCounter>>,
+    rom: String,
+}
+
+impl JobTemplate {
+    pub fn new(hasher: JobHasher, mask: u32, suffix: Vec<u8>) -> JobTemplate {
+        JobTemplate::for_rom(hasher, "", mask, suffix)
+    }
+
+    /// A template whose ROM seed is known, so that `mine` can share nonce
+    /// counters with other templates for the same ROM and suffix.
+    pub fn for_rom(hasher: JobHasher, rom: &str, mask: u32, suffix: Vec<u8>) -> JobTemplate {
+        JobTemplate {
+            serial: NEXT_SERIAL.fetch_add(1, Ordering::Relaxed),
+            hasher,
+            mask,
+            suffix,
+            counter: OnceLock::new(),
+            rom: rom.to_string(),
+        }
+    }
+
+    fn counter(&self) -> &NonceCounter {
+        self.counter.get_or_init(|| counter_for(&self.rom, &self.suffix))
+    }
+
+    /// Hash `count` nonces the daemon picks (see the module docs) on the
+    /// compute pool, without blocking, and call `done` with the result.
+    pub fn mine(self: &Arc<Self>, count: u64, random: bool, done: impl FnOnce(Mined) + Send + 'static) {
+        struct Acc {
+            left: AtomicUsize,
+            result: Mutex<Mined>,
+            done: Mutex<Option<Box<dyn FnOnce(Mined) + Send>>>,
+        }
+        let tasks = count.div_ceil(SEARCH_CHUNK).max(1);
+        let epoch = self.counter().epoch.load(Ordering::Relaxed);
+        let acc = Arc::new(Acc {
+            left: AtomicUsize::new(tasks as usize),
+            result: Mutex::new((0, Vec::new())),
+            done: Mutex::new(Some(Box::new(done))),
+        });
+        for i in 0..tasks {
+            let n = SEARCH_CHUNK.min(count - (i * SEARCH_CHUNK).min(count));
+            let (job, acc) = (self.clone(), acc.clone());
+            pool::spawn(move || {
+                let (hashed, winners) = job.mine_chunk(n, random, &|| job.cancelled(epoch));
+                {
+                    let mut r = acc.result.lock().unwrap();
+                    r.0 += hashed;
+                    r.1.extend(winners);
+                }
+                // the last task to finish reports
+                if acc.left.fetch_sub(1, Ordering::AcqRel) == 1 {
+                    let result = std::mem::take(&mut *acc.result.lock().unwrap());
+                    if let Some(done) = acc.done.lock().unwrap().take() {
+                        done(result);
+                    }
+                }
+            });
+        }
+    }
+
+    /// Hash up to `n` nonces, checking `cancelled` before each one.
+    fn mine_chunk(&self, n: u64, random: bool, cancelled: &dyn Fn() -> bool) -> Mined {
+        let mut winners = Vec::new();
+        let mut hashed = 0;
+        if !random {
+            // claim the next slice of the shared counter
+            let c = self.counter();
+            let from = c.next.fetch_add(n, Ordering::Relaxed);
+            while hashed < n && !cancelled() {
+                let nonce = from.wrapping_add(hashed);
+                let h = self.hash_nonce(nonce);
+                if hash_meets_difficulty(&h, self.mask) {
+                    winners.push((nonce, h));
+                }
+                hashed += 1;
+            }
+            c.hashed.fetch_add(hashed, Ordering::Relaxed);
+            return (hashed, winners);
+        }
+        RNG.with(|rng| {
+            let mut state = rng.get();
+            if state == 0 {
+                state = seed_from_clock();
+            }
+            while hashed < n && !cancelled() {
+                let nonce = splitmix64(&mut state);
+                let h = self.hash_nonce(nonce);
+                if hash_meets_difficulty(&h, self.mask) {
+                    winners.push((nonce, h));
+                }
+                hashed += 1;
+            }
+            rng.set(state);
+            (hashed, winners)
+        })
+    }
+
+    /// Mine this job until `stop` is set, the job is cancelled or, with
+    /// `once`, a winner has been found, keeping
+    /// one task per compute thread queued and reporting through `on_event`.
+    /// Tasks requeue themselves after every chunk, so other requests still
+    /// get their turn on the pool.
+    pub fn subscribe(
+        self: &Arc<Self>,
+        random: bool,
+        once: bool,
+        stop: Arc<AtomicBool>,
+        on_event: impl Fn(Event) + Send + Sync + 'static,
+    ) {
+        let tasks = pool::threads();
+        let sub = Arc::new(Subscription {
+            job: self.clone(),
+            random,
+            once,
+            epoch: self.counter().epoch.load(Ordering::Relaxed),
+            stop,
+            left: AtomicUsize::new(tasks),
+            hashed: AtomicU64::new(0),
+            on_event: Box::new(on_event),
+        });
+        for _ in 0..tasks {
+            let sub = sub.clone();
+            pool::spawn(move || sub.step());
+        }
+    }
+
+    /// Stop every `mine` and `subscribe` on this job (on any connection)
+    /// within one hash. Requests started afterwards run normally.
+    pub fn cancel(&self) {
+        self.counter().epoch.fetch_add(1, Ordering::Relaxed);
+    }
+
+    /// The current cancel epoch, for `cancelled`.
+    pub fn epoch(&self) -> u64 {
+        self.counter().epoch.load(Ordering::Relaxed)
+    }
+
+    /// Whether `cancel` was called since `epoch` was read.
+    pub fn cancelled(&self, epoch: u64) -> bool {
+        self.counter().epoch.load(Ordering::Relaxed) != epoch
+    }
+
+    /// Counter-mode coverage: (hashed, first nonce, next nonce to hand out).
+    pub fn progress(&self) -> (u64, u64, u64) {
+        let c = self.counter();
+        (c.hashed.load(Ordering::Relaxed), c.start, c.next.load(Ordering::Relaxed))
+    }
+
+    /// Hash `hex16(nonce) + suffix`.
+    pub fn hash_nonce(&self, nonce: u64) -> [u8; 64] {
+        PREIMAGE.with(|buf| {
+            let mut buf = buf.borrow_mut();
+            let (serial, pre) = &mut *buf;
+            if *serial != self.serial {
+                pre.clear();
+                pre.resize(16, b'0');
+                pre.extend_from_slice(&self.suffix);
+                *serial = self.serial;
+            }
+            write_nonce_hex(&mut pre[..16], nonce);
+            (self.hasher)(pre)
+        })
+    }
+
+    /// Hash nonces [start, end), checking `cancelled` before each one, and
+    /// return (hashed, winners).
+    pub fn search(&self, start: u64, end: u64, cancelled: &dyn Fn() -> bool) -> Mined {
+        let mut winners = Vec::new();
+        let mut nonce = start;
+        while nonce < end && !cancelled() {
+            let h = self.hash_nonce(nonce);
+            if hash_meets_difficulty(&h, self.mask) {
+                winners.push((nonce, h));
+            }
+            nonce += 1;
+        }
+        (nonce - start, winners)
+    }
+}
+
+struct Subscription {
+    job: Arc<JobTemplate>,
+    random: bool,
+    /// Stop at the first winner.
+    once: bool,
+    epoch: u64,
+    stop: Arc<AtomicBool>,
+    /// Tasks still running.
+    left: AtomicUsize,
+    hashed: AtomicU64,
+    on_event: Box<dyn Fn(Event) + Send + Sync>,
+}
+
+impl Subscription {
+    fn stopped(&self) -> bool {
+        self.stop.load(Ordering::Relaxed) || self.job.cancelled(self.epoch)
+    }
+
+    /// One chunk, then requeue; the last task to stop reports Done.
+    fn step(self: Arc<Self>) {
+        if !self.stopped() {
+            let (n, winners) = self.job.mine_chunk(SEARCH_CHUNK, self.random, &|| self.stopped());
+            self.hashed.fetch_add(n, Ordering::Relaxed);
+            if self.once && !winners.is_empty() {
+                self.stop.store(true, Ordering::Relaxed);
+            }
+            for (nonce, h) in winners {
+                (self.on_event)(Event::Found(nonce, h));
+            }
+            (self.on_event)(Event::Hashed(n));
+            if !self.stopped() {
+                pool::spawn(move || self.step());
+                return;
+            }
+        }
+        if self.left.fetch_sub(1, Ordering::AcqRel) == 1 {
+            (self.on_event)(Event::Done(self.hashed.load(Ordering::Relaxed)));
+        }
+    }
+}
+
+/// A subscription event of one line-protocol connection, by job name.
+type Push = (String, Event);
+
+/// Start the thread that writes a connection's pushed lines. Found hashes
+/// are written at once; hash counts are summed per job and written every
+/// PROGRESS_INTERVAL. It ends when the connection and all its
+/// subscriptions are gone, or the client stops reading.
+fn spawn_pusher<W: Write + Send + 'static>(writer: Arc<Mutex<W>>) -> mpsc::Sender<Push> {
+    let (tx, rx) = mpsc::channel::<Push>();
+    thread::Builder::new()
+        .name("ash-push".to_string())
+        .spawn(move || {
+            let mut hashed: HashMap<String, u64> = HashMap::new();
+            let mut last = Instant::now();
+            loop {
+                let mut out = String::new();
+                match rx.recv_timeout(PROGRESS_INTERVAL.saturating_sub(last.elapsed())) {
+                    Ok((name, Event::Found(nonce, h))) => {
+                        out.push_str(&format!("!found {} {:016x}:{}\n", name, nonce, hex::encode(h)));
+                    }
+                    Ok((name, Event::Hashed(n))) => *hashed.entry(name).or_default() += n,
+                    Ok((name, Event::Done(total))) => {
+                        if let Some(n) = hashed.remove(&name).filter(|n| *n > 0) {
+                            out.push_str(&format!("!hashed {} {}\n", name, n));
+                        }
+                        out.push_str(&format!("!done {} {}\n", name, total));
+                    }
+                    Err(RecvTimeoutError::Timeout) => {}
+                    Err(RecvTimeoutError::Disconnected) => return,
+                }
+                if last.elapsed() >= PROGRESS_INTERVAL {
+                    for (name, n) in hashed.iter_mut().filter(|(_, n)| **n > 0) {
+                        out.push_str(&format!("!hashed {} {}\n", name, n));
+                        *n = 0;
+                    }
+                    last = Instant::now();
+                }
+                if !out.is_empty() {
+                    let mut w = writer.lock().unwrap();
+                    if w.write_all(out.as_bytes()).and_then(|_| w.flush()).is_err() {
+                        return;
+                    }
+                }
+            }
+        })
+        .expect("failed to spawn push thread");
+    tx
+}
+
+/// Templates registered on one line-protocol connection, by client name.
+#[derive(Default)]
+pub struct Session {
+    jobs: HashMap<String, Arc<JobTemplate>>,
+    /// Stop flags of this connection's subscriptions, by job name.
+    subs: Vec<(String, Arc<AtomicBool>)>,
+    push: Option<mpsc::Sender<Push>>,
+}
+
+impl Drop for Session {
+    /// The client is gone: stop its subscriptions.
+    fn drop(&mut self) {
+        for (_, stop) in &self.subs {
+            stop.store(true, Ordering::Relaxed);
+        }
+    }
+}
+
+impl Session {
+    /// True for the lines `handle` serves.
+    pub fn is_session_line(line: &str) -> bool {
+        ["#job ", "#nonces ", "#search ", "#mine ", "#progress ", "#subscribe ", "#cancel ", "#drop ", "#multi "]
+            .iter()
+            .any(|p| line.starts_with(p))
+    }
+
+    /// Serve one session line (see is_session_line) and write its reply.
+    /// `writer` is shared with the thread writing subscription pushes.
+    pub fn handle<W: Write + Send + 'static>(
+        &mut self,
+        line: &str,
+        mode: &DaemonMode,
+        writer: &Arc<Mutex<W>>,
+    ) -> io::Result<()> {
+        let (cmd, rest) = line.split_once(' ').unwrap_or((line, ""));
+        let reply = match cmd {
+            "#job" => self.set_job(rest, mode),
+            "#nonces" => self.nonces(rest),
+            "#search" => self.search(rest),
+            "#mine" => self.mine(rest),
+            "#subscribe" => return self.subscribe(rest, writer),
+            "#multi" => return self.multi(rest, mode, writer),
+            "#drop" => self.drop_job(rest.trim()),
+            "#cancel" => self.job(rest.trim()).map(|job| {
+                job.cancel();
+                "ok".to_string()
+            }),
+            _ => self.progress(rest),
+        };
+        let mut w = writer.lock().unwrap();
+        match reply {
+            Ok(r) => writeln!(w, "{}", r),
+            Err(e) => writeln!(w, "err {}", e),
+        }
+    }
+
+    fn set_job(&mut self, args: &str, mode: &DaemonMode) -> Result<String, String> {
+        let mut parts = args.splitn(4, ' ');
+        let (name, rom, mask, suffix) = match (parts.next(), parts.next(), parts.next(), parts.next()) {
+            (Some(n), Some(r), Some(m), Some(s)) if !n.is_empty() => (n, r, m, s),
+            _ => return Err("usage: #job <name> <rom> <mask_hex> <suffix>".to_string()),
+        };
+        let mask = u32::from_str_radix(mask, 16).map_err(|e| format!("bad mask {:?}: {}", mask, e))?;
+        if self.jobs.len() >= MAX_JOBS && !self.jobs.contains_key(name) {
+            return Err("too many jobs on this connection".to_string());
+        }
+        let hasher = job_hasher(mode, rom).map_err(|e| e.to_string())?;
+        let template = JobTemplate::for_rom(hasher, rom, mask, suffix.as_bytes().to_vec());
+        self.jobs.insert(name.to_string(), Arc::new(template));
+        Ok("ok".to_string())
+    }
+
+    fn job(&self, name: &str) -> Result<Arc<JobTemplate>, String> {
+        self.jobs.get(name).cloned().ok_or_else(|| format!("unknown job {:?}", name))
+    }
+
+    fn nonces(&self, args: &str) -> Result<String, String> {
+        let mut parts = args.split_whitespace();
+        let job = self.job(parts.next().unwrap_or(""))?;
+        let nonces = parts
+            .map(|n| u64::from_str_radix(n, 16).map_err(|_| format!("bad nonce {:?}", n)))
+            .collect::<Result<Vec<u64>, String>>()?;
+        if nonces.len() > MAX_BATCH {
+            return Err(format!("more than {} nonces", MAX_BATCH));
+        }
+        let hashes = pool::map(nonces, move |n| hex::encode(job.hash_nonce(n)));
+        Ok(hashes.join("\n"))
+    }
+
+    fn search(&self, args: &str) -> Result<String, String> {
+        let mut parts = args.split_whitespace();
+        let job = self.job(parts.next().unwrap_or(""))?;
+        let start = parts.next().and_then(|s| u64::from_str_radix(s, 16).ok());
+        let count = parts.next().and_then(|c| c.parse::<u64>().ok());
+        let (start, count) = match (start, count) {
+            (Some(s), Some(c)) if c <= MAX_BATCH as u64 => (s, c),
+            _ => return Err("usage: #search <name> <start_hex> <count>".to_string()),
+        };
+        let end = start.saturating_add(count);
+        let chunks: Vec<u64> = (start..end).step_by(SEARCH_CHUNK as usize).collect();
+        let results = pool::map(chunks, move |from| {
+            job.search(from, from.saturating_add(SEARCH_CHUNK).min(end), &|| false)
+        });
+        let hashed = results.iter().map(|r| r.0).sum();
+        let winners: Vec<_> = results.into_iter().flat_map(|r| r.1).collect();
+        Ok(mined_reply(&(hashed, winners)))
+    }
+
+    fn mine(&self, args: &str) -> Result<String, String> {
+        let mut parts = args.split_whitespace();
+        let job = self.job(parts.next().unwrap_or(""))?;
+        let count = match parts.next().and_then(|c| c.parse::<u64>().ok()) {
+            Some(c) if c <= MAX_BATCH as u64 => c,
+            _ => return Err("usage: #mine <name> <count> [counter|random]".to_string()),
+        };
+        let random = nonce_mode(parts.next())?;
+        let (tx, rx) = std::sync::mpsc::channel();
+        job.mine(count, random, move |r| {
+            let _ = tx.send(r);
+        });
+        let mined = rx.recv().map_err(|_| "compute task panicked".to_string())?;
+        Ok(mined_reply(&mined))
+    }
+
+    fn subscribe<W: Write + Send + 'static>(&mut self, args: &str, writer: &Arc<Mutex<W>>) -> io::Result<()> {
+        let mut parts = args.split_whitespace();
+        let name = parts.next().unwrap_or("").to_string();
+        let (mut random, mut once) = (false, false);
+        let mut started = self.job(&name);
+        for opt in parts {
+            match opt {
+                "once" => once = true,
+                m => match nonce_mode(Some(m)) {
+                    Ok(r) => random = r,
+                    Err(e) => started = Err(e),
+                },
+            }
+        }
+        let job = match started {
+            Ok(job) => job,
+            Err(e) => return writeln!(writer.lock().unwrap(), "err {}", e),
+        };
+        reply_now(writer, "ok")?;
+        self.start_subscription(name, &job, random, once, writer);
+        Ok(())
+    }
+
+    fn multi<W: Write + Send + 'static>(
+        &mut self,
+        args: &str,
+        mode: &DaemonMode,
+        writer: &Arc<Mutex<W>>,
+    ) -> io::Result<()> {
+        let jobs = self.set_multi(args, mode);
+        let jobs = match jobs {
+            Ok(jobs) => jobs,
+            Err(e) => return writeln!(writer.lock().unwrap(), "err {}", e),
+        };
+        reply_now(writer, &format!("ok {}", jobs.len()))?;
+        for (name, job) in jobs {
+            self.start_subscription(name, &job, false, true, writer);
+        }
+        Ok(())
+    }
+
+    /// Register the per-address jobs of a "#multi" line.
+    fn set_multi(&mut self, args: &str, mode: &DaemonMode) -> Result<Vec<(String, Arc<JobTemplate>)>, String> {
+        let mut parts = args.split_whitespace();
+        let usage = || "usage: #multi <name> <rom> <mask_hex> <tail> <address>...".to_string();
+        let (name, rom, mask, tail) = match (parts.next(), parts.next(), parts.next(), parts.next()) {
+            (Some(n), Some(r), Some(m), Some(t)) => (n, r, m, t),
+            _ => return Err(usage()),
+        };
+        let addresses: Vec<&str> = parts.collect();
+        if addresses.is_empty() {
+            return Err(usage());
+        }
+        let mask = u32::from_str_radix(mask, 16).map_err(|e| format!("bad mask {:?}: {}", mask, e))?;
+        if self.jobs.len() + addresses.len() > MAX_JOBS {
+            return Err("too many jobs on this connection".to_string());
+        }
+        // one ROM for every address
+        let hasher = job_hasher(mode, rom).map_err(|e| e.to_string())?;
+        let mut jobs = Vec::with_capacity(addresses.len());
+        for (i, address) in addresses.iter().enumerate() {
+            let suffix = [address.as_bytes(), tail.as_bytes()].concat();
+            let job = Arc::new(JobTemplate::for_rom(hasher.clone(), rom, mask, suffix));
+            let job_name = format!("{}.{}", name, i);
+            self.jobs.insert(job_name.clone(), job.clone());
+            jobs.push((job_name, job));
+        }
+        Ok(jobs)
+    }
+
+    /// Start mining `job`, pushing its events under `name`.
+    fn start_subscription<W: Write + Send + 'static>(
+        &mut self,
+        name: String,
+        job: &Arc<JobTemplate>,
+        random: bool,
+        once: bool,
+        writer: &Arc<Mutex<W>>,
+    ) {
+        let push = self.push.get_or_insert_with(|| spawn_pusher(writer.clone())).clone();
+        let stop = Arc::new(AtomicBool::new(false));
+        self.subs.retain(|(_, s)| Arc::strong_count(s) > 1);
+        self.subs.push((name.clone(), stop.clone()));
+        job.subscribe(random, once, stop, move |e| {
+            let _ = push.send((name.clone(), e));
+        });
+    }
+
+    fn drop_job(&mut self, name: &str) -> Result<String, String> {
+        self.jobs.remove(name).ok_or_else(|| format!("unknown job {:?}", name))?;
+        self.subs.retain(|(n, stop)| {
+            if n == name {
+                stop.store(true, Ordering::Relaxed);
+            }
+            n != name
+        });
+        Ok("ok".to_string())
+    }
+
+    fn progress(&self, args: &str) -> Result<String, String> {
+        let (hashed, start, next) = self.job(args.trim())?.progress();
+        Ok(format!("{} {:016x} {:016x}", hashed, start, next))
+    }
+}
+
+/// Write and flush a reply before starting work that pushes lines, so that
+/// no push can come ahead of it.
+fn reply_now<W: Write>(writer: &Mutex<W>, reply: &str) -> io::Result<()> {
+    let mut w = writer.lock().unwrap();
+    writeln!(w, "{}", reply)?;
+    w.flush()
+}
+
+/// "counter" (the default) or "random" -> random?
+fn nonce_mode(arg: Option<&str>) -> Result<bool, String> {
+    match arg {
+        None | Some("counter") => Ok(false),
+        Some("random") => Ok(true),
+        Some(m) => Err(format!("unknown nonce mode {:?}", m)),
+    }
+}
+
+/// "<hashed> [<nonce>:<hash> ...]"
+fn mined_reply((hashed, winners): &Mined) -> String {
+    let mut reply = hashed.to_string();
+    for (nonce, h) in winners {
+        reply.push_str(&format!(" {:016x}:{}", nonce, hex::encode(h)));
+    }
+    reply
+}
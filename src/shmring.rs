@@ -0,0 +1,371 @@
+//! Shared-memory submission/completion ring between a coordinator and the
+//! daemon, so hash requests and results never pass through the kernel.
+//!
+//! The coordinator creates a file (normally under /dev/shm), lays out the
+//! header below, then sends "#ring <path>" on an ordinary connection. The
+//! daemon maps the file and serves it until that connection closes: one
+//! dispatcher thread claims submissions and hands them to the compute pool
+//! in small batches. All integers are little-endian.
+//!
+//! ```text
+//! 0     magic "ASHRING1"
+//! 8     u32 slots (power of two)     12  u32 job_slots
+//! 64    u64 sub_tail      daemon: next submission to claim (CAS)
+//! 128   u64 comp_reserve  daemon: next completion slot to fill (fetch_add)
+//! 192   u64 comp_tail     coordinator: completions consumed so far
+//! 256   u32 sub_bell      futex, bumped by the coordinator after submitting
+//! 260   u32 sub_waiters   daemon dispatcher sleeping on sub_bell
+//! 320   u32 comp_bell     futex, bumped by the daemon after completing
+//! 324   u32 comp_waiters  coordinator sleeping on comp_bell
+//! 512   job table: job_slots x JOB_SIZE
+//!         u32 gen (odd while being rewritten), u32 mask,
+//!         u16 rom_len, u16 suffix_len, rom @16, suffix @JOB_SUFFIX
+//! ...   submissions: slots x 32 bytes
+//!         u64 seq, u64 req_id, u64 nonce, u32 job, u32 flags
+//! ...   completions: slots x 96 bytes
+//!         u64 seq, u64 req_id, u32 matched, u32 job, 64 hash bytes
+//! ```
+//!
+//! A slot is valid for lap `n` when its seq equals `n + 1`. The coordinator is
+//! the only submitter and the only completion consumer; any number of daemon
+//! threads may claim submissions and publish completions. The job entry holds the
+//! challenge's ROM seed, difficulty mask and preimage suffix, so a submission
+//! only carries the nonce. The hashed preimage is `hex16(nonce) + suffix`.
+
+use std::fs::OpenOptions;
+use std::io;
+use std::os::unix::io::AsRawFd;
+use std::sync::atomic::{AtomicBool, AtomicU32, AtomicU64, Ordering};
+use std::sync::Arc;
+use std::thread;
+use std::time::Duration;
+
+use crate::session::JobTemplate;
+use crate::{hash_meets_difficulty, job_hasher, pool, DaemonMode};
+
+pub const MAGIC: &[u8; 8] = b"ASHRING1";
+pub const HEADER_SIZE: usize = 512;
+pub const JOB_SIZE: usize = 1024;
+pub const JOB_SUFFIX: usize = 272;
+pub const SUB_SIZE: usize = 32;
+pub const COMP_SIZE: usize = 96;
+
+const OFF_SLOTS: usize = 8;
+const OFF_JOB_SLOTS: usize = 12;
+const OFF_SUB_TAIL: usize = 64;
+const OFF_COMP_RESERVE: usize = 128;
+const OFF_COMP_TAIL: usize = 192;
+const OFF_SUB_BELL: usize = 256;
+const OFF_SUB_WAITERS: usize = 260;
+const OFF_COMP_BELL: usize = 320;
+const OFF_COMP_WAITERS: usize = 324;
+
+/// Upper bound on ring slots, to keep a bad header from mapping huge files.
+const MAX_SLOTS: usize = 1 << 20;
+const MAX_JOB_SLOTS: usize = 1024;
+/// How long an idle thread sleeps on a doorbell before re-checking state.
+const BELL_TIMEOUT: Duration = Duration::from_millis(50);
+/// Most submissions handed to one compute-pool task.
+const DISPATCH_BATCH: usize = 16;
+
+/// A mapped ring file. Unmapped on drop.
+pub struct Ring {
+    base: *mut u8,
+    len: usize,
+    slots: usize,
+    job_slots: usize,
+}
+
+// The mapping is shared memory accessed only through atomics or after the
+// seq/gen handshakes above.
+unsafe impl Send for Ring {}
+unsafe impl Sync for Ring {}
+
+impl Drop for Ring {
+    fn drop(&mut self) {
+        unsafe {
+            libc::munmap(self.base as *mut libc::c_void, self.len);
+        }
+    }
+}
+
+/// A job table entry as last seen by the dispatcher.
+struct CachedJob {
+    gen: u32,
+    template: JobTemplate,
+}
+
+impl Ring {
+    /// Map the ring file created by the coordinator and check its header.
+    pub fn open(path: &str) -> io::Result<Ring> {
+        let file = OpenOptions::new().read(true).write(true).open(path)?;
+        let len = file.metadata()?.len() as usize;
+        if len < HEADER_SIZE {
+            return Err(bad("ring file too small"));
+        }
+        let base = unsafe {
+            libc::mmap(
+                std::ptr::null_mut(),
+                len,
+                libc::PROT_READ | libc::PROT_WRITE,
+                libc::MAP_SHARED,
+                file.as_raw_fd(),
+                0,
+            )
+        };
+        if base == libc::MAP_FAILED {
+            return Err(io::Error::last_os_error());
+        }
+        let mut ring = Ring { base: base as *mut u8, len, slots: 0, job_slots: 0 };
+
+        let header = unsafe { std::slice::from_raw_parts(ring.base, HEADER_SIZE) };
+        if &header[..8] != MAGIC {
+            return Err(bad("bad ring magic"));
+        }
+        let slots = ring.u32_at(OFF_SLOTS).load(Ordering::Acquire) as usize;
+        let job_slots = ring.u32_at(OFF_JOB_SLOTS).load(Ordering::Acquire) as usize;
+        if slots == 0 || !slots.is_power_of_two() || slots > MAX_SLOTS
+            || job_slots == 0 || job_slots > MAX_JOB_SLOTS
+        {
+            return Err(bad("bad ring geometry"));
+        }
+        if len < HEADER_SIZE + job_slots * JOB_SIZE + slots * (SUB_SIZE + COMP_SIZE) {
+            return Err(bad("ring file shorter than its geometry"));
+        }
+        ring.slots = slots;
+        ring.job_slots = job_slots;
+        Ok(ring)
+    }
+
+    pub fn slots(&self) -> usize {
+        self.slots
+    }
+
+    fn u32_at(&self, off: usize) -> &AtomicU32 {
+        unsafe { &*(self.base.add(off) as *const AtomicU32) }
+    }
+
+    fn u64_at(&self, off: usize) -> &AtomicU64 {
+        unsafe { &*(self.base.add(off) as *const AtomicU64) }
+    }
+
+    fn bytes(&self, off: usize, len: usize) -> &[u8] {
+        unsafe { std::slice::from_raw_parts(self.base.add(off), len) }
+    }
+
+    fn job_off(&self, job: usize) -> usize {
+        HEADER_SIZE + job * JOB_SIZE
+    }
+
+    fn sub_off(&self, idx: u64) -> usize {
+        HEADER_SIZE + self.job_slots * JOB_SIZE + (idx as usize & (self.slots - 1)) * SUB_SIZE
+    }
+
+    fn comp_off(&self, idx: u64) -> usize {
+        HEADER_SIZE + self.job_slots * JOB_SIZE + self.slots * SUB_SIZE
+            + (idx as usize & (self.slots - 1)) * COMP_SIZE
+    }
+
+    /// Claim the next submission: (req_id, nonce, job, flags). Returns None
+    /// when nothing is pending, or when every completion slot is already
+    /// spoken for, so claimed work can always complete without waiting.
+    fn claim(&self) -> Option<(u64, u64, u32, u32)> {
+        let tail = self.u64_at(OFF_SUB_TAIL);
+        loop {
+            let t = tail.load(Ordering::Acquire);
+            if t.wrapping_sub(self.u64_at(OFF_COMP_TAIL).load(Ordering::Acquire)) >= self.slots as u64 {
+                return None;
+            }
+            let off = self.sub_off(t);
+            if self.u64_at(off).load(Ordering::Acquire) != t + 1 {
+                return None;
+            }
+            let req_id = self.u64_at(off + 8).load(Ordering::Relaxed);
+            let nonce = self.u64_at(off + 16).load(Ordering::Relaxed);
+            let job = self.u32_at(off + 24).load(Ordering::Relaxed);
+            let flags = self.u32_at(off + 28).load(Ordering::Relaxed);
+            if tail.compare_exchange(t, t + 1, Ordering::AcqRel, Ordering::Relaxed).is_ok() {
+                return Some((req_id, nonce, job, flags));
+            }
+        }
+    }
+
+    /// Publish one completion, waiting for the coordinator to free a slot.
+    fn complete(&self, req_id: u64, matched: bool, job: u32, hash: &[u8; 64], stop: &AtomicBool) {
+        let c = self.u64_at(OFF_COMP_RESERVE).fetch_add(1, Ordering::AcqRel);
+        while c.wrapping_sub(self.u64_at(OFF_COMP_TAIL).load(Ordering::Acquire)) >= self.slots as u64 {
+            if stop.load(Ordering::Relaxed) {
+                return;
+            }
+            thread::yield_now();
+        }
+        let off = self.comp_off(c);
+        self.u64_at(off + 8).store(req_id, Ordering::Relaxed);
+        self.u32_at(off + 16).store(matched as u32, Ordering::Relaxed);
+        self.u32_at(off + 20).store(job, Ordering::Relaxed);
+        unsafe {
+            std::ptr::copy_nonoverlapping(hash.as_ptr(), self.base.add(off + 32), 64);
+        }
+        self.u64_at(off).store(c + 1, Ordering::Release);
+
+        self.u32_at(OFF_COMP_BELL).fetch_add(1, Ordering::Release);
+        if self.u32_at(OFF_COMP_WAITERS).load(Ordering::Acquire) > 0 {
+            futex_wake(self.u32_at(OFF_COMP_BELL));
+        }
+    }
+
+    /// Read job entry `job` under its generation counter. None if the entry
+    /// is being rewritten or is malformed.
+    fn read_job(&self, job: usize) -> Option<(u32, u32, String, Vec<u8>)> {
+        if job >= self.job_slots {
+            return None;
+        }
+        let off = self.job_off(job);
+        let gen_cell = self.u32_at(off);
+        let gen = gen_cell.load(Ordering::Acquire);
+        if gen == 0 || gen & 1 == 1 {
+            return None;
+        }
+        let mask = self.u32_at(off + 4).load(Ordering::Relaxed);
+        let lens = self.u32_at(off + 8).load(Ordering::Relaxed);
+        let (rom_len, suffix_len) = ((lens & 0xffff) as usize, (lens >> 16) as usize);
+        if 16 + rom_len > JOB_SUFFIX || JOB_SUFFIX + suffix_len > JOB_SIZE {
+            return None;
+        }
+        let rom = String::from_utf8_lossy(self.bytes(off + 16, rom_len)).into_owned();
+        let suffix = self.bytes(off + JOB_SUFFIX, suffix_len).to_vec();
+        std::sync::atomic::fence(Ordering::Acquire);
+        if gen_cell.load(Ordering::Relaxed) != gen {
+            return None;
+        }
+        Some((gen, mask, rom, suffix))
+    }
+
+    /// Sleep until the coordinator rings the submission bell (or timeout).
+    fn wait_for_submissions(&self) {
+        let bell = self.u32_at(OFF_SUB_BELL);
+        let seen = bell.load(Ordering::Acquire);
+        let waiters = self.u32_at(OFF_SUB_WAITERS);
+        waiters.fetch_add(1, Ordering::AcqRel);
+        // re-check after announcing ourselves, so a bell rung in between is not lost
+        let t = self.u64_at(OFF_SUB_TAIL).load(Ordering::Acquire);
+        if self.u64_at(self.sub_off(t)).load(Ordering::Acquire) != t + 1 {
+            futex_wait(bell, seen, BELL_TIMEOUT);
+        }
+        waiters.fetch_sub(1, Ordering::AcqRel);
+    }
+}
+
+/// A claimed submission with its resolved job entry.
+type Claimed = (u64, u64, u32, Option<Arc<CachedJob>>);
+
+/// Serve `ring` from a dispatcher thread until `stop` is set.
+pub fn serve(ring: Arc<Ring>, mode: Arc<DaemonMode>, stop: Arc<AtomicBool>) -> thread::JoinHandle<()> {
+    thread::spawn(move || dispatch(&ring, &mode, &stop))
+}
+
+/// Claim submissions as they arrive and queue them on the compute pool,
+/// up to DISPATCH_BATCH per task.
+fn dispatch(ring: &Arc<Ring>, mode: &DaemonMode, stop: &Arc<AtomicBool>) {
+    let mut jobs: Vec<Option<Arc<CachedJob>>> = (0..ring.job_slots).map(|_| None).collect();
+    let mut batch: Vec<Claimed> = Vec::with_capacity(DISPATCH_BATCH);
+    let mut idle_spins = 0u32;
+    while !stop.load(Ordering::Relaxed) {
+        while batch.len() < DISPATCH_BATCH {
+            match ring.claim() {
+                Some((req_id, nonce, job, _flags)) => {
+                    let entry = resolve_job(ring, mode, &mut jobs, job as usize);
+                    batch.push((req_id, nonce, job, entry));
+                }
+                None => break,
+            }
+        }
+        if batch.is_empty() {
+            // spin briefly before paying for a futex sleep
+            idle_spins += 1;
+            if idle_spins < 64 {
+                std::hint::spin_loop();
+            } else {
+                ring.wait_for_submissions();
+            }
+            continue;
+        }
+        idle_spins = 0;
+        let work = std::mem::replace(&mut batch, Vec::with_capacity(DISPATCH_BATCH));
+        let (ring, stop) = (ring.clone(), stop.clone());
+        pool::spawn(move || compute(&ring, work, &stop));
+    }
+}
+
+fn compute(ring: &Ring, work: Vec<Claimed>, stop: &AtomicBool) {
+    for (req_id, nonce, job, entry) in work {
+        let (hash, matched) = match entry {
+            Some(j) => {
+                let h = j.template.hash_nonce(nonce);
+                (h, hash_meets_difficulty(&h, j.template.mask))
+            }
+            // unknown/invalid job: complete with an all-ones hash, never a match
+            None => ([0xff; 64], false),
+        };
+        ring.complete(req_id, matched, job, &hash, stop);
+    }
+}
+
+fn resolve_job(ring: &Ring, mode: &DaemonMode, jobs: &mut [Option<Arc<CachedJob>>], job: usize) -> Option<Arc<CachedJob>> {
+    if job >= jobs.len() {
+        return None;
+    }
+    let current = ring.u32_at(ring.job_off(job)).load(Ordering::Acquire);
+    let stale = match &jobs[job] {
+        Some(c) => c.gen != current,
+        None => true,
+    };
+    if stale {
+        jobs[job] = None;
+        for _ in 0..1000 {
+            if let Some((gen, mask, rom, suffix)) = ring.read_job(job) {
+                match job_hasher(mode, rom.trim()) {
+                    Ok(hasher) => {
+                        let template = JobTemplate::new(hasher, mask, suffix);
+                        jobs[job] = Some(Arc::new(CachedJob { gen, template }));
+                    }
+                    Err(e) => eprintln!("Ring job {} rejected: {:?}", job, e),
+                }
+                break;
+            }
+            thread::yield_now();
+        }
+    }
+    jobs[job].clone()
+}
+
+fn bad(msg: &str) -> io::Error {
+    io::Error::new(io::ErrorKind::InvalidData, msg.to_string())
+}
+
+/// futex(2) on a word in a MAP_SHARED mapping (so no FUTEX_PRIVATE_FLAG).
+#[cfg(target_os = "linux")]
+fn futex_wait(word: &AtomicU32, expected: u32, timeout: Duration) {
+    let ts = libc::timespec {
+        tv_sec: timeout.as_secs() as libc::time_t,
+        tv_nsec: timeout.subsec_nanos() as libc::c_long,
+    };
+    unsafe {
+        libc::syscall(libc::SYS_futex, word as *const AtomicU32, libc::FUTEX_WAIT, expected, &ts as *const libc::timespec);
+    }
+}
+
+#[cfg(target_os = "linux")]
+fn futex_wake(word: &AtomicU32) {
+    unsafe {
+        libc::syscall(libc::SYS_futex, word as *const AtomicU32, libc::FUTEX_WAKE, i32::MAX);
+    }
+}
+
+#[cfg(not(target_os = "linux"))]
+fn futex_wait(_word: &AtomicU32, _expected: u32, timeout: Duration) {
+    thread::sleep(timeout.min(Duration::from_millis(1)));
+}
+
+#[cfg(not(target_os = "linux"))]
+fn futex_wake(_word: &AtomicU32) {}
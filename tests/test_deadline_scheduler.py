@@ -0,0 +1,80 @@
+"""DeadlineScheduler.plan() and required_zero_bits() in the address-list
+coordinator (--deadline-schedule)."""
+import importlib.util
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_spec = importlib.util.spec_from_file_location(
+    "chayvottungaddresstheolist", os.path.join(ROOT, "chayvottungaddresstheolist.py"))
+coordinator = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(coordinator)
+
+NOW = 1_800_000_000.0
+
+
+def difficulty(zero_bits: int) -> str:
+    """Difficulty mask whose top zero_bits bits must be zero."""
+    return format(0xFFFFFFFF >> zero_bits, "08X")
+
+
+def pair(name: str, deadline_in: float, zero_bits: int) -> tuple:
+    latest = datetime.fromtimestamp(NOW + deadline_in, timezone.utc)
+    challenge = {
+        "challenge_id": name,
+        "difficulty": difficulty(zero_bits),
+        "latest_submission": latest.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+    }
+    return challenge, "addr1"
+
+
+def plan(pairs, rate, open_pairs=None):
+    scheduler = coordinator.DeadlineScheduler("http://x", "127.0.0.1", 0, False)
+    scheduler.rate = rate
+    order = scheduler.plan(pairs, set(range(len(pairs))) if open_pairs is None else open_pairs, NOW)
+    return [pairs[i][0]["challenge_id"] for i in order]
+
+
+@pytest.mark.parametrize("mask, bits", [
+    ("FFFFFFFF", 0),
+    ("0FFFFFFF", 4),
+    ("001FFFFF", 11),
+    ("0000FFFF", 16),
+    ("00000000", 32),
+])
+def test_required_zero_bits(mask, bits):
+    assert coordinator.required_zero_bits(mask) == bits
+
+
+def test_without_a_rate_pairs_go_by_deadline_then_difficulty():
+    pairs = [pair("late", 30, 1), pair("hard", 10, 5), pair("easy", 10, 2)]
+    assert plan(pairs, None) == ["easy", "hard", "late"]
+
+
+def test_pairs_that_fit_keep_deadline_order():
+    # 8 + 4 + 2 seconds at 1 H/s, all within their deadlines
+    pairs = [pair("c", 30, 1), pair("a", 10, 3), pair("b", 12, 2)]
+    assert plan(pairs, 1.0) == ["a", "b", "c"]
+
+
+def test_longest_pair_is_dropped_to_save_two_shorter_ones():
+    # x alone fits (8s by 9), x+y fits (10s by 10), x+y+z does not (12s by
+    # 11): dropping x, the longest, lets y and z both finish
+    pairs = [pair("x", 9, 3), pair("y", 10, 1), pair("z", 11, 1)]
+    assert plan(pairs, 1.0) == ["y", "z", "x"]
+
+
+def test_dropped_pairs_follow_by_deadline():
+    pairs = [pair("a", 10, 3), pair("b", 12, 2), pair("big", 13, 5),
+             pair("huge", 14, 6), pair("d", 30, 1)]
+    # big (32s) and huge (64s) cannot finish in time at 1 H/s
+    assert plan(pairs, 1.0) == ["a", "b", "d", "big", "huge"]
+    # at 8 H/s every pair fits: 1 + 0.5 + 4 + 8 + 0.25 seconds
+    assert plan(pairs, 8.0) == ["a", "b", "big", "huge", "d"]
+
+
+def test_only_open_pairs_are_planned():
+    pairs = [pair("a", 10, 3), pair("b", 12, 2), pair("c", 30, 1)]
+    assert plan(pairs, 1.0, open_pairs={0, 2}) == ["a", "c"]